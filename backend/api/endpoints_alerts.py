@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from uuid import uuid4
 from core.auth import get_current_user_id
@@ -6,7 +7,13 @@ from db.databases import engine
 from sqlalchemy import text
 from typing import List
 from datetime import datetime
-from services.subscription_checker import evaluate_all_subscriptions
+from services import mailer
+from services.subscription_checker import (
+    load_alerts,
+    run_alert_evaluation,
+    stream_triggered_alerts
+)
+import json
 from utils.helpers import setup_logger
 
 router = APIRouter()
@@ -65,11 +72,37 @@ async def delete_subscription(sub_id: str, user=Depends(get_current_user_id)):
     return {"message": f"Subscription {sub_id} deleted."}
 
 @router.get("/check-alerts/")
-async def check_triggered_alerts(send_email: bool = Query(True), user=Depends(get_current_user_id)):
-    logger.info(f"🔍 Checking alerts, send_email={send_email}")
+async def check_triggered_alerts(limit: int = Query(500, ge=1, le=5000), user=Depends(get_current_user_id)):
+    logger.info(f"🔍 Reading alert ledger, limit={limit}")
     if user["role"] != "admin":
         logger.warning("❌ Unauthorized alert check attempt")
-        raise HTTPException(status_code=403, detail="Only admins can trigger alert checks.")
-    alerts = await evaluate_all_subscriptions(send_email=send_email)
-    logger.info(f"✅ {len(alerts)} alerts triggered")
+        raise HTTPException(status_code=403, detail="Only admins can view all triggered alerts.")
+    alerts = load_alerts(limit=limit)
+    logger.info(f"✅ {len(alerts)} alerts returned")
     return {"total_triggered": len(alerts), "alerts": alerts}
+
+@router.post("/run-evaluation/")
+async def run_evaluation(
+    send_email: bool = Query(True),
+    force: bool = Query(False, description="Re-evaluate groups whose model and subscriptions are unchanged"),
+    stream: bool = Query(False, description="Stream newly recorded alerts as NDJSON"),
+    user=Depends(get_current_user_id)
+):
+    logger.info(f"🔔 Alert evaluation requested, send_email={send_email}, force={force}, stream={stream}")
+    if user["role"] != "admin":
+        logger.warning("❌ Unauthorized alert evaluation attempt")
+        raise HTTPException(status_code=403, detail="Only admins can trigger alert checks.")
+    if stream:
+        return StreamingResponse(_stream_alerts(send_email, force), media_type="application/x-ndjson")
+    summary = await run_alert_evaluation(send_email=send_email, force=force)
+    return summary
+
+
+async def _stream_alerts(send_email: bool, force: bool):
+    new_alerts = []
+    async for alert in stream_triggered_alerts(force=force):
+        new_alerts.append(alert)
+        yield json.dumps(alert, default=str) + "\n"
+    if send_email:
+        await mailer.enqueue(new_alerts)
+    logger.info(f"✅ {len(new_alerts)} alerts streamed")
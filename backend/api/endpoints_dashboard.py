@@ -1,18 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from sqlalchemy import text
-from core.auth import get_current_user_id
+from core.auth import get_current_user_id, get_stream_user
 from db.databases import engine
 from utils.helpers import download_from_supabase_storage
 from utils.helpers import get_aqi_category
-from services.evaluation import get_prophet_forecast
+from services.evaluation import get_prophet_forecast_async
+from services import compute, pubsub
+from services.subscription_checker import alert_channel, alert_event, load_alerts
 from services.insights import get_multi_year_personalized_trend
-from services.mistral_ai import generate_health_tip
-from services.insights_engine import build_risk_timeline
-from datetime import datetime, timedelta
+from services.mistral_ai import generate_health_tip, stream_health_tip
+from services.insights_engine import build_multi_pollutant_timeline
+from services.tip_precompute import standard_window
+from utils.sse import SSE_RETRY_MS, sse_event, sse_response
+from datetime import datetime
 import pandas as pd
+import json
 import pickle
 import logging
 import asyncio
+from collections import OrderedDict
+from typing import Optional
 import time
 import os
 
@@ -22,39 +29,83 @@ logger = logging.getLogger(__name__)
 DEFAULT_REGION = "thessaloniki"
 DEFAULT_POLLUTANTS = ["no2_conc", "o3_conc", "co_conc"]
 
-@router.get("/overview/")
-async def get_dashboard_overview(user=Depends(get_current_user_id)):
-    start_time = time.time()
-    region = DEFAULT_REGION
-    pollutant = "pollution"
-    user_id = user["user_id"]
+SSE_KEEPALIVE = float(os.getenv("SSE_KEEPALIVE", 15))
 
-    # 1. Load latest dataset
-    with engine.connect() as conn:
-        row = conn.execute(text("""
-            SELECT filename, year FROM datasets
-            WHERE region = :region
-            ORDER BY year DESC LIMIT 1
-        """), {"region": region}).fetchone()
+def _load_sorted_dataset(csv_bytes) -> pd.DataFrame:
+    df = pd.read_csv(csv_bytes)
+    df["time"] = pd.to_datetime(df["time"])
+    return df.sort_values("time")
 
-    if not row:
-        raise HTTPException(status_code=404, detail="No dataset found for region")
+def _read_file_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
 
-    filename, year = row
+# Per-section latency budgets (seconds). A section that misses its budget is
+# served from the last good value (stale) or as a degraded placeholder.
+SECTION_BUDGETS = {
+    "current": float(os.getenv("DASHBOARD_BUDGET_CURRENT", 4)),
+    "forecast": float(os.getenv("DASHBOARD_BUDGET_FORECAST", 6)),
+    "personalized": float(os.getenv("DASHBOARD_BUDGET_PERSONALIZED", 6)),
+    "risk": float(os.getenv("DASHBOARD_BUDGET_RISK", 6)),
+    "ai_tip": float(os.getenv("DASHBOARD_BUDGET_AI_TIP", 10)),
+}
+STALE_CACHE_SIZE = 1024
+_stale_sections: "OrderedDict[tuple, object]" = OrderedDict()
+
+
+def _remember(key: tuple, value):
+    _stale_sections[key] = value
+    _stale_sections.move_to_end(key)
+    while len(_stale_sections) > STALE_CACHE_SIZE:
+        _stale_sections.popitem(last=False)
+
+
+async def _run_section(name: str, task: asyncio.Future, stale_key: tuple, placeholder, deadline: float):
+    """
+    Await a section task until its deadline. Returns (value, status, ms) where
+    status is "ok", "stale" or "degraded". The task is shielded, so a missed
+    budget doesn't cancel work another section depends on; it finishes in the
+    background and refreshes the stale copy for the next request.
+    """
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        value = await asyncio.wait_for(asyncio.shield(task), timeout=max(deadline - time.perf_counter(), 0))
+        _remember(stale_key, value)
+    except HTTPException:
+        raise
+    except Exception as e:
+        if isinstance(e, asyncio.TimeoutError):
+            logger.warning(f"⚠️ Dashboard section '{name}' missed its {SECTION_BUDGETS[name]}s budget")
+            task.add_done_callback(
+                lambda t: _remember(stale_key, t.result()) if not t.cancelled() and t.exception() is None else None
+            )
+        else:
+            logger.warning(f"⚠️ Dashboard section '{name}' failed: {e}")
+        if stale_key in _stale_sections:
+            value, status = _stale_sections[stale_key], "stale"
+        else:
+            value, status = placeholder, "degraded"
+    return value, status, (time.perf_counter() - started) * 1000
+
+
+async def _current_section(filename: str):
     csv_bytes = await download_from_supabase_storage(filename, bucket="datasets")
-    df = pd.read_csv(csv_bytes)
-    df["time"] = pd.to_datetime(df["time"])
-    df = df.sort_values("time")
+    df = await compute.run_in_thread(_load_sorted_dataset, csv_bytes)
 
-    # 2. Current values
     latest = df.iloc[-1]
     current_values = {p: latest[p] for p in DEFAULT_POLLUTANTS if p in df.columns}
     current_aqi = max(
         [get_aqi_category(p, val) for p, val in current_values.items()],
         key=lambda cat: ["Good", "Moderate", "Unhealthy", "Very Unhealthy", "Hazardous"].index(cat)
     )
+    return {
+        "pollutants": current_values,
+        "aqi_category": current_aqi
+    }
 
-    # 3. Forecast preview
+
+async def _forecast_section(region: str, pollutant: str):
     forecast = []
     try:
         with engine.connect() as conn:
@@ -71,10 +122,9 @@ async def get_dashboard_overview(user=Depends(get_current_user_id)):
             model_path = model_filename if model_filename.startswith("local_models/") else os.path.join("local_models", model_filename)
 
             if os.path.exists(model_path):
-                with open(model_path, "rb") as f:
-                    model = pickle.load(f)
+                model_bytes = await compute.run_in_thread(_read_file_bytes, model_path)
 
-                forecast_df = get_prophet_forecast(model, pollutant=pollutant, periods=7)
+                forecast_df = await get_prophet_forecast_async(model_bytes, pollutant=pollutant, periods=7)
 
                 if isinstance(forecast_df, pd.DataFrame):
                     forecast_records = forecast_df.to_dict(orient="records")
@@ -83,7 +133,7 @@ async def get_dashboard_overview(user=Depends(get_current_user_id)):
                             forecast.append({
                                 "ds": str(row["ds"]),
                                 "yhat": round(row["yhat"], 2),
-                                "category": get_aqi_category(pollutant, row["yhat"])
+                                "category": row["category"]
                             })
                         except Exception as e:
                             logger.warning(f"⚠️ Skipping forecast row due to error: {e}")
@@ -95,67 +145,208 @@ async def get_dashboard_overview(user=Depends(get_current_user_id)):
             logger.warning(f"⚠️ No model found for {region} - {pollutant}")
     except Exception as e:
         logger.warning(f"⚠️ Forecast model error: {e}")
+    return forecast
+
+
+async def _risk_timeline(user_id: str, region: str):
+    # The same window the nightly tip precompute uses, so the AI tip is a cache hit
+    start_date, end_date = standard_window()
+    risk_forecast = await build_multi_pollutant_timeline(user_id, region, start_date, end_date)
+    if isinstance(risk_forecast, dict):
+        raise RuntimeError(risk_forecast.get("error", "Risk timeline unavailable"))
+    return risk_forecast
+
+
+async def _risk_section(timeline_task):
+    risk_forecast = await asyncio.shield(timeline_task)
+    return risk_forecast[-1]["category"] if risk_forecast else "Unknown"
 
-    # 4. Personalized insights
-    personalized = await get_multi_year_personalized_trend(user_id, region, pollutant)
 
-    # 5. AI Tip with timeout fallback
+def _load_profile(user_id: str) -> Optional[dict]:
+    with engine.connect() as conn:
+        profile_row = conn.execute(text("""
+            SELECT * FROM profiles WHERE user_id = :uid
+        """), {"uid": user_id}).fetchone()
+        return dict(profile_row._mapping) if profile_row else None
+
+
+async def _tip_forecast(timeline_task, fallback):
+    """The risk timeline and its last category; `await fallback()` if the timeline failed."""
     try:
-        # Get profile from DB
-        with engine.connect() as conn:
-            profile_row = conn.execute(text("""
-                SELECT * FROM profiles WHERE user_id = :uid
-            """), {"uid": user_id}).fetchone()
-            profile = dict(profile_row._mapping) if profile_row else None
-
-        # Fetch risk forecast for riskLevel
-        start_date = datetime.now().date().isoformat()
-        end_date = (datetime.now().date() + timedelta(days=6)).isoformat()
-        
-        try:
-            risk_forecast = await build_risk_timeline(user_id, region, pollutant, start_date, end_date)
-            risk_level_category = risk_forecast[-1]["category"] if risk_forecast else "Unknown"
-        except Exception as e:
-            logger.warning(f"⚠️ Risk timeline fetch failed: {e}")
-            risk_level_category = "Unknown"
-
-        health_tip = await generate_health_tip(region, pollutant, forecast, profile)
-        health_tip["riskLevel"] = risk_level_category
-
-    except asyncio.TimeoutError:
-        logger.warning("⚠️ Mistral tip generation timed out.")
-        health_tip = {
-            "tip": "Air quality insights are currently delayed. Avoid outdoor activities if unsure.",
-            "riskLevel": "Unknown",
-            "personalized": bool(profile)
-        }
+        risk_forecast = await asyncio.shield(timeline_task)
+        return risk_forecast, risk_forecast[-1]["category"] if risk_forecast else "Unknown"
     except Exception as e:
-        logger.warning(f"⚠️ Mistral generation failed: {e}")
-        health_tip = {
-            "tip": "Air quality health tips are temporarily unavailable.",
+        logger.warning(f"⚠️ Risk timeline fetch failed: {e}")
+        return await fallback(), "Unknown"
+
+
+async def _ai_tip_section(user_id: str, region: str, pollutant: str, forecast_task, timeline_task):
+    profile = _load_profile(user_id)
+
+    forecast, risk_level = await _tip_forecast(timeline_task, lambda: asyncio.shield(forecast_task))
+    health_tip = await generate_health_tip(region, pollutant, forecast, profile)
+    health_tip["riskLevel"] = risk_level
+    return health_tip
+
+
+@router.get("/overview/")
+async def get_dashboard_overview(response: Response, user=Depends(get_current_user_id)):
+    start_time = time.perf_counter()
+    region = DEFAULT_REGION
+    pollutant = "pollution"
+    user_id = user["user_id"]
+
+    with engine.connect() as conn:
+        row = conn.execute(text("""
+            SELECT filename, year FROM datasets
+            WHERE region = :region
+            ORDER BY year DESC LIMIT 1
+        """), {"region": region}).fetchone()
+
+    if not row:
+        raise HTTPException(status_code=404, detail="No dataset found for region")
+
+    filename, year = row
+
+    # Independent sections run concurrently; the AI tip waits on the forecast
+    # and risk sections it needs, so overview latency ~= the slowest chain.
+    timeline = asyncio.ensure_future(_risk_timeline(user_id, region))
+    tasks = {
+        "current": asyncio.ensure_future(_current_section(filename)),
+        "forecast": asyncio.ensure_future(_forecast_section(region, pollutant)),
+        "personalized": asyncio.ensure_future(get_multi_year_personalized_trend(user_id, region, pollutant)),
+        "risk": asyncio.ensure_future(_risk_section(timeline)),
+    }
+    tasks["ai_tip"] = asyncio.ensure_future(
+        _ai_tip_section(user_id, region, pollutant, tasks["forecast"], timeline)
+    )
+
+    placeholders = {
+        "current": {"pollutants": {}, "aqi_category": "Unknown"},
+        "forecast": [],
+        "personalized": {"error": "Personalized trend is temporarily unavailable."},
+        "risk": "Unknown",
+        "ai_tip": {
+            "tip": "Air quality insights are currently delayed. Avoid outdoor activities if unsure.",
             "riskLevel": "Unknown",
-            "personalized": bool(profile)
-        }
+            "personalized": False
+        },
+    }
+    stale_keys = {
+        "current": ("current", region),
+        "forecast": ("forecast", region, pollutant),
+        "personalized": ("personalized", region, pollutant, user_id),
+        "risk": ("risk", region, user_id),
+        "ai_tip": ("ai_tip", region, pollutant, user_id),
+    }
 
-    duration = time.time() - start_time
-    logger.info(f"✅ Dashboard overview completed in {duration:.2f}s")
+    names = list(tasks)
+    outcomes = await asyncio.gather(*[
+        _run_section(name, tasks[name], stale_keys[name], placeholders[name], start_time + SECTION_BUDGETS[name])
+        for name in names
+    ])
+    results = dict(zip(names, outcomes))
+
+    timings = ", ".join(f"{name};dur={ms:.1f}" for name, (_, _, ms) in results.items())
+    degraded = [name for name, (_, status, _) in results.items() if status != "ok"]
+    response.headers["Server-Timing"] = timings
+    response.headers["X-Dashboard-Degraded"] = ",".join(degraded) or "none"
+
+    duration = time.perf_counter() - start_time
+    logger.info(f"✅ Dashboard overview completed in {duration:.2f}s ({timings})")
 
     return {
         "region": region,
-        "current": {
-            "pollutants": current_values,
-            "aqi_category": current_aqi
-        },
-        "forecast": forecast,
-        "personalized": personalized,
-        "ai_tip": health_tip
+        "current": results["current"][0],
+        "forecast": results["forecast"][0],
+        "personalized": results["personalized"][0],
+        "ai_tip": results["ai_tip"][0]
     }
 
+@router.get("/ai-tip/stream/")
+async def stream_dashboard_ai_tip(user=Depends(get_stream_user)):
+    """
+    The overview's `ai_tip` section as Server-Sent Events: `token` events
+    carry text as Mistral generates it, and the final `tip` event carries
+    the same object the overview returns.
+    """
+    region, pollutant, user_id = DEFAULT_REGION, "pollution", user["user_id"]
+    profile = _load_profile(user_id)
+    timeline = asyncio.ensure_future(_risk_timeline(user_id, region))
+    forecast, risk_level = await _tip_forecast(timeline, lambda: _forecast_section(region, pollutant))
+
+    async def events():
+        async for event, data in stream_health_tip(region, pollutant, forecast, profile):
+            if event == "tip":
+                data["riskLevel"] = risk_level
+            yield sse_event(event, data)
+
+    return sse_response(events())
+
+
 @router.get("/alerts/")
 async def get_dashboard_alerts(user=Depends(get_current_user_id)):
+    """
+    Current alerts from the ledger plus the user's subscribed regions. New
+    alerts are pushed over /dashboard/alerts/stream/ (SSE) or
+    /dashboard/alerts/ws (WebSocket) instead of polling this endpoint.
+    """
     user_id = user["user_id"]
+    today = datetime.now().date()
+    active_alerts = [
+        alert for alert in await compute.run_in_thread(load_alerts, user_id, 100)
+        if str(alert["forecast_date"]) >= today.isoformat()
+    ]
+    with engine.connect() as conn:
+        regions = conn.execute(text("""
+            SELECT DISTINCT region FROM aqi_subscriptions WHERE user_id = :uid
+        """), {"uid": user_id}).fetchall()
+
     return {
-        "active_alerts": [],
-        "subscribed_regions": [],
-        "status": "No alerts configured yet"
-    }
\ No newline at end of file
+        "active_alerts": [alert_event(alert) for alert in active_alerts],
+        "subscribed_regions": sorted(row[0] for row in regions),
+        "status": f"{len(active_alerts)} active alerts" if active_alerts else "No active alerts"
+    }
+
+
+@router.get("/alerts/stream/")
+async def stream_dashboard_alerts(request: Request, user=Depends(get_stream_user)):
+    """Server-Sent Events: one `alert` event per newly triggered alert for this user."""
+    async def events():
+        async with pubsub.subscribe(alert_channel(user["user_id"])) as sub:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    alert = await asyncio.wait_for(sub.get(), timeout=SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse_event("alert", alert, id=alert["id"])
+
+    return sse_response(events())
+
+
+@router.websocket("/alerts/ws")
+async def websocket_dashboard_alerts(websocket: WebSocket, token: Optional[str] = Query(None)):
+    """WebSocket variant of the alert stream: each message is one alert as JSON."""
+    try:
+        user = get_stream_user(token, websocket.headers.get("authorization"))
+    except HTTPException:
+        await websocket.close(code=4401)
+        return
+    await websocket.accept()
+
+    async def forward(sub):
+        async for alert in sub:
+            await websocket.send_text(json.dumps(alert, default=str))
+
+    async with pubsub.subscribe(alert_channel(user["user_id"])) as sub:
+        sender = asyncio.ensure_future(forward(sub))
+        try:
+            # Nothing is expected from the client; this returns on disconnect
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            sender.cancel()
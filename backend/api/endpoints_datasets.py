@@ -9,7 +9,8 @@ from services.data_upload import (
     preview_dataset_contents,
     delete_dataset_by_id,
 )
-from schemas.insights import DatasetOut
+from schemas.insights import DatasetOut, RegionCentroidIn, RegionCentroidOut
+from services import compute, spatial
 from utils.helpers import setup_logger
 from sqlalchemy import text
 from db.databases import engine
@@ -96,3 +97,24 @@ async def check_dataset_available(region: str):
         row = result.mappings().fetchone()
         count = row["count"] if row else 0
     return {"available": count > 0}
+
+
+@router.get("/centroids/", response_model=List[RegionCentroidOut])
+async def list_region_centroids():
+    """Region centroids used to interpolate forecasts for regions without a model."""
+    centroids = await compute.run_in_thread(spatial.load_centroids)
+    return sorted(centroids.values(), key=lambda c: c["region"].lower())
+
+
+@router.put("/centroids/{region}", response_model=RegionCentroidOut)
+async def set_region_centroid(region: str, centroid: RegionCentroidIn, user=Depends(get_current_user_id)):
+    """Set a region's centroid by hand, e.g. for a municipality with no data of its own."""
+    if user["role"] != "admin":
+        logger.warning("❌ Unauthorized centroid update attempt")
+        raise HTTPException(status_code=403, detail="Only admins can set region centroids.")
+    try:
+        await compute.run_in_thread(spatial.set_centroid, region, centroid.lat, centroid.lon)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"📍 Centroid of {region} set to {centroid.lat}, {centroid.lon} by {user['user_id']}")
+    return {"region": region, "lat": centroid.lat, "lon": centroid.lon, "source": "manual"}
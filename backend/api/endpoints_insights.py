@@ -2,12 +2,12 @@ from fastapi import APIRouter, Query, Depends, HTTPException
 from core.auth import get_current_user_id
 from db.databases import engine
 from sqlalchemy import text
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Literal, Optional
 from collections import defaultdict
+import math
 from uuid import uuid4
-from datetime import datetime
+from datetime import datetime, date
 from services.insights import (
-    get_yearly_trend,
     get_top_polluted_regions,
     get_seasonal_variation,
     get_personalized_pollutant_insights,
@@ -16,6 +16,8 @@ from services.insights import (
     get_daily_trend,
     get_daily_trend_by_year
 )
+from services.summary_engine import get_pollution_summary
+from services import distribution, insights_batch, time_index
 import pandas as pd
 from utils.helpers import download_from_supabase_storage
 from typing import Union, List
@@ -29,7 +31,10 @@ from schemas.insights import (
     MonthlyForecastResponse,
     AQISubscriptionIn,
     AQISubscriptionOut,
-    DailyTrendResponse
+    DailyTrendResponse,
+    DistributionResponse,
+    InsightsBatchRequest,
+    InsightsBatchResponse
 )
 from utils.helpers import setup_logger
 
@@ -72,9 +77,52 @@ async def get_available_datasets():
     }
 
 @router.get("/trend/", response_model=DailyTrendResponse)
-async def trend_over_time(region: str, pollutant: str, year: int, user=Depends(get_current_user_id)):
+async def trend_over_time(
+    region: str,
+    pollutant: str,
+    year: int,
+    resolution: Optional[Literal["hourly", "daily", "weekly"]] = None,
+    max_points: Optional[int] = Query(None, ge=3, le=20000),
+    method: Literal["lttb", "minmax"] = "lttb",
+    user=Depends(get_current_user_id)
+):
+    """
+    Trend series for a dataset year. `resolution` averages to hourly, daily
+    or weekly points; `max_points` downsamples the result for charting
+    (`lttb` keeps the line shape, `minmax` the per-bucket envelope).
+    """
     logger.info(f"\ud83d\udcc8 Daily trend for {region} - {pollutant} in {year}")
-    result = await get_daily_trend_by_year(region, pollutant, year)
+    result = await get_daily_trend_by_year(region, pollutant, year, resolution, max_points, method)
+    if "error" in result:
+        raise HTTPException(status_code=404, detail=result["error"])
+    return {
+        "region": region,
+        "pollutant": pollutant,
+        "trend": result
+    }
+
+@router.get("/trend/range/", response_model=DailyTrendResponse)
+async def trend_over_range(
+    region: str,
+    pollutant: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    resolution: Optional[Literal["hourly", "daily", "weekly"]] = None,
+    max_points: Optional[int] = Query(None, ge=3, le=20000),
+    method: Literal["lttb", "minmax"] = "lttb",
+    user=Depends(get_current_user_id)
+):
+    """
+    Trend series for any date range (dates or ISO timestamps, open ends
+    allowed), merged across the region's datasets, spanning years if needed.
+    """
+    try:
+        time_index.parse_bound(start_date)
+        time_index.parse_bound(end_date, end=True)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start_date and end_date must be dates or ISO timestamps.")
+    logger.info(f"\ud83d\udcc8 Range trend for {region} - {pollutant} ({start_date}..{end_date})")
+    result = await get_daily_trend(region, pollutant, start_date, end_date, resolution, max_points, method)
     if "error" in result:
         raise HTTPException(status_code=404, detail=result["error"])
     return {
@@ -83,6 +131,44 @@ async def trend_over_time(region: str, pollutant: str, year: int, user=Depends(g
         "trend": result
     }
 
+@router.get("/distribution/", response_model=DistributionResponse)
+async def pollutant_distribution(
+    region: str,
+    pollutant: str,
+    year: Optional[int] = None,
+    month: Optional[int] = Query(None, ge=1, le=12),
+    grain: Literal["hour", "day"] = "day",
+    percentiles: str = Query("5,25,50,75,95", description="Comma-separated percentiles (0-100)"),
+    value: Optional[float] = Query(None, description="Also return the percentile rank of this value"),
+    user=Depends(get_current_user_id)
+):
+    """
+    Percentiles of hourly values or daily means for a region and pollutant
+    (all years, one year and/or one calendar month), and optionally the rank
+    of `value`, e.g. "today is worse than 90% of days". Estimated from
+    quantile sketches; see `rank_error_pct` for the error bound.
+    """
+    try:
+        levels = [float(p) for p in percentiles.split(",") if p.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="percentiles must be comma-separated numbers.")
+    if not levels or any(not math.isfinite(p) or p < 0 or p > 100 for p in levels):
+        raise HTTPException(status_code=400, detail="percentiles must be between 0 and 100.")
+    if value is not None and not math.isfinite(value):
+        raise HTTPException(status_code=400, detail="value must be a finite number.")
+
+    digest = await distribution.get_digest(region, pollutant, grain, year, month)
+    if digest.count == 0:
+        raise HTTPException(status_code=404, detail="No data for this region, pollutant and period.")
+    return {
+        "region": region,
+        "pollutant": pollutant,
+        "grain": grain,
+        "year": year,
+        "month": month,
+        **distribution.describe(digest, levels, value)
+    }
+
 @router.get("/seasonality/", response_model=SeasonalityResponse)
 async def seasonal_pattern(region: str, pollutant: str, year: int, user=Depends(get_current_user_id)):
     logger.info(f"\ud83d\uddd5\ufe0f Seasonality for {region} - {pollutant} ({year})")
@@ -96,9 +182,19 @@ async def seasonal_pattern(region: str, pollutant: str, year: int, user=Depends(
     }
 
 @router.get("/top-polluted/", response_model=List[Dict[str, Any]])
-async def top_polluted_regions(pollutant: str, year: int, top_n: int = 5, user=Depends(get_current_user_id)):
-    logger.info(f"\ud83c\udfc6 Top polluted regions for {pollutant} in {year}")
-    result = await get_top_polluted_regions(year, pollutant, top_n)
+async def top_polluted_regions(
+    pollutant: str,
+    year: Optional[int] = None,
+    top_n: int = 5,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    user=Depends(get_current_user_id)
+):
+    """Regions ranked by mean level for a dataset year, or for a start_date/end_date window."""
+    if year is None and start_date is None and end_date is None:
+        raise HTTPException(status_code=400, detail="Provide a year or a start_date/end_date window.")
+    logger.info(f"\ud83c\udfc6 Top polluted regions for {pollutant} in {year or f'{start_date}..{end_date}'}")
+    result = await get_top_polluted_regions(year, pollutant, top_n, start_date, end_date)
     return [
         {"name": name, "value": value}
         for name, value in zip(result["labels"], result["values"])
@@ -107,9 +203,8 @@ async def top_polluted_regions(pollutant: str, year: int, top_n: int = 5, user=D
 @router.get("/summary/", response_model=FullSummaryResponse)
 async def pollution_summary(region: str, pollutant: str, year: int, top_n: int = 5, user=Depends(get_current_user_id)):
     logger.info(f"\ud83d\udcca Summary for {region} - {pollutant} ({year})")
-    trend = await get_yearly_trend(region, pollutant, year)
-    top = await get_top_polluted_regions(year, pollutant, top_n)
-    seasonality = await get_seasonal_variation(region, pollutant, year)
+    summary = await get_pollution_summary(region, pollutant, year, top_n)
+    trend, top, seasonality = summary["trend"], summary["top_regions"], summary["seasonality"]
 
     if "error" in trend:
         raise HTTPException(status_code=404, detail=trend["error"])
@@ -126,6 +221,21 @@ async def pollution_summary(region: str, pollutant: str, year: int, top_n: int =
         }
     }
 
+@router.post("/batch/", response_model=InsightsBatchResponse)
+async def insights_batch_view(batch: InsightsBatchRequest, user=Depends(get_current_user_id)):
+    """
+    Several charts in one request. Datasets, the profile and duplicate
+    specs are loaded once and shared; results (or per-chart errors) are
+    keyed by spec id.
+    """
+    specs = [spec.dict() for spec in batch.specs]
+    if not specs or len(specs) > insights_batch.MAX_BATCH_SPECS:
+        raise HTTPException(status_code=400, detail=f"Send 1 to {insights_batch.MAX_BATCH_SPECS} chart specs.")
+    if len({spec["id"] for spec in specs}) != len(specs):
+        raise HTTPException(status_code=400, detail="Chart spec ids must be unique.")
+    logger.info(f"🧺 Insights batch of {len(specs)} charts for user {user['user_id']}")
+    return await insights_batch.run_batch(user["user_id"], specs)
+
 @router.get("/historical/", response_model=HistoricalDataResponse)
 async def historical_data(region: str, year: int):
     logger.info(f"📜 Historical view for {region} ({year})")
@@ -198,11 +308,10 @@ async def list_my_subscriptions(user=Depends(get_current_user_id)):
         logger.info(f"✅ {len(subs)} subscriptions returned")
         return subs
     
-@router.get("/triggered-alerts/", summary="Check triggered AQI alerts")
+@router.get("/triggered-alerts/", summary="Triggered AQI alerts for the current user")
 async def check_triggered_alerts(user=Depends(get_current_user_id)):
-    from services.subscription_checker import evaluate_all_subscriptions
-    logger.info("🔍 Checking triggered AQI alerts")
-    from services.subscription_checker import evaluate_all_subscriptions
-    alerts = await evaluate_all_subscriptions()
-    logger.info(f"✅ {len(alerts)} alerts triggered")
+    from services.subscription_checker import load_alerts
+    logger.info("🔍 Reading triggered AQI alerts from the ledger")
+    alerts = load_alerts(user_id=user["user_id"])
+    logger.info(f"✅ {len(alerts)} alerts found")
     return {"total_triggered": len(alerts), "alerts": alerts}
@@ -1,17 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
-from core.auth import get_current_user_id
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Request, Response
+from core.auth import get_current_user_id, get_stream_user
 from services.model_training import train_forecast_model
-from services.evaluation import load_forecast_model, get_prophet_forecast
+from services.evaluation import load_forecast_model, get_prophet_forecast_async, forecast_latest_model, load_model_file
 from db.databases import engine
 from typing import Optional, List
 from sqlalchemy import text
 from utils.helpers import delete_from_supabase_storage, download_from_supabase_storage
-from utils.helpers import get_aqi_category
-from services.insights_engine import build_risk_timeline, FRONTEND_LABELS
-from services.mistral_ai import generate_health_tip
+from utils.sse import sse_event, sse_response
+from services.insights_engine import build_risk_timeline, build_multi_pollutant_timeline, load_profile
+from services.mistral_ai import generate_health_tip, stream_health_tip
 import pickle
+from services import compute, forecast_matrix, spatial, tip_precompute
 from pydantic import BaseModel
-import pandas as pd
 from core.config import settings
 import json
 
@@ -68,10 +68,13 @@ async def train_pollutant_model(
         raise HTTPException(status_code=400, detail=error_msg)
 
     logger.info(f"✅ Training completed for {region} - {pollutant} ({frequency})")
+    # New forecasts may change categories; refresh the region's stored tips
+    tip_precompute.schedule_refresh(region)
+    spatial.invalidate(region)
     return result
 
 from fastapi import Query
-from datetime import datetime
+from datetime import date, datetime
 
 @router.get("/predict/")
 async def predict_pollutant(
@@ -85,6 +88,13 @@ async def predict_pollutant(
 ):
     logger.info(f"📈 Predicting {pollutant} for {region} ({frequency}) | User: {user['user_id']}")
 
+    # Parse optional dates
+    try:
+        start = datetime.fromisoformat(start_date) if start_date else None
+        end = datetime.fromisoformat(end_date) if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start_date and end_date must be ISO dates (YYYY-MM-DD).")
+
     with engine.connect() as conn:
         row = conn.execute(text("""
             SELECT file_path FROM models
@@ -97,18 +107,29 @@ async def predict_pollutant(
         }).mappings().fetchone()
 
     if not row:
-        raise HTTPException(status_code=404, detail="Trained model not found for this frequency")
+        # No model of its own: interpolate from the modeled neighbours
+        interpolated = await spatial.interpolate(
+            region, pollutant,
+            lambda neighbor: _stored_model_forecast(neighbor, pollutant, frequency, limit, start, end),
+            key=("predict", frequency, limit, start, end), frequency=frequency
+        )
+        if interpolated is None:
+            raise HTTPException(status_code=404, detail="Trained model not found for this frequency")
+        forecast_df, interpolation = interpolated
+        return {
+            "region": region,
+            "pollutant": pollutant,
+            "frequency": frequency,
+            "forecast": forecast_df.to_dict(orient="records"),
+            "provenance": "interpolated",
+            "interpolation": interpolation
+        }
 
     filename = row["file_path"]
-    model_bytes = await download_from_supabase_storage(filename, bucket=settings.bucket_models)
-    model = pickle.load(model_bytes)
+    model_bytes = await load_model_file(filename, bucket=settings.bucket_models)
 
-    # Parse optional dates
-    start = datetime.fromisoformat(start_date) if start_date else None
-    end = datetime.fromisoformat(end_date) if end_date else None
-
-    forecast_df = get_prophet_forecast(
-        model=model,
+    forecast_df = await get_prophet_forecast_async(
+        model=model_bytes,
         pollutant=pollutant,
         frequency=frequency,
         periods=limit,
@@ -120,10 +141,29 @@ async def predict_pollutant(
         "region": region,
         "pollutant": pollutant,
         "frequency": frequency,
-        "forecast": forecast_df.to_dict(orient="records") if hasattr(forecast_df, "to_dict") else forecast_df
+        "forecast": forecast_df.to_dict(orient="records") if hasattr(forecast_df, "to_dict") else forecast_df,
+        "provenance": "model"
     }
 
 
+async def _stored_model_forecast(
+    region: str, pollutant: str, frequency: str, limit: int,
+    start: Optional[datetime] = None, end: Optional[datetime] = None
+):
+    """A modeled region's `/predict/` forecast, for interpolating its neighbours."""
+    with engine.connect() as conn:
+        row = conn.execute(text("""
+            SELECT file_path FROM models
+            WHERE region = :region AND pollutant = :pollutant AND frequency = :frequency
+            ORDER BY created_at DESC LIMIT 1
+        """), {"region": region, "pollutant": pollutant, "frequency": frequency}).mappings().fetchone()
+    if not row:
+        return None
+    model_bytes = await load_model_file(row["file_path"], bucket=settings.bucket_models)
+    return await get_prophet_forecast_async(model=model_bytes, pollutant=pollutant, frequency=frequency, periods=limit,
+                                            start_date=start, end_date=end)
+
+
 
 @router.get("/list/")
 async def list_models(user=Depends(get_current_user_id)):
@@ -152,11 +192,9 @@ async def get_forecast_from_model(model_id: str, user=Depends(get_current_user_i
     if not row:
         raise HTTPException(status_code=404, detail="Model not found")
 
-    model = await load_forecast_model(row["region"], row["pollutant"], row["frequency"])
-    if not model:
+    forecast_df = await forecast_latest_model(row["region"], row["pollutant"], row["frequency"])
+    if forecast_df is None:
         raise HTTPException(status_code=404, detail="Model file not found")
-
-    forecast_df = get_prophet_forecast(model, row["pollutant"], frequency=row["frequency"])
     return {
         "region": row["region"],
         "pollutant": row["pollutant"],
@@ -188,23 +226,86 @@ async def forecast_from_model(
         }).fetchone()
 
     if not row or not row._mapping["model_blob"]:
-        logger.warning("⚠️ No model found in DB for that combination.")
-        raise HTTPException(status_code=404, detail="Model not found.")
+        # No model of its own: interpolate from the modeled neighbours
+        interpolated = await spatial.interpolate(
+            region, pollutant,
+            lambda neighbor: _blob_model_forecast(neighbor, pollutant, frequency, limit),
+            key=("forecast-range", frequency.lower(), limit), frequency=frequency
+        )
+        if interpolated is None:
+            logger.warning("⚠️ No model found in DB for that combination.")
+            raise HTTPException(status_code=404, detail="Model not found.")
+        forecast_df, interpolation = interpolated
+        return {
+            "forecast": json.loads(forecast_df.to_json(orient="records")),
+            "provenance": "interpolated",
+            "interpolation": interpolation
+        }
     
     try:
-        model = pickle.loads(row._mapping["model_blob"])
+        model = await compute.run_in_thread(pickle.loads, row._mapping["model_blob"])
         print("🔍 Training target range (y):", model.history["y"].describe())
     except Exception as e:
         logger.error(f"❌ Failed to load model blob: {e}")
         raise HTTPException(status_code=500, detail="Model loading failed.")
 
     try:
-        forecast_df = get_prophet_forecast(model, pollutant, frequency=normalized_freq, periods=limit)
-        return {"forecast": json.loads(forecast_df.to_json(orient="records"))}
+        forecast_df = await get_prophet_forecast_async(
+            row._mapping["model_blob"], pollutant, frequency=normalized_freq, periods=limit
+        )
+        return {"forecast": json.loads(forecast_df.to_json(orient="records")), "provenance": "model"}
     except Exception as e:
         logger.error(f"❌ Forecast generation failed: {e}")
         raise HTTPException(status_code=500, detail="Forecast failed.")
 
+
+async def _blob_model_forecast(region: str, pollutant: str, frequency: str, limit: int):
+    """A modeled region's `/forecast-range/` forecast, for interpolating its neighbours."""
+    with engine.connect() as conn:
+        row = conn.execute(text("""
+            SELECT model_blob FROM models
+            WHERE region = :region AND pollutant = :pollutant AND frequency = :frequency
+            ORDER BY created_at DESC LIMIT 1
+        """), {"region": region, "pollutant": pollutant, "frequency": frequency.lower()}).fetchone()
+    if not row or not row._mapping["model_blob"]:
+        return None
+    freq_map = {"daily": "D", "monthly": "M", "yearly": "Y"}
+    return await get_prophet_forecast_async(
+        row._mapping["model_blob"], pollutant, frequency=freq_map.get(frequency.lower(), frequency.upper()), periods=limit
+    )
+
+@router.get("/forecast/matrix/")
+async def get_forecast_matrix(
+    request: Request,
+    pollutant: str = Query(...),
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    regions: Optional[List[str]] = Query(None, description="Default: every modeled region (and, with interpolate, every region with a centroid)"),
+    interpolate: bool = Query(True, description="Fill regions without a model from their neighbours"),
+    user=Depends(get_current_user_id)
+):
+    """
+    Region x day matrix of daily `yhat`, category codes (indexes into
+    `categories`, -1 unknown) and base risk for the map view, in one
+    columnar response. The body is the same for every user; send the
+    returned ETag as If-None-Match to get 304 while it is unchanged.
+    """
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date.")
+    if (end_date - start_date).days + 1 > forecast_matrix.MATRIX_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"The window is limited to {forecast_matrix.MATRIX_MAX_DAYS} days.")
+
+    etag, body = await forecast_matrix.get_matrix(
+        pollutant, start_date, end_date, regions, interpolate, request.headers.get("if-none-match")
+    )
+    if etag is None:
+        # Some rows failed: the body must not be revalidated as the complete version
+        return Response(content=body, media_type="application/json", headers={"Cache-Control": "no-store"})
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if body is None:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/forecast/risk-timeline/")
 async def get_risk_timeline(
     region: str,
@@ -214,33 +315,13 @@ async def get_risk_timeline(
     user=Depends(get_current_user_id)
 ):
     if pollutant.lower() == "pollution":
-        combined = []
-        for pol in ["no2_conc", "o3_conc", "so2_conc", "co_conc", "no_conc"]:
-            logger.info(f"🔁 Sub-forecast for {pol}")
-            sub_result = await build_risk_timeline(user["user_id"], region, pol, start_date, end_date)
-            if "error" in sub_result:
-                logger.warning(f"⚠️ {pol} skipped: {sub_result['error']}")
-                continue
-            combined.append(pd.DataFrame(sub_result))
-
-        if not combined:
-            raise HTTPException(status_code=404, detail="No forecast data for any pollutants.")
-
-        # Merge and average
-        merged = pd.concat(combined).groupby("ds").agg({
-            "yhat": "mean",
-            "risk_score": "mean"
-        }).reset_index()
-
-        # Compute simplified category and frontend label from average yhat
-        merged["category"] = merged["yhat"].apply(lambda v: get_aqi_category("NO2", v))
-        merged["frontend_label"] = merged["category"].map(FRONTEND_LABELS)
-        merged["risk_score"] = merged["risk_score"].round().astype(int)
-        merged["ds"] = merged["ds"].astype(str)
+        merged = await build_multi_pollutant_timeline(user["user_id"], region, start_date, end_date)
+        if "error" in merged:
+            raise HTTPException(status_code=404, detail=merged["error"])
 
         return JSONResponse({
-            "forecast": merged.to_dict(orient="records"),
-            "current": merged.iloc[0].to_dict() if not merged.empty else None
+            "forecast": merged,
+            "current": merged[0] if merged else None
         })
 
     # Regular single-pollutant flow
@@ -278,6 +359,7 @@ async def delete_model(model_id: str = Path(...), user=Depends(get_current_user_
     # Delete from Supabase storage
     bucket = settings.bucket_models
     await delete_from_supabase_storage(filename, bucket)
+    spatial.invalidate()
 
     return {"message": f"Model {model_id} deleted successfully."}
 
@@ -351,11 +433,10 @@ async def compare_models(
         raise HTTPException(status_code=400, detail="Models must have the same pollutant and frequency for comparison.")
 
     for meta in metadata:
-        model = await load_forecast_model(meta["region"], meta["pollutant"], meta["frequency"])
-        if model:
-            forecast_df = get_prophet_forecast(
-                model, meta["pollutant"], frequency=meta["frequency"], periods=90
-            )
+        forecast_df = await forecast_latest_model(
+            meta["region"], meta["pollutant"], meta["frequency"], periods=90
+        )
+        if forecast_df is not None:
             forecasts.append({
                 "model_id": meta["id"],
                 "region": meta["region"],
@@ -435,67 +516,30 @@ async def preview_model_forecast(model_id: str, limit: int = 7):
     if not row:
         raise HTTPException(status_code=404, detail="Model not found")
 
-    # Load model from blob
-    model = pickle.loads(row["model_blob"])
+    # Model blob is unpickled inside the compute worker
     freq_map = {"daily": "D", "weekly": "W", "monthly": "M", "yearly": "Y"}
     freq_code = freq_map.get(row["frequency"].lower(), "D")
 
-    forecast = get_prophet_forecast(
-        model=model,
+    forecast = await get_prophet_forecast_async(
+        model=row["model_blob"],
         pollutant=row["pollutant"],
         frequency=freq_code,
         periods=limit
     )
     return forecast.to_dict(orient="records")
 
-@router.get("/forecast/health-tip/")
-async def get_health_tip(
-    region: str,
-    pollutant: str,
-    start_date: str,
-    end_date: str,
-    user=Depends(get_current_user_id)
-):
-    logger.info(f"🧠 Generating health tip for {region}, pollutant: {pollutant}")
-
-    # 👉 Load user profile
-    with engine.connect() as conn:
-        result = conn.execute(
-            text("SELECT * FROM profiles WHERE user_id = :uid"),
-            {"uid": user["user_id"]}
-        ).fetchone()
-    profile = dict(result._mapping) if result else {}
-
+async def _health_tip_forecast(user_id: str, region: str, pollutant: str, start_date: str, end_date: str, profile: dict):
     if pollutant.lower() == "pollution":
-        combined = []
-        POLLUTANTS = ["no2_conc", "o3_conc", "so2_conc", "co_conc", "no_conc"]
-        for pol in POLLUTANTS:
-            logger.info(f"🔁 Sub-forecast for {pol}")
-            sub_result = await build_risk_timeline(user["user_id"], region, pol, start_date, end_date)
-            if "error" in sub_result:
-                logger.warning(f"⚠️ {pol} skipped: {sub_result['error']}")
-                continue
-            combined.append(pd.DataFrame(sub_result))
-
-        if not combined:
-            raise HTTPException(status_code=404, detail="No forecast data for any pollutants.")
-
-        # 📊 Merge on ds and average yhat/risk
-        merged = pd.concat(combined).groupby("ds").agg({
-            "yhat": "mean",
-            "risk_score": "mean"
-        }).reset_index()
-
-        # Optional: pick main pollutant for AQI label logic
-        merged["category"] = merged["yhat"].apply(lambda v: get_aqi_category("NO2", v))  # use weighted logic later
-        merged["risk_score"] = merged["risk_score"].round().astype(int)
-        merged["ds"] = merged["ds"].astype(str)
-        forecast = merged.to_dict(orient="records")
+        forecast = await build_multi_pollutant_timeline(
+            user_id, region, start_date, end_date, profile=profile
+        )
+        if "error" in forecast:
+            raise HTTPException(status_code=404, detail=forecast["error"])
 
     else:
         # 👉 Regular single-pollutant forecast
         forecast = await build_risk_timeline(
-            user_id=user["user_id"],
+            user_id=user_id,
             region=region,
             pollutant=pollutant,
             start_date=start_date,
@@ -508,6 +552,21 @@ async def get_health_tip(
             raise HTTPException(status_code=404, detail="Forecast is empty.")
 
     logger.info(f"📬 Forecast rows to Mistral: {len(forecast)}")
+    return forecast
+
+@router.get("/forecast/health-tip/")
+async def get_health_tip(
+    region: str,
+    pollutant: str,
+    start_date: str,
+    end_date: str,
+    user=Depends(get_current_user_id)
+):
+    logger.info(f"🧠 Generating health tip for {region}, pollutant: {pollutant}")
+
+    # 👉 Load user profile
+    profile = load_profile(user["user_id"])
+    forecast = await _health_tip_forecast(user["user_id"], region, pollutant, start_date, end_date, profile)
 
     # 🔁 Generate AI health suggestions
     try:
@@ -521,4 +580,38 @@ async def get_health_tip(
             "personalized": bool(profile)
         }
 
-    return tip
\ No newline at end of file
+    return tip
+
+@router.get("/forecast/health-tip/stream/")
+async def stream_health_tip_events(
+    region: str,
+    pollutant: str,
+    start_date: str,
+    end_date: str,
+    user=Depends(get_stream_user)
+):
+    """
+    Streaming variant of /forecast/health-tip/ (Server-Sent Events): `token`
+    events carry text as Mistral generates it; the last event, `tip`, carries
+    the final {tip, riskLevel, personalized} object.
+    """
+    logger.info(f"🧠 Streaming health tip for {region}, pollutant: {pollutant}")
+    profile = load_profile(user["user_id"])
+    forecast = await _health_tip_forecast(user["user_id"], region, pollutant, start_date, end_date, profile)
+
+    async def events():
+        async for event, data in stream_health_tip(region, pollutant, forecast, profile):
+            yield sse_event(event, data)
+
+    return sse_response(events())
+
+@router.post("/health-tips/precompute/")
+async def precompute_health_tips(
+    region: Optional[str] = Query(None, description="Only this region"),
+    force: bool = Query(False, description="Regenerate tips whose inputs did not change"),
+    user=Depends(get_current_user_id)
+):
+    """Run the nightly health-tip precompute now (admin only)."""
+    if user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can precompute health tips.")
+    return await tip_precompute.run_precompute(region=region, force=force)
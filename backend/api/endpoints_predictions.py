@@ -1,11 +1,15 @@
 from fastapi import APIRouter, Query, Depends, HTTPException
 from core.auth import get_current_user_id
-from utils.helpers import download_from_supabase_storage, get_aqi_category
+from utils.helpers import download_from_supabase_storage
+from utils import aqi
 from db.databases import engine
 from sqlalchemy import text
 from io import BytesIO
 import pandas as pd
 import pickle
+from services import compute, forecast_tasks
+from services.evaluation import load_model_file
+from services.prediction import compare_regions_forecast, has_model, interpolated_forecast
 from utils.helpers import setup_logger
 
 router = APIRouter()
@@ -17,38 +21,46 @@ async def predict_pollutant(region: str = Query(...), pollutant: str = Query(...
     logger.info(f"📈 Predicting {pollutant} for {region}, user={user['user_id']}")
 
     try:
-        model_bytes: BytesIO = await download_from_supabase_storage(model_id, bucket="models")
-        model = pickle.load(model_bytes)
+        model_bytes = await load_model_file(model_id, bucket="models")
         logger.info("✅ Model loaded successfully")
     except Exception as e:
-        logger.error(f"❌ Model load failed: {e}", exc_info=True)
-        raise HTTPException(status_code=404, detail=f"Model not found for {region} - {pollutant}")
+        if await compute.run_in_thread(has_model, region, pollutant):
+            # The model exists but could not be loaded (storage/network): not a case for interpolation
+            logger.error(f"❌ Model load failed: {e}", exc_info=True)
+            raise
+        # No model of its own: interpolate from the modeled neighbours
+        interpolated = await interpolated_forecast(region, pollutant, 3, "Y", 90)
+        if interpolated is None:
+            logger.warning(f"⚠️ No model or modeled neighbours for {region} - {pollutant}")
+            raise HTTPException(status_code=404, detail=f"Model not found for {region} - {pollutant}")
+        forecast, interpolation = interpolated
+        return {
+            "region": region,
+            "pollutant": pollutant,
+            "forecast": forecast.to_dict(orient="records"),
+            "provenance": "interpolated",
+            "interpolation": interpolation
+        }
 
-    forecast = model.predict(model.make_future_dataframe(periods=3, freq="Y"))
-    forecast_tail = forecast[["ds", "yhat", "yhat_lower", "yhat_upper"]].tail(90)
-    forecast_tail["category"] = forecast_tail["yhat"].apply(lambda val: get_aqi_category(pollutant, val))
+    forecast_tail = await compute.run_in_process(
+        forecast_tasks.predict_tail, model_bytes, 3, "Y", 90
+    )
+    forecast_tail["category"] = aqi.categorize(pollutant, forecast_tail["yhat"])
 
     logger.info("✅ Forecast generated")
     return {
         "region": region,
         "pollutant": pollutant,
-        "forecast": forecast_tail.to_dict(orient="records")
+        "forecast": forecast_tail.to_dict(orient="records"),
+        "provenance": "model"
     }
 
 @router.post("/compare/")
 async def compare_regions_pollutant(pollutant: str = Query(...), regions: list[str] = Query(...), user=Depends(get_current_user_id)):
     logger.info(f"📊 Comparing {pollutant} across regions: {regions}")
-    from api.endpoints_predictions import predict_pollutant
+    comparison = await compare_regions_forecast(regions, pollutant)
+    for region, error in comparison["errors"].items():
+        logger.warning(f"⚠️ Failed forecast for region: {region} — {error}")
 
-    comparison = []
-    for region in regions:
-        try:
-            forecast = await predict_pollutant(region=region, pollutant=pollutant, user=user)
-            logger.info(f"✅ Forecast success for region: {region}")
-            comparison.append({"region": region, "forecast": forecast["forecast"]})
-        except HTTPException as e:
-            logger.warning(f"⚠️ Failed forecast for region: {region} — {e.detail}")
-            comparison.append({"region": region, "error": e.detail})
-
-    logger.info("✅ Comparison complete")
-    return {"pollutant": pollutant, "comparison": comparison}
+    logger.info(f"✅ Comparison complete ({len(comparison['regions'])}/{len(regions)} regions)")
+    return comparison
@@ -1,13 +1,19 @@
 from fastapi import APIRouter, Query, Depends, HTTPException
-from core.auth import get_current_user_id
-from utils.helpers import download_from_supabase_storage, get_aqi_category
+from core.auth import get_current_user_id, get_stream_user
+from utils.helpers import download_from_supabase_storage
+from utils import aqi
+from utils.sse import sse_event, sse_response
 from services.insights_engine import build_risk_timeline
-from services.mistral_ai import generate_health_tip
+from services.mistral_ai import generate_health_tip, stream_health_tip
+from services.tip_precompute import standard_window
 from db.databases import engine
 from sqlalchemy import text
 from io import BytesIO
 import pandas as pd
 import pickle
+from services import compute, forecast_tasks
+from services.evaluation import load_model_file
+from services.prediction import compare_regions_forecast
 
 from utils.helpers import setup_logger
 logger = setup_logger(__name__)
@@ -24,18 +30,15 @@ async def predict_pollutant(
     logger.info(f"📈 Predicting pollutant for {region} - {pollutant}, requested by {user['user_id']}")
 
     try:
-        model_bytes: BytesIO = await download_from_supabase_storage(model_id, bucket="models")
-        model = pickle.load(model_bytes)
+        model_bytes = await load_model_file(model_id, bucket="models")
     except Exception as e:
         logger.error(f"❌ Failed to load model {model_id}: {e}")
         raise HTTPException(status_code=404, detail=f"Model not found for {region} - {pollutant}")
 
-    future = model.make_future_dataframe(periods=3, freq="Y")
-    forecast = model.predict(future)
-    forecast_tail = forecast[["ds", "yhat", "yhat_lower", "yhat_upper"]].tail(90)
-    forecast_tail["category"] = forecast_tail["yhat"].apply(
-        lambda val: get_aqi_category(pollutant, val)
+    forecast_tail = await compute.run_in_process(
+        forecast_tasks.predict_tail, model_bytes, 3, "Y", 90
     )
+    forecast_tail["category"] = aqi.categorize(pollutant, forecast_tail["yhat"])
 
     logger.info(f"✅ Forecast generated for {region} - {pollutant}")
     return {
@@ -52,56 +55,46 @@ async def compare_regions_pollutant(
     user=Depends(get_current_user_id)
 ):
     logger.info(f"📊 Comparing pollutant {pollutant} across regions: {regions}")
-    from api.endpoints_predictions import predict_pollutant
-
-    comparison = []
-    for region in regions:
-        try:
-            forecast = await predict_pollutant(region=region, pollutant=pollutant, user=user)
-            comparison.append({
-                "region": region,
-                "forecast": forecast["forecast"]
-            })
-            logger.info(f"✅ Region {region} forecast retrieved")
-        except HTTPException as e:
-            logger.warning(f"⚠️ Forecast for {region} failed: {e.detail}")
-            comparison.append({
-                "region": region,
-                "error": e.detail
-            })
+    comparison = await compare_regions_forecast(regions, pollutant)
+    for region, error in comparison["errors"].items():
+        logger.warning(f"⚠️ Forecast for {region} failed: {error}")
 
     logger.info(f"✅ Region comparison completed for {pollutant}")
-    return {
-        "pollutant": pollutant,
-        "comparison": comparison
-    }
-
+    return comparison
 
-@router.get("/tip/")
-async def get_health_tip(
-    region: str = Query(...),
-    pollutant: str = Query(...),
-    include_profile: bool = Query(True),
-    user=Depends(get_current_user_id)
-):
-    """Return 2–5 health tips generated by Mistral AI."""
 
+async def _tip_inputs(user_id: str, region: str, pollutant: str, include_profile: bool):
     # Load optional user profile
     profile = {}
     if include_profile:
         with engine.connect() as conn:
             row = conn.execute(
                 text("SELECT * FROM profiles WHERE user_id = :uid"),
-                {"uid": user["user_id"]}
+                {"uid": user_id}
             ).fetchone()
         profile = dict(row._mapping) if row else {}
 
-    # Build forecast timeline for AI prompt
+    # Build forecast timeline for AI prompt over the precomputed tip window
+    start_date, end_date = standard_window()
     try:
-        forecast = await build_risk_timeline(user["user_id"], region, pollutant)
+        forecast = await build_risk_timeline(user_id, region, pollutant, start_date, end_date)
     except Exception as e:
         logger.error(f"Forecast failed: {e}")
         raise HTTPException(status_code=400, detail="Forecast generation failed")
+    if isinstance(forecast, dict):
+        raise HTTPException(status_code=404, detail=forecast.get("error", "Forecast generation failed"))
+    return forecast, profile
+
+
+@router.get("/tip/")
+async def get_health_tip(
+    region: str = Query(...),
+    pollutant: str = Query(...),
+    include_profile: bool = Query(True),
+    user=Depends(get_current_user_id)
+):
+    """Return 2–5 health tips generated by Mistral AI."""
+    forecast, profile = await _tip_inputs(user["user_id"], region, pollutant, include_profile)
 
     try:
         tip = await generate_health_tip(region, pollutant, forecast, profile)
@@ -114,3 +107,24 @@ async def get_health_tip(
         "pollutant": pollutant,
         "advice": tip.get("tip", "")
     }
+
+
+@router.get("/tip/stream/")
+async def stream_health_tip_events(
+    region: str = Query(...),
+    pollutant: str = Query(...),
+    include_profile: bool = Query(True),
+    user=Depends(get_stream_user)
+):
+    """
+    Streaming variant of /tip/ (Server-Sent Events): `token` events carry
+    text as it is generated, then a final `tip` event with
+    {tip, riskLevel, personalized}.
+    """
+    forecast, profile = await _tip_inputs(user["user_id"], region, pollutant, include_profile)
+
+    async def events():
+        async for event, data in stream_health_tip(region, pollutant, forecast, profile):
+            yield sse_event(event, data)
+
+    return sse_response(events())
@@ -0,0 +1,41 @@
+from fastapi import APIRouter
+from services import compute, mailer, mistral_ai, pubsub, query_engine, singleflight, tip_cache, tip_precompute
+from utils.helpers import setup_logger
+
+router = APIRouter()
+logger = setup_logger(__name__)
+
+@router.get("/compute/")
+async def compute_metrics():
+    """Queue depth, concurrency and timing for the compute executors."""
+    return compute.get_metrics()
+
+@router.get("/singleflight/")
+async def singleflight_metrics():
+    """Calls vs. actual executions per coalesced computation."""
+    return singleflight.get_metrics()
+
+@router.get("/mailer/")
+async def mailer_metrics():
+    """Outbox throughput, retries and SMTP session reuse."""
+    return mailer.get_metrics()
+
+@router.get("/pubsub/")
+async def pubsub_metrics():
+    """Connected push subscribers and delivered/dropped events."""
+    return pubsub.get_metrics()
+
+@router.get("/tip-cache/")
+async def tip_cache_metrics():
+    """Health-tip cache hit rate, LLM latency saved and the last precompute run."""
+    return {**tip_cache.get_metrics(), "precompute": tip_precompute.get_metrics()}
+
+@router.get("/llm/")
+async def llm_metrics():
+    """LLM gateway concurrency, latency, hedging and circuit breaker state."""
+    return mistral_ai.gateway.metrics()
+
+@router.get("/query-engine/")
+async def query_engine_metrics():
+    """Embedded query engine state: enabled, cached datasets and last sync."""
+    return query_engine.get_metrics()
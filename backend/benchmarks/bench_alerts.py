@@ -0,0 +1,86 @@
+"""
+Benchmark: alert evaluation throughput on 100k synthetic subscriptions.
+
+Compares the old per-subscription loop (categorize + is_threshold_exceeded
+for every subscription, with one forecast per subscription) against the
+grouped evaluator (one forecast per region/pollutant, vectorized threshold
+matching). Forecasts are synthetic so only the evaluation cost is measured;
+the forecast counts show the Prophet work each approach would do.
+
+Run from backend/ with the app's env vars set:  python -m benchmarks.bench_alerts
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from services.subscription_checker import group_subscriptions, match_group
+from utils import aqi
+from utils.helpers import is_threshold_exceeded
+
+N_SUBSCRIPTIONS = 100_000
+REGIONS = ["thessaloniki", "kalamaria", "ampelokipoi-menemeni", "neapoli-sykies", "pavlos-melas"]
+POLLUTANTS = ["no2_conc", "o3_conc", "so2_conc", "co_conc", "no_conc"]
+
+
+def _synthetic(rng):
+    subscriptions = [
+        {
+            "sub_id": str(i),
+            "user_id": f"user-{i}",
+            "email": f"user-{i}@example.com",
+            "region": REGIONS[rng.integers(len(REGIONS))],
+            "pollutant": POLLUTANTS[rng.integers(len(POLLUTANTS))],
+            "threshold": aqi.AQI_CATEGORIES_ORDER[rng.integers(len(aqi.AQI_CATEGORIES_ORDER))],
+        }
+        for i in range(N_SUBSCRIPTIONS)
+    ]
+    forecasts = {
+        (region, pollutant): pd.DataFrame({
+            "ds": pd.to_datetime(["2025-12-31", "2026-12-31", "2027-12-31"]),
+            "yhat": rng.gamma(2.0, 25.0, 3),
+        })
+        for region in REGIONS for pollutant in POLLUTANTS
+    }
+    return subscriptions, forecasts
+
+
+def _per_subscription(subscriptions, forecasts):
+    alerts = 0
+    for sub in subscriptions:
+        forecast = forecasts[(sub["region"], sub["pollutant"])]
+        categories = aqi.categorize(sub["pollutant"], forecast["yhat"])
+        for (_, row), category in zip(forecast.iterrows(), categories):
+            if is_threshold_exceeded(category, sub["threshold"]):
+                alerts += 1
+                break
+    return alerts
+
+
+def _grouped(subscriptions, forecasts):
+    alerts = 0
+    for key, subs in group_subscriptions(subscriptions).items():
+        alerts += len(match_group(subs, key[1], forecasts[key]))
+    return alerts
+
+
+def main():
+    subscriptions, forecasts = _synthetic(np.random.default_rng(0))
+    groups = len(group_subscriptions(subscriptions))
+
+    for name, fn, n_forecasts in [
+        ("per-subscription", _per_subscription, N_SUBSCRIPTIONS),
+        ("grouped", _grouped, groups),
+    ]:
+        start = time.perf_counter()
+        alerts = fn(subscriptions, forecasts)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:>17}: {elapsed:7.2f}s  {N_SUBSCRIPTIONS / elapsed:>10,.0f} subs/s  "
+            f"{alerts} alerts  {n_forecasts} forecasts"
+        )
+
+
+if __name__ == "__main__":
+    main()
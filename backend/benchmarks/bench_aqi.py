@@ -0,0 +1,47 @@
+"""
+Microbenchmark: per-row `.apply(get_aqi_category)` vs vectorized `utils.aqi`.
+
+Run from backend/:  python -m benchmarks.bench_aqi
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import aqi
+
+SIZES = [10_000, 100_000, 1_000_000]
+
+
+def _per_row(pollutant: str, values: pd.Series, weight: float):
+    categories = values.apply(lambda v: aqi.category_for(pollutant, v))
+    labels = categories.map(aqi.FRONTEND_LABELS)
+    scores = categories.apply(
+        lambda c: round(aqi.AQI_CATEGORIES_ORDER.index(c) * weight) if c in aqi.AQI_CATEGORIES_ORDER else 0
+    )
+    return categories, labels, scores
+
+
+def _vectorized(pollutant: str, values: pd.Series, weight: float):
+    return aqi.classify(pollutant, values, weight)
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'points':>10} {'per-row (s)':>12} {'vectorized (s)':>15} {'speedup':>8}")
+    for n in SIZES:
+        values = pd.Series(rng.gamma(2.0, 20.0, n))
+        slow = _timed(_per_row, "no2_conc", values, 1.5)
+        fast = min(_timed(_vectorized, "no2_conc", values, 1.5) for _ in range(3))
+        print(f"{n:>10} {slow:>12.3f} {fast:>15.4f} {slow / fast:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: one insights page view as separate chart requests vs one batch.
+
+The page shows the daily trend, yearly trend and seasonality of a region
+and year, the personalized trend and the multi-year trend (three dataset
+years). As separate requests, each chart downloads and fully parses its
+own CSV(s) and the two personalized charts each read the profile. The
+batch (`insights_batch.run_batch`, query engine off) downloads each CSV
+once, parses only the needed columns once, and reads the profile once.
+
+Datasets are synthetic hourly CSVs with the usual pollutant columns plus
+PM and meteorological ones; downloads are in-memory, so the CPU numbers
+(process time) are parsing and aggregation only.
+
+Run from backend/ with the app's env vars set:  python -m benchmarks.bench_insights_batch
+"""
+
+import asyncio
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from services import insights_batch
+from services.insights import (
+    _daily_trend_by_year_from_csv,
+    _seasonal_variation_from_csv,
+    _year_average_from_csv,
+    _yearly_trend_from_csv
+)
+
+REGION, POLLUTANT, YEARS = "kalamaria", "no2_conc", [2022, 2023, 2024]
+ROUNDS = 5
+COLUMNS = ["no2_conc", "o3_conc", "so2_conc", "co_conc", "no_conc", "pm10_conc", "pm2p5_conc", "nh3_conc",
+           "temperature", "humidity", "wind_speed"]
+
+
+def _files():
+    rng = np.random.default_rng(0)
+    files = {}
+    for year in YEARS:
+        times = pd.date_range(f"{year}-01-01", f"{year}-12-31 23:00", freq="h")
+        df = pd.DataFrame({"time": times.astype(str), "lat": 40.6, "lon": 22.9})
+        for column in COLUMNS:
+            df[column] = rng.gamma(2.0, 15.0, len(times))
+        files[f"{REGION}_{year}.csv"] = df.to_csv(index=False).encode()
+    return files
+
+
+def separate(files):
+    """Each chart as its own request; returns bytes fetched."""
+    fetched = 0
+
+    def download(year):
+        nonlocal fetched
+        contents = files[f"{REGION}_{year}.csv"]
+        fetched += len(contents)
+        return BytesIO(contents)
+
+    _daily_trend_by_year_from_csv(download(2024), REGION, POLLUTANT, 2024, max_points=500)
+    _yearly_trend_from_csv(download(2024), REGION, POLLUTANT, 2024)
+    _seasonal_variation_from_csv(download(2024), REGION, POLLUTANT, 2024)
+    _yearly_trend_from_csv(download(2024), REGION, POLLUTANT, 2024)  # personalized
+    for year in YEARS:
+        _year_average_from_csv(download(year), POLLUTANT, year)
+    return fetched
+
+
+async def batch(files):
+    specs = [
+        {"id": "trend", "type": "trend", "max_points": 500},
+        {"id": "yearly", "type": "yearly_trend"},
+        {"id": "seasonality", "type": "seasonality"},
+        {"id": "personalized", "type": "personalized"},
+        {"id": "history", "type": "multi_year_trend"},
+    ]
+    specs = [{"region": REGION, "pollutant": POLLUTANT, "year": 2024, **spec} for spec in specs]
+    result = await insights_batch.run_batch("user", specs)
+    assert all(r["status"] == "ok" for r in result["results"].values()), result["results"]
+    return result["meta"]["bytes_fetched"]
+
+
+def main():
+    files = _files()
+
+    async def download(filename):
+        return files[filename]
+
+    insights_batch.query_engine.ready = lambda: False
+    insights_batch._dataset_rows = lambda regions: {REGION: {y: f"{REGION}_{y}.csv" for y in YEARS}}
+    insights_batch.load_dataset_file = download
+    insights_batch.load_profile = lambda user_id: {"user_id": user_id, "has_asthma": True}
+
+    print(f"{len(YEARS)} datasets of {len(files[f'{REGION}_2024.csv']) / 2**20:.1f} MiB each")
+    for name, run in [("separate", lambda: separate(files)), ("batch", lambda: asyncio.run(batch(files)))]:
+        cpu, wall = time.process_time(), time.perf_counter()
+        for _ in range(ROUNDS):
+            fetched = run()
+        cpu = (time.process_time() - cpu) / ROUNDS
+        wall = (time.perf_counter() - wall) / ROUNDS
+        print(f"{name:>9}: {fetched / 2**20:5.1f} MiB fetched  {cpu * 1000:6.0f} ms CPU  {wall * 1000:6.0f} ms wall "
+              f"per page view")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark: health-tip LLM calls under upstream slowness and an outage.
+
+Runs against the local stub server (benchmarks/llm_stub.py) and compares
+the old call path (a new httpx client per call, 30 s timeout, no limit)
+with the gateway (pooled client, concurrency limit, latency budget, hedged
+second request, circuit breaker). A failed or over-budget call counts as a
+fallback, which is what the user would see instead of a tip. The last
+section compares time to first token with the full completion time for a
+streamed call.
+
+Run from backend/:  python -m benchmarks.bench_llm_gateway
+"""
+
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.llm_stub import StubLLMServer
+from services.llm_gateway import LLMGateway
+
+N_CALLS = 200
+CLIENTS = 8
+BODY = {"model": "mistral-tiny", "messages": [{"role": "user", "content": "tip"}]}
+
+
+async def _direct(url: str, body: dict):
+    async with httpx.AsyncClient(timeout=30) as client:
+        resp = await client.post(url, json=body)
+        resp.raise_for_status()
+        return resp.json()
+
+
+async def _run(call) -> dict:
+    latencies, fallbacks = [], 0
+    queue = asyncio.Queue()
+    for _ in range(N_CALLS):
+        queue.put_nowait(None)
+
+    async def client():
+        nonlocal fallbacks
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                await call()
+            except Exception:
+                fallbacks += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(CLIENTS)])
+    ms = np.array(latencies) * 1000
+    return {
+        "wall_s": time.perf_counter() - started,
+        "p50_ms": np.percentile(ms, 50),
+        "p95_ms": np.percentile(ms, 95),
+        "max_ms": ms.max(),
+        "fallbacks": fallbacks,
+    }
+
+
+def _report(label: str, result: dict):
+    print(
+        f"  {label:<10} wall {result['wall_s']:6.2f}s  p50 {result['p50_ms']:7.1f}ms  "
+        f"p95 {result['p95_ms']:7.1f}ms  max {result['max_ms']:7.1f}ms  fallbacks {result['fallbacks']}"
+    )
+
+
+async def main():
+    stub = StubLLMServer(delay=0.2, slow_fraction=0.1, slow_delay=5.0)
+    url = await stub.start()
+
+    print(f"Slow tail: {N_CALLS} calls from {CLIENTS} clients, 10% of responses take 5 s")
+    _report("direct", await _run(lambda: _direct(url, BODY)))
+    gateway = LLMGateway(url, max_concurrency=16, timeout=2.0, hedge_after=0.5)
+    _report("gateway", await _run(lambda: gateway.complete(BODY)))
+    print(f"  gateway metrics: {gateway.metrics()}")
+    await gateway.close()
+
+    stub.fail, stub.slow_fraction = True, 0.0
+    print(f"\nOutage: every response is a 503 after 0.2 s")
+    stub.requests = 0
+    _report("direct", await _run(lambda: _direct(url, BODY)))
+    print(f"  upstream requests: {stub.requests}")
+    stub.requests = 0
+    gateway = LLMGateway(url, max_concurrency=16, timeout=2.0, breaker_failures=5, breaker_reset=30)
+    _report("gateway", await _run(lambda: gateway.complete(BODY)))
+    print(f"  upstream requests: {stub.requests}, breaker: {gateway.metrics()['breaker_state']}")
+    await gateway.close()
+
+    stub.fail, stub.delay = False, 0.5
+    print(f"\nStreaming: first token after 0.5 s, then one word every {stub.token_delay * 1000:.0f} ms")
+    gateway = LLMGateway(url)
+    started = time.perf_counter()
+    first_token = None
+    async for _ in gateway.stream(BODY):
+        first_token = first_token or time.perf_counter() - started
+    total = time.perf_counter() - started
+    print(f"  first token {first_token * 1000:.0f}ms, full completion {total * 1000:.0f}ms")
+    await gateway.close()
+
+    await stub.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
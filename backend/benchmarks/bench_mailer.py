@@ -0,0 +1,65 @@
+"""
+Benchmark: alert email throughput over a local SMTP stand-in.
+
+Compares the old delivery path (a new SMTP session per message: connect,
+EHLO, send, QUIT) with the pooled mailer (`SMTPConnectionPool`, sessions
+opened once and reused), both sending with the same concurrency. The
+stand-in (benchmarks/smtp_stub.py) delays each reply and each new session
+to approximate a remote relay; TLS and login are off.
+
+Run from backend/:  python -m benchmarks.bench_mailer
+"""
+
+import asyncio
+import smtplib
+import time
+
+from benchmarks.smtp_stub import StubSMTPServer
+from utils.email_utils import SMTPConnectionPool, build_message
+
+N_MESSAGES = 200
+CONCURRENCY = 2
+SENDER = "alerts@example.com"
+
+
+def _messages():
+    return [build_message(f"user{i}@example.com", "AQI alert", "body", sender=SENDER) for i in range(N_MESSAGES)]
+
+
+def _send_one(port: int, message):
+    with smtplib.SMTP("127.0.0.1", port, timeout=30) as server:
+        server.send_message(message)
+
+
+async def per_message(port: int, messages) -> None:
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def send(message):
+        async with semaphore:
+            await asyncio.to_thread(_send_one, port, message)
+
+    await asyncio.gather(*(send(m) for m in messages))
+
+
+async def pooled(port: int, messages) -> None:
+    pool = SMTPConnectionPool(host="127.0.0.1", port=port, user="", starttls=False, size=CONCURRENCY, timeout=30)
+    await asyncio.gather(*(pool.send(m) for m in messages))
+    await pool.close()
+
+
+async def main():
+    messages = _messages()
+    print(f"{N_MESSAGES} messages, concurrency {CONCURRENCY}")
+    for name, run in [("per-message", per_message), ("pooled", pooled)]:
+        stub = StubSMTPServer()
+        port = await stub.start()
+        started = time.perf_counter()
+        await run(port, messages)
+        elapsed = time.perf_counter() - started
+        await stub.stop()
+        assert stub.messages == N_MESSAGES
+        print(f"{name:>12}: {N_MESSAGES / elapsed:7.0f} msg/s  {stub.sessions:4d} SMTP sessions  {elapsed:6.2f} s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""
+Benchmark: insight aggregates with pandas per file vs the DuckDB query engine.
+
+The corpus is synthetic: 20 regions x 10 years of hourly data, one CSV per
+region and year (200 datasets). For each workload it compares:
+
+- pandas: what the insight functions do per request, parsing the CSV(s)
+  (downloads are not counted, so pandas gets the benefit of a warm file)
+- engine: `query_engine.aggregate` over the Parquet cache
+
+Workloads: yearly trend and seasonality for one region/year, the
+multi-year trend of one region (10 files), and ranking all regions for one
+year (20 files). The one-off Parquet conversion of the corpus is reported
+separately.
+
+Run from backend/ with the app's env vars set:  python -m benchmarks.bench_query_engine
+"""
+
+import tempfile
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from services import query_engine
+from services.insights import _seasonal_variation_from_csv, _year_average_from_csv, _yearly_trend_from_csv
+from utils import composite
+
+REGIONS = [f"region-{i:02d}" for i in range(20)]
+YEARS = list(range(2015, 2025))
+ROUNDS = 3
+
+
+def _corpus():
+    rng = np.random.default_rng(0)
+    files = {}
+    for year in YEARS:
+        times = pd.date_range(f"{year}-01-01", f"{year}-12-31 23:00", freq="h")
+        for region in REGIONS:
+            df = pd.DataFrame({"time": times.astype(str), "lat": 40.6, "lon": 22.9})
+            for pollutant in composite.COMPONENT_POLLUTANTS:
+                df[pollutant] = rng.gamma(2.0, 15.0, len(times)).round(3)
+            files[(region, year)] = composite.add_derived_columns(df).to_csv(index=False).encode()
+    return files
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        result = fn()
+    return (time.perf_counter() - start) / ROUNDS, result
+
+
+def main():
+    files = _corpus()
+    size = sum(len(f) for f in files.values())
+    print(f"{len(REGIONS)} regions x {len(YEARS)} years = {len(files)} datasets, {size / 2**20:.0f} MiB of CSV")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        query_engine._cache_dir = cache_dir
+        start = time.perf_counter()
+        for i, ((region, year), contents) in enumerate(files.items()):
+            query_engine.cache_frame(str(i), pd.read_csv(BytesIO(contents)))
+            query_engine.note_dataset(str(i), region, year)
+        print(f"one-off Parquet conversion: {time.perf_counter() - start:.1f} s, "
+              f"{query_engine.get_metrics()['cache_bytes'] / 2**20:.0f} MiB")
+
+        region, year, pollutant = REGIONS[3], 2020, "no2_conc"
+        workloads = [
+            ("yearly trend", lambda: _yearly_trend_from_csv(BytesIO(files[(region, year)]), region, pollutant, year),
+             lambda: query_engine.aggregate(pollutant, ["year"], region=region, dataset_year=year)),
+            ("seasonality", lambda: _seasonal_variation_from_csv(BytesIO(files[(region, year)]), region, pollutant, year),
+             lambda: query_engine.aggregate(pollutant, ["month"], region=region, dataset_year=year)),
+            ("multi-year", lambda: [_year_average_from_csv(BytesIO(files[(region, y)]), "pollution", y) for y in YEARS],
+             lambda: query_engine.aggregate("pollution", ["dataset_year"], region=region, within_dataset_year=True)),
+            ("ranking", lambda: sorted(((_year_average_from_csv(BytesIO(files[(r, year)]), pollutant, year), r)
+                                        for r in REGIONS), reverse=True)[:5],
+             lambda: query_engine.aggregate(pollutant, ["region"], dataset_year=year, order_by="mean",
+                                            descending=True, limit=5)),
+        ]
+        for name, pandas_fn, engine_fn in workloads:
+            pandas_s, _ = _timed(pandas_fn)
+            engine_s, _ = _timed(engine_fn)
+            print(f"{name:>13}: pandas {pandas_s * 1000:8.1f} ms   engine {engine_s * 1000:7.1f} ms   "
+                  f"x{pandas_s / engine_s:5.1f}")
+
+        ranking_pandas = _timed(workloads[3][1])[1]
+        ranking_engine = query_engine.aggregate(pollutant, ["region"], dataset_year=year, order_by="mean",
+                                                descending=True, limit=5)
+        assert [r for _, r in ranking_pandas] == ranking_engine["region"].tolist()
+        assert np.allclose([v for v, _ in ranking_pandas], ranking_engine["mean"])
+
+
+if __name__ == "__main__":
+    main()
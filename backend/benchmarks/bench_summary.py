@@ -0,0 +1,120 @@
+"""
+Benchmark: /insights/summary/ data loading, before and after the single pass.
+
+Compares three ways of building the summary for one region:
+
+- legacy: trend and seasonality each download and parse the region's CSV,
+  and the ranking downloads and parses every region's CSV
+- sequential: as legacy, but the ranking reads the region index
+- single pass: `summary_engine` downloads and parses the region's CSV once
+  (only the needed columns), derives both views from one groupby, and runs
+  the ranking concurrently
+
+Datasets are synthetic hourly CSVs for a year; downloads are simulated with a
+fixed latency (DOWNLOAD_MS) and the index query with INDEX_MS, so the numbers
+show download counts, parse time and end-to-end latency.
+
+Run from backend/ with the app's env vars set:  python -m benchmarks.bench_summary
+"""
+
+import asyncio
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from services import compute
+from services.insights import _seasonal_variation_from_csv, _yearly_trend_from_csv
+from services.insights_engine import COMPONENT_POLLUTANTS
+from services.summary_engine import summarize_csv
+
+REGIONS = ["thessaloniki", "kalamaria", "ampelokipoi-menemeni", "neapoli-sykies", "pavlos-melas",
+           "kordelio-evosmos", "pylaia-chortiatis", "delta"]
+DOWNLOAD_MS = 80
+INDEX_MS = 5
+ROUNDS = 5
+
+
+def _datasets():
+    rng = np.random.default_rng(0)
+    times = pd.date_range("2024-01-01", "2024-12-31 23:00", freq="h").astype(str)
+    files = {}
+    for region in REGIONS:
+        df = pd.DataFrame({"time": times, "lat": 40.6, "lon": 22.9})
+        for pollutant in COMPONENT_POLLUTANTS + ["pm10_conc", "pm2p5_conc", "nh3_conc"]:
+            df[pollutant] = rng.gamma(2.0, 15.0, len(times))
+        files[region] = df.to_csv(index=False).encode()
+    return files
+
+
+class Counters:
+    def __init__(self):
+        self.downloads = 0
+        self.parse_s = 0.0
+
+
+async def _download(files, counters, region):
+    counters.downloads += 1
+    await asyncio.sleep(DOWNLOAD_MS / 1000)
+    return BytesIO(files[region])
+
+
+async def _parse(counters, fn, *args):
+    start = time.perf_counter()
+    result = await compute.run_in_thread(fn, *args)
+    counters.parse_s += time.perf_counter() - start
+    return result
+
+
+def _region_mean(csv_bytes, pollutant):
+    df = pd.read_csv(csv_bytes)
+    return df[COMPONENT_POLLUTANTS].mean(axis=1).mean() if pollutant == "pollution" else df[pollutant].mean()
+
+
+async def legacy(files, counters, region, pollutant):
+    trend = await _parse(counters, _yearly_trend_from_csv, await _download(files, counters, region), region, pollutant, 2024)
+    means = {}
+    for other in REGIONS:
+        means[other] = await _parse(counters, _region_mean, await _download(files, counters, other), pollutant)
+    seasonality = await _parse(counters, _seasonal_variation_from_csv, await _download(files, counters, region),
+                               region, pollutant, 2024)
+    return trend, sorted(means.items(), key=lambda item: -item[1])[:5], seasonality
+
+
+async def sequential(files, counters, region, pollutant):
+    trend = await _parse(counters, _yearly_trend_from_csv, await _download(files, counters, region), region, pollutant, 2024)
+    await asyncio.sleep(INDEX_MS / 1000)
+    seasonality = await _parse(counters, _seasonal_variation_from_csv, await _download(files, counters, region),
+                               region, pollutant, 2024)
+    return trend, None, seasonality
+
+
+async def single_pass(files, counters, region, pollutant):
+    async def views():
+        return await _parse(counters, summarize_csv, await _download(files, counters, region), region, pollutant, 2024)
+
+    (trend, seasonality), _ = await asyncio.gather(views(), asyncio.sleep(INDEX_MS / 1000))
+    return trend, None, seasonality
+
+
+async def main():
+    files = _datasets()
+    print(f"{len(REGIONS)} regions, {len(pd.read_csv(BytesIO(files[REGIONS[0]])))} rows each; "
+          f"download {DOWNLOAD_MS} ms, index query {INDEX_MS} ms")
+    for pollutant in ["no2_conc", "pollution"]:
+        for name, fn in [("legacy", legacy), ("sequential", sequential), ("single pass", single_pass)]:
+            counters = Counters()
+            start = time.perf_counter()
+            for _ in range(ROUNDS):
+                trend, _, seasonality = await fn(files, counters, "kalamaria", pollutant)
+            elapsed = (time.perf_counter() - start) / ROUNDS
+            print(
+                f"{pollutant:>10} {name:>12}: {elapsed * 1000:7.1f} ms/summary  "
+                f"{counters.downloads / ROUNDS:4.1f} downloads  {counters.parse_s / ROUNDS * 1000:7.1f} ms parsing"
+            )
+        assert "error" not in trend and "error" not in seasonality
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,152 @@
+"""
+Benchmark and evaluation set for health-tip prompt compaction.
+
+The evaluation set is a fixed list of synthetic forecasts (seeded, so they
+never change) covering short and long ranges, trends, isolated spikes and
+sub-daily rows. For each case it checks that the compact prompt still
+states the facts a tip depends on (worst category, the highest day, the
+trend direction) and compares prompt size with the old one-line-per-row
+prompt. Both prompts are then sent to the local stub server, where every
+prompt token costs 0.5 ms of prefill, to compare latency.
+
+With --live the compact prompts go to the real Mistral API (needs
+MISTRAL_API_KEY) and each returned tip is checked for format and for
+protective advice where the forecast calls for it.
+
+Run from backend/ with the app's env vars set:  python -m benchmarks.bench_tip_prompt [--live]
+"""
+
+import argparse
+import asyncio
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.llm_stub import StubLLMServer
+from services import mistral_ai
+from services.llm_gateway import LLMGateway
+from utils import aqi
+from utils.forecast_summary import estimate_tokens
+
+PROFILE = {"has_asthma": True, "has_heart_disease": False, "is_smoker": False,
+           "has_diabetes": False, "has_lung_disease": False}
+PROTECTIVE = re.compile(r"\b(limit|avoid|reduce|stay indoors|mask|close)", re.IGNORECASE)
+SEVERE = {"Unhealthy for Sensitive Groups", "Unhealthy", "Very Unhealthy"}
+
+
+def _case(name, pollutant, start, periods, values, freq="D"):
+    ds = pd.date_range(start, periods=periods, freq=freq)
+    values = np.clip(values, 0, None)
+    categories = aqi.categorize(pollutant, values)
+    rows = [{"ds": str(d), "yhat": float(v), "category": c} for d, v, c in zip(ds, values, categories)]
+    daily = pd.Series(values, index=ds).resample("D").mean()
+    week = max(1, len(daily) // 4)
+    change = daily.iloc[-week:].mean() - daily.iloc[:week].mean()
+    trend = "stable" if abs(change) < 0.1 * daily.mean() else ("rising" if change > 0 else "falling")
+    worst = max(categories, key=lambda c: aqi.AQI_CATEGORIES_ORDER.index(c) if c in aqi.AQI_CATEGORIES_ORDER else -1)
+    return {
+        "name": name,
+        "pollutant": pollutant,
+        "forecast": rows,
+        "worst": worst,
+        "peak_date": str(ds[int(np.argmax(values))])[:10],
+        "trend": trend,
+    }
+
+
+def evaluation_set():
+    rng = np.random.default_rng(2025)
+    t30, t90 = np.arange(30), np.arange(90)
+    spike = np.full(30, 12.0) + rng.normal(0, 2, 30)
+    spike[16] = 95.0
+    hourly = np.arange(14 * 24)
+    return [
+        _case("week_moderate", "no2_conc", "2025-06-01", 7, 25 + rng.normal(0, 3, 7)),
+        _case("month_rising_no2", "no2_conc", "2025-06-01", 30, 20 + 1.6 * t30 + rng.normal(0, 4, 30)),
+        _case("month_spike_o3", "o3_conc", "2025-07-01", 30, spike),
+        _case("quarter_falling_so2", "so2_conc", "2025-01-01", 90, 60 - 0.5 * t90 + rng.normal(0, 5, 90)),
+        _case("quarter_seasonal_pollution", "pollution", "2025-03-01", 90,
+              40 + 25 * np.sin(t90 / 9) + rng.normal(0, 6, 90)),
+        _case("two_weeks_hourly_no2", "no2_conc", "2025-11-01", len(hourly),
+              35 + 20 * np.sin(hourly / 24 * 2 * np.pi) + 0.08 * hourly + rng.normal(0, 5, len(hourly)), freq="h"),
+    ]
+
+
+def check_prompt(prompt: str, case: dict):
+    """Facts from the forecast that the prompt must still carry."""
+    missing = []
+    if case["worst"] not in prompt:
+        missing.append("worst category")
+    if case["peak_date"] not in prompt:
+        missing.append("peak day")
+    if case["trend"] != "stable" and len(case["forecast"]) > 7 and case["trend"] not in prompt:
+        missing.append("trend")
+    return missing
+
+
+def check_tip(tip: str, case: dict):
+    """Format and content rules every tip should satisfy."""
+    problems = []
+    items = [line for line in tip.splitlines() if re.match(r"^\s*\d+\.", line)]
+    if not 2 <= len(items) <= 5:
+        problems.append(f"{len(items)} list items")
+    if any("**" not in item for item in items):
+        problems.append("item without bold action")
+    if case["worst"] in SEVERE and not PROTECTIVE.search(tip):
+        problems.append("no protective advice")
+    return problems
+
+
+async def _stub_latency(url: str, prompts, repeat: int = 3) -> float:
+    gateway = LLMGateway(url)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for prompt in prompts:
+            await gateway.complete(mistral_ai.completion_body(prompt))
+    await gateway.close()
+    return (time.perf_counter() - started) / (repeat * len(prompts)) * 1000
+
+
+async def main(live: bool):
+    cases = evaluation_set()
+    full_prompts, compact_prompts = [], []
+
+    print(f"{'case':<28} {'rows':>5} {'full tok':>9} {'compact tok':>12}  missing facts")
+    for case in cases:
+        full = mistral_ai.build_prompt("thessaloniki", case["pollutant"], case["forecast"], PROFILE, compact=False)
+        compact = mistral_ai.build_prompt("thessaloniki", case["pollutant"], case["forecast"], PROFILE)
+        full_prompts.append(full)
+        compact_prompts.append(compact)
+        missing = check_prompt(compact, case)
+        print(f"{case['name']:<28} {len(case['forecast']):>5} {estimate_tokens(full):>9} "
+              f"{estimate_tokens(compact):>12}  {', '.join(missing) or '-'}")
+
+    stub = StubLLMServer(delay=0.2, prefill_delay=0.0005)
+    url = await stub.start()
+    full_ms = await _stub_latency(url, full_prompts)
+    compact_ms = await _stub_latency(url, compact_prompts)
+    await stub.close()
+    full_tokens = sum(estimate_tokens(p) for p in full_prompts)
+    compact_tokens = sum(estimate_tokens(p) for p in compact_prompts)
+    print(f"\nPrompt tokens: {full_tokens} -> {compact_tokens} ({1 - compact_tokens / full_tokens:.0%} fewer)")
+    print(f"Stub latency (0.5 ms/prompt token): {full_ms:.0f}ms -> {compact_ms:.0f}ms per call")
+
+    if live:
+        print("\nLive tips (compact prompts):")
+        for case, prompt in zip(cases, compact_prompts):
+            try:
+                tip = await mistral_ai.request_tip(prompt)
+            except Exception as e:
+                print(f"  {case['name']:<28} request failed: {e}")
+                continue
+            problems = check_tip(tip, case)
+            print(f"  {case['name']:<28} {', '.join(problems) or 'ok'}")
+        await mistral_ai.gateway.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--live", action="store_true", help="also score tips from the real Mistral API")
+    asyncio.run(main(parser.parse_args().live))
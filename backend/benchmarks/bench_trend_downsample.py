@@ -0,0 +1,70 @@
+"""
+Benchmark: /insights/trend/ payload size and latency with downsampling.
+
+Builds the trend for a synthetic year of hourly data (one dataset of
+HOURS_PER_YEAR rows) at full resolution and with each `resolution` /
+`max_points` option, then validates it through `DailyTrendResponse` and
+serializes it to JSON as the endpoint would. Reported: points returned,
+JSON size, and time from parsed CSV to a serialized response.
+
+Run from backend/ with the app's env vars set:  python -m benchmarks.bench_trend_downsample
+"""
+
+import json
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from schemas.insights import DailyTrendResponse
+from services.insights import _daily_trend_by_year_from_csv
+
+ROUNDS = 5
+OPTIONS = [
+    ("full", {}),
+    ("daily", {"resolution": "daily"}),
+    ("weekly", {"resolution": "weekly"}),
+    ("lttb 1000", {"max_points": 1000}),
+    ("lttb 300", {"max_points": 300}),
+    ("minmax 300", {"max_points": 300, "method": "minmax"}),
+    ("daily+lttb 120", {"resolution": "daily", "max_points": 120}),
+]
+
+
+def _csv():
+    rng = np.random.default_rng(0)
+    times = pd.date_range("2024-01-01", "2024-12-31 23:00", freq="h")
+    hours = np.arange(len(times))
+    values = 35 + 12 * np.sin(hours / 24 * 2 * np.pi) + 8 * np.sin(hours / (24 * 365) * 2 * np.pi)
+    values = values + rng.gamma(1.5, 4.0, len(times))
+    return pd.DataFrame({"time": times.astype(str), "no2_conc": values}).to_csv(index=False).encode()
+
+
+def _render(csv, options):
+    trend = _daily_trend_by_year_from_csv(BytesIO(csv), "kalamaria", "no2_conc", 2024, **options)
+    response = DailyTrendResponse(region="kalamaria", pollutant="no2_conc", trend=trend)
+    return trend, json.dumps(response.model_dump() if hasattr(response, "model_dump") else response.dict())
+
+
+def main():
+    csv = _csv()
+    # Parse cost is the same for every option; measure it once and report it apart
+    start = time.perf_counter()
+    pd.read_csv(BytesIO(csv))
+    parse_ms = (time.perf_counter() - start) * 1000
+    print(f"CSV parse: {parse_ms:.1f} ms (included in every row below)")
+
+    for name, options in OPTIONS:
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            trend, body = _render(csv, options)
+        elapsed = (time.perf_counter() - start) / ROUNDS
+        print(
+            f"{name:>15}: {len(trend['values']):6d} points  {len(body) / 1024:8.1f} KiB  "
+            f"{elapsed * 1000:7.1f} ms  peak {max(trend['values']):.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Stand-in for the Mistral chat completions API, for benchmarking the LLM
+gateway under upstream slowness and outages.
+
+Every response is delayed by `delay` seconds, except a `slow_fraction` of
+them that take `slow_delay`; with `fail` set it answers 503 instead.
+Requests with `"stream": true` get the completion as server-sent chunks,
+one word every `token_delay` seconds after the initial delay. With
+`prefill_delay` set, every prompt token adds that many seconds up front, as
+prompt processing does upstream. The settings can be changed while the
+server runs.
+
+Standalone:  python -m benchmarks.llm_stub --port 8089 --slow-fraction 0.1
+then point the app at it with MISTRAL_URL=http://127.0.0.1:8089/v1/chat/completions
+"""
+
+import argparse
+import asyncio
+import json
+import random
+
+from utils.forecast_summary import estimate_tokens
+
+CONTENT = (
+    "1. **Limit outdoor activity** on high-pollution days.\n"
+    "2. **Keep windows closed** during peak traffic hours.\n"
+    "3. **Stay hydrated** to support respiratory health."
+)
+
+
+class StubLLMServer:
+    def __init__(self, delay: float = 0.2, slow_fraction: float = 0.0, slow_delay: float = 5.0,
+                 fail: bool = False, token_delay: float = 0.05, prefill_delay: float = 0.0, seed: int = 7):
+        self.delay = delay
+        self.token_delay = token_delay
+        self.prefill_delay = prefill_delay
+        self.slow_fraction = slow_fraction
+        self.slow_delay = slow_delay
+        self.fail = fail
+        self.requests = 0
+        self.prompt_tokens = 0
+        self._random = random.Random(seed)
+        self._server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._server = await asyncio.start_server(self._handle, host, port)
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _stream(self, writer: asyncio.StreamWriter):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+        words = CONTENT.split(" ")
+        frames = [
+            {"choices": [{"delta": {"content": word if i == 0 else " " + word}}]}
+            for i, word in enumerate(words)
+        ]
+        for i, frame in enumerate(frames):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            self._chunk(writer, f"data: {json.dumps(frame)}\n\n".encode())
+            await writer.drain()
+        self._chunk(writer, b"data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    def _chunk(writer: asyncio.StreamWriter, data: bytes):
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:  # keep-alive: serve requests until the client hangs up
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.decode("latin-1").split("\r\n"):
+                    if line.lower().startswith("content-length:"):
+                        length = int(line.split(":", 1)[1])
+                request = json.loads(await reader.readexactly(length) or b"{}")
+                self.requests += 1
+
+                prompt = "".join(m.get("content", "") for m in request.get("messages", []))
+                self.prompt_tokens += estimate_tokens(prompt)
+                slow = self._random.random() < self.slow_fraction
+                await asyncio.sleep((self.slow_delay if slow else self.delay) + self.prefill_delay * estimate_tokens(prompt))
+                if not self.fail and request.get("stream"):
+                    await self._stream(writer)
+                    continue
+                if self.fail:
+                    status, payload = "503 Service Unavailable", {"error": "upstream unavailable"}
+                else:
+                    status, payload = "200 OK", {"choices": [{"message": {"role": "assistant", "content": CONTENT}}]}
+
+                body = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _serve(args):
+    stub = StubLLMServer(args.delay, args.slow_fraction, args.slow_delay, args.fail, args.token_delay, args.prefill_delay)
+    url = await stub.start(port=args.port)
+    print(f"Stub LLM listening on {url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Mistral chat completions server")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--delay", type=float, default=0.2)
+    parser.add_argument("--slow-fraction", type=float, default=0.0)
+    parser.add_argument("--slow-delay", type=float, default=5.0)
+    parser.add_argument("--token-delay", type=float, default=0.05)
+    parser.add_argument("--prefill-delay", type=float, default=0.0)
+    parser.add_argument("--fail", action="store_true")
+    asyncio.run(_serve(parser.parse_args()))
@@ -0,0 +1,54 @@
+"""
+Stand-in SMTP server for benchmarking the mailer.
+
+Accepts every message. Each reply is delayed by `reply_delay` seconds, and
+the greeting of a new session by `connect_delay` seconds, which stands in
+for the TCP, TLS and login round trips a real relay costs per session.
+"""
+
+import asyncio
+
+
+class StubSMTPServer:
+    def __init__(self, reply_delay: float = 0.002, connect_delay: float = 0.03):
+        self.reply_delay = reply_delay
+        self.connect_delay = connect_delay
+        self.sessions = 0
+        self.messages = 0
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _reply(self, writer, line: bytes):
+        await asyncio.sleep(self.reply_delay)
+        writer.write(line)
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        self.sessions += 1
+        await asyncio.sleep(self.connect_delay)
+        await self._reply(writer, b"220 stub ESMTP\r\n")
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                await self._reply(writer, b"250-stub\r\n250 OK\r\n")
+            elif command.startswith("DATA"):
+                await self._reply(writer, b"354 go ahead\r\n")
+                while not (await reader.readline()).endswith(b".\r\n"):
+                    pass
+                self.messages += 1
+                await self._reply(writer, b"250 queued\r\n")
+            elif command.startswith("QUIT"):
+                await self._reply(writer, b"221 bye\r\n")
+                break
+            else:
+                await self._reply(writer, b"250 OK\r\n")
+        writer.close()
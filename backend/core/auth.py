@@ -1,6 +1,7 @@
 import os
 # import requests  # unused in this module
-from fastapi import Depends, HTTPException, Security
+from typing import Optional
+from fastapi import Depends, Header, HTTPException, Query, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
 import httpx
@@ -33,8 +34,14 @@ def decode_jwt_token(token: str) -> dict:
 
 
 def get_current_user_id(credentials: HTTPAuthorizationCredentials = Security(security)) -> dict:
+    return get_user_from_token(credentials.credentials)
+
+def get_user_from_token(token: str) -> dict:
+    """
+    Resolve a bearer token to the user dict. Also used directly by streaming
+    endpoints (SSE/WebSocket), where browsers pass the token as a query param.
+    """
     try:
-        token = credentials.credentials
         payload = jwt.decode(
             token,
             SUPABASE_JWT_SECRET,
@@ -63,6 +70,21 @@ def get_current_user_id(credentials: HTTPAuthorizationCredentials = Security(sec
     except JWTError as e:
         raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
 
+
+def get_stream_user(
+    token: Optional[str] = Query(None),
+    authorization: Optional[str] = Header(None)
+) -> dict:
+    """
+    Auth for streaming endpoints. EventSource and browser WebSockets can't set
+    headers, so the token may come as a `token` query parameter instead.
+    """
+    if authorization and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing token")
+    return get_user_from_token(token)
+
     
 async def signup_user(email: str, password: str):
     async with httpx.AsyncClient() as client:
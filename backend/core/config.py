@@ -22,6 +22,35 @@ DB_CONFIG = {
 
 SQLALCHEMY_DATABASE_URL = os.getenv("SUPABASE_DB_URL")
 
+# Compute executors (see services/compute.py). A process pool size of 0 runs
+# Prophet work on the thread pool instead, which is handy for local dev/tests.
+COMPUTE_THREAD_WORKERS = int(os.getenv("COMPUTE_THREAD_WORKERS", min(32, (os.cpu_count() or 1) + 4)))
+COMPUTE_PROCESS_WORKERS = int(os.getenv("COMPUTE_PROCESS_WORKERS", os.cpu_count() or 1))
+COMPUTE_THREAD_CONCURRENCY = int(os.getenv("COMPUTE_THREAD_CONCURRENCY", COMPUTE_THREAD_WORKERS * 2))
+COMPUTE_PROCESS_CONCURRENCY = int(os.getenv("COMPUTE_PROCESS_CONCURRENCY", max(COMPUTE_PROCESS_WORKERS, 1) * 2))
+
+# Background alert evaluation (services/subscription_checker.py); 0 disables
+# the in-app scheduler, e.g. when `python -m services.subscription_checker`
+# runs as a separate cron job instead.
+ALERT_EVALUATION_INTERVAL = int(os.getenv("ALERT_EVALUATION_INTERVAL", 3600))
+
+# Nightly health-tip precomputation (services/tip_precompute.py): local hour
+# of day to run at; -1 disables the in-app schedule.
+TIP_PRECOMPUTE_HOUR = int(os.getenv("TIP_PRECOMPUTE_HOUR", 3))
+
+# Background indexing of datasets that predate the upload-time indexes
+# (services/index_backfill.py), every INDEX_BACKFILL_INTERVAL seconds; 0 disables.
+INDEX_BACKFILL_INTERVAL = int(os.getenv("INDEX_BACKFILL_INTERVAL", 600))
+
+# Embedded analytical engine for insights (services/query_engine.py):
+# "duckdb" (needs the duckdb package) or "pandas" for the per-file code paths.
+# Datasets are cached locally as Parquet under DATASET_CACHE_DIR, and the
+# dataset list is re-synced from the database in the background every
+# QUERY_ENGINE_REFRESH seconds; insights use pandas until the first sync is done.
+INSIGHTS_QUERY_ENGINE = os.getenv("INSIGHTS_QUERY_ENGINE", "duckdb").lower()
+DATASET_CACHE_DIR = os.getenv("DATASET_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), ".dataset_cache"))
+QUERY_ENGINE_REFRESH = int(os.getenv("QUERY_ENGINE_REFRESH", 60))
+
 settings = SimpleNamespace(
     supabase_url=SUPABASE_URL,
     supabase_key=SUPABASE_KEY,
@@ -29,5 +58,15 @@ settings = SimpleNamespace(
     supabase_jwt_secret=SUPABASE_JWT_SECRET,
     bucket_datasets=SUPABASE_BUCKET_DATASETS,
     bucket_models=SUPABASE_BUCKET_MODELS,
-    db_url=SQLALCHEMY_DATABASE_URL
+    db_url=SQLALCHEMY_DATABASE_URL,
+    compute_thread_workers=COMPUTE_THREAD_WORKERS,
+    compute_process_workers=COMPUTE_PROCESS_WORKERS,
+    compute_thread_concurrency=COMPUTE_THREAD_CONCURRENCY,
+    compute_process_concurrency=COMPUTE_PROCESS_CONCURRENCY,
+    alert_evaluation_interval=ALERT_EVALUATION_INTERVAL,
+    tip_precompute_hour=TIP_PRECOMPUTE_HOUR,
+    index_backfill_interval=INDEX_BACKFILL_INTERVAL,
+    insights_query_engine=INSIGHTS_QUERY_ENGINE,
+    dataset_cache_dir=DATASET_CACHE_DIR,
+    query_engine_refresh=QUERY_ENGINE_REFRESH
 )
\ No newline at end of file
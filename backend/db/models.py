@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Text, ForeignKey, DateTime
+from sqlalchemy import Column, String, Integer, Text, ForeignKey, DateTime, Date, Float, LargeBinary, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -85,4 +85,112 @@ class AQISubscription(Base):
     region = Column(String, nullable=False)
     pollutant = Column(String, nullable=False)
     threshold = Column(String, nullable=False)  # e.g., "Unhealthy", "Very Unhealthy"
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class AQIAlert(Base):
+    __tablename__ = "aqi_alerts"
+    __table_args__ = (UniqueConstraint("subscription_id", "forecast_date"),)
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    subscription_id = Column(UUID(as_uuid=True), ForeignKey("aqi_subscriptions.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    region = Column(String, nullable=False)
+    pollutant = Column(String, nullable=False)
+    forecast_date = Column(Date, nullable=False)
+    value = Column(Float, nullable=False)
+    category = Column(String, nullable=False)
+    threshold = Column(String, nullable=False)
+    message = Column(Text, nullable=False)
+    model_version = Column(String, nullable=False)  # sha1 of the model file
+    sent_at = Column(DateTime)                      # NULL until the email went out
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class AQIAlertEvaluation(Base):
+    __tablename__ = "aqi_alert_evaluations"
+
+    region = Column(String, primary_key=True)
+    pollutant = Column(String, primary_key=True)
+    model_version = Column(String, nullable=False)
+    last_subscription_at = Column(DateTime)
+    evaluated_at = Column(DateTime, default=datetime.utcnow)
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    alert_ids = Column(JSONB, nullable=False, default=list)
+    status = Column(String, nullable=False, default="pending")  # pending | sending | sent | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    claimed_at = Column(DateTime)
+    sent_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class HealthTipCache(Base):
+    __tablename__ = "health_tip_cache"
+
+    signature = Column(String, primary_key=True)  # sha1 of region|pollutant|category runs|profile flags
+    region = Column(String, nullable=False)
+    pollutant = Column(String, nullable=False)
+    tip = Column(JSONB, nullable=False)
+    generation_ms = Column(Float)
+    ttl_seconds = Column(Float)  # NULL: TIP_CACHE_TTL
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class RegionPollutantMean(Base):
+    __tablename__ = "region_pollutant_means"
+
+    dataset_id = Column(UUID(as_uuid=True), ForeignKey("datasets.id", ondelete="CASCADE"), primary_key=True)
+    region = Column(String, nullable=False)
+    year = Column(Integer, nullable=False)
+    pollutant = Column(String, primary_key=True)  # includes the composite "pollution"
+    value_sum = Column(Float, nullable=False)
+    value_count = Column(Integer, nullable=False)
+
+class RegionPollutantDaily(Base):
+    __tablename__ = "region_pollutant_daily"
+
+    dataset_id = Column(UUID(as_uuid=True), ForeignKey("datasets.id", ondelete="CASCADE"), primary_key=True)
+    region = Column(String, nullable=False)
+    pollutant = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    value_sum = Column(Float, nullable=False)
+    value_count = Column(Integer, nullable=False)
+
+class DatasetTimeIndex(Base):
+    __tablename__ = "dataset_time_index"
+
+    dataset_id = Column(UUID(as_uuid=True), ForeignKey("datasets.id", ondelete="CASCADE"), primary_key=True)
+    region = Column(String, nullable=False)
+    time_start = Column(DateTime)
+    time_end = Column(DateTime)
+    row_count = Column(Integer, nullable=False)
+    blocks = Column(JSONB)  # None when the file's rows are not in time order
+
+class PollutantSketch(Base):
+    __tablename__ = "pollutant_sketches"
+
+    dataset_id = Column(UUID(as_uuid=True), ForeignKey("datasets.id", ondelete="CASCADE"), primary_key=True)
+    region = Column(String, nullable=False)
+    pollutant = Column(String, primary_key=True)
+    grain = Column(String, primary_key=True)  # "hour" or "day"
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    value_count = Column(Integer, nullable=False)
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+    sketch = Column(LargeBinary, nullable=False)
+
+class RegionCentroid(Base):
+    __tablename__ = "region_centroids"
+
+    region = Column(String, primary_key=True)  # unique on LOWER(region)
+    lat = Column(Float, nullable=False)
+    lon = Column(Float, nullable=False)
+    source = Column(String, nullable=False, default="dataset")  # "dataset" or "manual"
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -1,3 +1,5 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
@@ -9,18 +11,60 @@ from api import (
     endpoints_suggestions,
     endpoints_insights,
     endpoints_datasets,
-    endpoints_dashboard
+    endpoints_dashboard,
+    endpoints_system
 )
 from api.endpoints_public_data import router as metadata_router
 from api.endpoints_alerts import router as alerts_router
+from services import (
+    compute, distribution, index_backfill, mailer, mistral_ai, pubsub, query_engine, region_index,
+    subscription_checker, time_index, tip_precompute
+)
+from core.config import settings
 import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up = asyncio.create_task(compute.warm_up())
+    mail_worker = asyncio.create_task(mailer.run_worker())
+    alert_scheduler = None
+    if settings.alert_evaluation_interval > 0:
+        alert_scheduler = asyncio.create_task(
+            subscription_checker.run_scheduler(settings.alert_evaluation_interval)
+        )
+    tip_scheduler = None
+    if settings.tip_precompute_hour >= 0:
+        tip_scheduler = asyncio.create_task(tip_precompute.run_scheduler(settings.tip_precompute_hour))
+    backfill_scheduler = None
+    if settings.index_backfill_interval > 0:
+        # Backfills of region_index, time_index and distribution register on import
+        backfill_scheduler = asyncio.create_task(index_backfill.run_scheduler(settings.index_backfill_interval))
+    query_sync = None
+    if query_engine.enabled():
+        query_sync = asyncio.create_task(query_engine.run_sync_loop(settings.query_engine_refresh))
+    yield
+    warm_up.cancel()
+    if alert_scheduler:
+        alert_scheduler.cancel()
+    if tip_scheduler:
+        tip_scheduler.cancel()
+    if backfill_scheduler:
+        backfill_scheduler.cancel()
+    if query_sync:
+        query_sync.cancel()
+    mail_worker.cancel()
+    await asyncio.gather(mail_worker, return_exceptions=True)
+    await pubsub.close()
+    await mistral_ai.gateway.close()
+    compute.shutdown()
+
 app = FastAPI(
     title="Air Quality App - Thessaloniki",
     version="0.1.0",
-    root_path="/api"
+    root_path="/api",
+    lifespan=lifespan
 )
 
 # Optional: allow frontend requests during dev
@@ -42,6 +86,7 @@ app.include_router(endpoints_insights.router, prefix="/insights", tags=["Insight
 app.include_router(endpoints_dashboard.router, prefix="/dashboard", tags=["Dashboard"])
 app.include_router(metadata_router, prefix="/metadata", tags=["Metadata"])
 app.include_router(alerts_router, prefix="/alerts", tags=["AQI Alerts"])
+app.include_router(endpoints_system.router, prefix="/system", tags=["System"])
 
 # Inject security scheme into OpenAPI
 def custom_openapi():
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Dict, Union, Optional
+from pydantic import BaseModel, Field
+from typing import Any, List, Dict, Literal, Union, Optional
 from datetime import datetime
 
 class DatasetOut(BaseModel):
@@ -14,6 +14,14 @@ class DatasetOut(BaseModel):
     class Config:
         orm_mode = True
 
+class RegionCentroidIn(BaseModel):
+    lat: float
+    lon: float
+
+class RegionCentroidOut(RegionCentroidIn):
+    region: str
+    source: str
+
 class TrendItem(BaseModel):
     year: int
     yhat: float
@@ -111,3 +119,43 @@ class AQISubscriptionIn(BaseModel):
 class AQISubscriptionOut(AQISubscriptionIn):
     id: str
     created_at: datetime
+
+class DistributionResponse(BaseModel):
+    region: str
+    pollutant: str
+    grain: str
+    year: Optional[int] = None
+    month: Optional[int] = None
+    count: int
+    min: float
+    max: float
+    percentiles: Dict[str, float]
+    rank_error_pct: float
+    value: Optional[float] = None
+    rank_pct: Optional[float] = None
+
+class ChartSpec(BaseModel):
+    id: str
+    type: Literal["trend", "trend_range", "yearly_trend", "seasonality", "top_regions",
+                  "personalized", "multi_year_trend", "forecast_calendar"]
+    pollutant: str
+    region: Optional[str] = None
+    year: Optional[int] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    top_n: int = 5
+    resolution: Optional[Literal["hourly", "daily", "weekly"]] = None
+    max_points: Optional[int] = Field(None, ge=3, le=20000)
+    method: Literal["lttb", "minmax"] = "lttb"
+
+class InsightsBatchRequest(BaseModel):
+    specs: List[ChartSpec]
+
+class ChartResult(BaseModel):
+    status: Literal["ok", "error"]
+    data: Optional[Any] = None
+    error: Optional[str] = None
+
+class InsightsBatchResponse(BaseModel):
+    results: Dict[str, ChartResult]
+    meta: Dict[str, Union[int, float]]
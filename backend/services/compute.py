@@ -0,0 +1,179 @@
+# services/compute.py
+"""
+Managed executors for CPU-bound work.
+
+Request handlers are `async def`, so pandas parsing/aggregation and Prophet
+predict/fit must not run on the event loop. Services submit that work here:
+
+- `run_in_thread` for pandas/NumPy work (mostly releases the GIL)
+- `run_in_process` for Prophet predict/fit (pure-Python heavy, holds the GIL)
+
+Each pool has a concurrency limit; callers beyond it wait in a queue whose
+depth is reported by `get_metrics()`.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ComputePool:
+    def __init__(self, name: str, factory: Callable[[], Executor], max_workers: int, max_concurrency: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_concurrency = max(1, max_concurrency)
+        self._factory = factory
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.queued = 0
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self._wait_total = 0.0
+        self._run_total = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = self._factory()
+            logger.info(f"⚙️ Started {self.name} pool ({self.max_workers} workers)")
+        return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Semaphores bind to the loop they are first used on; tests and
+        # scripts may run several loops in one process.
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def submit(self, fn: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        semaphore = self._get_semaphore()
+
+        self.submitted += 1
+        self.queued += 1
+        queued_at = time.perf_counter()
+        try:
+            await semaphore.acquire()
+        finally:
+            self.queued -= 1
+        started_at = time.perf_counter()
+        self._wait_total += started_at - queued_at
+
+        self.running += 1
+        try:
+            result = await loop.run_in_executor(self._get_executor(), partial(fn, *args, **kwargs))
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.running -= 1
+            self._run_total += time.perf_counter() - started_at
+            semaphore.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        finished = self.completed + self.failed
+        return {
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "queued": self.queued,
+            "running": self.running,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_ms": round(self._wait_total / finished * 1000, 2) if finished else 0.0,
+            "avg_run_ms": round(self._run_total / finished * 1000, 2) if finished else 0.0,
+        }
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+def _make_thread_pool() -> Executor:
+    return ThreadPoolExecutor(
+        max_workers=settings.compute_thread_workers,
+        thread_name_prefix="airq-compute"
+    )
+
+
+def _make_process_pool() -> Executor:
+    # "spawn" avoids forking a process that already runs the event loop,
+    # DB connections and HTTP clients.
+    return ProcessPoolExecutor(
+        max_workers=settings.compute_process_workers,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+thread_pool = ComputePool(
+    "thread",
+    _make_thread_pool,
+    settings.compute_thread_workers,
+    settings.compute_thread_concurrency
+)
+
+process_pool = ComputePool(
+    "process",
+    _make_process_pool,
+    settings.compute_process_workers,
+    settings.compute_process_concurrency
+) if settings.compute_process_workers > 0 else None
+
+
+async def run_in_thread(fn: Callable, *args, **kwargs) -> Any:
+    """Run a pandas/NumPy-heavy callable on the shared thread pool."""
+    return await thread_pool.submit(fn, *args, **kwargs)
+
+
+async def run_in_process(fn: Callable, *args, **kwargs) -> Any:
+    """
+    Run a GIL-bound callable (Prophet predict/fit) on the process pool.
+    `fn` and its arguments must be picklable; falls back to the thread pool
+    when the process pool is disabled.
+    """
+    if process_pool is None:
+        return await thread_pool.submit(fn, *args, **kwargs)
+    return await process_pool.submit(fn, *args, **kwargs)
+
+
+async def warm_up():
+    """Start the process workers ahead of the first request (spawn + Prophet import)."""
+    if process_pool is None:
+        return
+    from services import forecast_tasks
+    try:
+        await asyncio.gather(*[
+            process_pool.submit(forecast_tasks.warm_up) for _ in range(process_pool.max_workers)
+        ])
+        logger.info("🔥 Compute process pool warmed up")
+    except Exception as e:
+        logger.warning(f"⚠️ Compute warm-up failed: {e}")
+
+
+def get_metrics() -> Dict[str, Any]:
+    return {
+        "thread": thread_pool.metrics(),
+        "process": process_pool.metrics() if process_pool else None,
+    }
+
+
+def shutdown(wait: bool = True):
+    thread_pool.shutdown(wait=wait)
+    if process_pool:
+        process_pool.shutdown(wait=wait)
@@ -7,17 +7,24 @@ from sqlalchemy import text
 from utils.helpers import upload_to_supabase_storage, download_from_supabase_storage, delete_from_supabase_storage
 import pandas as pd
 import numpy as np
+from utils import composite
 from utils.helpers import setup_logger
 from services.insights import POLLUTANTS
+from services import compute, distribution, query_engine, region_index, spatial, time_index
 
 DATASET_BUCKET = "datasets"
 logger = setup_logger(__name__)
 
+def _with_derived_columns(contents: bytes):
+    df = composite.add_derived_columns(pd.read_csv(pd.io.common.BytesIO(contents)))
+    return df, df.to_csv(index=False).encode()
+
 async def upload_dataset_to_supabase(file: UploadFile, region: str, year: int, uploaded_by: str, token: str):
     dataset_id = str(uuid.uuid4())
     filename = f"{region.lower().replace(' ', '_')}_{year}_{dataset_id}.csv"
 
-    contents = await file.read()
+    # The derived composites are stored as real columns (see utils.composite)
+    df, contents = await compute.run_in_thread(_with_derived_columns, await file.read())
     await upload_to_supabase_storage(
         data=contents,
         filename=filename,
@@ -25,7 +32,6 @@ async def upload_dataset_to_supabase(file: UploadFile, region: str, year: int, u
         token=token
     )
 
-    df = pd.read_csv(pd.io.common.BytesIO(contents))
     available_pollutants = [p for p in POLLUTANTS if p in df.columns]
 
     with engine.begin() as conn:
@@ -43,6 +49,31 @@ async def upload_dataset_to_supabase(file: UploadFile, region: str, year: int, u
         })
         logger.info(f"✅ Inserted dataset {dataset_id} into DB with available pollutants: {available_pollutants}")
 
+    # Keep the ranking, time and distribution indexes current; a failure here is
+    # repaired by the background backfill (index_backfill.run_scheduler)
+    try:
+        await compute.run_in_thread(region_index.index_frame, dataset_id, region, year, df)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not index dataset {dataset_id}: {e}")
+    try:
+        await compute.run_in_thread(time_index.index_contents, dataset_id, region, contents, df)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not time-index dataset {dataset_id}: {e}")
+    try:
+        await compute.run_in_thread(distribution.index_frame, dataset_id, region, df)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not sketch dataset {dataset_id}: {e}")
+    try:
+        await compute.run_in_thread(spatial.index_frame, region, df)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not record the centroid of {region}: {e}")
+    if query_engine.enabled():
+        try:
+            await compute.run_in_thread(query_engine.cache_frame, dataset_id, df)
+            query_engine.note_dataset(dataset_id, region, year)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not cache dataset {dataset_id} for the query engine: {e}")
+
     return {
         "id": dataset_id,
         "region": region,
@@ -100,8 +131,14 @@ async def delete_dataset_by_id(dataset_id: str):
             raise HTTPException(status_code=404, detail="Dataset not found.")
 
         file_path = row._mapping.get("file_path")
+        region_index.remove_dataset(dataset_id, conn)
+        time_index.remove_dataset(dataset_id, conn)
+        distribution.remove_dataset(dataset_id, conn)
         conn.execute(text("DELETE FROM datasets WHERE id = :id"), {"id": dataset_id})
 
+    if query_engine.enabled():
+        query_engine.evict(dataset_id)
+
     # Delete file from Supabase storage
     await delete_from_supabase_storage(file_path, bucket=DATASET_BUCKET)
 
@@ -0,0 +1,178 @@
+# services/distribution.py
+"""
+Distribution and percentile queries from quantile sketches.
+
+Answering "today is worse than 90% of days" or drawing percentile bands
+would otherwise mean scanning every hourly file of a region. Each dataset
+is reduced on upload to t-digests (utils/tdigest.py) per pollutant
+(including the derived composites), calendar month and grain: "hour"
+digests summarize the hourly values, "day" digests the daily means. They
+are stored in `pollutant_sketches` (~800 bytes each).
+
+A query merges the stored digests for a region/pollutant/grain, optionally
+restricted to a year and/or month, and keeps the merged digest in memory
+for DISTRIBUTION_CACHE_TTL seconds, so repeated percentile and rank
+lookups are answered in microseconds. Estimates are within
+tdigest.RANK_ERROR of the exact ranks. Datasets that predate the sketches
+are sketched in the background (services/index_backfill.py).
+"""
+
+import os
+import time
+from collections import OrderedDict
+from io import BytesIO
+from typing import Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy import text
+
+from db.databases import engine
+from services import compute, index_backfill
+from services.region_index import pollutant_series
+from services.singleflight import coalesced
+from utils.helpers import download_from_supabase_storage, setup_logger
+from utils.tdigest import RANK_ERROR, TDigest
+
+logger = setup_logger(__name__)
+
+GRAINS = ("hour", "day")
+DEFAULT_PERCENTILES = [5, 25, 50, 75, 95]
+DISTRIBUTION_CACHE_TTL = float(os.getenv("DISTRIBUTION_CACHE_TTL", 600))
+DISTRIBUTION_CACHE_SIZE = 256
+
+_merged: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+
+def dataset_sketches(df: pd.DataFrame) -> List[dict]:
+    """Sketch rows (pollutant, grain, year, month, digest) for one dataset's frame."""
+    if "time" not in df.columns:
+        return []
+    times = pd.to_datetime(df["time"], errors="coerce")
+    rows = []
+    for pollutant, values in pollutant_series(df).items():
+        values = values[times.loc[values.index].notna()]
+        if values.empty:
+            continue
+        hourly = pd.Series(values.to_numpy(), index=pd.DatetimeIndex(times.loc[values.index]))
+        daily = hourly.resample("D").mean().dropna()
+        for grain, series in (("hour", hourly), ("day", daily)):
+            for (year, month), chunk in series.groupby([series.index.year, series.index.month]):
+                digest = TDigest.from_values(chunk.to_numpy())
+                rows.append({"pollutant": pollutant, "grain": grain, "year": int(year), "month": int(month),
+                             "digest": digest})
+    return rows
+
+
+def _store(dataset_id: str, region: str, rows: List[dict]):
+    with engine.begin() as conn:
+        remove_dataset(dataset_id, conn)
+        if rows:
+            conn.execute(text("""
+                INSERT INTO pollutant_sketches
+                    (dataset_id, region, pollutant, grain, year, month, value_count, min_value, max_value, sketch)
+                VALUES (:dataset_id, :region, :pollutant, :grain, :year, :month, :value_count, :min_value, :max_value, :sketch)
+            """), [{
+                "dataset_id": dataset_id,
+                "region": region,
+                "pollutant": row["pollutant"],
+                "grain": row["grain"],
+                "year": row["year"],
+                "month": row["month"],
+                "value_count": int(row["digest"].count),
+                "min_value": row["digest"].min,
+                "max_value": row["digest"].max,
+                "sketch": row["digest"].to_bytes()
+            } for row in rows])
+
+
+def index_frame(dataset_id: str, region: str, df: pd.DataFrame):
+    """Sketch an already parsed dataset (blocking; run in a worker thread)."""
+    rows = dataset_sketches(df)
+    _store(dataset_id, region, rows)
+    _merged.clear()
+    logger.info(f"📐 Sketched dataset {dataset_id} ({region}): {len(rows)} digests")
+
+
+def remove_dataset(dataset_id: str, conn=None):
+    """Drop a dataset's sketches; pass `conn` to join the caller's transaction."""
+    if conn is None:
+        with engine.begin() as conn:
+            return remove_dataset(dataset_id, conn)
+    conn.execute(text("DELETE FROM pollutant_sketches WHERE dataset_id = :id"), {"id": dataset_id})
+    _merged.clear()
+
+
+def _unindexed() -> List[dict]:
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT d.id, d.region, d.filename FROM datasets d
+            WHERE NOT EXISTS (SELECT 1 FROM pollutant_sketches s WHERE s.dataset_id = d.id)
+        """)).fetchall()
+    return [dict(row._mapping) for row in rows]
+
+
+async def _index_row(row: dict):
+    csv_bytes = await download_from_supabase_storage(row["filename"], bucket="datasets")
+    df = await compute.run_in_thread(pd.read_csv, BytesIO(csv_bytes.getvalue()))
+    await compute.run_in_thread(index_frame, str(row["id"]), row["region"], df)
+
+
+backfill = index_backfill.Backfill("Percentile sketches", _unindexed, _index_row)
+
+
+def _load_merged(region: str, pollutant: str, grain: str, year: Optional[int], month: Optional[int]) -> TDigest:
+    query = """
+        SELECT min_value, max_value, sketch FROM pollutant_sketches
+        WHERE LOWER(region) = LOWER(:region) AND pollutant = :pollutant AND grain = :grain
+    """
+    params = {"region": region, "pollutant": pollutant, "grain": grain}
+    if year is not None:
+        query += " AND year = :year"
+        params["year"] = year
+    if month is not None:
+        query += " AND month = :month"
+        params["month"] = month
+    with engine.connect() as conn:
+        rows = conn.execute(text(query), params).fetchall()
+    return TDigest.merge(TDigest.from_bytes(bytes(row.sketch), row.min_value, row.max_value) for row in rows)
+
+
+@coalesced("distribution")
+async def get_digest(
+    region: str,
+    pollutant: str,
+    grain: str = "day",
+    year: Optional[int] = None,
+    month: Optional[int] = None
+) -> TDigest:
+    """Merged digest for a region/pollutant/grain, optionally one year and/or month."""
+    key = (region.lower(), pollutant, grain, year, month)
+    cached = _merged.get(key)
+    if cached is not None and time.monotonic() - cached[0] < DISTRIBUTION_CACHE_TTL:
+        _merged.move_to_end(key)
+        return cached[1]
+
+    digest = await compute.run_in_thread(_load_merged, region, pollutant, grain, year, month)
+    _merged[key] = (time.monotonic(), digest)
+    _merged.move_to_end(key)
+    while len(_merged) > DISTRIBUTION_CACHE_SIZE:
+        _merged.popitem(last=False)
+    return digest
+
+
+def describe(digest: TDigest, percentiles: List[float], value: Optional[float] = None) -> Dict:
+    """Percentiles (0-100) and, for `value`, its rank (% of observations at or below it)."""
+    result = {
+        "count": int(digest.count),
+        "min": round(digest.min, 2),
+        "max": round(digest.max, 2),
+        "percentiles": {
+            f"p{p:g}": round(float(v), 2)
+            for p, v in zip(percentiles, digest.quantile([p / 100 for p in percentiles]))
+        },
+        "rank_error_pct": RANK_ERROR * 100,
+    }
+    if value is not None:
+        result["value"] = value
+        result["rank_pct"] = round(float(digest.cdf(value)) * 100, 1)
+    return result
@@ -1,5 +1,7 @@
-from utils.helpers import download_from_supabase_storage, get_aqi_category
+from utils.helpers import download_from_supabase_storage
+from utils import aqi
 from io import BytesIO
+from datetime import datetime
 from typing import Optional
 from sqlalchemy import text
 from db.databases import engine
@@ -7,10 +9,20 @@ from core.config import settings
 import pickle
 import pandas as pd
 from utils.helpers import setup_logger
+from services import compute, forecast_tasks
+from services.singleflight import coalesced
 
 MODEL_BUCKET = "models"
 logger = setup_logger(__name__)
 
+@coalesced("model_file")
+async def load_model_file(filename: str, bucket: str = MODEL_BUCKET) -> bytes:
+    """Raw pickle bytes of a model stored in Supabase storage."""
+    model_bytes: BytesIO = await download_from_supabase_storage(filename, bucket=bucket)
+    return model_bytes.getvalue()
+
+
+@coalesced("model")
 async def load_forecast_model(region: str, pollutant: str, frequency: str):
     freq_map = {"daily": "D", "weekly": "W", "monthly": "M", "yearly": "Y"}
     normalized_freq = freq_map.get(frequency.lower(), frequency.upper())
@@ -27,37 +39,79 @@ async def load_forecast_model(region: str, pollutant: str, frequency: str):
         }).fetchone()
 
     if result and result._mapping["model_blob"]:
-        return pickle.loads(result._mapping["model_blob"])
+        return await compute.run_in_thread(pickle.loads, result._mapping["model_blob"])
     else:
         return None
 
 
+def _normalize_frequency(frequency: str) -> str:
+    freq_map = {
+        "daily": "D", "weekly": "W", "monthly": "M", "yearly": "Y",
+        "d": "D", "w": "W", "m": "M", "y": "Y"
+    }
+    return freq_map.get(frequency.lower(), frequency.upper())
+
+
+def _format_forecast(forecast: pd.DataFrame, pollutant: str) -> pd.DataFrame:
+    result = forecast[["ds", "yhat", "yhat_lower", "yhat_upper"]].copy()
+    result["ds"] = result["ds"].dt.strftime("%Y-%m-%dT%H:%M:%S")
+    result["category"] = aqi.categorize(pollutant, result["yhat"])
+    logger.info(f"📅 Forecast starts at {result['ds'].iloc[0]} with {len(result)} points")
+    return result
+
+
 def get_prophet_forecast(model, pollutant: str, frequency: str = "D", periods: Optional[int] = None):
     try:
-        freq_map = {
-            "daily": "D", "weekly": "W", "monthly": "M", "yearly": "Y",
-            "d": "D", "w": "W", "m": "M", "y": "Y"
-        }
-        normalized_freq = freq_map.get(frequency.lower(), frequency.upper())
-        
-        # ✅ Get last date from training
-        last_training_date = model.history["ds"].max()
-        logger.info(f"🧠 Model trained up to: {last_training_date}")
+        normalized_freq = _normalize_frequency(frequency)
 
-        # ✅ Generate full future dataframe
-        full_future = model.make_future_dataframe(periods=periods or 7, freq=normalized_freq)
+        # ✅ Get last date from training
+        logger.info(f"🧠 Model trained up to: {model.history['ds'].max()}")
 
-        # ✅ Keep only rows after the training data
-        future = full_future[full_future["ds"] > last_training_date]
+        # ✅ Predict only the rows after the training data
+        forecast = forecast_tasks.predict_after_history(model, periods or 7, normalized_freq)
+        return _format_forecast(forecast, pollutant)
+    except Exception as e:
+        logger.error(f"❌ Forecast generation failed: {str(e)}")
+        return pd.DataFrame()
 
-        # Predict
-        forecast = model.predict(future)
-        result = forecast[["ds", "yhat", "yhat_lower", "yhat_upper"]].copy()
-        result["ds"] = result["ds"].dt.strftime("%Y-%m-%dT%H:%M:%S")
-        result["category"] = result["yhat"].apply(lambda v: get_aqi_category(pollutant, v))
-        logger.info(f"📅 Forecast starts at {result['ds'].iloc[0]} with {len(result)} points")
 
-        return result
+async def get_prophet_forecast_async(
+    model,
+    pollutant: str,
+    frequency: str = "D",
+    periods: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+):
+    """
+    Same as `get_prophet_forecast`, but runs Prophet on the compute process
+    pool so the event loop stays free. `model` may be a Prophet object or
+    raw pickle bytes. With `end_date`, the steps after the training data up
+    to it are forecast instead of `periods` steps; `start_date` drops the
+    earlier ones.
+    """
+    try:
+        normalized_freq = _normalize_frequency(frequency)
+        if end_date is not None:
+            forecast = await compute.run_in_process(
+                forecast_tasks.predict_range, model, start_date or pd.Timestamp.min, end_date, normalized_freq
+            )
+        else:
+            forecast = await compute.run_in_process(
+                forecast_tasks.predict_after_history, model, periods or 7, normalized_freq
+            )
+            if start_date is not None:
+                forecast = forecast[forecast["ds"] >= pd.Timestamp(start_date)].reset_index(drop=True)
+        return _format_forecast(forecast, pollutant)
     except Exception as e:
         logger.error(f"❌ Forecast generation failed: {str(e)}")
         return pd.DataFrame()
+
+
+@coalesced("forecast")
+async def forecast_latest_model(region: str, pollutant: str, frequency: str, periods: Optional[int] = None):
+    """Forecast from the latest stored model; `None` when no model exists."""
+    model = await load_forecast_model(region, pollutant, frequency)
+    if not model:
+        return None
+    return await get_prophet_forecast_async(model, pollutant, frequency=frequency, periods=periods)
@@ -0,0 +1,189 @@
+# services/forecast_matrix.py
+"""
+Region x day forecast matrix for the map view (`/models/forecast/matrix/`).
+
+The map used to call the forecast endpoint once per region and receive a
+list of dicts for each. Here one request returns, for a pollutant and date
+window, a dense columnar payload: the date axis, the region axis, and
+`yhat`, category-code and risk matrices (region-major; null / -1 where a
+region has no value for a day), plus each region's provenance ("model" or,
+for regions with a centroid but no model, "interpolated").
+
+Rows are the daily forecasts of `insights_engine.forecast_window`,
+materialized through the spatial forecast cache, so they are shared with
+interpolation. They are reindexed onto the window's date grid and stacked
+into one array, and categories and risk are computed on the whole matrix
+at once.
+
+The matrix does not depend on the user: risk is the base score (profile
+weight 1). Its version, the ETag, is a hash of the request and the latest
+model per region (plus the centroids when interpolating). The serialized
+body is cached under that ETag, so every user gets the same bytes, and a
+matching If-None-Match costs one small query. A body with failed rows is
+neither cached nor tagged, so it is rebuilt on the next request.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from db.databases import engine
+from services import compute, spatial
+from services.insights_engine import forecast_window
+from utils import aqi
+from utils.helpers import setup_logger
+
+logger = setup_logger(__name__)
+
+MATRIX_MAX_DAYS = 92
+MATRIX_CACHE_SIZE = 32
+MATRIX_CACHE_TTL = 3600
+
+_bodies: "OrderedDict[str, tuple]" = OrderedDict()
+
+
+def model_versions(pollutant: str) -> Dict[str, str]:
+    """Latest model timestamp per modeled region for the pollutant."""
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT region, MAX(created_at) AS latest FROM models
+            WHERE pollutant = :pollutant
+            GROUP BY region
+        """), {"pollutant": pollutant}).fetchall()
+    return {row.region: str(row.latest) for row in rows}
+
+
+def plan(
+    pollutant: str,
+    start: date,
+    end: date,
+    regions: Optional[List[str]],
+    interpolate: bool,
+    versions: Dict[str, str],
+    centroids: Dict[str, dict]
+) -> Tuple[List[Tuple[str, str]], str]:
+    """([(region, "model" | "interpolated")], etag) for a request."""
+    modeled = {region.lower(): region for region in versions}
+    if regions is None:
+        names = sorted(set(modeled.values()) | ({c["region"] for c in centroids.values()} if interpolate else set()),
+                       key=str.lower)
+    else:
+        names = list(dict.fromkeys(regions))
+    rows = [(modeled.get(name.lower(), name), "model") if name.lower() in modeled
+            else (name, "interpolated") for name in names]
+    if not interpolate:
+        rows = [row for row in rows if row[1] == "model"]
+
+    version = {
+        "pollutant": pollutant,
+        "window": [start.isoformat(), end.isoformat()],
+        "rows": rows,
+        "models": sorted((r, versions[r]) for r, kind in rows if kind == "model"),
+    }
+    if any(kind == "interpolated" for _, kind in rows):
+        # Interpolated rows depend on their neighbours' models, which may not be rows themselves
+        version["models"] = sorted(versions.items())
+    if interpolate:
+        version["centroids"] = sorted((c["region"], c["lat"], c["lon"]) for c in centroids.values())
+        version["spatial"] = [spatial.SPATIAL_NEIGHBORS, spatial.SPATIAL_MAX_KM, spatial.SPATIAL_POWER]
+    digest = hashlib.sha1(json.dumps(version, sort_keys=True, default=str).encode()).hexdigest()
+    return rows, f'"{digest}"'
+
+
+def stack(frames: List[Optional[pd.DataFrame]], dates: pd.DatetimeIndex) -> np.ndarray:
+    """(regions x dates) yhat matrix; NaN where a region has no value."""
+    matrix = np.full((len(frames), len(dates)), np.nan)
+    for i, frame in enumerate(frames):
+        if frame is None or frame.empty:
+            continue
+        ds = pd.to_datetime(frame["ds"]).dt.normalize()
+        columns = dates.get_indexer(ds)
+        valid = columns >= 0
+        matrix[i, columns[valid]] = frame["yhat"].to_numpy(dtype=float)[valid]
+    return matrix
+
+
+def _nullable(matrix: np.ndarray) -> list:
+    values = np.round(matrix, 2).astype(object)
+    values[np.isnan(matrix)] = None
+    return values.tolist()
+
+
+def payload(pollutant: str, dates: pd.DatetimeIndex, rows: List[Tuple[str, str]], matrix: np.ndarray,
+            errors: Dict[str, str]) -> dict:
+    codes = aqi.category_codes(pollutant, matrix)
+    return {
+        "pollutant": pollutant,
+        "dates": dates.strftime("%Y-%m-%d").tolist(),
+        "regions": [region for region, _ in rows],
+        "provenance": [kind for _, kind in rows],
+        "yhat": _nullable(matrix),
+        "category_codes": codes.tolist(),
+        "risk": aqi.risk_scores_from_codes(codes).tolist(),
+        "categories": aqi.AQI_CATEGORIES_ORDER,
+        "unit": "μg/m³",
+        "errors": errors,
+    }
+
+
+async def _row(region: str, kind: str, pollutant: str, start: str, end: str) -> Optional[pd.DataFrame]:
+    key = ("window", start, end)
+    if kind == "model":
+        return await spatial.materialized(
+            (key, pollutant, region), lambda: forecast_window(region, pollutant, start, end)
+        )
+    interpolated = await spatial.interpolate(
+        region, pollutant, lambda neighbor: forecast_window(neighbor, pollutant, start, end), key=key
+    )
+    return interpolated[0] if interpolated is not None else None
+
+
+async def get_matrix(
+    pollutant: str,
+    start: date,
+    end: date,
+    regions: Optional[List[str]] = None,
+    interpolate: bool = True,
+    if_none_match: Optional[str] = None
+) -> Tuple[Optional[str], Optional[bytes]]:
+    """
+    (etag, JSON body); the body is None when `if_none_match` already names
+    this version, and the etag is None when some rows failed.
+    """
+    versions = await compute.run_in_thread(model_versions, pollutant)
+    centroids = await compute.run_in_thread(spatial.load_centroids) if interpolate else {}
+    rows, etag = plan(pollutant, start, end, regions, interpolate, versions, centroids)
+    if if_none_match is not None and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return etag, None
+
+    cached = _bodies.get(etag)
+    if cached is not None and time.monotonic() - cached[0] < MATRIX_CACHE_TTL:
+        _bodies.move_to_end(etag)
+        return etag, cached[1]
+
+    first, last = start.isoformat(), end.isoformat()
+    frames = await asyncio.gather(*(_row(region, kind, pollutant, first, last) for region, kind in rows))
+    errors = {region: ("No forecast available." if kind == "model" else "No modeled neighbours to interpolate from.")
+              for (region, kind), frame in zip(rows, frames) if frame is None or frame.empty}
+
+    dates = pd.date_range(start, end, freq="D")
+    matrix = await compute.run_in_thread(stack, list(frames), dates)
+    body = await compute.run_in_thread(
+        lambda: json.dumps(payload(pollutant, dates, rows, matrix, errors), separators=(",", ":")).encode()
+    )
+    if errors:
+        logger.warning(f"⚠️ Forecast matrix {pollutant} {first}..{last}: no rows for {', '.join(errors)}")
+        return None, body
+    _bodies[etag] = (time.monotonic(), body)
+    while len(_bodies) > MATRIX_CACHE_SIZE:
+        _bodies.popitem(last=False)
+    logger.info(f"🗺️ Forecast matrix {pollutant} {first}..{last}: {len(rows)} regions x {len(dates)} days")
+    return etag, body
@@ -0,0 +1,84 @@
+# services/forecast_tasks.py
+"""
+Prophet work that runs inside the compute process pool.
+
+Everything here must be importable in a freshly spawned worker, so this module
+only depends on pandas/pickle — no DB engine, Supabase client or settings.
+Models may be passed either as a loaded Prophet object or as raw pickle bytes
+(straight from storage or `models.model_blob`), which is cheaper to ship.
+"""
+
+import pickle
+from io import BytesIO
+from typing import Union
+
+import pandas as pd
+
+FORECAST_COLUMNS = ["ds", "yhat", "yhat_lower", "yhat_upper"]
+
+
+def warm_up() -> bool:
+    """Import Prophet in a fresh worker so the first request doesn't pay for it."""
+    import prophet  # noqa: F401
+    return True
+
+
+def load_model(model):
+    if isinstance(model, (bytes, bytearray, memoryview)):
+        return pickle.loads(bytes(model))
+    if isinstance(model, BytesIO):
+        return pickle.loads(model.getvalue())
+    return model
+
+
+def predict_with_history(model, periods: int, freq: str) -> pd.DataFrame:
+    """Predict over the training history plus `periods` future steps."""
+    model = load_model(model)
+    future = model.make_future_dataframe(periods=periods, freq=freq)
+    return model.predict(future)[FORECAST_COLUMNS]
+
+
+def predict_after_history(model, periods: int, freq: str) -> pd.DataFrame:
+    """Predict only the `periods` steps after the last training date."""
+    model = load_model(model)
+    last_training_date = model.history["ds"].max()
+    full_future = model.make_future_dataframe(periods=periods, freq=freq)
+    future = full_future[full_future["ds"] > last_training_date]
+    return model.predict(future)[FORECAST_COLUMNS].reset_index(drop=True)
+
+
+def predict_tail(model, periods: int, freq: str, tail: int) -> pd.DataFrame:
+    """
+    Last `tail` rows of history + `periods` future steps, predicting only those
+    rows instead of the whole history (Prophet predicts each row independently).
+    """
+    model = load_model(model)
+    future = model.make_future_dataframe(periods=periods, freq=freq).tail(tail)
+    return model.predict(future)[FORECAST_COLUMNS].reset_index(drop=True)
+
+
+def predict_range(model, start_date, end_date, freq: str = "D") -> pd.DataFrame:
+    """
+    Predict only the steps in [start_date, end_date] after the training data,
+    on the same grid `make_future_dataframe` would produce.
+    """
+    model = load_model(model)
+    history_end = model.history["ds"].max()
+    grid = pd.date_range(history_end, pd.to_datetime(end_date), freq=freq)
+    grid = grid[(grid > history_end) & (grid >= pd.to_datetime(start_date))]
+    if grid.empty:
+        return pd.DataFrame(columns=FORECAST_COLUMNS)
+    return model.predict(pd.DataFrame({"ds": grid}))[FORECAST_COLUMNS]
+
+
+def predict_dates(model, ds: Union[pd.Series, list]) -> pd.DataFrame:
+    model = load_model(model)
+    return model.predict(pd.DataFrame({"ds": pd.to_datetime(ds)}))[FORECAST_COLUMNS]
+
+
+def fit_prophet(train_df: pd.DataFrame, **prophet_kwargs):
+    from prophet import Prophet
+
+    model = Prophet(**prophet_kwargs)
+    model.fit(train_df)
+    return model
@@ -0,0 +1,90 @@
+# services/index_backfill.py
+"""
+Background indexing of datasets that predate an upload-time index.
+
+The ranking index, the time index and the percentile sketches are written
+when a dataset is uploaded. Older datasets (and uploads whose indexing
+failed) are picked up here, off the request path: `run_scheduler`, started
+from the app lifespan, runs every registered `Backfill` every
+INDEX_BACKFILL_INTERVAL seconds.
+
+A dataset that fails to download or parse is not retried on every run:
+each failure doubles its back-off, from one interval up to
+BACKFILL_MAX_BACKOFF seconds.
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from services import compute
+from utils.helpers import setup_logger
+
+logger = setup_logger(__name__)
+
+BACKFILL_MAX_BACKOFF = 24 * 3600
+
+_registry: List["Backfill"] = []
+
+
+class Backfill:
+    def __init__(
+        self,
+        name: str,
+        unindexed: Callable[[], List[dict]],
+        index: Callable[[dict], Awaitable[None]],
+        backoff: float = 600
+    ):
+        self.name = name
+        self.unindexed = unindexed  # blocking: rows (with an `id`) still missing from the index
+        self.index = index
+        self.backoff = backoff
+        self.failures: Dict[str, Tuple[int, float]] = {}  # dataset id -> (attempts, retry at)
+        _registry.append(self)
+
+    def _due(self, dataset_id: str) -> bool:
+        failed = self.failures.get(dataset_id)
+        return failed is None or time.monotonic() >= failed[1]
+
+    def _failed(self, dataset_id: str):
+        attempts = self.failures.get(dataset_id, (0, 0.0))[0] + 1
+        delay = min(self.backoff * 2 ** (attempts - 1), BACKFILL_MAX_BACKOFF)
+        self.failures[dataset_id] = (attempts, time.monotonic() + delay)
+
+    async def run(self) -> int:
+        """Index the missing datasets that are not backing off; returns how many."""
+        missing = await compute.run_in_thread(self.unindexed)
+        # Forget failures of datasets that were deleted or indexed since
+        self.failures = {k: v for k, v in self.failures.items() if k in {str(row["id"]) for row in missing}}
+        indexed = 0
+        for row in missing:
+            dataset_id = str(row["id"])
+            if not self._due(dataset_id):
+                continue
+            try:
+                await self.index(row)
+                self.failures.pop(dataset_id, None)
+                indexed += 1
+            except Exception as e:
+                self._failed(dataset_id)
+                attempts, retry_at = self.failures[dataset_id]
+                logger.warning(f"⚠️ {self.name}: could not index dataset {dataset_id} (attempt {attempts}, "
+                               f"retry in {retry_at - time.monotonic():.0f}s): {e}")
+        if indexed:
+            logger.info(f"📇 {self.name}: backfilled {indexed} datasets")
+        return indexed
+
+
+async def run_scheduler(interval: int):
+    """Run every backfill now and then every `interval` seconds until cancelled (started from the app lifespan)."""
+    logger.info(f"⏰ Index backfill scheduled every {interval}s")
+    while True:
+        for backfill in _registry:
+            backfill.backoff = interval
+            try:
+                await backfill.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ {backfill.name} backfill failed: {e}")
+        await asyncio.sleep(interval)
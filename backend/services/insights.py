@@ -4,85 +4,62 @@ from db.databases import engine
 from sqlalchemy import text
 from io import BytesIO
 import pickle
-from utils.helpers import get_aqi_category, is_threshold_exceeded
+from utils import aqi, composite, downsample
 import pandas as pd
 from utils.helpers import download_from_supabase_storage
 from typing import Optional
-from utils.email_utils import send_email_alert
+from datetime import date
 from utils.helpers import setup_logger
+from services import compute, forecast_tasks, query_engine, region_index, subscription_checker, time_index
+from services.evaluation import load_model_file
+from services.singleflight import coalesced
+import calendar
+import copy
 
 POLLUTANTS = ["no2_conc", "o3_conc", "so2_conc", "co_conc", "no_conc"]
 logger = setup_logger(__name__)
 
-async def evaluate_all_subscriptions():
+async def engine_query(**kwargs) -> Optional[pd.DataFrame]:
+    """Result of a query_engine aggregate, or None to use the pandas path."""
+    if not query_engine.ready():
+        return None
+    try:
+        frame = await query_engine.query(**kwargs)
+    except Exception as e:
+        logger.warning(f"⚠️ Query engine failed, using pandas: {e}")
+        return None
+    return frame if not frame.empty else None
+
+@coalesced("dataset_file")
+async def load_dataset_file(filename: str) -> bytes:
+    """Raw CSV bytes of a dataset; concurrent requests share one download."""
+    csv_bytes = await download_from_supabase_storage(filename, bucket="datasets")
+    return csv_bytes.getvalue()
+
+# Alert evaluation lives in services.subscription_checker (grouped per
+# region/pollutant); kept importable from here for older callers.
+evaluate_all_subscriptions = subscription_checker.evaluate_all_subscriptions
+
+def load_profile(user_id: str) -> Optional[dict]:
     with engine.connect() as conn:
-        result = conn.execute(text("""
-            SELECT a.id AS sub_id, a.user_id, a.region, a.pollutant, a.threshold, u.email
-            FROM aqi_subscriptions a
-            JOIN users u ON a.user_id = u.id
-        """))
-        subscriptions = [dict(row._mapping) for row in result.fetchall()]
-
-    triggered_alerts = []
-
-    for sub in subscriptions:
-        try:
-            model_id = f"{sub['region']}_{sub['pollutant']}_model.pkl"
-            model_bytes = await download_from_supabase_storage(model_id, bucket="models")
-            model = pickle.load(model_bytes)
-
-            future = model.make_future_dataframe(periods=3, freq="Y")
-            forecast = model.predict(future).tail(3)
-
-            for _, row in forecast.iterrows():
-                category = get_aqi_category(sub["pollutant"], row["yhat"])
-                if is_threshold_exceeded(category, sub["threshold"]):
-                    alert = {
-                        "user_id": sub["user_id"],
-                        "email": sub["email"],
-                        "region": sub["region"],
-                        "pollutant": sub["pollutant"],
-                        "date": row["ds"],
-                        "value": round(row["yhat"], 2),
-                        "category": category,
-                        "threshold": sub["threshold"]
-                    }
-                    triggered_alerts.append(alert)
-
-                    subject = f"[AQI Alert] Forecast for {sub['region']} exceeds your threshold"
-                    body = (
-                        f"Dear user,\n\n"
-                        f"The forecasted AQI level for {sub['pollutant']} in {sub['region']} "
-                        f"on {row['ds'].date()} is {alert['value']} ({category}), "
-                        f"which exceeds your threshold: {sub['threshold']}.\n\n"
-                        f"Stay safe,\nThessAir Team"
-                    )
-                    send_email_alert(sub["email"], subject, body)
-                    break
-        except Exception as e:
-            print(f"❌ Error evaluating subscription for {sub['email']}: {str(e)}")
-            continue
+        row = conn.execute(text("""
+            SELECT * FROM profiles WHERE user_id = :uid
+        """), {"uid": user_id}).fetchone()
+    return dict(row._mapping) if row else None
 
-    return triggered_alerts
+def risk_factor(profile: Optional[dict]) -> float:
+    """Exposure multiplier for a user's health profile."""
+    profile = profile or {}
+    factor = 1.0
+    if profile.get("has_asthma"): factor += 0.4
+    if profile.get("has_heart_disease"): factor += 0.3
+    if profile.get("is_smoker"): factor += 0.3
+    return factor
 
 async def get_personalized_pollutant_insights(user_id: str, region: str, pollutant: str):
-    with engine.connect() as conn:
-        result = conn.execute(text("""
-            SELECT * FROM profiles WHERE user_id = :uid
-        """), {"uid": user_id})
-        row = result.fetchone()
-
-    if not row:
+    profile = await compute.run_in_thread(load_profile, user_id)
+    if not profile:
         return {"error": "User profile not found."}
-    profile = dict(row._mapping)
-
-    risk_factor = 1.0
-    if profile.get("has_asthma"):
-        risk_factor += 0.4
-    if profile.get("has_heart_disease"):
-        risk_factor += 0.3
-    if profile.get("is_smoker"):
-        risk_factor += 0.3
 
     # 🩹 FIX: get latest year from datasets
     with engine.connect() as conn:
@@ -95,11 +72,16 @@ async def get_personalized_pollutant_insights(user_id: str, region: str, polluta
     year = year_row[0]
 
     trend = await get_yearly_trend(region, pollutant, year)
+    return personalize_trend(trend, risk_factor(profile), user_id)
+
+def personalize_trend(trend: dict, factor: float, user_id: str):
+    """A yearly trend payload with risk-adjusted values."""
     if "error" in trend:
         return trend
+    trend = copy.deepcopy(trend)  # shared with other in-flight callers
 
     trend["adjusted_values"] = [
-        round(v * risk_factor, 2) if v is not None else None for v in trend["values"]
+        round(v * factor, 2) if v is not None else None for v in trend["values"]
     ]
     trend["meta"]["type"] = "personalized_trend"
     trend["meta"]["user_id"] = user_id
@@ -108,19 +90,17 @@ async def get_personalized_pollutant_insights(user_id: str, region: str, polluta
 
 async def get_multi_year_personalized_trend(user_id: str, region: str, pollutant: str):
     # 1. Fetch user profile for risk adjustments
-    with engine.connect() as conn:
-        row = conn.execute(text("""
-            SELECT * FROM profiles WHERE user_id = :uid
-        """), {"uid": user_id}).fetchone()
-    profile = dict(row._mapping) if row else {}
+    factor = risk_factor(await compute.run_in_thread(load_profile, user_id))
 
-    # Risk multiplier
-    risk_factor = 1.0
-    if profile.get("has_asthma"): risk_factor += 0.4
-    if profile.get("has_heart_disease"): risk_factor += 0.3
-    if profile.get("is_smoker"): risk_factor += 0.3
+    # 2. Yearly averages, from the query engine or from every dataset of the region
+    frame = await engine_query(pollutant=pollutant, group_by=["dataset_year"], region=region,
+                                within_dataset_year=True)
+    if frame is not None:
+        return _personalized_trend_payload(
+            [(int(r.dataset_year), float(r.mean)) for r in frame.itertuples()],
+            factor, region, pollutant, user_id
+        )
 
-    # 2. Load all datasets for this region
     with engine.connect() as conn:
         result = conn.execute(text("""
             SELECT filename, year FROM datasets
@@ -137,26 +117,10 @@ async def get_multi_year_personalized_trend(user_id: str, region: str, pollutant
         filename = row._mapping["filename"]
         year = row._mapping["year"]
         try:
-            csv_bytes = await download_from_supabase_storage(filename, bucket="datasets")
-            df = pd.read_csv(csv_bytes)
-            if "time" not in df.columns:
+            csv_bytes = BytesIO(await load_dataset_file(filename))
+            avg = await compute.run_in_thread(_year_average_from_csv, csv_bytes, pollutant, year)
+            if avg is None:
                 continue
-            df["time"] = pd.to_datetime(df["time"], errors="coerce")
-            df.dropna(subset=["time"], inplace=True)
-            df = df[df["time"].dt.year == year]
-
-            if pollutant.lower() == "pollution":
-                valid_cols = [p for p in POLLUTANTS if p in df.columns]
-                if not valid_cols:
-                    continue
-                df["value"] = df[valid_cols].mean(axis=1)
-            elif pollutant in df.columns:
-                df["value"] = df[pollutant]
-            else:
-                continue
-
-            df.dropna(subset=["value"], inplace=True)
-            avg = df["value"].mean()
             combined.append((year, avg))
 
         except Exception as e:
@@ -164,12 +128,13 @@ async def get_multi_year_personalized_trend(user_id: str, region: str, pollutant
 
     if not combined:
         return {"error": "No valid pollutant data found."}
+    return _personalized_trend_payload(combined, factor, region, pollutant, user_id)
 
-    # 3. Structure results
+def _personalized_trend_payload(combined, factor: float, region: str, pollutant: str, user_id: str):
     combined.sort(key=lambda x: x[0])
     labels = [str(y) for y, _ in combined]
     values = [round(v, 2) for _, v in combined]
-    adjusted_values = [round(v * risk_factor, 2) for v in values]
+    adjusted_values = [round(v * factor, 2) for v in values]
     deltas = [round(values[i] - values[i - 1], 2) if i > 0 else 0.0 for i in range(len(values))]
 
     return {
@@ -187,6 +152,25 @@ async def get_multi_year_personalized_trend(user_id: str, region: str, pollutant
         }
     }
 
+def _year_average_from_csv(csv_bytes: BytesIO, pollutant: str, year: int) -> Optional[float]:
+    return _year_average_from_frame(pd.read_csv(csv_bytes), pollutant, year)
+
+def _year_average_from_frame(df: pd.DataFrame, pollutant: str, year: int) -> Optional[float]:
+    if "time" not in df.columns:
+        return None
+    df["time"] = pd.to_datetime(df["time"], errors="coerce")
+    df.dropna(subset=["time"], inplace=True)
+    df = df[df["time"].dt.year == year]
+
+    values = composite.pollutant_values(df, pollutant)
+    if values is None:
+        return None
+    df["value"] = values
+
+    df.dropna(subset=["value"], inplace=True)
+    return df["value"].mean()
+
+@coalesced("historical_data_by_region_year")
 async def get_historical_data_by_region_year(region: str, year: int):
     with engine.connect() as conn:
         result = conn.execute(text("""
@@ -200,7 +184,10 @@ async def get_historical_data_by_region_year(region: str, year: int):
         return {"error": "No dataset found for this region and year."}
     row = dict(row._mapping)
 
-    csv_bytes = await download_from_supabase_storage(row["filename"], bucket="datasets")
+    csv_bytes = BytesIO(await load_dataset_file(row["filename"]))
+    return await compute.run_in_thread(_historical_summary_from_csv, csv_bytes)
+
+def _historical_summary_from_csv(csv_bytes: BytesIO):
     df = pd.read_csv(csv_bytes)
 
     return {
@@ -209,25 +196,31 @@ async def get_historical_data_by_region_year(region: str, year: int):
         "summary": df.describe(include="all").to_dict()
     }
 
+@coalesced("monthly_forecast_calendar")
 async def get_monthly_forecast_calendar(region: str, pollutant: str):
     model_id = f"{region}_{pollutant}_model.pkl"
     try:
-        model_bytes = await download_from_supabase_storage(model_id, bucket="models")
-        model = pickle.load(model_bytes)
+        model_bytes = await load_model_file(model_id, bucket="models")
     except Exception:
         return {"error": f"No trained model available for {region} - {pollutant}"}
 
-    future = model.make_future_dataframe(periods=12, freq="M")
-    forecast = model.predict(future)
+    forecast = await compute.run_in_process(
+        forecast_tasks.predict_with_history, model_bytes, 12, "M"
+    )
 
     upcoming = forecast[["ds", "yhat"]].tail(12).copy()
     upcoming["month"] = upcoming["ds"].dt.strftime("%B %Y")
     upcoming["value"] = upcoming["yhat"].round(2)
-    upcoming["category"] = upcoming["value"].apply(lambda val: get_aqi_category(pollutant, val))
+    upcoming["category"] = aqi.categorize(pollutant, upcoming["value"])
 
     return upcoming[["month", "value", "category"]].to_dict(orient="records")
 
+@coalesced("yearly_trend")
 async def get_yearly_trend(region: str, pollutant: str, year: int):
+    frame = await engine_query(pollutant=pollutant, group_by=["year"], region=region, dataset_year=year)
+    if frame is not None:
+        return yearly_trend_payload(frame, region, pollutant, year)
+
     with engine.connect() as conn:
         result = conn.execute(text("""
             SELECT filename FROM datasets
@@ -239,19 +232,32 @@ async def get_yearly_trend(region: str, pollutant: str, year: int):
     if not row:
         return {"error": "No dataset found for this region and year."}
     row = dict(row._mapping)
-    csv_bytes = await download_from_supabase_storage(row["filename"], bucket="datasets")
-    df = pd.read_csv(csv_bytes)
+    csv_bytes = BytesIO(await load_dataset_file(row["filename"]))
+    return await compute.run_in_thread(_yearly_trend_from_csv, csv_bytes, region, pollutant, year)
+
+def yearly_trend_payload(frame: pd.DataFrame, region: str, pollutant: str, year: int):
+    """Trend payload from a query_engine frame with `year` and `mean` columns."""
+    values = frame["mean"].round(2)
+    return {
+        "labels": frame["year"].astype(int).astype(str).tolist(),
+        "values": values.tolist(),
+        "deltas": frame["mean"].diff().round(2).fillna(0).tolist(),
+        "unit": "μg/m³",
+        "meta": {"type": "trend", "region": region, "pollutant": pollutant, "year": year}
+    }
 
-    if pollutant.lower() == "pollution":
-        available = [p for p in POLLUTANTS if p in df.columns]
-        if not available:
+def _yearly_trend_from_csv(csv_bytes: BytesIO, region: str, pollutant: str, year: int):
+    return _yearly_trend_from_frame(pd.read_csv(csv_bytes), region, pollutant, year)
+
+def _yearly_trend_from_frame(df: pd.DataFrame, region: str, pollutant: str, year: int):
+
+    values = composite.pollutant_values(df, pollutant)
+    if values is None:
+        if composite.is_derived(pollutant):
             return {"error": "No pollutant data available in dataset."}
-        df["value"] = df[available].mean(axis=1)
-    else:
-        if pollutant not in df.columns:
-            logger.warning(f"Pollutant {pollutant} not found in dataset columns: {df.columns}")
-            return {"error": f"{pollutant} not found in dataset."}
-        df["value"] = df[pollutant]
+        logger.warning(f"Pollutant {pollutant} not found in dataset columns: {df.columns}")
+        return {"error": f"{pollutant} not found in dataset."}
+    df["value"] = values
 
     if "time" not in df.columns:
         return {"error": "Missing 'time' column."}
@@ -279,60 +285,87 @@ async def get_yearly_trend(region: str, pollutant: str, year: int):
         }
     }
 
-async def get_daily_trend(region: str, pollutant: str, start_date: Optional[str], end_date: Optional[str]):
-    with engine.connect() as conn:
-        result = conn.execute(text("""
-            SELECT filename FROM datasets
-            WHERE region = :region
-            ORDER BY year DESC LIMIT 1
-        """), {"region": region})
-        row = result.fetchone()
-
-    if not row:
-        return {"error": "No dataset found."}
-    row = dict(row._mapping)
-
-    csv_bytes = await download_from_supabase_storage(row["filename"], bucket="datasets")
-    df = pd.read_csv(csv_bytes)
-
-    if "time" not in df.columns:
-        return {"error": "Dataset missing 'time' column."}
-    df["time"] = pd.to_datetime(df["time"])
-
-    # Filter by pollutant
-    if pollutant.lower() == "pollution":
-        available = [p for p in POLLUTANTS if p in df.columns]
-        if not available:
-            return {"error": "No pollutant data available in dataset."}
-        df["value"] = df[available].mean(axis=1)
-    else:
-        if pollutant not in df.columns:
-            logger.warning(f"Pollutant {pollutant} not found in dataset columns: {df.columns}")
-            return {"error": f"{pollutant} not found in dataset."}
-        df["value"] = df[pollutant]
-
-    # Optional date filtering
-    if start_date:
-        df = df[df["time"] >= pd.to_datetime(start_date)]
-    if end_date:
-        df = df[df["time"] <= pd.to_datetime(end_date)]
-
-    df = df[["time", "value"]].dropna().sort_values("time")
+def _trend_points(df: pd.DataFrame, resolution: Optional[str], max_points: Optional[int], method: str):
+    """
+    (labels, values, meta) of a time-sorted `time`/`value` frame, averaged to
+    `resolution` and/or downsampled to `max_points`. Without either, every
+    row is returned with date labels, as before.
+    """
+    if resolution is None and not max_points:
+        return df["time"].dt.strftime("%Y-%m-%d").tolist(), df["value"].round(2).tolist(), {}
+
+    series = df.set_index("time")["value"]
+    if resolution is not None:
+        series = downsample.resample(series.index.to_series(), series, resolution)
+    source_points = len(series)
+    keep = downsample.downsample(series.index.to_series(), series, max_points, method)
+    series = series.iloc[keep]
+
+    # Sub-daily points need the hour in their label to stay distinct
+    daily = resolution in ("daily", "weekly") or bool((series.index.normalize() == series.index).all())
+    labels = series.index.strftime("%Y-%m-%d" if daily else "%Y-%m-%d %H:%M").tolist()
+    meta = {"resolution": resolution or "native", "points": len(series), "source_points": source_points}
+    if max_points:
+        meta["max_points"], meta["method"] = max_points, method
+    return labels, series.round(2).tolist(), meta
+
+
+@coalesced("daily_trend")
+async def get_daily_trend(
+    region: str,
+    pollutant: str,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    resolution: Optional[str] = None,
+    max_points: Optional[int] = None,
+    method: str = "lttb"
+):
+    """
+    The region's series between start_date and end_date, across all of its
+    datasets (open ends allowed); only overlapping datasets and days are read.
+    """
+    df = await time_index.read_range(region, pollutant, start_date, end_date)
+    if df.empty:
+        return {"error": "No data found for this region, pollutant and date range."}
+    return await compute.run_in_thread(
+        _daily_trend_payload, df, region, pollutant, start_date, end_date, resolution, max_points, method
+    )
+
+def _daily_trend_payload(
+    df: pd.DataFrame,
+    region: str,
+    pollutant: str,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    resolution: Optional[str] = None,
+    max_points: Optional[int] = None,
+    method: str = "lttb"
+):
+    labels, values, points_meta = _trend_points(df, resolution, max_points, method)
 
     return {
-        "labels": df["time"].dt.strftime("%Y-%m-%d").tolist(),
-        "values": df["value"].round(2).tolist(),
+        "labels": labels,
+        "values": values,
         "unit": "μg/m³",
         "meta": {
             "type": "daily_trend",
             "region": region,
             "pollutant": pollutant,
-            "start_date": start_date,
-            "end_date": end_date
+            "start_date": str(start_date) if start_date else labels[0],
+            "end_date": str(end_date) if end_date else labels[-1],
+            **points_meta
         }
     }
     
-async def get_daily_trend_by_year(region: str, pollutant: str, year: int):
+@coalesced("daily_trend_by_year")
+async def get_daily_trend_by_year(
+    region: str,
+    pollutant: str,
+    year: int,
+    resolution: Optional[str] = None,
+    max_points: Optional[int] = None,
+    method: str = "lttb"
+):
     with engine.connect() as conn:
         result = conn.execute(text("""
             SELECT filename FROM datasets
@@ -345,84 +378,98 @@ async def get_daily_trend_by_year(region: str, pollutant: str, year: int):
         return {"error": "No dataset found for this region and year."}
     row = dict(row._mapping)
 
-    csv_bytes = await download_from_supabase_storage(row["filename"], bucket="datasets")
-    df = pd.read_csv(csv_bytes)
+    csv_bytes = BytesIO(await load_dataset_file(row["filename"]))
+    return await compute.run_in_thread(
+        _daily_trend_by_year_from_csv, csv_bytes, region, pollutant, year, resolution, max_points, method
+    )
+
+def _daily_trend_by_year_from_csv(
+    csv_bytes: BytesIO,
+    region: str,
+    pollutant: str,
+    year: int,
+    resolution: Optional[str] = None,
+    max_points: Optional[int] = None,
+    method: str = "lttb"
+):
+    return _daily_trend_by_year_from_frame(
+        pd.read_csv(csv_bytes), region, pollutant, year, resolution, max_points, method
+    )
+
+def _daily_trend_by_year_from_frame(
+    df: pd.DataFrame,
+    region: str,
+    pollutant: str,
+    year: int,
+    resolution: Optional[str] = None,
+    max_points: Optional[int] = None,
+    method: str = "lttb"
+):
 
     if "time" not in df.columns:
         return {"error": "Dataset missing 'time' column."}
     df["time"] = pd.to_datetime(df["time"])
     df = df[df["time"].dt.year == year]
 
-    if pollutant.lower() == "pollution":
-        available = [p for p in POLLUTANTS if p in df.columns]
-        if not available:
+    values = composite.pollutant_values(df, pollutant)
+    if values is None:
+        if composite.is_derived(pollutant):
             return {"error": "No pollutant data available in dataset."}
-        df["value"] = df[available].mean(axis=1)
-    else:
-        if pollutant not in df.columns:
-            logger.warning(f"Pollutant {pollutant} not found in dataset columns: {df.columns}")
-            return {"error": f"{pollutant} not found in dataset."}
-        df["value"] = df[pollutant]
+        logger.warning(f"Pollutant {pollutant} not found in dataset columns: {df.columns}")
+        return {"error": f"{pollutant} not found in dataset."}
+    df["value"] = values
 
     df = df[["time", "value"]].dropna().sort_values("time")
+    labels, values, points_meta = _trend_points(df, resolution, max_points, method)
 
     return {
-        "labels": df["time"].dt.strftime("%Y-%m-%d").tolist(),
-        "values": df["value"].round(2).tolist(),
+        "labels": labels,
+        "values": values,
         "unit": "μg/m³",
         "meta": {
             "type": "daily_trend",
             "region": region,
             "pollutant": pollutant,
-            "year": year
+            "year": year,
+            **points_meta
         }
     }
 
-async def get_top_polluted_regions(year: int, pollutant: str, limit: int = 5):
-    with engine.connect() as conn:
-        result = conn.execute(text("""
-            SELECT region, filename FROM datasets WHERE year = :year
-        """), {"year": year})
-        rows = result.fetchall()
-
-    scores = []
-    for row in rows:
-        row = dict(row._mapping)
-        csv_bytes = await download_from_supabase_storage(row["filename"], bucket="datasets")
-        df = pd.read_csv(csv_bytes)
-
-        if pollutant.lower() == "pollution":
-            available = [p for p in POLLUTANTS if p in df.columns]
-            if not available:
-                continue
-            avg = df[available].dropna().mean(axis=1).mean()
-        else:
-            if pollutant not in df.columns:
-                logger.warning(f"Pollutant {pollutant} not found in dataset columns: {df.columns}")
-                continue
-            avg = df[pollutant].dropna().mean()
-
-        if pd.isna(avg):
-            continue
-
-        scores.append((row["region"], round(avg, 2)))
-
-    top = sorted(scores, key=lambda x: x[1], reverse=True)[:limit]
+@coalesced("top_polluted_regions")
+async def get_top_polluted_regions(
+    year: Optional[int],
+    pollutant: str,
+    limit: int = 5,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+):
+    """Regions ranked by mean level for a dataset year, or for a date window, from the ranking index."""
+    top = await region_index.rank_regions(pollutant, limit, year=year, start_date=start_date, end_date=end_date)
+
+    meta = {
+        "type": "ranking",
+        "year": year,
+        "pollutant": pollutant,
+        "top_n": limit
+    }
+    if start_date is not None or end_date is not None:
+        meta["start_date"] = start_date.isoformat() if start_date else None
+        meta["end_date"] = end_date.isoformat() if end_date else None
 
     return {
         "labels": [r[0] for r in top],
         "values": [r[1] for r in top],
         "unit": "μg/m³",
-        "meta": {
-            "type": "ranking",
-            "year": year,
-            "pollutant": pollutant,
-            "top_n": limit
-        }
+        "meta": meta
     }
 
 
+@coalesced("seasonal_variation")
 async def get_seasonal_variation(region: str, pollutant: str, year: int):
+    frame = await engine_query(pollutant=pollutant, group_by=["month"], region=region, dataset_year=year)
+    if frame is not None:
+        return seasonality_payload(frame, region, pollutant, year)
+
     with engine.connect() as conn:
         result = conn.execute(text("""
             SELECT filename FROM datasets
@@ -434,8 +481,22 @@ async def get_seasonal_variation(region: str, pollutant: str, year: int):
     if not row:
         return {"error": "Dataset not found."}
     row = dict(row._mapping)
-    csv_bytes = await download_from_supabase_storage(row["filename"], bucket="datasets")
-    df = pd.read_csv(csv_bytes)
+    csv_bytes = BytesIO(await load_dataset_file(row["filename"]))
+    return await compute.run_in_thread(_seasonal_variation_from_csv, csv_bytes, region, pollutant, year)
+
+def seasonality_payload(frame: pd.DataFrame, region: str, pollutant: str, year: int):
+    """Seasonality payload from a query_engine frame with `month` and `mean` columns."""
+    return {
+        "labels": [calendar.month_name[int(m)] for m in frame["month"]],
+        "values": frame["mean"].round(2).tolist(),
+        "unit": "μg/m³",
+        "meta": {"type": "seasonality", "region": region, "pollutant": pollutant, "year": year}
+    }
+
+def _seasonal_variation_from_csv(csv_bytes: BytesIO, region: str, pollutant: str, year: int):
+    return _seasonal_variation_from_frame(pd.read_csv(csv_bytes), region, pollutant, year)
+
+def _seasonal_variation_from_frame(df: pd.DataFrame, region: str, pollutant: str, year: int):
 
     if "time" not in df.columns:
         return {"error": "Missing 'time' column in dataset."}
@@ -451,16 +512,13 @@ async def get_seasonal_variation(region: str, pollutant: str, year: int):
     df = df[df["month"].isin(month_order)]
     df["month"] = pd.Categorical(df["month"], categories=month_order, ordered=True)
 
-    if pollutant.lower() == "pollution":
-        available = [p for p in POLLUTANTS if p in df.columns]
-        if not available:
+    values = composite.pollutant_values(df, pollutant)
+    if values is None:
+        if composite.is_derived(pollutant):
             return {"error": "No pollutant data available in dataset."}
-        df["value"] = df[available].mean(axis=1)
-    else:
-        if pollutant not in df.columns:
-            logger.warning(f"Pollutant {pollutant} not found in dataset columns: {df.columns}")
-            return {"error": "Dataset must contain selected pollutant."}
-        df["value"] = df[pollutant]
+        logger.warning(f"Pollutant {pollutant} not found in dataset columns: {df.columns}")
+        return {"error": "Dataset must contain selected pollutant."}
+    df["value"] = values
 
     df.dropna(subset=["value"], inplace=True)
     if df.empty:
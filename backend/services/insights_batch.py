@@ -0,0 +1,299 @@
+# services/insights_batch.py
+"""
+Several insight charts in one request (`/insights/batch/`).
+
+The insights page used to fire one request per chart, and each repeated
+auth, the profile lookup and the download and parse of the same dataset.
+A batch takes a list of chart specs and:
+
+1. plans the shared loads: identical specs run once, the profile is read
+   once, the dataset rows of every involved region come from one query,
+   and each needed CSV is downloaded and parsed once, keeping only the
+   union of the columns its specs use;
+2. renders the specs concurrently from that shared data. Charts that have
+   their own index (range trends, rankings, the forecast calendar) and, with
+   the query engine enabled, the aggregate charts use their standalone
+   functions;
+3. returns every result keyed by spec id, per-spec errors included, with
+   the load statistics.
+
+Payloads are those of the single-chart endpoints.
+"""
+
+import asyncio
+import time
+from collections import defaultdict
+from datetime import date
+from io import BytesIO
+from typing import Dict, List, Optional, Set
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from db.databases import engine
+from services import compute, query_engine
+from services.insights import (
+    _daily_trend_by_year_from_frame,
+    _personalized_trend_payload,
+    _seasonal_variation_from_frame,
+    _year_average_from_frame,
+    _yearly_trend_from_frame,
+    engine_query,
+    get_daily_trend,
+    get_monthly_forecast_calendar,
+    get_seasonal_variation,
+    get_top_polluted_regions,
+    get_yearly_trend,
+    load_dataset_file,
+    load_profile,
+    personalize_trend,
+    risk_factor
+)
+from utils import composite
+from utils.helpers import setup_logger
+
+logger = setup_logger(__name__)
+
+MAX_BATCH_SPECS = 20
+
+# Parameters each chart type needs besides `pollutant`
+REQUIRED = {
+    "trend": ("region", "year"),
+    "trend_range": ("region",),
+    "yearly_trend": ("region", "year"),
+    "seasonality": ("region", "year"),
+    "top_regions": (),
+    "personalized": ("region",),
+    "multi_year_trend": ("region",),
+    "forecast_calendar": ("region",),
+}
+PROFILE_CHARTS = {"personalized", "multi_year_trend"}
+ENGINE_CHARTS = {"yearly_trend", "seasonality", "personalized", "multi_year_trend"}
+
+
+def spec_key(spec: dict) -> tuple:
+    """Identity of a spec's result: everything but its id."""
+    return tuple(sorted((k, v) for k, v in spec.items() if k != "id"))
+
+
+def _invalid(spec: dict) -> Optional[str]:
+    missing = [p for p in REQUIRED[spec["type"]] if spec.get(p) is None]
+    if missing:
+        return f"{spec['type']} needs {', '.join(missing)}."
+    if spec["type"] == "top_regions" and spec.get("year") is None \
+            and spec.get("start_date") is None and spec.get("end_date") is None:
+        return "top_regions needs a year or a start_date/end_date window."
+    return None
+
+
+def _dataset_rows(regions: Set[str]) -> Dict[str, Dict[int, str]]:
+    """Latest filename per year, for each (lowercased) region."""
+    if not regions:
+        return {}
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT region, year, filename FROM datasets
+            WHERE LOWER(region) IN :regions
+            ORDER BY created_at
+        """).bindparams(bindparam("regions", expanding=True)), {"regions": sorted(regions)}).fetchall()
+    latest = defaultdict(dict)
+    for row in rows:
+        latest[row.region.lower()][row.year] = row.filename
+    return latest
+
+
+def _files_for(spec: dict, datasets: Dict[str, Dict[int, str]], use_engine: bool) -> List[str]:
+    """Dataset files a spec renders from (none for index- and engine-served charts)."""
+    kind = spec["type"]
+    if kind not in {"trend", "yearly_trend", "seasonality", "personalized", "multi_year_trend"}:
+        return []
+    if use_engine and kind in ENGINE_CHARTS:
+        return []
+    years = datasets.get(spec["region"].lower(), {})
+    if kind == "multi_year_trend":
+        return list(years.values())
+    year = max(years, default=None) if kind == "personalized" else spec["year"]
+    return [years[year]] if year in years else []
+
+
+def _parse(contents: bytes, columns: Set[str]) -> pd.DataFrame:
+    return pd.read_csv(BytesIO(contents), usecols=lambda column: column == "time" or column in columns)
+
+
+class BatchContext:
+    """Data shared by the specs of one batch."""
+
+    def __init__(self, user_id: str, datasets: Dict[str, Dict[int, str]], use_engine: bool):
+        self.user_id = user_id
+        self.datasets = datasets
+        self.use_engine = use_engine
+        self.profile = None
+        self.frames: Dict[str, pd.DataFrame] = {}
+        self.bytes_fetched = 0
+
+    async def load(self, needs: Dict[str, Set[str]], profile: bool):
+        async def fetch(filename: str, columns: Set[str]):
+            contents = await load_dataset_file(filename)
+            self.bytes_fetched += len(contents)
+            self.frames[filename] = await compute.run_in_thread(_parse, contents, columns)
+
+        async def fetch_profile():
+            self.profile = await compute.run_in_thread(load_profile, self.user_id)
+
+        tasks = [fetch(filename, columns) for filename, columns in needs.items()]
+        if profile:
+            tasks.append(fetch_profile())
+        for outcome in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(outcome, Exception):
+                logger.warning(f"⚠️ Batch load failed: {outcome}")
+
+    def frame(self, region: str, year: int) -> Optional[pd.DataFrame]:
+        filename = self.datasets.get(region.lower(), {}).get(year)
+        frame = self.frames.get(filename)
+        # Renderers modify their frame
+        return frame.copy() if frame is not None else None
+
+    def latest_year(self, region: str) -> Optional[int]:
+        return max(self.datasets.get(region.lower(), {}), default=None)
+
+
+async def _from_frame(ctx: BatchContext, fn, spec: dict, *args, missing: str = "No dataset found for this region and year."):
+    frame = ctx.frame(spec["region"], spec["year"])
+    if frame is None:
+        return {"error": missing}
+    return await compute.run_in_thread(fn, frame, spec["region"], spec["pollutant"], spec["year"], *args)
+
+
+async def _personalized(ctx: BatchContext, spec: dict):
+    if not ctx.profile:
+        return {"error": "User profile not found."}
+    year = ctx.latest_year(spec["region"])
+    if year is None:
+        return {"error": "No available dataset year for region"}
+    if ctx.use_engine:
+        trend = await get_yearly_trend(spec["region"], spec["pollutant"], year)
+    else:
+        trend = await _from_frame(ctx, _yearly_trend_from_frame, {**spec, "year": year})
+    return personalize_trend(trend, risk_factor(ctx.profile), ctx.user_id)
+
+
+async def _multi_year(ctx: BatchContext, spec: dict):
+    region, pollutant = spec["region"], spec["pollutant"]
+    factor = risk_factor(ctx.profile)
+    if ctx.use_engine:
+        frame = await engine_query(pollutant=pollutant, group_by=["dataset_year"], region=region,
+                                   within_dataset_year=True)
+        if frame is not None:
+            return _personalized_trend_payload(
+                [(int(r.dataset_year), float(r.mean)) for r in frame.itertuples()],
+                factor, region, pollutant, ctx.user_id
+            )
+
+    years = ctx.datasets.get(region.lower(), {})
+    if not years:
+        return {"error": "No datasets available for this region."}
+    combined = []
+    for year in sorted(years):
+        frame = ctx.frame(region, year)
+        try:
+            if frame is None:
+                # Not preloaded: the query engine failed, or so did the load
+                frame = await compute.run_in_thread(
+                    _parse, await load_dataset_file(years[year]), composite.needed_columns(pollutant)
+                )
+            avg = await compute.run_in_thread(_year_average_from_frame, frame, pollutant, year)
+        except Exception:
+            continue
+        if avg is not None and not pd.isna(avg):
+            combined.append((year, avg))
+    if not combined:
+        return {"error": "No valid pollutant data found."}
+    return _personalized_trend_payload(combined, factor, region, pollutant, ctx.user_id)
+
+
+async def render(ctx: BatchContext, spec: dict):
+    """One chart's payload (a dict with "error" on failure)."""
+    kind, region, pollutant = spec["type"], spec.get("region"), spec["pollutant"]
+    if kind == "trend":
+        return await _from_frame(ctx, _daily_trend_by_year_from_frame, spec,
+                                 spec.get("resolution"), spec.get("max_points"), spec.get("method", "lttb"))
+    if kind == "trend_range":
+        return await get_daily_trend(region, pollutant, spec.get("start_date"), spec.get("end_date"),
+                                     spec.get("resolution"), spec.get("max_points"), spec.get("method", "lttb"))
+    if kind == "yearly_trend":
+        if ctx.use_engine:
+            return await get_yearly_trend(region, pollutant, spec["year"])
+        return await _from_frame(ctx, _yearly_trend_from_frame, spec)
+    if kind == "seasonality":
+        if ctx.use_engine:
+            return await get_seasonal_variation(region, pollutant, spec["year"])
+        return await _from_frame(ctx, _seasonal_variation_from_frame, spec, missing="Dataset not found.")
+    if kind == "top_regions":
+        start = date.fromisoformat(spec["start_date"]) if spec.get("start_date") else None
+        end = date.fromisoformat(spec["end_date"]) if spec.get("end_date") else None
+        result = await get_top_polluted_regions(spec.get("year"), pollutant, spec.get("top_n", 5), start, end)
+        return [{"name": name, "value": value} for name, value in zip(result["labels"], result["values"])]
+    if kind == "personalized":
+        return await _personalized(ctx, spec)
+    if kind == "multi_year_trend":
+        return await _multi_year(ctx, spec)
+    if kind == "forecast_calendar":
+        return await get_monthly_forecast_calendar(region, pollutant)
+    return {"error": f"Unknown chart type {kind!r}."}
+
+
+async def _render_safely(ctx: BatchContext, spec: dict):
+    try:
+        return await render(ctx, spec)
+    except ValueError as e:
+        return {"error": str(e)}
+    except Exception as e:
+        logger.error(f"❌ Batch chart {spec['type']} failed: {e}")
+        return {"error": "Chart could not be rendered."}
+
+
+async def run_batch(user_id: str, specs: List[dict]) -> dict:
+    """Render `specs` (dicts with an `id`, a `type` and its parameters) with shared loads."""
+    started = time.perf_counter()
+    results = {}
+    unique: Dict[tuple, dict] = {}
+    for spec in specs:
+        error = _invalid(spec)
+        if error:
+            results[spec["id"]] = {"error": error}
+        else:
+            unique.setdefault(spec_key(spec), spec)
+
+    use_engine = query_engine.ready()
+    regions = {spec["region"].lower() for spec in unique.values() if spec.get("region")}
+    datasets = await compute.run_in_thread(_dataset_rows, regions)
+    ctx = BatchContext(user_id, datasets, use_engine)
+
+    needs: Dict[str, Set[str]] = defaultdict(set)
+    for spec in unique.values():
+        for filename in _files_for(spec, datasets, use_engine):
+            needs[filename] |= composite.needed_columns(spec["pollutant"])
+    await ctx.load(needs, profile=any(spec["type"] in PROFILE_CHARTS for spec in unique.values()))
+
+    rendered = await asyncio.gather(*(_render_safely(ctx, spec) for spec in unique.values()))
+    by_key = dict(zip(unique, rendered))
+    for spec in specs:
+        if spec["id"] not in results:
+            results[spec["id"]] = by_key[spec_key(spec)]
+
+    logger.info(f"🧺 Batch of {len(specs)} charts: {len(unique)} rendered, {len(needs)} datasets, "
+                f"{ctx.bytes_fetched / 1024:.0f} KiB fetched")
+    return {
+        "results": {
+            spec_id: {"status": "error", "error": payload["error"]}
+            if isinstance(payload, dict) and "error" in payload else {"status": "ok", "data": payload}
+            for spec_id, payload in results.items()
+        },
+        "meta": {
+            "specs": len(specs),
+            "rendered": len(unique),
+            "datasets_loaded": len(ctx.frames),
+            "bytes_fetched": ctx.bytes_fetched,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+    }
@@ -1,10 +1,20 @@
-from utils.helpers import download_from_supabase_storage, get_aqi_category
+from utils.helpers import download_from_supabase_storage
+from utils import aqi
+from utils.aqi import FRONTEND_LABELS  # noqa: F401  (re-exported)
+from utils.composite import COMPONENT_POLLUTANTS  # components of the "pollution" composite
 from db.databases import engine
 from sqlalchemy import text
-from typing import Optional
+from typing import List, Optional, Tuple
+import asyncio
+import numpy as np
 import pandas as pd
 import pickle
 from io import BytesIO
+from services import compute, forecast_tasks
+from services.singleflight import coalesced
+from utils.helpers import setup_logger
+
+logger = setup_logger(__name__)
 
 RISK_WEIGHTS = {
     "asthma": 1.5,
@@ -15,37 +25,13 @@ RISK_WEIGHTS = {
     "base": 1.0
 }
 
-FRONTEND_LABELS = {
-    "Good": "good",
-    "Moderate": "moderate",
-    "Unhealthy for Sensitive Groups": "unhealthy-sensitive",
-    "Unhealthy": "unhealthy",
-    "Very Unhealthy": "very-unhealthy"
-}
-
-def calculate_risk_score(category: str, weight: float) -> int:
-    base_score = {
-        "Good": 0,
-        "Moderate": 1,
-        "Unhealthy for Sensitive Groups": 2,
-        "Unhealthy": 3,
-        "Very Unhealthy": 4
-    }.get(category, 0)
-    return round(base_score * weight)
-
-async def build_risk_timeline(
-    user_id: str,
-    region: str,
-    pollutant: str,
-    start_date: str,
-    end_date: str
-):
-    # Load profile
+def load_profile(user_id: str) -> dict:
     with engine.connect() as conn:
         result = conn.execute(text("SELECT * FROM profiles WHERE user_id = :uid"), {"uid": user_id})
         profile = result.fetchone()
-    profile = dict(profile._mapping) if profile else {}
+    return dict(profile._mapping) if profile else {}
 
+def profile_risk_weight(profile: dict) -> float:
     weight = RISK_WEIGHTS["base"]
     if profile.get("has_asthma"):
         weight *= RISK_WEIGHTS["asthma"]
@@ -57,8 +43,75 @@ async def build_risk_timeline(
         weight *= RISK_WEIGHTS["diabetes"]
     if profile.get("has_lung_disease"):
         weight *= RISK_WEIGHTS["lung_disease"]
+    return weight
+
+async def build_risk_timeline(
+    user_id: str,
+    region: str,
+    pollutant: str,
+    start_date: str,
+    end_date: str
+):
+    weight = profile_risk_weight(load_profile(user_id))
+
+    # The forecast itself doesn't depend on the user, so concurrent
+    # requests for the same window share one computation
+    forecast = await forecast_window(region, pollutant, start_date, end_date)
+    if forecast is None:
+        return {"error": "No trained model for this pollutant in this region."}
+
+    return await compute.run_in_thread(_annotate_risk, forecast, pollutant, weight)
+
 
-    # Load latest model
+async def build_multi_pollutant_timeline(
+    user_id: str,
+    region: str,
+    start_date: str,
+    end_date: str,
+    pollutants: List[str] = COMPONENT_POLLUTANTS,
+    profile: Optional[dict] = None
+):
+    """
+    Risk timeline for the virtual "pollution" pollutant: the profile is read
+    once, every component model is forecast concurrently over just the
+    requested window, and the components are averaged as arrays.
+    """
+    if profile is None:
+        profile = load_profile(user_id)
+    weight = profile_risk_weight(profile)
+
+    forecasts = await asyncio.gather(*[
+        forecast_window(region, pol, start_date, end_date) for pol in pollutants
+    ])
+    available = []
+    for pol, forecast in zip(pollutants, forecasts):
+        if forecast is None or forecast.empty:
+            logger.warning(f"⚠️ {pol} skipped: no forecast for {region}")
+            continue
+        available.append((pol, forecast))
+
+    if not available:
+        return {"error": "No forecast data for any pollutants."}
+
+    return await compute.run_in_thread(_combine_components, available, weight)
+
+
+async def build_timeline(region: str, pollutant: str, start_date: str, end_date: str, profile: dict):
+    """
+    Risk timeline for any pollutant, including the virtual "pollution" one,
+    when the caller already has the profile (e.g. batch jobs without a user).
+    """
+    if pollutant.lower() == "pollution":
+        return await build_multi_pollutant_timeline(None, region, start_date, end_date, profile=profile)
+
+    forecast = await forecast_window(region, pollutant, start_date, end_date)
+    if forecast is None:
+        return {"error": "No trained model for this pollutant in this region."}
+    return await compute.run_in_thread(_annotate_risk, forecast, pollutant, profile_risk_weight(profile))
+
+
+@coalesced("risk_model")
+async def load_latest_model_blob(region: str, pollutant: str) -> Optional[bytes]:
     with engine.connect() as conn:
         row = conn.execute(text("""
             SELECT model_blob FROM models
@@ -67,28 +120,64 @@ async def build_risk_timeline(
         """), {"region": region, "pollutant": pollutant}).fetchone()
 
     if not row or not row._mapping["model_blob"]:
-        return {"error": "No trained model for this pollutant in this region."}
+        return None
+    return row._mapping["model_blob"]
 
-    model = pickle.loads(row._mapping["model_blob"])
-    history_end = model.history["ds"].max()
 
-    # Generate full forecast
-    full_range_days = (pd.to_datetime(end_date) - history_end).days + 30  # buffer
-    future_df = model.make_future_dataframe(periods=full_range_days, freq="D")
-    forecast = model.predict(future_df)
+@coalesced("risk_forecast")
+async def forecast_window(region: str, pollutant: str, start_date: str, end_date: str) -> Optional[pd.DataFrame]:
+    """Daily `ds`/`yhat` forecast for [start_date, end_date] from the latest model."""
+    model_blob = await load_latest_model_blob(region, pollutant)
+    if model_blob is None:
+        return None
 
-    # Filter forecast for date range only
-    forecast = forecast[forecast["ds"] > history_end]
-    forecast = forecast[
-        (forecast["ds"] >= pd.to_datetime(start_date)) &
-        (forecast["ds"] <= pd.to_datetime(end_date))
-    ]
-    forecast = forecast[["ds", "yhat"]]
+    # Predict only the requested days after the training history
+    # (the model is unpickled in the worker)
+    forecast = await compute.run_in_process(
+        forecast_tasks.predict_range, model_blob, start_date, end_date, "D"
+    )
+    return forecast[["ds", "yhat"]]
 
-    # Annotate with AQI and risk
-    forecast["category"] = forecast["yhat"].apply(lambda val: get_aqi_category(pollutant, val))
-    forecast["frontend_label"] = forecast["category"].map(FRONTEND_LABELS)
-    forecast["risk_score"] = forecast["category"].apply(lambda cat: calculate_risk_score(cat, weight))
+
+def _annotate_risk(forecast: pd.DataFrame, pollutant: str, weight: float):
+    forecast = forecast.copy()
+    result = aqi.classify(pollutant, forecast["yhat"], weight)
+    forecast["category"] = result.categories
+    forecast["frontend_label"] = result.labels
+    forecast["risk_score"] = result.risk_scores
     forecast["ds"] = forecast["ds"].astype(str)
 
-    return forecast[["ds", "yhat", "category", "frontend_label", "risk_score"]].to_dict(orient="records")
\ No newline at end of file
+    return forecast[["ds", "yhat", "category", "frontend_label", "risk_score"]].to_dict(orient="records")
+
+
+def _combine_components(components: List[Tuple[str, pd.DataFrame]], weight: float):
+    """Average component forecasts on a shared date index (NaN where a model has no value)."""
+    index = pd.DatetimeIndex(sorted(set().union(*[set(f["ds"]) for _, f in components])))
+    yhat = np.vstack([
+        f.set_index("ds")["yhat"].reindex(index).to_numpy(dtype=float) for _, f in components
+    ])
+    missing = np.isnan(yhat)
+
+    scores = np.vstack([
+        aqi.risk_scores_from_codes(aqi.category_codes(pol, yhat[i]), weight)
+        for i, (pol, _) in enumerate(components)
+    ])
+
+    present = (~missing).sum(axis=0)
+    mean_yhat = np.where(missing, 0.0, yhat).sum(axis=0) / present
+    mean_risk = np.round(scores.sum(axis=0) / present).astype(int)
+
+    # Composite category uses the NO2 scale until a weighted index exists
+    composite = aqi.classify("NO2", mean_yhat)
+    ds = pd.Series(index).astype(str).tolist()
+
+    return [
+        {
+            "ds": d,
+            "yhat": float(y),
+            "risk_score": int(r),
+            "category": c,
+            "frontend_label": label
+        }
+        for d, y, r, c, label in zip(ds, mean_yhat, mean_risk, composite.categories, composite.labels)
+    ]
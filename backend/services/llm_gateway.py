@@ -0,0 +1,288 @@
+# services/llm_gateway.py
+"""
+Gateway for LLM completion calls (Mistral).
+
+All calls share one pooled `httpx.AsyncClient` and a global concurrency
+limit (LLM_MAX_CONCURRENCY), so a slow upstream cannot tie up every request
+handler. Each call has a latency budget (LLM_TIMEOUT) that covers waiting
+for a slot as well as the request itself. With LLM_HEDGE_AFTER set, a call
+still running after that many seconds gets one hedged duplicate request if
+a slot is free, and the first successful answer wins.
+
+A circuit breaker opens after LLM_BREAKER_FAILURES consecutive failures.
+While open, calls fail immediately with `CircuitOpenError` so callers can
+serve a cached or templated answer; after LLM_BREAKER_RESET seconds one
+probe request is let through to decide whether to close it again. A
+probe cancelled by its caller reopens the circuit until the next probe.
+
+`stream` relays a streamed completion chunk by chunk under the same limit
+and breaker. Its budget bounds the time to the first chunk and each gap
+between chunks; streamed calls are not hedged.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 10))
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", 0))  # 0 disables hedging
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", 30))
+
+
+class LLMUnavailableError(Exception):
+    """The gateway could not produce a completion; callers should fall back."""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    pass
+
+
+class BudgetExceededError(LLMUnavailableError):
+    pass
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, reset_after: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_after = reset_after
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_after:
+            self.state = self.HALF_OPEN  # let exactly one probe through
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("✅ LLM circuit closed")
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(f"⚠️ LLM circuit opened after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """A half-open probe was cancelled: reopen and wait for the next probe without counting a failure."""
+        if self.state == self.HALF_OPEN:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        url: str,
+        api_key: Optional[str] = None,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        timeout: float = LLM_TIMEOUT,
+        hedge_after: float = LLM_HEDGE_AFTER,
+        breaker_failures: int = LLM_BREAKER_FAILURES,
+        breaker_reset: float = LLM_BREAKER_RESET,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.url = url
+        self.api_key = api_key
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset)
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.in_flight = 0
+        self._stats = {"calls": 0, "streamed": 0, "succeeded": 0, "failed": 0, "short_circuited": 0,
+                       "budget_exceeded": 0, "hedged": 0, "hedge_wins": 0}
+        self._latency_total = 0.0
+
+    def _bind(self):
+        # Clients and semaphores belong to one event loop; tests and scripts
+        # may run several loops in one process.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency * 2,
+                                    max_keepalive_connections=self.max_concurrency),
+                transport=self._transport
+            )
+            self._loop = loop
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    async def _acquire(self, deadline: float):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise asyncio.TimeoutError()
+        await asyncio.wait_for(self._semaphore.acquire(), remaining)
+        self.in_flight += 1
+
+    def _release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    async def _post(self, body: dict, deadline: float) -> Any:
+        await self._acquire(deadline)
+        try:
+            resp = await self._client.post(self.url, headers=self._headers(), json=body)
+            resp.raise_for_status()
+            return resp.json()
+        finally:
+            self._release()
+
+    async def _hedged(self, body: dict, deadline: float) -> Any:
+        first = asyncio.ensure_future(self._post(body, deadline))
+        attempts = [first]
+        try:
+            if self.hedge_after > 0:
+                done, _ = await asyncio.wait(attempts, timeout=self.hedge_after)
+                # Only hedge with spare capacity; under saturation it just adds load
+                if not done and not self._semaphore.locked():
+                    self._stats["hedged"] += 1
+                    attempts.append(asyncio.ensure_future(self._post(body, deadline)))
+
+            pending = set(attempts)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self._stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    def _admit(self):
+        self._bind()
+        self._stats["calls"] += 1
+        if not self.breaker.allow():
+            self._stats["short_circuited"] += 1
+            raise CircuitOpenError("LLM circuit is open")
+
+    def _failed(self, budget: bool = False):
+        self._stats["failed"] += 1
+        if budget:
+            self._stats["budget_exceeded"] += 1
+        self.breaker.record_failure()
+
+    def _succeeded(self, started: float):
+        self._stats["succeeded"] += 1
+        self._latency_total += time.monotonic() - started
+        self.breaker.record_success()
+
+    async def complete(self, body: dict) -> Any:
+        """POST `body` and return the decoded JSON response, within the latency budget."""
+        self._admit()
+
+        started = time.monotonic()
+        try:
+            data = await asyncio.wait_for(self._hedged(body, started + self.timeout), self.timeout)
+        except asyncio.TimeoutError:
+            self._failed(budget=True)
+            raise BudgetExceededError(f"LLM call exceeded {self.timeout}s budget")
+        except asyncio.CancelledError:
+            self.breaker.release_probe()  # the caller gave up; says nothing about the upstream
+            raise
+        except Exception:
+            self._failed()
+            raise
+
+        self._succeeded(started)
+        return data
+
+    async def stream(self, body: dict) -> AsyncIterator[dict]:
+        """
+        POST `body` with `stream: true` and yield each decoded server-sent
+        chunk until the upstream sends `[DONE]`.
+        """
+        self._admit()
+        self._stats["streamed"] += 1
+        started = time.monotonic()
+        response = None
+        try:
+            await self._acquire(started + self.timeout)
+            try:
+                request = self._client.build_request("POST", self.url, headers=self._headers(),
+                                                     json={**body, "stream": True})
+                response = await asyncio.wait_for(self._client.send(request, stream=True),
+                                                  started + self.timeout - time.monotonic())
+                response.raise_for_status()
+                lines = response.aiter_lines()
+                while True:
+                    try:
+                        line = await asyncio.wait_for(lines.__anext__(), self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    if not line.startswith("data:"):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == "[DONE]":
+                        break
+                    yield json.loads(payload)
+            finally:
+                if response is not None:
+                    await response.aclose()
+                self._release()
+        except asyncio.TimeoutError:
+            self._failed(budget=True)
+            raise BudgetExceededError(f"LLM stream stalled beyond the {self.timeout}s budget")
+        except (asyncio.CancelledError, GeneratorExit):
+            self.breaker.release_probe()  # the consumer went away; says nothing about the upstream
+            raise
+        except Exception:
+            self._failed()
+            raise
+
+        self._succeeded(started)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "timeout": self.timeout,
+            "hedge_after": self.hedge_after,
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.times_opened,
+            "avg_latency_ms": round(self._latency_total / self._stats["succeeded"] * 1000, 1)
+            if self._stats["succeeded"] else 0.0,
+        }
@@ -0,0 +1,226 @@
+# services/mailer.py
+"""
+Outbox-backed alert email delivery.
+
+The alert evaluator never talks to SMTP. It groups each run's new alerts per
+user into one digest and writes it to the `email_outbox` table. A background
+worker claims due messages in batches and sends them over a small pool of
+persistent SMTP sessions, under a global rate limit. Failed sends are
+retried with exponential backoff until MAIL_MAX_ATTEMPTS. Once a digest is
+delivered, its alerts get `sent_at` stamped in the `aqi_alerts` ledger.
+"""
+
+import asyncio
+import json
+import os
+import smtplib
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List
+from uuid import uuid4
+
+from db.databases import engine
+from services import compute
+from sqlalchemy import text
+from utils.email_utils import RateLimiter, SMTPConnectionPool, build_message
+from utils.helpers import setup_logger
+
+logger = setup_logger(__name__)
+
+MAIL_POOL_SIZE = int(os.getenv("MAIL_POOL_SIZE", 2))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 100))
+MAIL_RATE_PER_SEC = float(os.getenv("MAIL_RATE_PER_SEC", 10))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", 5))
+MAIL_BACKOFF_BASE = float(os.getenv("MAIL_BACKOFF_BASE", 30))
+MAIL_BACKOFF_MAX = float(os.getenv("MAIL_BACKOFF_MAX", 3600))
+MAIL_POLL_INTERVAL = float(os.getenv("MAIL_POLL_INTERVAL", 30))
+# A message claimed longer ago than this (crashed worker) is claimed again
+MAIL_CLAIM_TIMEOUT = float(os.getenv("MAIL_CLAIM_TIMEOUT", 600))
+
+pool = SMTPConnectionPool(size=MAIL_POOL_SIZE)
+rate_limiter = RateLimiter(MAIL_RATE_PER_SEC)
+
+_wake = asyncio.Event()
+_stats = {"enqueued": 0, "sent": 0, "retried": 0, "failed": 0}
+
+
+def build_digest(alerts: List[dict]) -> Dict[str, str]:
+    """One email for all of a user's alerts from a run."""
+    if len(alerts) == 1:
+        alert = alerts[0]
+        subject = f"[AQI Alert] {alert['pollutant']} forecast for {alert['region']}"
+    else:
+        regions = sorted({alert["region"] for alert in alerts})
+        subject = f"[AQI Alert] {len(alerts)} forecast alerts for {', '.join(regions)}"
+
+    body = "\n\n".join(alert["message"] for alert in alerts)
+    return {"subject": subject, "body": body + "\n\nStay safe,\nThessAir Team"}
+
+
+def enqueue_digests(alerts: List[dict]) -> int:
+    """Write one outbox message per user for `alerts`; returns the number queued."""
+    by_user = defaultdict(list)
+    for alert in alerts:
+        by_user[(alert["user_id"], alert["email"])].append(alert)
+    if not by_user:
+        return 0
+
+    now = datetime.utcnow()
+    rows = []
+    for (user_id, email), user_alerts in by_user.items():
+        digest = build_digest(user_alerts)
+        rows.append({
+            "id": str(uuid4()),
+            "user_id": user_id,
+            "to_email": email,
+            "subject": digest["subject"],
+            "body": digest["body"],
+            "alert_ids": json.dumps([alert["id"] for alert in user_alerts]),
+            "now": now
+        })
+
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO email_outbox (
+                id, user_id, to_email, subject, body, alert_ids,
+                status, attempts, next_attempt_at, created_at
+            ) VALUES (
+                :id, :user_id, :to_email, :subject, :body, :alert_ids,
+                'pending', 0, :now, :now
+            )
+        """), rows)
+
+    _stats["enqueued"] += len(rows)
+    return len(rows)
+
+
+async def enqueue(alerts: List[dict]) -> int:
+    """Queue digests for `alerts` and wake the worker so they go out right away."""
+    queued = await compute.run_in_thread(enqueue_digests, alerts)
+    if queued:
+        _wake.set()
+    return queued
+
+
+def claim_batch(limit: int = MAIL_BATCH_SIZE) -> List[dict]:
+    """
+    Mark up to `limit` due messages as sending and return them. The outer
+    status check is re-evaluated under the row lock, so two workers never
+    claim the same message.
+    """
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=MAIL_CLAIM_TIMEOUT)
+    with engine.begin() as conn:
+        result = conn.execute(text("""
+            UPDATE email_outbox
+            SET status = 'sending', claimed_at = :now, attempts = attempts + 1
+            WHERE id IN (
+                SELECT id FROM email_outbox
+                WHERE (status = 'pending' AND next_attempt_at <= :now)
+                   OR (status = 'sending' AND claimed_at < :stale_before)
+                ORDER BY created_at
+                LIMIT :limit
+            )
+            AND (status = 'pending' OR claimed_at < :stale_before)
+            RETURNING id, to_email, subject, body, alert_ids, attempts
+        """), {"now": now, "stale_before": stale_before, "limit": limit})
+        return [dict(row._mapping) for row in result.fetchall()]
+
+
+def _backoff(attempts: int) -> float:
+    return min(MAIL_BACKOFF_MAX, MAIL_BACKOFF_BASE * 2 ** (attempts - 1))
+
+
+def record_results(results: List[tuple]):
+    """`results` holds (message, error) pairs; error is None on success."""
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for message, error in results:
+            if error is None:
+                conn.execute(text("""
+                    UPDATE email_outbox SET status = 'sent', sent_at = :now, last_error = NULL
+                    WHERE id = :id
+                """), {"id": message["id"], "now": now})
+                alert_ids = json.loads(message["alert_ids"]) if isinstance(message["alert_ids"], str) else message["alert_ids"]
+                if alert_ids:
+                    conn.execute(
+                        text("UPDATE aqi_alerts SET sent_at = :now WHERE id = :id"),
+                        [{"id": alert_id, "now": now} for alert_id in alert_ids]
+                    )
+                continue
+
+            permanent = isinstance(error, smtplib.SMTPRecipientsRefused)
+            if permanent or message["attempts"] >= MAIL_MAX_ATTEMPTS:
+                conn.execute(text("""
+                    UPDATE email_outbox SET status = 'failed', last_error = :error WHERE id = :id
+                """), {"id": message["id"], "error": str(error)})
+            else:
+                conn.execute(text("""
+                    UPDATE email_outbox
+                    SET status = 'pending', last_error = :error, next_attempt_at = :next_attempt_at
+                    WHERE id = :id
+                """), {
+                    "id": message["id"],
+                    "error": str(error),
+                    "next_attempt_at": now + timedelta(seconds=_backoff(message["attempts"]))
+                })
+
+
+async def _send_one(message: dict):
+    await rate_limiter.acquire()
+    try:
+        await pool.send(build_message(message["to_email"], message["subject"], message["body"]))
+        return message, None
+    except Exception as e:
+        return message, e
+
+
+async def send_batch(messages: List[dict]) -> List[tuple]:
+    """Send claimed messages concurrently over the SMTP pool."""
+    results = await asyncio.gather(*[_send_one(message) for message in messages])
+    for message, error in results:
+        if error is None:
+            _stats["sent"] += 1
+        elif isinstance(error, smtplib.SMTPRecipientsRefused) or message["attempts"] >= MAIL_MAX_ATTEMPTS:
+            _stats["failed"] += 1
+            logger.error(f"❌ Giving up on email to {message['to_email']}: {error}")
+        else:
+            _stats["retried"] += 1
+            logger.warning(f"⚠️ Email to {message['to_email']} failed (attempt {message['attempts']}): {error}")
+    return results
+
+
+async def drain() -> int:
+    """Send everything that is currently due; returns the number of messages attempted."""
+    attempted = 0
+    while True:
+        batch = await compute.run_in_thread(claim_batch)
+        if not batch:
+            return attempted
+        results = await send_batch(batch)
+        await compute.run_in_thread(record_results, results)
+        attempted += len(batch)
+
+
+async def run_worker():
+    """Drain the outbox whenever woken, or every MAIL_POLL_INTERVAL seconds for retries."""
+    logger.info("📬 Email outbox worker started")
+    try:
+        while True:
+            _wake.clear()
+            try:
+                await drain()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Email outbox drain failed: {e}")
+            try:
+                await asyncio.wait_for(_wake.wait(), timeout=MAIL_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        await pool.close()
+
+
+def get_metrics():
+    return {**_stats, "smtp": pool.metrics(), "rate_per_sec": MAIL_RATE_PER_SEC}
@@ -1,21 +1,50 @@
 import os
-import httpx
-import json
+import time
+from typing import Any, AsyncIterator, Tuple
 from dotenv import load_dotenv
 from utils.helpers import get_risk_level_from_category
 from utils.helpers import setup_logger
+from utils.forecast_summary import compact_forecast, daily_lines
+from services import tip_cache
+from services.llm_gateway import LLMGateway, LLMUnavailableError
 
 load_dotenv()
 logger = setup_logger(__name__)
 
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
-MISTRAL_URL = "https://api.mistral.ai/v1/chat/completions"
-
-async def generate_health_tip(region, pollutant, forecast_list, profile):
-    forecast_text = "\n".join([
-        f"{row['ds']}: {round(row['yhat'], 1)} μg/m³ ({row['category']})"
-        for row in forecast_list
-    ])
+MISTRAL_URL = os.getenv("MISTRAL_URL", "https://api.mistral.ai/v1/chat/completions")
+
+FALLBACK_TIP = "Air quality data is currently unavailable. Consider staying indoors as a precaution."
+
+# Served when Mistral is unavailable and nothing is cached for the inputs
+TEMPLATE_TIPS = {
+    "Low": (
+        "1. **Enjoy outdoor activities** as usual; air quality is expected to be acceptable.\n"
+        "2. **Keep an eye on updates** in case conditions change."
+    ),
+    "Moderate": (
+        "1. **Limit prolonged outdoor exertion** if you have asthma, heart or lung conditions.\n"
+        "2. **Keep reliever medication at hand** when going outside.\n"
+        "3. **Prefer indoor exercise** on the worst forecast days."
+    ),
+    "High": (
+        "1. **Avoid strenuous outdoor activity** during the forecast period.\n"
+        "2. **Keep windows closed** at peak traffic hours.\n"
+        "3. **Wear a well-fitting mask** if you must spend time outside."
+    ),
+    "Severe": (
+        "1. **Stay indoors** as much as possible.\n"
+        "2. **Avoid all outdoor exercise**, especially near busy roads.\n"
+        "3. **Seek medical advice** if you notice breathing difficulty or chest pain."
+    ),
+}
+
+gateway = LLMGateway(MISTRAL_URL, MISTRAL_API_KEY)
+
+
+def build_prompt(region, pollutant, forecast_list, profile, compact: bool = True) -> str:
+    # Long ranges are summarized so the prompt stays within a fixed budget
+    forecast_text = compact_forecast(forecast_list) if compact else daily_lines(forecast_list)
 
     profile_summary = (
         f"- Asthma: {profile.get('has_asthma', False)}\n"
@@ -56,39 +85,112 @@ Example output:
 Only return the list — no introduction or conclusion.
 """
 
-    headers = {
-        "Authorization": f"Bearer {MISTRAL_API_KEY}",
-        "Content-Type": "application/json"
-    }
+    return prompt
 
-    body = {
+
+def completion_body(prompt: str) -> dict:
+    return {
         "model": "mistral-tiny",
         "messages": [{"role": "user", "content": prompt}],
         "temperature": 0.7
     }
 
+
+async def request_tip(prompt: str) -> str:
+    """
+    One completion from Mistral through the shared gateway; raises on
+    transport errors, bad status codes, an open circuit or a spent budget.
+    """
+    data = await gateway.complete(completion_body(prompt))
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.post(MISTRAL_URL, headers=headers, json=body)
-            resp.raise_for_status()
-            data = resp.json()
-            try:
-                response_text = data["choices"][0]["message"]["content"]
-            except (KeyError, IndexError, TypeError) as e:
-                logger.warning(f"⚠️ Unexpected Mistral response format: {data}")
-                response_text = "Air quality health tips are temporarily unavailable."
+        return data["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        logger.warning(f"⚠️ Unexpected Mistral response format: {data}")
+        raise ValueError("Unexpected Mistral response format")
+
+
+def fallback_tip(profile, category: str = "Unknown") -> dict:
+    risk_level = get_risk_level_from_category(category)
+    return {
+        "tip": TEMPLATE_TIPS.get(risk_level, FALLBACK_TIP),
+        "riskLevel": risk_level,
+        "personalized": bool(profile)
+    }
+
+
+async def _generate_tip(region, pollutant, forecast_list, profile):
+    """A fresh tip from Mistral, or None when it could not produce one."""
+    latest_cat = forecast_list[-1]["category"] if forecast_list else "Unknown"
+    try:
+        response_text = await request_tip(build_prompt(region, pollutant, forecast_list, profile))
+    except LLMUnavailableError as e:
+        logger.warning(f"⚠️ Mistral unavailable: {e}")
+        return None
     except Exception as e:
         print(f"⚠️ Mistral error: {e}")
-        return {
-            "tip": "Air quality data is currently unavailable. Consider staying indoors as a precaution.",
-            "riskLevel": "Unknown",
-            "personalized": bool(profile)
-        }
+        return None
+    return {
+        "tip": response_text.strip(),
+        "riskLevel": get_risk_level_from_category(latest_cat),
+        "personalized": bool(profile)
+    }
+
 
+async def generate_health_tip(region, pollutant, forecast_list, profile):
     latest_cat = forecast_list[-1]["category"] if forecast_list else "Unknown"
 
-    return {
-        "tip": response_text.strip(),
+    async def generate():
+        return await _generate_tip(region, pollutant, forecast_list, profile)
+
+    # Identical category patterns + profile flags reuse an earlier tip
+    tip = await tip_cache.get_or_generate(region, pollutant, forecast_list, profile, generate)
+    return tip if tip is not None else fallback_tip(profile, latest_cat)
+
+
+async def precompute_health_tip(region, pollutant, forecast_list, profile, ttl: float, force: bool = False) -> str:
+    """Store a tip for these inputs ahead of requests; see tip_cache.warm for the result values."""
+    async def generate():
+        return await _generate_tip(region, pollutant, forecast_list, profile)
+
+    return await tip_cache.warm(region, pollutant, forecast_list, profile, generate, ttl, force)
+
+
+async def stream_health_tip(region, pollutant, forecast_list, profile) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming variant of generate_health_tip. Yields ("token", text) pieces
+    as Mistral produces them, then ("tip", payload) with the same payload
+    generate_health_tip returns. The final event is authoritative: if the
+    stream fails midway it carries the fallback, not the partial text.
+    """
+    latest_cat = forecast_list[-1]["category"] if forecast_list else "Unknown"
+
+    cached = await tip_cache.lookup(region, pollutant, forecast_list, profile)
+    if cached is not None:
+        yield "token", cached["tip"]
+        yield "tip", cached
+        return
+
+    started = time.perf_counter()
+    parts = []
+    try:
+        prompt = build_prompt(region, pollutant, forecast_list, profile)
+        async for chunk in gateway.stream(completion_body(prompt)):
+            delta = chunk["choices"][0].get("delta", {}).get("content")
+            if delta:
+                parts.append(delta)
+                yield "token", delta
+        if not "".join(parts).strip():
+            raise ValueError("Empty Mistral completion")
+    except Exception as e:
+        logger.warning(f"⚠️ Mistral stream failed: {e}")
+        expired = await tip_cache.lookup(region, pollutant, forecast_list, profile, allow_expired=True)
+        yield "tip", expired if expired is not None else fallback_tip(profile, latest_cat)
+        return
+
+    tip = {
+        "tip": "".join(parts).strip(),
         "riskLevel": get_risk_level_from_category(latest_cat),
         "personalized": bool(profile)
-    }
\ No newline at end of file
+    }
+    await tip_cache.store(region, pollutant, forecast_list, profile, tip, (time.perf_counter() - started) * 1000)
+    yield "tip", tip
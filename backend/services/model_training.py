@@ -8,7 +8,9 @@ from datetime import datetime, timezone
 from typing import Optional
 from sqlalchemy import text
 from db.databases import engine
-from services.evaluation import get_prophet_forecast
+from services.evaluation import get_prophet_forecast_async
+from services import compute, forecast_tasks
+from utils import composite
 from utils.helpers import (
     upload_to_supabase_storage,
     download_from_supabase_storage,
@@ -40,6 +42,12 @@ def aggregate_to_frequency(df: pd.DataFrame, frequency: str) -> pd.DataFrame:
         raise ValueError(f"Unsupported frequency: {frequency}")
 
 
+def _resample_series(df: pd.DataFrame, datetime_col: str, freq: str) -> pd.DataFrame:
+    df["ds"] = pd.to_datetime(df[datetime_col])
+    df = df[["ds", "y"]].dropna()
+    return df.set_index("ds").resample(freq).mean().dropna().reset_index()
+
+
 LOCAL_MODEL_DIR = "local_models"
 os.makedirs(LOCAL_MODEL_DIR, exist_ok=True)
 
@@ -93,21 +101,24 @@ async def train_forecast_model(
 
         dataset_id = rows[-1]._mapping["id"]
         dfs = [
-            pd.read_csv(await download_from_supabase_storage(r._mapping["filename"], bucket="datasets"))
+            await compute.run_in_thread(
+                pd.read_csv, await download_from_supabase_storage(r._mapping["filename"], bucket="datasets")
+            )
             for r in rows
         ]
-        df = pd.concat(dfs, ignore_index=True)
+        df = await compute.run_in_thread(pd.concat, dfs, ignore_index=True)
 
         # Step 3: Preprocess
         expected_datetime_col = "time"
         valid_pollutants = ["no2_conc", "o3_conc", "co_conc", "no_conc", "so2_conc"]
 
         pollutant = pollutant.lower()
-        if pollutant == "pollution":
-            available = [p for p in valid_pollutants if p in df.columns]
-            if not available:
+        if composite.is_derived(pollutant):
+            # Stored at ingest; derived here for datasets uploaded earlier
+            values = composite.pollutant_values(df, pollutant)
+            if values is None:
                 return {"error": "No pollutants found to compute pollution average."}
-            df["y"] = df[available].mean(axis=1)
+            df["y"] = values
         elif pollutant in valid_pollutants and pollutant in df.columns:
             df["y"] = df[pollutant]
         else:
@@ -116,19 +127,21 @@ async def train_forecast_model(
         if expected_datetime_col not in df.columns:
             return {"error": f"Missing column: '{expected_datetime_col}'"}
 
-        df["ds"] = pd.to_datetime(df[expected_datetime_col])
-        df = df[["ds", "y"]].dropna()
-        df = df.set_index("ds").resample(normalized_freq).mean().dropna().reset_index()
+        df = await compute.run_in_thread(
+            _resample_series, df, expected_datetime_col, normalized_freq
+        )
 
-        # Step 4: Train
+        # Step 4: Train (Prophet fit runs on the compute process pool)
         split_index = int(len(df) * 0.8)
         train_df, test_df = df.iloc[:split_index], df.iloc[split_index:]
-        model = Prophet(daily_seasonality=True, yearly_seasonality=True)
-        model.fit(train_df)
+        model = await compute.run_in_process(
+            forecast_tasks.fit_prophet, train_df,
+            daily_seasonality=True, yearly_seasonality=True
+        )
 
         # Step 5: Evaluate
-        forecast_full = model.predict(df[["ds"]])
-        df["yhat"] = forecast_full["yhat"]
+        forecast_full = await compute.run_in_process(forecast_tasks.predict_dates, model, df["ds"])
+        df["yhat"] = forecast_full["yhat"].values
         df.dropna(subset=["y", "yhat"], inplace=True)
 
         test_df = df.iloc[int(len(df) * 0.8):]
@@ -184,7 +197,7 @@ async def train_forecast_model(
             })
 
         # Step 8: Return forecast
-        preview = get_prophet_forecast(
+        preview = await get_prophet_forecast_async(
             model=model,
             pollutant=pollutant,
             frequency=frequency,
@@ -1,11 +1,17 @@
 # --- services/prediction.py ---
 
+import asyncio
+import os
 import pickle
 import pandas as pd
 from io import BytesIO
+from typing import List, Optional, Tuple
 from db.databases import engine
-from utils.helpers import download_from_supabase_storage, get_aqi_category
+from utils.helpers import download_from_supabase_storage
+from utils import aqi
 from sqlalchemy import text
+from services import compute, forecast_tasks, spatial
+from services.evaluation import load_model_file
 
 async def load_forecast_model(region: str, pollutant: str):
     """Download and load a trained Prophet model."""
@@ -30,8 +36,8 @@ async def forecast_pollutant(region: str, pollutant: str, periods: int = 168):
     try:
         future = model.make_future_dataframe(periods=periods, freq="H")
         forecast = model.predict(future)
-        forecast_result = forecast[["ds", "yhat"]].tail(periods)
-        forecast_result["category"] = forecast_result["yhat"].apply(lambda v: get_aqi_category(pollutant, v))
+        forecast_result = forecast[["ds", "yhat"]].tail(periods).copy()
+        forecast_result["category"] = aqi.categorize(pollutant, forecast_result["yhat"])
         return forecast_result.to_dict(orient="records")
 
     except Exception as e:
@@ -43,3 +49,95 @@ async def list_available_models():
     with engine.connect() as conn:
         result = conn.execute(text("SELECT region, pollutant FROM models"))
         return [dict(row._mapping) for row in result]
+
+
+async def bucket_forecast(region: str, pollutant: str, periods: int = 3, freq: str = "Y", tail: int = 90) -> Optional[pd.DataFrame]:
+    """`predict_tail` forecast (with categories) of the region's stored model; None without one."""
+    try:
+        model_bytes = await load_model_file(f"{region}_{pollutant}_model.pkl", bucket="models")
+    except Exception:
+        return None
+    forecast = await compute.run_in_process(forecast_tasks.predict_tail, model_bytes, periods, freq, tail)
+    forecast["category"] = aqi.categorize(pollutant, forecast["yhat"])
+    return forecast
+
+
+def has_model(region: str, pollutant: str) -> bool:
+    """Whether the region has a trained model for the pollutant (blocking)."""
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT 1 FROM models WHERE region = :region AND pollutant = :pollutant LIMIT 1
+        """), {"region": region, "pollutant": pollutant}).fetchone() is not None
+
+
+async def interpolated_forecast(
+    region: str, pollutant: str, periods: int = 3, freq: str = "Y", tail: int = 90
+) -> Optional[Tuple[pd.DataFrame, dict]]:
+    """`bucket_forecast` for a region without a model, interpolated from its modeled neighbours."""
+    return await spatial.interpolate(
+        region, pollutant,
+        lambda neighbor: bucket_forecast(neighbor, pollutant, periods, freq, tail),
+        key=("bucket", periods, freq, tail)
+    )
+
+
+COMPARE_CONCURRENCY = int(os.getenv("COMPARE_CONCURRENCY", 4))
+
+
+async def compare_regions_forecast(regions: List[str], pollutant: str, periods: int = 3, freq: str = "Y", tail: int = 90):
+    """
+    Forecast one pollutant for several regions as a single batch.
+
+    Models are fetched concurrently (shared with other in-flight requests),
+    predictions run on the process pool with at most COMPARE_CONCURRENCY per
+    request, and the results are outer-joined on one date index. Returns a
+    columnar payload: one `ds` vector plus a `yhat` vector per region
+    (`None` where a region has no value for that date). Regions without a
+    model are interpolated from their neighbours where possible and listed
+    under `interpolated` with their provenance.
+    """
+    regions = list(dict.fromkeys(regions))
+    semaphore = asyncio.Semaphore(max(1, min(COMPARE_CONCURRENCY, len(regions))))
+
+    async def forecast_region(region: str):
+        model_id = f"{region}_{pollutant}_model.pkl"
+        try:
+            model_bytes = await load_model_file(model_id, bucket="models")
+        except Exception as e:
+            if await compute.run_in_thread(has_model, region, pollutant):
+                return region, None, f"Model load failed for {region} - {pollutant}: {e}", None
+            # Interpolating may run several neighbour predictions; count it against the same limit
+            async with semaphore:
+                interpolated = await interpolated_forecast(region, pollutant, periods, freq, tail)
+            if interpolated is None:
+                return region, None, f"Model not found for {region} - {pollutant}", None
+            forecast, provenance = interpolated
+            return region, forecast.set_index("ds")["yhat"], None, provenance
+        async with semaphore:
+            try:
+                forecast = await compute.run_in_process(
+                    forecast_tasks.predict_tail, model_bytes, periods, freq, tail
+                )
+            except Exception as e:
+                return region, None, f"Forecast failed for {region} - {pollutant}: {e}", None
+        return region, forecast.set_index("ds")["yhat"], None, None
+
+    results = await asyncio.gather(*[forecast_region(r) for r in regions])
+
+    series = {region: s for region, s, _, _ in results if s is not None}
+    errors = {region: err for region, _, err, _ in results if err is not None}
+    interpolated = {region: p for region, _, _, p in results if p is not None}
+    if not series:
+        return {"pollutant": pollutant, "ds": [], "regions": [], "yhat": {}, "errors": errors, "interpolated": {}}
+
+    aligned = pd.concat(series, axis=1).sort_index().round(2)
+    aligned = aligned.astype(object).where(aligned.notna(), None)
+
+    return {
+        "pollutant": pollutant,
+        "ds": aligned.index.strftime("%Y-%m-%d").tolist(),
+        "regions": list(series),
+        "yhat": {region: aligned[region].tolist() for region in series},
+        "errors": errors,
+        "interpolated": interpolated
+    }
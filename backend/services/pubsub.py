@@ -0,0 +1,288 @@
+# services/pubsub.py
+"""
+Publish/subscribe for pushing events (triggered alerts) to connected clients.
+
+Subscribers hold a bounded queue on a local hub; a slow client loses its
+oldest undelivered messages rather than stalling publishers. How messages
+reach the hub depends on the backend (PUBSUB_BACKEND):
+
+- "memory" (default): publish delivers straight to this process's hub.
+  Fine for a single worker.
+- "postgres": publish issues NOTIFY; every worker LISTENs on one connection
+  and feeds its own hub, so clients on any worker get every message. The
+  connection is pinged every PUBSUB_HEALTHCHECK seconds; when it drops it
+  is re-established with backoff (up to PUBSUB_RECONNECT_MAX seconds) and
+  LISTENs again. Events published meanwhile are not replayed.
+
+Other backends (e.g. Redis) can be added with `register_backend`.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "memory")
+PUBSUB_QUEUE_SIZE = int(os.getenv("PUBSUB_QUEUE_SIZE", 100))
+PUBSUB_HEALTHCHECK = float(os.getenv("PUBSUB_HEALTHCHECK", 30))
+PUBSUB_RECONNECT_MAX = float(os.getenv("PUBSUB_RECONNECT_MAX", 30))
+PUBSUB_RECONNECT_DELAY = 1.0
+PG_CHANNEL = "airq_events"
+
+
+class Subscription:
+    def __init__(self, hub: "LocalHub", channel: str, maxsize: int):
+        self.hub = hub
+        self.channel = channel
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    async def get(self) -> Any:
+        return await self.queue.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+
+class LocalHub:
+    """Fan-out to this process's subscribers. Must be used from the event loop thread."""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def add(self, channel: str, maxsize: int) -> Subscription:
+        sub = Subscription(self, channel, maxsize)
+        self._subscribers.setdefault(channel, set()).add(sub)
+        return sub
+
+    def remove(self, sub: Subscription):
+        subs = self._subscribers.get(sub.channel)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._subscribers[sub.channel]
+
+    def deliver(self, channel: str, message: Any):
+        self.published += 1
+        for sub in self._subscribers.get(channel, ()):
+            if sub.queue.full():
+                sub.queue.get_nowait()
+                self.dropped += 1
+            sub.queue.put_nowait(message)
+            self.delivered += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "channels": len(self._subscribers),
+            "subscribers": sum(len(subs) for subs in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+class MemoryBackend:
+    name = "memory"
+
+    def __init__(self, hub: LocalHub):
+        self.hub = hub
+
+    async def publish(self, channel: str, message: Any):
+        self.hub.deliver(channel, message)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class PostgresBackend:
+    """LISTEN/NOTIFY over the app database; payloads must stay under ~8 kB."""
+
+    name = "postgres"
+
+    def __init__(self, hub: LocalHub):
+        self.hub = hub
+        self._listener = None
+        self._fd = None
+        self._start_lock = asyncio.Lock()
+        self._watchdog: Optional[asyncio.Task] = None
+        self._reconnecting: Optional[asyncio.Task] = None
+        self.reconnects = 0
+
+    async def publish(self, channel: str, message: Any):
+        from db.databases import engine
+        from sqlalchemy import text
+
+        payload = json.dumps({"channel": channel, "message": message}, default=str)
+
+        def notify():
+            with engine.begin() as conn:
+                conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": PG_CHANNEL, "payload": payload})
+
+        await asyncio.to_thread(notify)
+
+    async def start(self):
+        async with self._start_lock:
+            if self._listener is None and self._reconnecting is None:
+                await self._listen()
+            if self._watchdog is None:
+                self._watchdog = asyncio.create_task(self._watch())
+
+    @staticmethod
+    def _connect():
+        from db.databases import engine
+
+        raw = engine.raw_connection()
+        raw.detach()  # keep this connection out of the pool for good
+        return raw.driver_connection
+
+    async def _listen(self):
+        conn = await asyncio.to_thread(self._connect)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {PG_CHANNEL}")
+        self._fd = conn.fileno()
+        asyncio.get_running_loop().add_reader(self._fd, self._on_readable)
+        self._listener = conn
+        logger.info(f"📡 Listening for pub/sub events on {PG_CHANNEL}")
+
+    def _on_readable(self):
+        try:
+            self._listener.poll()
+        except Exception as e:
+            self._drop(e)
+            return
+        self._drain()
+
+    def _drain(self):
+        while self._listener is not None and self._listener.notifies:
+            notify = self._listener.notifies.pop(0)
+            try:
+                event = json.loads(notify.payload)
+                self.hub.deliver(event["channel"], event["message"])
+            except Exception as e:
+                logger.warning(f"⚠️ Bad pub/sub payload: {e}")
+
+    def _release(self):
+        if self._listener is None:
+            return
+        with contextlib.suppress(Exception):
+            asyncio.get_running_loop().remove_reader(self._fd)
+        with contextlib.suppress(Exception):
+            self._listener.close()
+        self._listener = None
+
+    def _drop(self, reason: Exception):
+        """The LISTEN connection failed: release it and reconnect in the background."""
+        if self._listener is None:
+            return
+        logger.warning(f"⚠️ Pub/sub listener connection lost ({reason}); reconnecting")
+        self._release()
+        self._reconnecting = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = PUBSUB_RECONNECT_DELAY
+        try:
+            while True:
+                try:
+                    await self._listen()
+                    self.reconnects += 1
+                    return
+                except Exception as e:
+                    logger.warning(f"⚠️ Pub/sub reconnect failed ({e}); retrying in {delay:.0f}s")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, PUBSUB_RECONNECT_MAX)
+        finally:
+            self._reconnecting = None
+
+    @staticmethod
+    def _ping(conn):
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+
+    async def _watch(self):
+        # A connection lost without a FIN never becomes readable; ping it
+        while True:
+            await asyncio.sleep(PUBSUB_HEALTHCHECK)
+            conn = self._listener
+            if conn is None:
+                continue
+            try:
+                await asyncio.wait_for(asyncio.to_thread(self._ping, conn), PUBSUB_HEALTHCHECK)
+            except Exception as e:
+                if self._listener is conn:
+                    self._drop(e)
+                continue
+            self._drain()  # notifications read along with the ping's reply
+
+    async def close(self):
+        for task in (self._watchdog, self._reconnecting):
+            if task is not None:
+                task.cancel()
+        self._watchdog = self._reconnecting = None
+        self._release()
+
+
+_backends: Dict[str, Callable[[LocalHub], Any]] = {
+    "memory": MemoryBackend,
+    "postgres": PostgresBackend,
+}
+
+hub = LocalHub()
+_backend = None
+
+
+def register_backend(name: str, factory: Callable[[LocalHub], Any]):
+    """Add a backend: `factory(hub)` returns an object with async publish/start/close."""
+    _backends[name] = factory
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        if PUBSUB_BACKEND not in _backends:
+            raise RuntimeError(f"Unknown PUBSUB_BACKEND '{PUBSUB_BACKEND}'")
+        _backend = _backends[PUBSUB_BACKEND](hub)
+    return _backend
+
+
+async def publish(channel: str, message: Any):
+    try:
+        await get_backend().publish(channel, message)
+    except Exception as e:
+        # Push is best effort; the ledger remains the source of truth
+        logger.warning(f"⚠️ Publish to {channel} failed: {e}")
+
+
+@contextlib.asynccontextmanager
+async def subscribe(channel: str, maxsize: Optional[int] = None):
+    await get_backend().start()
+    sub = hub.add(channel, maxsize or PUBSUB_QUEUE_SIZE)
+    try:
+        yield sub
+    finally:
+        hub.remove(sub)
+
+
+async def close():
+    if _backend is not None:
+        await _backend.close()
+
+
+def get_metrics() -> Dict[str, Any]:
+    metrics = {"backend": PUBSUB_BACKEND, **hub.metrics()}
+    if isinstance(_backend, PostgresBackend):
+        metrics["listening"] = _backend._listener is not None
+        metrics["reconnects"] = _backend.reconnects
+    return metrics
@@ -0,0 +1,331 @@
+# services/query_engine.py
+"""
+Embedded analytical query engine (DuckDB) over a local Parquet copy of the
+dataset store.
+
+Insight functions used to download CSVs and run pandas per request, and
+each new chart meant another such function. Instead, every dataset is
+converted once to Parquet in long form (dataset_id, time, pollutant, value;
+the derived composites included) under DATASET_CACHE_DIR, and DuckDB
+queries the whole store in-process:
+
+- the queried relation: region, dataset_year, time, pollutant, value over
+  the latest dataset per region and year (as the per-file code picked);
+  region and dataset-year filters select the files before any is opened
+- `aggregate()`: the query API. Grouping keys and statistics come from
+  fixed whitelists (GROUPS, STATS) and every filter value is a bound
+  parameter, so callers cannot inject SQL.
+
+The dataset list is synced from the `datasets` table in the background
+(`run_sync_loop`, started from the app lifespan) every
+QUERY_ENGINE_REFRESH seconds; missing files are downloaded and converted,
+and deleted datasets are evicted. Uploads and deletes update the cache
+directly, and those changes survive a sync that started before them.
+Requests never wait for a sync: `ready()` is False until the first one
+has finished, and callers use their pandas paths meanwhile. duckdb is
+imported lazily: `enabled()` is False when it is not installed or
+INSIGHTS_QUERY_ENGINE is "pandas".
+"""
+
+import asyncio
+import glob
+import os
+import threading
+import time
+from datetime import datetime
+from io import BytesIO
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+from sqlalchemy import text
+
+from core.config import settings
+from db.databases import engine
+from services import compute
+from services.singleflight import coalesced
+from utils import composite
+from utils.helpers import download_from_supabase_storage, setup_logger
+
+logger = setup_logger(__name__)
+
+SERIES = composite.COMPONENT_POLLUTANTS + list(composite.DERIVED)
+
+GROUPS = {
+    "region": "region",
+    "dataset_year": "dataset_year",
+    "year": "year(time)",
+    "month": "month(time)",
+    "weekday": "isodow(time)",
+    "hour": "hour(time)",
+    "day": "CAST(time AS DATE)",
+}
+STATS = {
+    "mean": "avg(value)",
+    "min": "min(value)",
+    "max": "max(value)",
+    "median": "median(value)",
+    "p90": "quantile_cont(value, 0.9)",
+    "count": "count(value)",
+}
+
+_lock = threading.Lock()
+_connection = None
+_synced_at = 0.0
+_pending: Dict[str, bool] = {}  # dataset id -> present, for uploads/deletes since the running sync's snapshot
+_cache_dir = settings.dataset_cache_dir
+
+
+def _duckdb():
+    import duckdb  # optional; only needed when the engine is enabled
+    return duckdb
+
+
+def enabled() -> bool:
+    if settings.insights_query_engine != "duckdb":
+        return False
+    try:
+        _duckdb()
+    except ImportError:
+        return False
+    return True
+
+
+def ready() -> bool:
+    """Enabled and synced at least once; until then queries would miss datasets."""
+    return _synced_at > 0 and enabled()
+
+
+def _glob() -> str:
+    return os.path.join(_cache_dir, "*.parquet")
+
+
+def _path(dataset_id: str) -> str:
+    return os.path.join(_cache_dir, f"{dataset_id}.parquet")
+
+
+def _cursor():
+    """A cursor on the shared in-memory database (one per call; safe across threads)."""
+    global _connection
+    with _lock:
+        if _connection is None:
+            os.makedirs(_cache_dir, exist_ok=True)
+            _connection = _duckdb().connect(":memory:")
+            _connection.execute("""
+                CREATE TABLE datasets (id VARCHAR, region VARCHAR, year INTEGER, created_at TIMESTAMP)
+            """)
+        return _connection.cursor()
+
+
+def _long_frame(dataset_id: str, df: pd.DataFrame) -> pd.DataFrame:
+    df = composite.add_derived_columns(df.copy()) if composite.COMPOSITE not in df.columns else df
+    series = [p for p in SERIES if p in df.columns]
+    frame = pd.DataFrame({"time": pd.to_datetime(df["time"], errors="coerce")})
+    frame[series] = df[series].astype(float)
+    long = frame.melt(id_vars="time", value_vars=series, var_name="pollutant", value_name="value")
+    long = long.dropna()
+    long.insert(0, "dataset_id", dataset_id)
+    return long
+
+
+def cache_frame(dataset_id: str, df: pd.DataFrame):
+    """Write a parsed dataset to the Parquet cache (blocking)."""
+    if "time" not in df.columns:
+        return
+    long = _long_frame(dataset_id, df)
+    cursor = _cursor()
+    tmp = _path(dataset_id) + ".tmp"
+    cursor.register("incoming", long)
+    try:
+        cursor.execute(f"COPY (SELECT * FROM incoming ORDER BY pollutant, time) "
+                       f"TO '{tmp.replace(chr(39), chr(39) * 2)}' (FORMAT PARQUET)")
+    finally:
+        cursor.unregister("incoming")
+    os.replace(tmp, _path(dataset_id))
+
+
+def evict(dataset_id: str):
+    with _lock:
+        _pending[str(dataset_id)] = False
+    try:
+        os.remove(_path(dataset_id))
+    except FileNotFoundError:
+        pass
+    cursor = _cursor()
+    cursor.execute("DELETE FROM datasets WHERE id = ?", [str(dataset_id)])
+
+
+def note_dataset(dataset_id: str, region: str, year: int, created_at: Optional[datetime] = None):
+    """Register a freshly uploaded (and cached) dataset without waiting for the next sync."""
+    with _lock:
+        _pending[str(dataset_id)] = True
+    cursor = _cursor()
+    cursor.execute("DELETE FROM datasets WHERE id = ?", [str(dataset_id)])
+    cursor.execute("INSERT INTO datasets VALUES (?, ?, ?, ?)",
+                   [str(dataset_id), region, year, created_at or datetime.utcnow()])
+
+
+def _dataset_rows() -> List[dict]:
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, region, year, filename, created_at FROM datasets")).fetchall()
+    return [dict(row._mapping) for row in rows]
+
+
+def _replace_datasets(rows: List[dict]):
+    # Uploads and deletes applied since the snapshot was read are newer than it
+    with _lock:
+        pending = dict(_pending)
+    rows = [r for r in rows if str(r["id"]) not in pending]
+    noted = [dataset_id for dataset_id, present in pending.items() if present]
+    frame = pd.DataFrame({
+        "id": [str(r["id"]) for r in rows],
+        "region": [r["region"] for r in rows],
+        "year": pd.Series([r["year"] for r in rows], dtype="int32"),
+        "created_at": pd.to_datetime([r["created_at"] for r in rows]),
+    })
+    cursor = _cursor()
+    cursor.register("incoming", frame)
+    try:
+        cursor.execute("BEGIN")
+        cursor.execute("DELETE FROM datasets WHERE NOT list_contains(?, id)", [noted])
+        cursor.execute("INSERT INTO datasets SELECT * FROM incoming")
+        cursor.execute("COMMIT")
+    finally:
+        cursor.unregister("incoming")
+
+    known = {str(r["id"]) for r in rows} | set(noted)
+    for path in glob.glob(_glob()):
+        if os.path.basename(path)[:-len(".parquet")] not in known:
+            os.remove(path)
+
+
+async def _cache_dataset(row: dict, semaphore: asyncio.Semaphore):
+    async with semaphore:
+        try:
+            csv_bytes = await download_from_supabase_storage(row["filename"], bucket="datasets")
+            df = await compute.run_in_thread(pd.read_csv, BytesIO(csv_bytes.getvalue()))
+            await compute.run_in_thread(cache_frame, str(row["id"]), df)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not cache dataset {row['id']} for the query engine: {e}")
+
+
+@coalesced("query_engine_sync")
+async def sync() -> int:
+    """Bring the cache and dataset list in line with the database; returns files added."""
+    global _synced_at
+    with _lock:
+        _pending.clear()
+    rows = await compute.run_in_thread(_dataset_rows)
+    missing = [row for row in rows if not os.path.exists(_path(str(row["id"])))]
+    semaphore = asyncio.Semaphore(4)
+    await asyncio.gather(*(_cache_dataset(row, semaphore) for row in missing))
+    await compute.run_in_thread(_replace_datasets, rows)
+    _synced_at = time.monotonic()
+    if missing:
+        logger.info(f"🦆 Query engine cached {len(missing)} datasets ({len(rows)} total)")
+    return len(missing)
+
+
+def _latest_files(cursor, region: Optional[str], dataset_year: Optional[int]) -> List[str]:
+    # Latest dataset per region and year, like the per-file code paths; only
+    # these files are scanned
+    sql = """
+        SELECT id FROM (
+            SELECT *, row_number() OVER (PARTITION BY lower(region), year ORDER BY created_at DESC) AS rn
+            FROM datasets
+        ) WHERE rn = 1
+    """
+    params = []
+    if region is not None:
+        sql += " AND lower(region) = lower(?)"
+        params.append(region)
+    if dataset_year is not None:
+        sql += " AND year = ?"
+        params.append(dataset_year)
+    paths = [_path(row[0]) for row in cursor.execute(sql, params).fetchall()]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def aggregate(
+    pollutant: str,
+    group_by: Sequence[str],
+    stats: Sequence[str] = ("mean",),
+    region: Optional[str] = None,
+    dataset_year: Optional[int] = None,
+    year: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    within_dataset_year: bool = False,
+    order_by: Optional[str] = None,
+    descending: bool = False,
+    limit: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    One row per `group_by` combination with the requested `stats` of the
+    pollutant's values, filtered by region, dataset year, calendar year of
+    the measurement and/or time window (`within_dataset_year` keeps only
+    rows from the year the dataset is filed under). Blocking; run in a
+    worker thread.
+    Grouping keys and stats must come from GROUPS and STATS.
+    """
+    unknown = [g for g in group_by if g not in GROUPS] + [s for s in stats if s not in STATS]
+    if unknown:
+        raise ValueError(f"Unsupported group or statistic: {unknown}")
+    if order_by is not None and order_by not in group_by and order_by not in stats:
+        raise ValueError(f"Cannot order by {order_by!r}")
+    columns = [f"{GROUPS[g]} AS {g}" for g in group_by] + [f"{STATS[s]} AS {s}" for s in stats]
+    cursor = _cursor()
+    paths = _latest_files(cursor, region, dataset_year)
+    if not paths:
+        return pd.DataFrame(columns=list(group_by) + list(stats))
+
+    source = """
+        SELECT d.region, d.year AS dataset_year, m.time, m.pollutant, m.value
+        FROM read_parquet(?) m JOIN datasets d ON d.id = m.dataset_id
+    """
+    where, params = ["pollutant = ?"], [paths, pollutant.lower() if composite.is_derived(pollutant) else pollutant]
+    for clause, value in [("lower(region) = lower(?)", region), ("dataset_year = ?", dataset_year),
+                          ("year(time) = ?", year), ("time >= ?", start), ("time <= ?", end)]:
+        if value is not None:
+            where.append(clause)
+            params.append(value)
+    if within_dataset_year:
+        where.append("year(time) = dataset_year")
+
+    sql = f"SELECT {', '.join(columns)} FROM ({source}) WHERE {' AND '.join(where)}"
+    if group_by:
+        sql += f" GROUP BY {', '.join(GROUPS[g] for g in group_by)}"
+    order = order_by or (group_by[0] if group_by else None)
+    if order is not None:
+        sql += f" ORDER BY {order} {'DESC' if descending else 'ASC'}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    return cursor.execute(sql, params).df()
+
+
+async def query(**kwargs) -> pd.DataFrame:
+    """`aggregate` off the event loop."""
+    return await compute.run_in_thread(aggregate, **kwargs)
+
+
+async def run_sync_loop(interval: int):
+    """Sync now and then every `interval` seconds until cancelled (started from the app lifespan)."""
+    while True:
+        try:
+            await sync()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Query engine sync failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def get_metrics() -> Dict[str, object]:
+    files = glob.glob(_glob())
+    return {
+        "enabled": enabled(),
+        "ready": ready(),
+        "cached_datasets": len(files),
+        "cache_bytes": sum(os.path.getsize(f) for f in files),
+        "synced_seconds_ago": round(time.monotonic() - _synced_at, 1) if _synced_at else None,
+    }
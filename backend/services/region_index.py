@@ -0,0 +1,156 @@
+# services/region_index.py
+"""
+Ranking index of region pollution levels.
+
+Ranking regions used to mean downloading and parsing every region's dataset
+on each request. Instead, each dataset is reduced once, when it is uploaded,
+to sums and counts per pollutant (including the derived composites):
+
+- `region_pollutant_means`: one row per dataset and pollutant, for yearly
+  rankings (`ORDER BY ... LIMIT` over a handful of rows per region)
+- `region_pollutant_daily`: one row per dataset, pollutant and day, for
+  rankings over arbitrary date windows
+
+Sums and counts (rather than means) keep the ranking exact when a region
+has several datasets or a window spans datasets. Rows are removed with
+their dataset. Datasets uploaded before the index existed are indexed in
+the background (services/index_backfill.py).
+"""
+
+from datetime import date
+from io import BytesIO
+from typing import List, Optional
+
+import pandas as pd
+from sqlalchemy import text
+
+from db.databases import engine
+from services import compute, index_backfill
+from utils.composite import AQI_COMPOSITE, COMPONENT_POLLUTANTS, COMPOSITE, pollutant_values
+from utils.helpers import download_from_supabase_storage, setup_logger
+
+logger = setup_logger(__name__)
+
+INDEXED_POLLUTANTS = COMPONENT_POLLUTANTS + [COMPOSITE, AQI_COMPOSITE]
+
+
+def pollutant_series(df: pd.DataFrame) -> dict:
+    """Value series per indexed pollutant (composites included); missing ones give empty series."""
+    series = {}
+    for pollutant in INDEXED_POLLUTANTS:
+        values = pollutant_values(df, pollutant)
+        series[pollutant] = values.dropna() if values is not None else pd.Series(dtype=float)
+    return series
+
+
+def dataset_stats(df: pd.DataFrame):
+    """(yearly rows, daily rows) of sums and counts for one dataset's frame."""
+    series = pollutant_series(df)
+    times = pd.to_datetime(df["time"], errors="coerce") if "time" in df.columns else None
+
+    yearly, daily = [], []
+    for pollutant, values in series.items():
+        yearly.append({"pollutant": pollutant, "value_sum": float(values.sum()), "value_count": int(values.size)})
+        if times is None or values.empty:
+            continue
+        days = times.loc[values.index].dt.date
+        grouped = values.groupby(days).agg(["sum", "count"])
+        daily.extend(
+            {"pollutant": pollutant, "day": day, "value_sum": float(row["sum"]), "value_count": int(row["count"])}
+            for day, row in grouped.iterrows()
+        )
+    return yearly, daily
+
+
+def _store(dataset_id: str, region: str, year: int, yearly: List[dict], daily: List[dict]):
+    keys = {"dataset_id": dataset_id, "region": region, "year": year}
+    with engine.begin() as conn:
+        remove_dataset(dataset_id, conn)
+        conn.execute(text("""
+            INSERT INTO region_pollutant_means (dataset_id, region, year, pollutant, value_sum, value_count)
+            VALUES (:dataset_id, :region, :year, :pollutant, :value_sum, :value_count)
+        """), [{**keys, **row} for row in yearly])
+        if daily:
+            conn.execute(text("""
+                INSERT INTO region_pollutant_daily (dataset_id, region, pollutant, day, value_sum, value_count)
+                VALUES (:dataset_id, :region, :pollutant, :day, :value_sum, :value_count)
+            """), [{**keys, **row} for row in daily])
+
+
+def index_frame(dataset_id: str, region: str, year: int, df: pd.DataFrame):
+    """Index an already parsed dataset (blocking; run in a worker thread)."""
+    yearly, daily = dataset_stats(df)
+    _store(dataset_id, region, year, yearly, daily)
+    logger.info(f"📇 Indexed dataset {dataset_id} ({region} {year}): {len(daily)} daily rows")
+
+
+def remove_dataset(dataset_id: str, conn=None):
+    """Drop a dataset's index rows; pass `conn` to join the caller's transaction."""
+    if conn is None:
+        with engine.begin() as conn:
+            return remove_dataset(dataset_id, conn)
+    conn.execute(text("DELETE FROM region_pollutant_daily WHERE dataset_id = :id"), {"id": dataset_id})
+    conn.execute(text("DELETE FROM region_pollutant_means WHERE dataset_id = :id"), {"id": dataset_id})
+
+
+def _unindexed() -> List[dict]:
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT d.id, d.region, d.year, d.filename FROM datasets d
+            WHERE NOT EXISTS (SELECT 1 FROM region_pollutant_means m WHERE m.dataset_id = d.id)
+        """)).fetchall()
+    return [dict(row._mapping) for row in rows]
+
+
+async def _index_row(row: dict):
+    csv_bytes = await download_from_supabase_storage(row["filename"], bucket="datasets")
+    df = await compute.run_in_thread(pd.read_csv, BytesIO(csv_bytes.getvalue()))
+    await compute.run_in_thread(index_frame, str(row["id"]), row["region"], row["year"], df)
+
+
+backfill = index_backfill.Backfill("Region index", _unindexed, _index_row)
+
+
+def _rank_year(year: int, pollutant: str, limit: int):
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT region, SUM(value_sum) / SUM(value_count) AS mean_value
+            FROM region_pollutant_means
+            WHERE year = :year AND pollutant = :pollutant AND value_count > 0
+            GROUP BY region
+            ORDER BY mean_value DESC
+            LIMIT :limit
+        """), {"year": year, "pollutant": pollutant, "limit": limit}).fetchall()
+
+
+def _rank_window(start_date: date, end_date: date, pollutant: str, limit: int):
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT region, SUM(value_sum) / SUM(value_count) AS mean_value
+            FROM region_pollutant_daily
+            WHERE pollutant = :pollutant AND day BETWEEN :start_date AND :end_date
+            GROUP BY region
+            HAVING SUM(value_count) > 0
+            ORDER BY mean_value DESC
+            LIMIT :limit
+        """), {"start_date": start_date, "end_date": end_date, "pollutant": pollutant, "limit": limit}).fetchall()
+
+
+async def rank_regions(
+    pollutant: str,
+    limit: int,
+    year: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> List[tuple]:
+    """
+    [(region, mean)] highest first, for a dataset year or for the days
+    between `start_date` and `end_date` (inclusive).
+    """
+    if start_date is not None or end_date is not None:
+        rows = await compute.run_in_thread(
+            _rank_window, start_date or date.min, end_date or date.max, pollutant, limit
+        )
+    else:
+        rows = await compute.run_in_thread(_rank_year, year, pollutant, limit)
+    return [(row.region, round(float(row.mean_value), 2)) for row in rows]
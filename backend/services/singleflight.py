@@ -0,0 +1,82 @@
+# services/singleflight.py
+"""
+Request coalescing for identical concurrent computations.
+
+When a forecast is published, many users ask for the same region/pollutant at
+once. Callers that use the same key while a computation is in flight await
+the same asyncio task instead of downloading, unpickling and predicting again.
+Nothing is cached after the task finishes.
+
+Results are shared between callers, so treat them as read-only (copy before
+mutating).
+"""
+
+import asyncio
+import functools
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.executions = 0
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            self.executions += 1
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._forget, key))
+        # Shield so one caller disconnecting doesn't cancel everyone's work
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"single-flight {self.name}:{key} failed: {task.exception()}")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._inflight),
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.calls - self.executions,
+        }
+
+
+_groups: Dict[str, SingleFlight] = {}
+
+
+def group(name: str) -> SingleFlight:
+    if name not in _groups:
+        _groups[name] = SingleFlight(name)
+    return _groups[name]
+
+
+def coalesced(name: str):
+    """
+    Decorator: concurrent calls with equal arguments share one execution.
+    Arguments must be hashable.
+    """
+    def decorator(fn: Callable[..., Awaitable[Any]]):
+        flight = group(name)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            return await flight.do(key, fn, *args, **kwargs)
+
+        return wrapper
+    return decorator
+
+
+def get_metrics() -> Dict[str, Any]:
+    return {name: flight.metrics() for name, flight in _groups.items()}
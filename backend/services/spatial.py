@@ -0,0 +1,245 @@
+# services/spatial.py
+"""
+Forecasts for regions without their own model, interpolated in space.
+
+Small municipalities track their neighbours closely, so instead of
+uploading data and training a Prophet model for each, their forecast is
+the inverse-distance weighted (IDW) mean of the forecasts of the nearest
+modeled regions: at most SPATIAL_NEIGHBORS of them within SPATIAL_MAX_KM,
+weighted 1 / distance^SPATIAL_POWER (great-circle distance between region
+centroids). Where the neighbours' forecast dates differ, each date uses
+the neighbours that cover it, re-weighted, and dates covered by less than
+half of the total weight are dropped.
+
+Centroids are region metadata in `region_centroids`. They are taken from
+the lat/lon columns of uploaded datasets, or set by an admin. Manual
+values are never overwritten by uploads, and they are how regions with no
+data at all get a location.
+
+Successful neighbour forecasts are materialized in memory for
+SPATIAL_FORECAST_TTL seconds and cleared when models change. Once the modeled regions'
+forecasts exist, interpolating a region is a NumPy weighted sum.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from db.databases import engine
+from services import compute
+from utils import aqi
+from utils.helpers import setup_logger
+
+logger = setup_logger(__name__)
+
+SPATIAL_NEIGHBORS = int(os.getenv("SPATIAL_NEIGHBORS", 4))
+SPATIAL_MAX_KM = float(os.getenv("SPATIAL_MAX_KM", 25))
+SPATIAL_POWER = float(os.getenv("SPATIAL_POWER", 2))
+SPATIAL_FORECAST_TTL = float(os.getenv("SPATIAL_FORECAST_TTL", 3600))
+SPATIAL_CACHE_SIZE = 512
+CENTROID_TTL = 300
+MIN_COVERAGE = 0.5
+EARTH_RADIUS_KM = 6371.0
+VALUE_COLUMNS = ["yhat", "yhat_lower", "yhat_upper"]
+LAT_COLUMNS, LON_COLUMNS = ("lat", "latitude"), ("lon", "lng", "longitude")
+
+_forecasts: "OrderedDict[tuple, tuple]" = OrderedDict()
+_centroids: Tuple[float, Dict[str, dict]] = (0.0, {})
+
+
+def haversine_km(lat: float, lon: float, lats, lons) -> np.ndarray:
+    """Great-circle distances (km) from one point to arrays of points."""
+    lat, lon = np.radians(lat), np.radians(lon)
+    lats, lons = np.radians(np.asarray(lats, dtype=float)), np.radians(np.asarray(lons, dtype=float))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def idw_weights(distances, power: float = SPATIAL_POWER) -> np.ndarray:
+    """Normalized inverse-distance weights; coincident points take all the weight."""
+    distances = np.asarray(distances, dtype=float)
+    coincident = distances < 1e-6
+    if coincident.any():
+        return coincident / coincident.sum()
+    weights = 1.0 / distances ** power
+    return weights / weights.sum()
+
+
+def blend(frames: List[pd.DataFrame], weights) -> pd.DataFrame:
+    """
+    Weighted mean of forecast frames (`ds` plus value columns) on the union
+    of their dates, re-weighting per date over the frames that cover it.
+    """
+    weights = np.asarray(weights, dtype=float)
+    columns = [c for c in VALUE_COLUMNS if all(c in f.columns for f in frames)]
+    aligned = [f.assign(ds=pd.to_datetime(f["ds"])).drop_duplicates("ds").set_index("ds") for f in frames]
+    index = aligned[0].index
+    for frame in aligned[1:]:
+        index = index.union(frame.index)
+    index = index.sort_values()
+
+    values = np.stack([f[columns].reindex(index).to_numpy(dtype=float) for f in aligned])  # (frames, dates, columns)
+    present = ~np.isnan(values[:, :, 0])
+    covered = weights @ present
+    keep = covered >= MIN_COVERAGE * weights.sum()
+    blended = np.einsum("k,knc->nc", weights, np.nan_to_num(values))[keep] / covered[keep, None]
+
+    result = pd.DataFrame(blended, columns=columns)
+    result.insert(0, "ds", index[keep])
+    if not pd.api.types.is_datetime64_any_dtype(frames[0]["ds"]):
+        # Formatted forecasts (services.evaluation) carry string timestamps
+        result["ds"] = result["ds"].dt.strftime("%Y-%m-%dT%H:%M:%S")
+    return result
+
+
+def centroid_from_frame(df: pd.DataFrame) -> Optional[Tuple[float, float]]:
+    lat = next((c for c in LAT_COLUMNS if c in df.columns), None)
+    lon = next((c for c in LON_COLUMNS if c in df.columns), None)
+    if lat is None or lon is None:
+        return None
+    lat_mean, lon_mean = pd.to_numeric(df[lat], errors="coerce").mean(), pd.to_numeric(df[lon], errors="coerce").mean()
+    if pd.isna(lat_mean) or pd.isna(lon_mean):
+        return None
+    return float(lat_mean), float(lon_mean)
+
+
+def _upsert(region: str, lat: float, lon: float, source: str):
+    global _centroids
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("Centroid outside valid latitude/longitude range.")
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO region_centroids (region, lat, lon, source, updated_at)
+            VALUES (:region, :lat, :lon, :source, NOW())
+            ON CONFLICT ((LOWER(region))) DO UPDATE
+            SET lat = EXCLUDED.lat, lon = EXCLUDED.lon, source = EXCLUDED.source, updated_at = NOW()
+            WHERE region_centroids.source = 'dataset' OR EXCLUDED.source = 'manual'
+        """), {"region": region, "lat": lat, "lon": lon, "source": source})
+    _centroids = (0.0, {})
+
+
+def index_frame(region: str, df: pd.DataFrame):
+    """Record a region's centroid from an uploaded dataset's coordinates (blocking)."""
+    centroid = centroid_from_frame(df)
+    if centroid is None:
+        return
+    _upsert(region, *centroid, source="dataset")
+    logger.info(f"📍 Centroid of {region}: {centroid[0]:.4f}, {centroid[1]:.4f}")
+
+
+def set_centroid(region: str, lat: float, lon: float):
+    """Set a region's centroid by hand (blocking); uploads will not overwrite it."""
+    _upsert(region, lat, lon, source="manual")
+
+
+def load_centroids() -> Dict[str, dict]:
+    """{lowercased region: {"region", "lat", "lon", "source"}}, cached for CENTROID_TTL seconds."""
+    global _centroids
+    loaded_at, centroids = _centroids
+    if time.monotonic() - loaded_at < CENTROID_TTL:
+        return centroids
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT region, lat, lon, source FROM region_centroids")).fetchall()
+    centroids = {row.region.lower(): dict(row._mapping) for row in rows}
+    _centroids = (time.monotonic(), centroids)
+    return centroids
+
+
+def modeled_regions(pollutant: str, frequency: Optional[str] = None) -> List[str]:
+    query = "SELECT DISTINCT region FROM models WHERE pollutant = :pollutant"
+    params = {"pollutant": pollutant}
+    if frequency is not None:
+        query += " AND frequency = :frequency"
+        params["frequency"] = frequency.lower()
+    with engine.connect() as conn:
+        return [row.region for row in conn.execute(text(query), params).fetchall()]
+
+
+def neighbors(region: str, candidates: List[str], centroids: Dict[str, dict]) -> List[dict]:
+    """Nearest candidates within SPATIAL_MAX_KM with their IDW weights; [] if `region` has no centroid."""
+    target = centroids.get(region.lower())
+    # Keep the candidates' own spelling: model lookups match it exactly
+    located = {c.lower(): c for c in candidates if c.lower() in centroids and c.lower() != region.lower()}
+    names = list(located.values())
+    if target is None or not names:
+        return []
+    points = [centroids[name.lower()] for name in names]
+    distances = haversine_km(target["lat"], target["lon"], [p["lat"] for p in points], [p["lon"] for p in points])
+    order = [i for i in np.argsort(distances, kind="stable") if distances[i] <= SPATIAL_MAX_KM][:SPATIAL_NEIGHBORS]
+    if not order:
+        return []
+    weights = idw_weights(distances[order])
+    return [{"region": names[i], "distance_km": round(float(distances[i]), 2), "weight": float(w)}
+            for i, w in zip(order, weights)]
+
+
+async def materialized(key: tuple, produce: Callable[[], Awaitable[Optional[pd.DataFrame]]]):
+    cached = _forecasts.get(key)
+    if cached is not None and time.monotonic() - cached[0] < SPATIAL_FORECAST_TTL:
+        _forecasts.move_to_end(key)
+        return cached[1]
+    try:
+        frame = await produce()
+    except Exception as e:
+        logger.warning(f"⚠️ Neighbour forecast {key} failed: {e}")
+        return None
+    if frame is None or frame.empty:
+        return frame  # only successful forecasts are kept; failures are retried on the next call
+    _forecasts[key] = (time.monotonic(), frame)
+    while len(_forecasts) > SPATIAL_CACHE_SIZE:
+        _forecasts.popitem(last=False)
+    return frame
+
+
+def invalidate(region: Optional[str] = None):
+    """Drop materialized forecasts (of one modeled region, or all)."""
+    for key in [k for k in _forecasts if region is None or k[-1].lower() == region.lower()]:
+        _forecasts.pop(key, None)
+
+
+async def interpolate(
+    region: str,
+    pollutant: str,
+    forecast: Callable[[str], Awaitable[Optional[pd.DataFrame]]],
+    key: Hashable,
+    frequency: Optional[str] = None
+) -> Optional[Tuple[pd.DataFrame, dict]]:
+    """
+    IDW forecast for `region` from its modeled neighbours, or None. `forecast`
+    produces one modeled region's forecast frame; `key` identifies what it
+    computes (endpoint and parameters) for materialization. Returns the
+    frame (with categories) and its provenance.
+    """
+    candidates, centroids = await asyncio.gather(
+        compute.run_in_thread(modeled_regions, pollutant, frequency),
+        compute.run_in_thread(load_centroids)
+    )
+    nearest = neighbors(region, candidates, centroids)
+    if not nearest:
+        return None
+
+    frames = await asyncio.gather(*(
+        materialized((key, pollutant, n["region"]), lambda n=n: forecast(n["region"])) for n in nearest
+    ))
+    used = [(n, f) for n, f in zip(nearest, frames) if f is not None and not f.empty]
+    if not used:
+        return None
+    blended = blend([f for _, f in used], [n["weight"] for n, _ in used])
+    if blended.empty:
+        return None
+    blended["category"] = aqi.categorize(pollutant, blended["yhat"])
+
+    total = sum(n["weight"] for n, _ in used)
+    provenance = {
+        "method": "idw",
+        "power": SPATIAL_POWER,
+        "neighbors": [{**n, "weight": round(n["weight"] / total, 4)} for n, _ in used],
+    }
+    logger.info(f"🗺️ Interpolated {region} - {pollutant} from {', '.join(n['region'] for n, _ in used)}")
+    return blended, provenance
@@ -1,66 +1,351 @@
 # services/subscription_checker.py
+"""
+Incremental AQI alert evaluation.
 
+Subscriptions are grouped by (region, pollutant); each group's model is
+fingerprinted and only re-forecast when the model changed or the group has
+subscriptions newer than the last run. Triggered alerts are written to the
+`aqi_alerts` ledger (unique per subscription and forecast date), and only
+newly recorded alerts are queued for email (one digest per user, see
+services/mailer.py), so repeated runs never re-send.
+
+Runs on a schedule inside the app lifespan (ALERT_EVALUATION_INTERVAL) or
+standalone:  python -m services.subscription_checker [--loop] [--no-email]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+from collections import defaultdict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+import numpy as np
+import pandas as pd
 from db.databases import engine
 from sqlalchemy import text
-from utils.helpers import download_from_supabase_storage, get_aqi_category, is_threshold_exceeded
-from utils.email_utils import send_email_alert
-import pickle
-import pandas as pd
-from io import BytesIO
+from utils import aqi
+from utils.helpers import setup_logger
+from core.config import settings
+from services import compute, forecast_tasks, mailer, pubsub
+from services.evaluation import load_model_file
 
-async def evaluate_all_subscriptions(send_email: bool = True):
+logger = setup_logger(__name__)
+
+# (region, pollutant) groups forecast at the same time during one evaluation
+ALERT_GROUP_CONCURRENCY = int(os.getenv("ALERT_GROUP_CONCURRENCY", 4))
+
+# Forecast horizon checked against subscription thresholds
+ALERT_PERIODS = 3
+ALERT_FREQ = "Y"
+
+
+def load_subscriptions() -> List[dict]:
     with engine.connect() as conn:
         result = conn.execute(text("""
-            SELECT a.id AS sub_id, a.user_id, a.region, a.pollutant, a.threshold, u.email
+            SELECT a.id AS sub_id, a.user_id, a.region, a.pollutant, a.threshold, a.created_at, u.email
             FROM aqi_subscriptions a
             JOIN users u ON a.user_id = u.id
         """))
-        subscriptions = [dict(row._mapping) for row in result.fetchall()]
+        return [dict(row._mapping) for row in result.fetchall()]
 
-    triggered_alerts = []
 
+def group_subscriptions(subscriptions: List[dict]) -> Dict[Tuple[str, str], List[dict]]:
+    groups = defaultdict(list)
     for sub in subscriptions:
-        try:
-            model_id = f"{sub['region']}_{sub['pollutant']}_model.pkl"
-            model_bytes: BytesIO = await download_from_supabase_storage(model_id, bucket="models")
-            model = pickle.load(model_bytes)
-
-            future = model.make_future_dataframe(periods=3, freq="Y")
-            forecast = model.predict(future).tail(3)
-
-            for _, row in forecast.iterrows():
-                category = get_aqi_category(sub["pollutant"], row["yhat"])
-                if is_threshold_exceeded(category, sub["threshold"]):
-                    message = (
-                        f"📍 *Region:* {sub['region']}\n"
-                        f"💨 *Pollutant:* {sub['pollutant']}\n"
-                        f"📅 *Forecasted Date:* {row['ds'].date()}\n"
-                        f"📊 *Predicted Value:* {round(row['yhat'], 2)} → *{category}*\n"
-                        f"⚠️ *Threshold set:* {sub['threshold']}"
-                    )
-
-                    alert = {
-                        "user_id": sub["user_id"],
-                        "email": sub["email"],
-                        "region": sub["region"],
-                        "pollutant": sub["pollutant"],
-                        "date": row["ds"],
-                        "value": round(row["yhat"], 2),
-                        "category": category,
-                        "threshold": sub["threshold"],
-                        "message": message
-                    }
-
-                    triggered_alerts.append(alert)
-
-                    if send_email:
-                        subject = f"[AQI Alert] {sub['pollutant']} forecast for {sub['region']}"
-                        send_email_alert(sub["email"], subject, message)
-
-                    break  # only alert once per subscription
+        groups[(sub["region"], sub["pollutant"])].append(sub)
+    return groups
+
+
+def match_group(subscriptions: List[dict], pollutant: str, forecast: pd.DataFrame) -> List[dict]:
+    """
+    Alerts for every subscription of one (region, pollutant) group against a
+    shared forecast. Thresholds are compared as category ordinals in a single
+    (subscriptions x forecast dates) matrix; each subscription alerts at most
+    once, on the first date that reaches its threshold.
+    """
+    codes = aqi.category_codes(pollutant, forecast["yhat"])
+    thresholds = aqi.codes_from_categories([sub["threshold"] for sub in subscriptions])
+
+    # Unknown thresholds and unknown forecast categories never trigger
+    exceeded = (codes[None, :] >= thresholds[:, None]) & (thresholds[:, None] != aqi.UNKNOWN_CODE)
+    triggered = np.flatnonzero(exceeded.any(axis=1))
+    if triggered.size == 0:
+        return []
+    first_dates = exceeded[triggered].argmax(axis=1)
+
+    categories = aqi.categories_from_codes(codes)
+    dates = forecast["ds"].tolist()
+    values = forecast["yhat"].round(2).tolist()
+
+    alerts = []
+    for i, j in zip(triggered.tolist(), first_dates.tolist()):
+        sub = subscriptions[i]
+        message = (
+            f"📍 *Region:* {sub['region']}\n"
+            f"💨 *Pollutant:* {sub['pollutant']}\n"
+            f"📅 *Forecasted Date:* {dates[j].date()}\n"
+            f"📊 *Predicted Value:* {values[j]} → *{categories[j]}*\n"
+            f"⚠️ *Threshold set:* {sub['threshold']}"
+        )
+        alerts.append({
+            "subscription_id": sub["sub_id"],
+            "user_id": sub["user_id"],
+            "email": sub["email"],
+            "region": sub["region"],
+            "pollutant": sub["pollutant"],
+            "date": dates[j],
+            "forecast_date": dates[j].date(),
+            "value": values[j],
+            "category": categories[j],
+            "threshold": sub["threshold"],
+            "message": message
+        })
+    return alerts
+
+
+def model_fingerprint(model_bytes: bytes) -> str:
+    return hashlib.sha1(model_bytes).hexdigest()
+
+
+def load_evaluation_state() -> Dict[Tuple[str, str], dict]:
+    with engine.connect() as conn:
+        result = conn.execute(text("""
+            SELECT region, pollutant, model_version, last_subscription_at
+            FROM aqi_alert_evaluations
+        """))
+        return {(row.region, row.pollutant): dict(row._mapping) for row in result.fetchall()}
+
+
+def save_evaluation_state(region: str, pollutant: str, model_version: str, last_subscription_at):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO aqi_alert_evaluations (region, pollutant, model_version, last_subscription_at, evaluated_at)
+            VALUES (:region, :pollutant, :model_version, :last_subscription_at, NOW())
+            ON CONFLICT (region, pollutant) DO UPDATE SET
+                model_version = EXCLUDED.model_version,
+                last_subscription_at = EXCLUDED.last_subscription_at,
+                evaluated_at = EXCLUDED.evaluated_at
+        """), {
+            "region": region,
+            "pollutant": pollutant,
+            "model_version": model_version,
+            "last_subscription_at": last_subscription_at
+        })
+
+
+def record_alerts(alerts: List[dict], model_version: str) -> List[dict]:
+    """
+    Write alerts to the ledger and return only the ones that were not there
+    yet. The unique (subscription_id, forecast_date) key makes this safe when
+    several app instances evaluate at the same time.
+    """
+    if not alerts:
+        return []
+
+    first_date = min(alert["forecast_date"] for alert in alerts)
+    with engine.begin() as conn:
+        existing = {
+            (str(row.subscription_id), str(row.forecast_date))
+            for row in conn.execute(text("""
+                SELECT subscription_id, forecast_date FROM aqi_alerts
+                WHERE region = :region AND pollutant = :pollutant AND forecast_date >= :first_date
+            """), {"region": alerts[0]["region"], "pollutant": alerts[0]["pollutant"], "first_date": first_date})
+        }
+
+        recorded = []
+        for alert in alerts:
+            if (str(alert["subscription_id"]), str(alert["forecast_date"])) in existing:
+                continue
+            row = conn.execute(text("""
+                INSERT INTO aqi_alerts (
+                    id, subscription_id, user_id, region, pollutant, forecast_date,
+                    value, category, threshold, message, model_version, created_at
+                ) VALUES (
+                    :id, :subscription_id, :user_id, :region, :pollutant, :forecast_date,
+                    :value, :category, :threshold, :message, :model_version, NOW()
+                )
+                ON CONFLICT (subscription_id, forecast_date) DO NOTHING
+                RETURNING id
+            """), {
+                "id": str(uuid4()),
+                "subscription_id": alert["subscription_id"],
+                "user_id": alert["user_id"],
+                "region": alert["region"],
+                "pollutant": alert["pollutant"],
+                "forecast_date": alert["forecast_date"],
+                "value": alert["value"],
+                "category": alert["category"],
+                "threshold": alert["threshold"],
+                "message": alert["message"],
+                "model_version": model_version
+            }).fetchone()
+            if row:
+                recorded.append({**alert, "id": str(row.id)})
+    return recorded
+
 
+def alert_channel(user_id: str) -> str:
+    return f"alerts:{user_id}"
+
+
+def alert_event(alert: dict) -> dict:
+    """The part of a ledger alert pushed to clients."""
+    return {
+        "id": str(alert["id"]),
+        "region": alert["region"],
+        "pollutant": alert["pollutant"],
+        "forecast_date": str(alert["forecast_date"]),
+        "value": alert["value"],
+        "category": alert["category"],
+        "threshold": alert["threshold"],
+        "message": alert["message"],
+    }
+
+
+def load_alerts(user_id: Optional[str] = None, limit: int = 500) -> List[dict]:
+    """Recorded alerts from the ledger, newest first (all users when `user_id` is None)."""
+    query = """
+        SELECT id, subscription_id, user_id, region, pollutant, forecast_date, value,
+               category, threshold, message, sent_at, created_at
+        FROM aqi_alerts
+    """
+    params = {"limit": limit}
+    if user_id is not None:
+        query += " WHERE user_id = :uid"
+        params["uid"] = user_id
+    query += " ORDER BY created_at DESC, forecast_date LIMIT :limit"
+
+    with engine.connect() as conn:
+        result = conn.execute(text(query), params)
+        return [dict(row._mapping) for row in result.fetchall()]
+
+
+async def _evaluate_group(key: Tuple[str, str], subs: List[dict], state: Optional[dict], force: bool):
+    """
+    Returns (status, newly recorded alerts) where status is "evaluated",
+    "skipped" (model unchanged and no new subscriptions) or "failed".
+    """
+    region, pollutant = key
+    model_id = f"{region}_{pollutant}_model.pkl"
+    try:
+        model_bytes = await load_model_file(model_id, bucket="models")
+    except Exception as e:
+        logger.warning(f"⚠️ Skipping {len(subs)} subscriptions for {region} - {pollutant}: {e}")
+        return "failed", []
+
+    model_version = model_fingerprint(model_bytes)
+    last_subscription_at = max(sub["created_at"] for sub in subs)
+
+    if state and state["model_version"] == model_version and not force:
+        since = state["last_subscription_at"]
+        subs = [sub for sub in subs if since is None or sub["created_at"] > since]
+        if not subs:
+            return "skipped", []
+
+    try:
+        forecast = await compute.run_in_process(
+            forecast_tasks.predict_after_history, model_bytes, ALERT_PERIODS, ALERT_FREQ
+        )
+        alerts = await compute.run_in_thread(match_group, subs, pollutant, forecast)
+        recorded = await compute.run_in_thread(record_alerts, alerts, model_version)
+        await compute.run_in_thread(
+            save_evaluation_state, region, pollutant, model_version, last_subscription_at
+        )
+    except Exception as e:
+        logger.error(f"❌ Alert evaluation failed for {region} - {pollutant}: {e}")
+        return "failed", []
+
+    return "evaluated", recorded
+
+
+async def stream_triggered_alerts(force: bool = False, stats: Optional[dict] = None) -> AsyncIterator[dict]:
+    """
+    Incrementally evaluate all subscriptions and yield newly recorded alerts
+    group by group as soon as each group finishes. `force` re-evaluates
+    every group regardless of the stored state (the ledger still dedupes).
+    """
+    subscriptions = load_subscriptions()
+    groups = group_subscriptions(subscriptions)
+    states = load_evaluation_state()
+    semaphore = asyncio.Semaphore(max(1, ALERT_GROUP_CONCURRENCY))
+    if stats is not None:
+        stats.update({"subscriptions": len(subscriptions), "groups": len(groups),
+                      "evaluated": 0, "skipped": 0, "failed": 0})
+
+    async def evaluate(key: Tuple[str, str], subs: List[dict]):
+        async with semaphore:
+            return await _evaluate_group(key, subs, states.get(key), force)
+
+    tasks = [asyncio.ensure_future(evaluate(key, subs)) for key, subs in groups.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            status, recorded = await next_done
+            if stats is not None:
+                stats[status] += 1
+            for alert in recorded:
+                await pubsub.publish(alert_channel(alert["user_id"]), alert_event(alert))
+                yield alert
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+_run_lock = asyncio.Lock()
+
+
+async def run_alert_evaluation(send_email: bool = True, force: bool = False) -> dict:
+    """One incremental evaluation; concurrent callers in this process run one after another."""
+    async with _run_lock:
+        stats = {}
+        new_alerts = []
+        async for alert in stream_triggered_alerts(force=force, stats=stats):
+            new_alerts.append(alert)
+        if send_email:
+            await mailer.enqueue(new_alerts)
+
+        logger.info(
+            f"🔔 Alert evaluation: {stats['evaluated']} groups evaluated, {stats['skipped']} unchanged, "
+            f"{stats['failed']} failed, {len(new_alerts)} new alerts"
+        )
+        return {**stats, "new_alerts": len(new_alerts), "alerts": new_alerts}
+
+
+async def evaluate_all_subscriptions(send_email: bool = True):
+    """Run an evaluation and return the newly recorded alerts."""
+    return (await run_alert_evaluation(send_email=send_email))["alerts"]
+
+
+async def run_scheduler(interval: int):
+    """Evaluate every `interval` seconds until cancelled (started from the app lifespan)."""
+    logger.info(f"⏰ Alert evaluator scheduled every {interval}s")
+    while True:
+        try:
+            await run_alert_evaluation()
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            print(f"⚠️ Skipping alert for {sub['email']}: {str(e)}")
-            continue
+            logger.error(f"❌ Scheduled alert evaluation failed: {e}")
+        await asyncio.sleep(interval)
+
+
+async def _main(args):
+    try:
+        if args.loop:
+            await run_scheduler(args.interval)
+        else:
+            await run_alert_evaluation(send_email=not args.no_email, force=args.force)
+            await mailer.drain()
+    finally:
+        await mailer.pool.close()
+        compute.shutdown()
+
 
-    return triggered_alerts
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate AQI alert subscriptions")
+    parser.add_argument("--loop", action="store_true", help="keep running on a schedule")
+    parser.add_argument("--interval", type=int, default=settings.alert_evaluation_interval or 3600)
+    parser.add_argument("--no-email", action="store_true", help="record alerts without emailing")
+    parser.add_argument("--force", action="store_true", help="re-evaluate unchanged groups")
+    asyncio.run(_main(parser.parse_args()))
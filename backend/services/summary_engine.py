@@ -0,0 +1,143 @@
+# services/summary_engine.py
+"""
+Single-pass pollution summary (yearly trend, seasonality, top regions).
+
+`/insights/summary/` used to call `get_yearly_trend`, `get_top_polluted_regions`
+and `get_seasonal_variation` one after another: the region's CSV was
+downloaded and parsed twice and the composite "pollution" value derived twice.
+Here the dataset is looked up once, its CSV is parsed once (only the `time`
+and needed pollutant columns), and both views come from one
+(year, month) groupby of sums and counts. The ranking comes from the region
+index and runs concurrently with the download and parse.
+
+With the query engine enabled, both views are two concurrent aggregate
+queries instead. Results match the standalone functions, including their
+error dicts, so the endpoint keeps its status codes.
+"""
+
+import asyncio
+from io import BytesIO
+from typing import Optional
+
+import pandas as pd
+from sqlalchemy import text
+
+from db.databases import engine
+from services import compute, query_engine, region_index
+from services.insights import engine_query, load_dataset_file, seasonality_payload, yearly_trend_payload
+from services.singleflight import coalesced
+from utils import composite
+from utils.helpers import setup_logger
+
+logger = setup_logger(__name__)
+
+UNIT = "μg/m³"
+MONTHS = [
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December"
+]
+
+
+def _dataset_filename(region: str, year: int) -> Optional[str]:
+    with engine.connect() as conn:
+        row = conn.execute(text("""
+            SELECT filename FROM datasets
+            WHERE LOWER(region) = LOWER(:region) AND year = :year
+            ORDER BY created_at DESC LIMIT 1
+        """), {"region": region, "year": year}).fetchone()
+    return row.filename if row else None
+
+
+def monthly_stats(csv_bytes: BytesIO, pollutant: str):
+    """
+    Sums and counts of the pollutant (or composite) value per (year, month),
+    or an error string. The one pass both summary views are derived from.
+    """
+    needed = composite.needed_columns(pollutant)
+    df = pd.read_csv(csv_bytes, usecols=lambda column: column == "time" or column in needed)
+
+    value = composite.pollutant_values(df, pollutant)
+    if value is None:
+        if composite.is_derived(pollutant):
+            return "No pollutant data available in dataset."
+        logger.warning(f"Pollutant {pollutant} not found in dataset columns: {df.columns}")
+        return f"{pollutant} not found in dataset."
+
+    if "time" not in df.columns:
+        return "Missing 'time' column."
+
+    time = pd.to_datetime(df["time"], errors="coerce")
+    frame = pd.DataFrame({"year": time.dt.year, "month": time.dt.month, "value": value}).dropna()
+    if frame.empty:
+        return "No data available for chart."
+
+    return frame.groupby(["year", "month"])["value"].agg(["sum", "count"])
+
+
+def _trend(stats: pd.DataFrame, region: str, pollutant: str, year: int) -> dict:
+    yearly = stats.groupby(level="year").sum()
+    values = yearly["sum"] / yearly["count"]
+    deltas = values.diff().round(2)
+    return {
+        "labels": [str(int(y)) for y in values.index],
+        "values": values.round(2).tolist(),
+        "deltas": deltas.fillna(0).tolist(),
+        "unit": UNIT,
+        "meta": {"type": "trend", "region": region, "pollutant": pollutant, "year": year}
+    }
+
+
+def _seasonality(stats: pd.DataFrame, region: str, pollutant: str, year: int) -> dict:
+    monthly = stats.groupby(level="month").sum().sort_index()
+    values = (monthly["sum"] / monthly["count"]).round(2)
+    return {
+        "labels": [MONTHS[int(m) - 1] for m in values.index],
+        "values": values.tolist(),
+        "unit": UNIT,
+        "meta": {"type": "seasonality", "region": region, "pollutant": pollutant, "year": year}
+    }
+
+
+def summarize_csv(csv_bytes: BytesIO, region: str, pollutant: str, year: int):
+    """(trend, seasonality) for one dataset, from a single parse."""
+    stats = monthly_stats(csv_bytes, pollutant)
+    if isinstance(stats, str):
+        return {"error": stats}, {"error": stats}
+    return _trend(stats, region, pollutant, year), _seasonality(stats, region, pollutant, year)
+
+
+async def _region_views(region: str, pollutant: str, year: int):
+    if query_engine.ready():
+        trend, seasonality = await asyncio.gather(
+            engine_query(pollutant=pollutant, group_by=["year"], region=region, dataset_year=year),
+            engine_query(pollutant=pollutant, group_by=["month"], region=region, dataset_year=year)
+        )
+        if trend is not None and seasonality is not None:
+            return (yearly_trend_payload(trend, region, pollutant, year),
+                    seasonality_payload(seasonality, region, pollutant, year))
+
+    filename = await compute.run_in_thread(_dataset_filename, region, year)
+    if filename is None:
+        return {"error": "No dataset found for this region and year."}, {"error": "Dataset not found."}
+    csv_bytes = BytesIO(await load_dataset_file(filename))
+    return await compute.run_in_thread(summarize_csv, csv_bytes, region, pollutant, year)
+
+
+async def _top_regions(pollutant: str, year: int, top_n: int) -> dict:
+    top = await region_index.rank_regions(pollutant, top_n, year=year)
+    return {
+        "labels": [r[0] for r in top],
+        "values": [r[1] for r in top],
+        "unit": UNIT,
+        "meta": {"type": "ranking", "year": year, "pollutant": pollutant, "top_n": top_n}
+    }
+
+
+@coalesced("pollution_summary")
+async def get_pollution_summary(region: str, pollutant: str, year: int, top_n: int = 5) -> dict:
+    """{"trend", "top_regions", "seasonality"}; trend/seasonality may be error dicts."""
+    (trend, seasonality), top = await asyncio.gather(
+        _region_views(region, pollutant, year),
+        _top_regions(pollutant, year, top_n)
+    )
+    return {"trend": trend, "top_regions": top, "seasonality": seasonality}
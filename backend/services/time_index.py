@@ -0,0 +1,215 @@
+# services/time_index.py
+"""
+Per-region time index of datasets, for date-range queries.
+
+`get_daily_trend` used to read the region's latest dataset in full and only
+then filter by date, so a range spanning years could not be served. Each
+dataset now gets a `dataset_time_index` row, written on upload, with its
+first and last timestamp and, when its rows are in time order, the byte
+offset at which each day starts in the CSV.
+
+`read_range` opens only the datasets that overlap the requested window and,
+for indexed files, downloads only the bytes of the overlapping days (an
+HTTP Range request) and parses only the needed columns. The pieces are
+merged into one time-sorted series; where datasets overlap, the most
+recently uploaded one wins. Datasets that predate the index are indexed
+in the background (services/index_backfill.py).
+"""
+
+import asyncio
+import bisect
+import json
+from datetime import date, datetime, time
+from io import BytesIO
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from db.databases import engine
+from services import compute, index_backfill
+from utils import composite
+from utils.helpers import download_from_supabase_storage, download_range_from_supabase_storage, setup_logger
+
+logger = setup_logger(__name__)
+
+DATASET_BUCKET = "datasets"
+
+
+def day_blocks(contents: bytes, times: pd.Series) -> Optional[dict]:
+    """
+    Byte layout of a time-sorted CSV: the header line, the total size, and
+    [day, offset] for the first row of each day. None if the rows are not in
+    time order or lines do not map one-to-one to rows (quoted newlines,
+    blank lines), in which case the file is always read whole.
+    """
+    if times.isna().any() or not times.is_monotonic_increasing:
+        return None
+    newlines = np.flatnonzero(np.frombuffer(contents, dtype=np.uint8) == ord("\n"))
+    line_starts = newlines + 1
+    line_starts = line_starts[line_starts < len(contents)]
+    if len(line_starts) != len(times):
+        return None
+
+    days = times.dt.normalize().to_numpy()
+    first = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    return {
+        "header": contents[:line_starts[0]].decode() if len(line_starts) else contents.decode(),
+        "size": len(contents),
+        "days": [[str(pd.Timestamp(days[i]).date()), int(line_starts[i])] for i in first],
+    }
+
+
+def byte_range(blocks: dict, start: Optional[datetime], end: Optional[datetime]):
+    """[from, to) byte offsets of the day blocks covering start..end."""
+    days = [day for day, _ in blocks["days"]]
+    offsets = [offset for _, offset in blocks["days"]]
+    lo = 0
+    if start is not None:
+        lo = max(0, bisect.bisect_right(days, str(start.date())) - 1)
+    hi = len(days)
+    if end is not None:
+        hi = bisect.bisect_right(days, str(end.date()))
+    if hi <= lo:
+        return None
+    return offsets[lo], offsets[hi] if hi < len(offsets) else blocks["size"]
+
+
+def _store(dataset_id: str, region: str, times: pd.Series, blocks: Optional[dict]):
+    valid = times.dropna()
+    with engine.begin() as conn:
+        remove_dataset(dataset_id, conn)
+        conn.execute(text("""
+            INSERT INTO dataset_time_index (dataset_id, region, time_start, time_end, row_count, blocks)
+            VALUES (:dataset_id, :region, :time_start, :time_end, :row_count, :blocks)
+        """), {
+            "dataset_id": dataset_id,
+            "region": region,
+            "time_start": valid.min().to_pydatetime() if not valid.empty else None,
+            "time_end": valid.max().to_pydatetime() if not valid.empty else None,
+            "row_count": int(valid.size),
+            "blocks": json.dumps(blocks) if blocks is not None else None
+        })
+
+
+def index_contents(dataset_id: str, region: str, contents: bytes, df: pd.DataFrame):
+    """Index an uploaded CSV (raw bytes plus its parsed frame); blocking."""
+    if "time" not in df.columns:
+        logger.warning(f"⚠️ Dataset {dataset_id} has no 'time' column; not time-indexed")
+        return
+    times = pd.to_datetime(df["time"], errors="coerce")
+    blocks = day_blocks(contents, times)
+    _store(dataset_id, region, times, blocks)
+    logger.info(f"🗂️ Time-indexed dataset {dataset_id} ({region}): "
+                f"{len(blocks['days']) if blocks else 'unsorted, no'} day blocks")
+
+
+def remove_dataset(dataset_id: str, conn=None):
+    """Drop a dataset's index row; pass `conn` to join the caller's transaction."""
+    if conn is None:
+        with engine.begin() as conn:
+            return remove_dataset(dataset_id, conn)
+    conn.execute(text("DELETE FROM dataset_time_index WHERE dataset_id = :id"), {"id": dataset_id})
+
+
+def _unindexed() -> List[dict]:
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT d.id, d.region, d.filename FROM datasets d
+            WHERE NOT EXISTS (SELECT 1 FROM dataset_time_index t WHERE t.dataset_id = d.id)
+        """)).fetchall()
+    return [dict(row._mapping) for row in rows]
+
+
+async def _index_row(row: dict):
+    contents = (await download_from_supabase_storage(row["filename"], bucket=DATASET_BUCKET)).getvalue()
+    df = await compute.run_in_thread(pd.read_csv, BytesIO(contents))
+    await compute.run_in_thread(index_contents, str(row["id"]), row["region"], contents, df)
+
+
+backfill = index_backfill.Backfill("Time index", _unindexed, _index_row)
+
+
+def _overlapping(region: str, start: Optional[datetime], end: Optional[datetime]) -> List[dict]:
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT d.id, d.filename, t.blocks FROM dataset_time_index t
+            JOIN datasets d ON d.id = t.dataset_id
+            WHERE LOWER(t.region) = LOWER(:region)
+              AND t.time_start IS NOT NULL
+              AND (CAST(:start AS TIMESTAMP) IS NULL OR t.time_end >= :start)
+              AND (CAST(:end AS TIMESTAMP) IS NULL OR t.time_start <= :end)
+            ORDER BY d.created_at
+        """), {"region": region, "start": start, "end": end}).fetchall()
+    return [dict(row._mapping) for row in rows]
+
+
+def parse_values(csv_bytes: BytesIO, pollutant: str, start: Optional[datetime], end: Optional[datetime]):
+    """`time`/`value` frame of one CSV (or CSV slice), limited to start..end."""
+    needed = composite.needed_columns(pollutant)
+    df = pd.read_csv(csv_bytes, usecols=lambda column: column == "time" or column in needed)
+    value = composite.pollutant_values(df, pollutant)
+    if "time" not in df.columns or value is None:
+        return None
+
+    frame = pd.DataFrame({"time": pd.to_datetime(df["time"], errors="coerce"), "value": value})
+    if start is not None:
+        frame = frame[frame["time"] >= start]
+    if end is not None:
+        frame = frame[frame["time"] <= end]
+    return frame.dropna()
+
+
+async def _read_dataset(row: dict, pollutant: str, start: Optional[datetime], end: Optional[datetime]):
+    blocks = row["blocks"]
+    if isinstance(blocks, str):
+        blocks = json.loads(blocks)
+    if blocks:
+        span = byte_range(blocks, start, end)
+        if span is None:
+            return None
+        body = await download_range_from_supabase_storage(row["filename"], DATASET_BUCKET, *span)
+        csv_bytes = BytesIO(blocks["header"].encode() + body)
+    else:
+        csv_bytes = await download_from_supabase_storage(row["filename"], bucket=DATASET_BUCKET)
+    return await compute.run_in_thread(parse_values, csv_bytes, pollutant, start, end)
+
+
+def merge(frames: List[Optional[pd.DataFrame]]) -> pd.DataFrame:
+    """Concatenate per-dataset frames (oldest upload first); later uploads win on equal timestamps."""
+    frames = [frame for frame in frames if frame is not None and not frame.empty]
+    if not frames:
+        return pd.DataFrame({"time": pd.Series(dtype="datetime64[ns]"), "value": pd.Series(dtype=float)})
+    merged = pd.concat(frames, ignore_index=True)
+    merged = merged.drop_duplicates(subset="time", keep="last")
+    return merged.sort_values("time", kind="stable").reset_index(drop=True)
+
+
+def parse_bound(value, end: bool = False) -> Optional[datetime]:
+    """A range bound as a datetime; raises ValueError for anything but a date or ISO timestamp."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, time.max if end else time.min)
+    parsed = pd.Timestamp(value)
+    if pd.isna(parsed):
+        raise ValueError(f"Not a date: {value!r}")
+    # A bare date as the end bound means the whole day
+    if end and len(str(value)) <= 10:
+        parsed = parsed + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+    return parsed.to_pydatetime()
+
+
+async def read_range(region: str, pollutant: str, start_date=None, end_date=None) -> pd.DataFrame:
+    """
+    The region's `time`/`value` series between `start_date` and `end_date`
+    (dates, datetimes or ISO strings; open ends allowed), across every
+    overlapping dataset.
+    """
+    start, end = parse_bound(start_date), parse_bound(end_date, end=True)
+    rows = await compute.run_in_thread(_overlapping, region, start, end)
+    frames = await asyncio.gather(*(_read_dataset(row, pollutant, start, end) for row in rows))
+    return merge(list(frames))
@@ -0,0 +1,298 @@
+# services/tip_cache.py
+"""
+Cache for generated health tips.
+
+The tip prompt is driven by region, pollutant, the forecast's AQI categories
+and five profile flags, so the cache key is a normalized signature of those:
+categories are run-length encoded ("Good*3,Moderate*4") instead of keyed on
+raw concentrations, which change on every retrain without changing advice.
+
+Entries live in an in-memory LRU backed by the `health_tip_cache` table (so
+restarts start warm). Within TIP_CACHE_TTL (or the entry's own TTL, which
+the nightly precompute sets to last until its next run) an entry is served
+as is; for TIP_CACHE_STALE - TIP_CACHE_TTL longer it is served immediately while one background refresh
+regenerates it; older entries are regenerated inline, and served anyway if
+that fails. Concurrent misses for one signature share a single generation.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from itertools import groupby
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from db.databases import engine
+from sqlalchemy import text
+from services import compute, singleflight
+from utils.helpers import setup_logger
+
+logger = setup_logger(__name__)
+
+TIP_CACHE_SIZE = int(os.getenv("TIP_CACHE_SIZE", 1024))
+TIP_CACHE_TTL = float(os.getenv("TIP_CACHE_TTL", 6 * 3600))
+TIP_CACHE_STALE = float(os.getenv("TIP_CACHE_STALE", 24 * 3600))
+
+PROFILE_FLAGS = ["has_asthma", "has_heart_disease", "is_smoker", "has_diabetes", "has_lung_disease"]
+
+_entries: "OrderedDict[str, dict]" = OrderedDict()
+_refreshing: Dict[str, asyncio.Task] = {}
+_flight = singleflight.group("health_tip")
+_stats = {"hits": 0, "stale_hits": 0, "expired_hits": 0, "db_hits": 0, "misses": 0, "generations": 0,
+          "saved_ms": 0.0, "generation_ms": 0.0}
+
+
+def category_runs(forecast_list: List[dict]) -> str:
+    return ",".join(
+        f"{category}*{len(list(run))}"
+        for category, run in groupby(row.get("category", "Unknown") for row in forecast_list)
+    )
+
+
+def signature(region: str, pollutant: str, forecast_list: List[dict], profile: Optional[dict]) -> str:
+    flags = "".join("1" if profile.get(flag) else "0" for flag in PROFILE_FLAGS) if profile else "-"
+    normalized = "|".join([
+        region.strip().lower(),
+        pollutant.strip().lower(),
+        category_runs(forecast_list),
+        flags,
+    ])
+    return hashlib.sha1(normalized.encode()).hexdigest()
+
+
+def _remember(key: str, entry: dict):
+    _entries[key] = entry
+    _entries.move_to_end(key)
+    while len(_entries) > TIP_CACHE_SIZE:
+        _entries.popitem(last=False)
+
+
+def _load_entry(key: str) -> Optional[dict]:
+    with engine.connect() as conn:
+        row = conn.execute(text("""
+            SELECT tip, generation_ms, ttl_seconds, created_at FROM health_tip_cache WHERE signature = :sig
+        """), {"sig": key}).fetchone()
+    if not row:
+        return None
+    tip = row.tip if isinstance(row.tip, dict) else json.loads(row.tip)
+    created_at = row.created_at
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    return {"tip": tip, "generation_ms": row.generation_ms or 0.0, "ttl": row.ttl_seconds,
+            "created": created_at.timestamp()}
+
+
+def _store_entry(key: str, region: str, pollutant: str, entry: dict):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO health_tip_cache (signature, region, pollutant, tip, generation_ms, ttl_seconds, created_at)
+            VALUES (:sig, :region, :pollutant, :tip, :generation_ms, :ttl, :created_at)
+            ON CONFLICT (signature) DO UPDATE SET
+                tip = EXCLUDED.tip,
+                generation_ms = EXCLUDED.generation_ms,
+                ttl_seconds = EXCLUDED.ttl_seconds,
+                created_at = EXCLUDED.created_at
+        """), {
+            "sig": key,
+            "region": region,
+            "pollutant": pollutant,
+            "tip": json.dumps(entry["tip"]),
+            "generation_ms": entry["generation_ms"],
+            "ttl": entry.get("ttl"),
+            "created_at": datetime.fromtimestamp(entry["created"])
+        })
+
+
+def _entry(tip: dict, generation_ms: float, ttl: Optional[float] = None) -> dict:
+    return {"tip": tip, "generation_ms": generation_ms, "ttl": ttl, "created": time.time()}
+
+
+def _limits(entry: dict):
+    """(fresh_for, servable_for) in seconds; entries may carry their own TTL."""
+    ttl = entry.get("ttl") or TIP_CACHE_TTL
+    return ttl, ttl + max(0.0, TIP_CACHE_STALE - TIP_CACHE_TTL)
+
+
+async def _persist(key: str, region: str, pollutant: str, entry: dict):
+    try:
+        await compute.run_in_thread(_store_entry, key, region, pollutant, entry)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not persist health tip: {e}")
+
+
+async def _put(key: str, region: str, pollutant: str, entry: dict):
+    _stats["generations"] += 1
+    _stats["generation_ms"] += entry["generation_ms"]
+    _remember(key, entry)
+    await _persist(key, region, pollutant, entry)
+
+
+async def _generate(
+    key: str,
+    region: str,
+    pollutant: str,
+    generate: Callable[[], Awaitable[Optional[dict]]],
+    ttl: Optional[float] = None
+):
+    started = time.perf_counter()
+    tip = await generate()
+    if tip is None:
+        return None  # upstream failed; fallbacks are not cached
+
+    await _put(key, region, pollutant, _entry(tip, (time.perf_counter() - started) * 1000, ttl))
+    return tip
+
+
+def _refresh_in_background(key: str, region: str, pollutant: str, generate):
+    if key in _refreshing:
+        return
+
+    async def refresh():
+        try:
+            await _flight.do(key, _generate, key, region, pollutant, generate)
+        except Exception as e:
+            logger.warning(f"⚠️ Health tip refresh failed: {e}")
+        finally:
+            _refreshing.pop(key, None)
+
+    _refreshing[key] = asyncio.ensure_future(refresh())
+
+
+async def _find(key: str) -> Optional[dict]:
+    entry = _entries.get(key)
+    if entry is not None:
+        _entries.move_to_end(key)
+        return entry
+    try:
+        entry = await compute.run_in_thread(_load_entry, key)
+    except Exception as e:
+        logger.warning(f"⚠️ Health tip cache lookup failed: {e}")
+        return None
+    if entry is not None:
+        _stats["db_hits"] += 1
+        _remember(key, entry)
+    return entry
+
+
+def _serve(entry: Optional[dict]) -> Optional[str]:
+    """Count a lookup; returns "fresh"/"stale" when `entry` can be served."""
+    if entry is not None:
+        age = time.time() - entry["created"]
+        fresh_for, servable_for = _limits(entry)
+    if entry is None or age >= servable_for:
+        _stats["misses"] += 1
+        return None
+    _stats["saved_ms"] += entry["generation_ms"]
+    if age < fresh_for:
+        _stats["hits"] += 1
+        return "fresh"
+    _stats["stale_hits"] += 1
+    return "stale"
+
+
+async def get_or_generate(
+    region: str,
+    pollutant: str,
+    forecast_list: List[dict],
+    profile: Optional[dict],
+    generate: Callable[[], Awaitable[Optional[dict]]]
+) -> Optional[dict]:
+    """
+    Cached tip for these inputs, or the result of `generate()` (an awaitable
+    returning the tip dict, or None when it could not produce one).
+    """
+    key = signature(region, pollutant, forecast_list, profile)
+    entry = await _find(key)
+
+    state = _serve(entry)
+    if state is not None:
+        if state == "stale":
+            _refresh_in_background(key, region, pollutant, generate)
+        return dict(entry["tip"])
+
+    tip = await _flight.do(key, _generate, key, region, pollutant, generate)
+    if tip is None and entry is not None:
+        # Upstream is down: an expired tip for the same inputs beats a template
+        _stats["expired_hits"] += 1
+        tip = entry["tip"]
+    # Callers may adjust the payload (e.g. the dashboard sets riskLevel)
+    return dict(tip) if tip is not None else None
+
+
+async def lookup(
+    region: str,
+    pollutant: str,
+    forecast_list: List[dict],
+    profile: Optional[dict],
+    allow_expired: bool = False
+) -> Optional[dict]:
+    """
+    Cached tip without generating one, for callers that produce tips
+    themselves (streaming). `allow_expired` also returns entries past
+    TIP_CACHE_STALE, as a fallback when the upstream is down.
+    """
+    key = signature(region, pollutant, forecast_list, profile)
+    entry = await _find(key)
+    if allow_expired:
+        if entry is None:
+            return None
+        _stats["expired_hits"] += 1
+        return dict(entry["tip"])
+    return dict(entry["tip"]) if _serve(entry) is not None else None
+
+
+async def store(
+    region: str,
+    pollutant: str,
+    forecast_list: List[dict],
+    profile: Optional[dict],
+    tip: dict,
+    generation_ms: float
+):
+    key = signature(region, pollutant, forecast_list, profile)
+    await _put(key, region, pollutant, _entry(dict(tip), generation_ms))
+
+
+async def warm(
+    region: str,
+    pollutant: str,
+    forecast_list: List[dict],
+    profile: Optional[dict],
+    generate: Callable[[], Awaitable[Optional[dict]]],
+    ttl: float,
+    force: bool = False
+) -> str:
+    """
+    Make sure a tip for these inputs stays fresh for `ttl` seconds (batch
+    precomputation). A servable entry is kept and re-dated rather than
+    regenerated, unless `force`. Returns "kept", "generated" or "failed".
+    """
+    key = signature(region, pollutant, forecast_list, profile)
+    entry = await _find(key)
+    if entry is not None and not force and time.time() - entry["created"] < _limits(entry)[1]:
+        entry["created"], entry["ttl"] = time.time(), ttl
+        await _persist(key, region, pollutant, entry)
+        return "kept"
+
+    tip = await _flight.do(key, _generate, key, region, pollutant, generate, ttl)
+    return "generated" if tip is not None else "failed"
+
+
+def get_metrics() -> Dict[str, float]:
+    served = _stats["hits"] + _stats["stale_hits"]
+    lookups = served + _stats["misses"]
+    return {
+        "entries": len(_entries),
+        "hits": _stats["hits"],
+        "stale_hits": _stats["stale_hits"],
+        "expired_hits": _stats["expired_hits"],
+        "db_hits": _stats["db_hits"],
+        "misses": _stats["misses"],
+        "hit_rate": round(served / lookups, 3) if lookups else 0.0,
+        "latency_saved_ms": round(_stats["saved_ms"], 1),
+        "avg_generation_ms": round(_stats["generation_ms"] / _stats["generations"], 1) if _stats["generations"] else 0.0,
+        "refreshing": len(_refreshing),
+    }
@@ -0,0 +1,183 @@
+# services/tip_precompute.py
+"""
+Nightly precomputation of health tips.
+
+A tip depends on the region, the pollutant, the forecast's categories and
+five boolean profile flags, so each region/pollutant has only 33 variants:
+the 32 flag combinations plus "no profile". After forecasts are refreshed,
+this job builds the standard tip window forecast (TIP_WINDOW_DAYS from
+today) for every modelled region/pollutant and the combined "pollution"
+index, and stores a tip for every variant in the tip cache, fresh until the
+next run. The dashboard and tip endpoints use the same window, so they are
+answered from the cache without calling Mistral.
+
+Variants whose inputs did not change since the last run keep their tip.
+Generation runs at most TIP_PRECOMPUTE_CONCURRENCY at a time, so the batch
+leaves gateway slots for interactive requests.
+
+Run once from backend/:  python -m services.tip_precompute [--force] [--region R]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from itertools import product
+from typing import Dict, List, Optional, Tuple
+
+from core.config import settings
+from db.databases import engine
+from services import compute, mistral_ai
+from services.insights_engine import build_timeline
+from services.tip_cache import PROFILE_FLAGS
+from sqlalchemy import text
+from utils.helpers import setup_logger
+
+logger = setup_logger(__name__)
+
+TIP_WINDOW_DAYS = 7
+TIP_PRECOMPUTE_CONCURRENCY = int(os.getenv("TIP_PRECOMPUTE_CONCURRENCY", 2))
+# Fresh until the next nightly run, with slack for a slow batch
+TIP_PRECOMPUTE_TTL = 26 * 3600
+
+_run_lock = asyncio.Lock()
+_last_run: Dict[str, object] = {}
+
+
+def standard_window(today=None) -> Tuple[str, str]:
+    """The forecast window tips are precomputed for: today and the next six days."""
+    today = today or datetime.now().date()
+    return today.isoformat(), (today + timedelta(days=TIP_WINDOW_DAYS - 1)).isoformat()
+
+
+def profile_variants() -> List[Optional[dict]]:
+    return [None] + [dict(zip(PROFILE_FLAGS, flags)) for flags in product([False, True], repeat=len(PROFILE_FLAGS))]
+
+
+def load_targets(region: Optional[str] = None) -> List[Tuple[str, str]]:
+    """Every modelled (region, pollutant), plus the combined index per region."""
+    query = "SELECT DISTINCT region, pollutant FROM models"
+    params = {}
+    if region:
+        query += " WHERE region = :region"
+        params["region"] = region
+    with engine.connect() as conn:
+        rows = conn.execute(text(query), params).fetchall()
+
+    targets = {(row.region, row.pollutant) for row in rows}
+    targets |= {(region, "pollution") for region, _ in targets}
+    return sorted(targets)
+
+
+async def precompute_target(
+    region: str,
+    pollutant: str,
+    semaphore: asyncio.Semaphore,
+    force: bool = False
+) -> Dict[str, int]:
+    counts = {"kept": 0, "generated": 0, "failed": 0}
+    start_date, end_date = standard_window()
+    forecast = await build_timeline(region, pollutant, start_date, end_date, profile={})
+    if isinstance(forecast, dict) or not forecast:
+        reason = forecast.get("error") if isinstance(forecast, dict) else "empty forecast"
+        logger.warning(f"⚠️ No tip forecast for {region} - {pollutant}: {reason}")
+        counts["failed"] += len(profile_variants())
+        return counts
+
+    async def one(profile):
+        async with semaphore:
+            return await mistral_ai.precompute_health_tip(
+                region, pollutant, forecast, profile, TIP_PRECOMPUTE_TTL, force
+            )
+
+    for result in await asyncio.gather(*[one(profile) for profile in profile_variants()]):
+        counts[result] += 1
+    return counts
+
+
+async def run_precompute(region: Optional[str] = None, force: bool = False) -> dict:
+    """One batch over all targets (or one region); concurrent runs queue up."""
+    async with _run_lock:
+        started = time.perf_counter()
+        targets = await compute.run_in_thread(load_targets, region)
+        semaphore = asyncio.Semaphore(TIP_PRECOMPUTE_CONCURRENCY)
+
+        totals = {"kept": 0, "generated": 0, "failed": 0}
+        results = await asyncio.gather(
+            *[precompute_target(r, p, semaphore, force) for r, p in targets],
+            return_exceptions=True
+        )
+        for (r, p), result in zip(targets, results):
+            if isinstance(result, Exception):
+                logger.error(f"❌ Tip precompute failed for {r} - {p}: {result}")
+                totals["failed"] += len(profile_variants())
+                continue
+            for key, value in result.items():
+                totals[key] += value
+
+        summary = {
+            "targets": len(targets),
+            **totals,
+            "duration_s": round(time.perf_counter() - started, 2),
+            "finished_at": datetime.utcnow().isoformat(),
+        }
+        _last_run.clear()
+        _last_run.update(summary)
+        logger.info(f"✅ Health tips precomputed: {summary}")
+        return summary
+
+
+def schedule_refresh(region: str):
+    """Precompute a region's tips in the background, e.g. after a model was retrained."""
+    def log_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"❌ Tip precompute for {region} failed: {task.exception()}")
+
+    task = asyncio.ensure_future(run_precompute(region=region))
+    task.add_done_callback(log_failure)
+    return task
+
+
+def _seconds_until(hour: int) -> float:
+    now = datetime.now()
+    next_run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+async def run_scheduler(hour: int):
+    """Precompute every night at `hour` (local time) until cancelled (started from the app lifespan)."""
+    logger.info(f"⏰ Health tip precompute scheduled daily at {hour:02d}:00")
+    while True:
+        await asyncio.sleep(_seconds_until(hour))
+        try:
+            await run_precompute()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Scheduled tip precompute failed: {e}")
+
+
+def get_metrics() -> dict:
+    return {
+        "variants_per_target": len(profile_variants()),
+        "concurrency": TIP_PRECOMPUTE_CONCURRENCY,
+        "last_run": dict(_last_run) or None,
+    }
+
+
+async def _main(args):
+    try:
+        await run_precompute(region=args.region, force=args.force)
+    finally:
+        await mistral_ai.gateway.close()
+        compute.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute health tips for every profile variant")
+    parser.add_argument("--region", help="only this region")
+    parser.add_argument("--force", action="store_true", help="regenerate tips whose inputs did not change")
+    asyncio.run(_main(parser.parse_args()))
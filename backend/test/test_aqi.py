@@ -0,0 +1,28 @@
+import numpy as np
+from utils import aqi
+
+
+def _reference_category(pollutant, value):
+    # Original per-value loop from utils.helpers.get_aqi_category
+    limits = aqi.THRESHOLDS.get(aqi.normalize_pollutant(pollutant))
+    if limits is None:
+        return "Unknown"
+    for limit, category in zip(list(limits) + [float("inf")], aqi.AQI_CATEGORIES_ORDER):
+        if value <= limit:
+            return category
+    return "Unknown"
+
+
+def test_categorize_matches_scalar_lookup_on_edges():
+    values = np.array([-1, 0, 3, 6, 10, 15, 19.99, 20, 20.01, 40, 60, 80, 100, 120, 150, 160, 200, 1e6, np.inf, np.nan])
+    for pollutant in ["no2_conc", "O3", "so2_conc", "co_conc", "no_conc", "pollution", "pm10"]:
+        expected = [_reference_category(pollutant, v) for v in values]
+        assert aqi.categorize(pollutant, values).tolist() == expected
+        assert [aqi.category_for(pollutant, v) for v in values] == expected
+
+
+def test_classify_labels_and_weighted_risk():
+    result = aqi.classify("no2_conc", [10, 30, 50, 100, 500, np.nan], weight=1.5)
+    assert result.codes.tolist() == [0, 1, 2, 3, 4, aqi.UNKNOWN_CODE]
+    assert result.labels.tolist() == ["good", "moderate", "unhealthy-sensitive", "unhealthy", "very-unhealthy", None]
+    assert result.risk_scores.tolist() == [round(i * 1.5) for i in range(5)] + [0]
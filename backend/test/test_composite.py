@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from services.data_upload import _with_derived_columns
+from utils import aqi
+from utils.composite import AQI_COMPOSITE, COMPOSITE, pollutant_values, sub_index
+
+
+def _frame():
+    return pd.DataFrame({
+        "time": ["2024-01-01 00:00:00", "2024-01-01 01:00:00", "2024-01-01 02:00:00"],
+        "no2_conc": [20.0, 80.0, np.nan],
+        "o3_conc": [60.0, np.nan, np.nan],
+        "co_conc": [1.5, 3.0, np.nan],
+    })
+
+
+def test_ingest_stores_composites_readers_use_like_any_column():
+    df, contents = _with_derived_columns(_frame().to_csv(index=False).encode())
+    stored = pd.read_csv(pd.io.common.BytesIO(contents))
+
+    assert {COMPOSITE, AQI_COMPOSITE} <= set(stored.columns)
+    # Plain mean of the components present in each row
+    assert np.allclose(stored[COMPOSITE].iloc[:2], [(20 + 60 + 1.5) / 3, (80 + 3.0) / 2])
+    assert np.isnan(stored[COMPOSITE].iloc[2])
+    assert pollutant_values(stored, COMPOSITE) is not None
+    assert pollutant_values(stored, "pm10") is None
+
+
+def test_aqi_composite_puts_components_on_one_scale():
+    # Each component at its Good limit scores 50, at its Unhealthy limit 200
+    for pollutant, limits in [("no2_conc", aqi.THRESHOLDS["NO2"]), ("co_conc", aqi.THRESHOLDS["CO"])]:
+        assert np.allclose(sub_index(pollutant, [0, limits[0], limits[1], limits[3]]), [0, 50, 100, 200])
+    assert sub_index("no2_conc", [160])[0] > 200
+
+    df, _ = _with_derived_columns(_frame().to_csv(index=False).encode())
+    # Row 0: NO2, O3 and CO all at their Good limits (CO halfway into Good)
+    assert df[AQI_COMPOSITE].iloc[0] == round((50 + 50 + 25) / 3, 2)
+    # Row 1: NO2 at its USG limit (150) and CO at its Good limit (50)
+    assert df[AQI_COMPOSITE].iloc[1] == 100
+    assert list(aqi.categorize(AQI_COMPOSITE, df[AQI_COMPOSITE].iloc[:2].to_numpy())) == ["Good", "Moderate"]
+
+
+def test_older_rows_without_the_column_are_derived():
+    old = _frame()
+    new, _ = _with_derived_columns(_frame().to_csv(index=False).encode())
+    merged = pd.concat([old, new], ignore_index=True)
+    values = pollutant_values(merged, COMPOSITE)
+    assert np.allclose(values.iloc[:2], values.iloc[3:5])
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+import time
+from services.compute import ComputePool, run_in_thread, run_in_process, _make_thread_pool
+
+
+def test_run_in_thread_leaves_event_loop_free():
+    main_thread = threading.get_ident()
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            for _ in range(5):
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        worker_thread, _ = await asyncio.gather(
+            run_in_thread(lambda: (time.sleep(0.1), threading.get_ident())[1]),
+            ticker()
+        )
+        return worker_thread, ticks
+
+    worker_thread, ticks = asyncio.run(scenario())
+    assert worker_thread != main_thread
+    assert ticks == 5
+
+
+def test_run_in_process_returns_result():
+    assert asyncio.run(run_in_process(sum, [1, 2, 3])) == 6
+
+
+def test_pool_concurrency_limit_and_queue_depth():
+    pool = ComputePool("test", _make_thread_pool, max_workers=4, max_concurrency=2)
+    peak = {"running": 0, "queued": 0}
+
+    def work():
+        peak["running"] = max(peak["running"], pool.running)
+        peak["queued"] = max(peak["queued"], pool.queued)
+        time.sleep(0.05)
+
+    async def scenario():
+        await asyncio.gather(*[pool.submit(work) for _ in range(6)])
+
+    asyncio.run(scenario())
+    pool.shutdown()
+
+    metrics = pool.metrics()
+    assert peak["running"] <= 2
+    assert peak["queued"] > 0
+    assert metrics["completed"] == 6
+    assert metrics["queued"] == 0 and metrics["running"] == 0
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from services.distribution import dataset_sketches, describe
+from utils.tdigest import RANK_ERROR, TDigest
+
+
+def _rank_error(digest, data):
+    """Largest gap between estimated and exact ranks, over 999 quantiles."""
+    data = np.sort(data)
+    qs = np.linspace(0.001, 0.999, 999)
+    estimates = digest.quantile(qs)
+    below = np.searchsorted(data, estimates, side="left") / data.size
+    at_or_below = np.searchsorted(data, estimates, side="right") / data.size
+    quantile_error = np.maximum(0, np.maximum(below - qs, qs - at_or_below)).max()
+    exact = np.quantile(data, qs)
+    ranks = digest.cdf(exact)
+    below = np.searchsorted(data, exact, side="left") / data.size
+    at_or_below = np.searchsorted(data, exact, side="right") / data.size
+    rank_error = np.maximum(0, np.maximum(below - ranks, ranks - at_or_below)).max()
+    return max(quantile_error, rank_error)
+
+
+def test_merged_sketches_stay_within_the_documented_error():
+    rng = np.random.default_rng(11)
+    for data in [rng.gamma(2.0, 15.0, 80_000), rng.lognormal(3.0, 1.0, 80_000), rng.uniform(0, 120, 80_000)]:
+        months = [TDigest.from_values(chunk) for chunk in np.array_split(data, 12)]
+        # Merge the way queries do: stored bytes, then merge of merges
+        stored = [TDigest.from_bytes(d.to_bytes(), d.min, d.max) for d in months]
+        merged = TDigest.merge([TDigest.merge(stored[:6]), TDigest.merge(stored[6:])])
+
+        assert merged.count == data.size and merged.min == data.min() and merged.max == data.max()
+        assert _rank_error(merged, data) < RANK_ERROR
+        assert len(merged.to_bytes()) <= 1000
+
+
+def test_dataset_sketches_cover_hours_days_and_the_composite():
+    rng = np.random.default_rng(5)
+    times = pd.date_range("2024-01-01", "2024-02-29 23:00", freq="h")
+    df = pd.DataFrame({"time": times.astype(str), "no2_conc": rng.gamma(2.0, 15.0, len(times)),
+                       "o3_conc": rng.gamma(3.0, 20.0, len(times))})
+    rows = dataset_sketches(df)
+
+    keys = {(r["pollutant"], r["grain"], r["month"]) for r in rows}
+    assert ("no2_conc", "hour", 1) in keys and ("pollution", "day", 2) in keys
+    days = TDigest.merge(r["digest"] for r in rows if r["pollutant"] == "no2_conc" and r["grain"] == "day")
+    assert days.count == 60
+
+    summary = describe(days, [50, 90], value=float(days.quantile(0.9)))
+    assert abs(summary["rank_pct"] - 90) < 1 and summary["percentiles"]["p50"] < summary["percentiles"]["p90"]
@@ -0,0 +1,49 @@
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from services.insights import _daily_trend_by_year_from_csv
+from utils.downsample import downsample, lttb, minmax
+
+
+def _hourly(year=2024, seed=1):
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(f"{year}-01-01", f"{year}-12-31 23:00", freq="h")
+    values = 30 + 10 * np.sin(np.arange(len(times)) / 24) + rng.normal(0, 2, len(times))
+    values[5000] = 400.0  # a spike any chart must still show
+    return times, values
+
+
+def test_lttb_and_minmax_keep_endpoints_and_spikes():
+    times, values = _hourly()
+    x = times.asi8.astype(float)
+
+    picked = lttb(x, values, 500)
+    assert len(picked) == 500 and picked[0] == 0 and picked[-1] == len(values) - 1
+    assert np.all(np.diff(picked) > 0)
+    assert 5000 in picked
+
+    envelope = minmax(values, 500)
+    assert len(envelope) <= 500 and np.all(np.diff(envelope) > 0)
+    assert 5000 in envelope and int(np.argmin(values)) in envelope
+
+    assert len(downsample(pd.Series(times), pd.Series(values), None)) == len(values)
+
+
+def test_trend_payload_is_bounded_and_labels_are_distinct():
+    times, values = _hourly()
+    csv = pd.DataFrame({"time": times.astype(str), "no2_conc": values}).to_csv(index=False).encode()
+
+    raw = _daily_trend_by_year_from_csv(BytesIO(csv), "kalamaria", "no2_conc", 2024)
+    assert len(raw["values"]) == len(values) and "points" not in raw["meta"]
+
+    reduced = _daily_trend_by_year_from_csv(BytesIO(csv), "kalamaria", "no2_conc", 2024, max_points=300)
+    assert len(reduced["values"]) == 300 == reduced["meta"]["points"]
+    assert len(set(reduced["labels"])) == 300
+    assert max(reduced["values"]) == 400.0
+
+    weekly = _daily_trend_by_year_from_csv(BytesIO(csv), "kalamaria", "no2_conc", 2024, resolution="weekly")
+    assert weekly["meta"]["resolution"] == "weekly" and 52 <= len(weekly["values"]) <= 53
+    daily = _daily_trend_by_year_from_csv(BytesIO(csv), "kalamaria", "no2_conc", 2024, resolution="daily")
+    assert len(daily["values"]) == 366 and daily["labels"][0] == "2024-01-01"
@@ -0,0 +1,122 @@
+import asyncio
+import time
+import pytest
+import smtplib
+from utils.email_utils import RateLimiter, SMTPConnectionPool, build_message
+
+
+class SMTPStandIn:
+    """Minimal local SMTP server: accepts everything except '*reject*' recipients."""
+
+    def __init__(self, drop_after: int = 0):
+        self.drop_after = drop_after
+        self.connections = 0
+        self.messages = []
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        sent_here = 0
+        writer.write(b"220 standin ESMTP\r\n")
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                writer.write(b"250-standin\r\n250 OK\r\n")
+            elif command.startswith("RCPT") and "REJECT" in command:
+                writer.write(b"550 no such user\r\n")
+            elif command.startswith("DATA"):
+                writer.write(b"354 go ahead\r\n")
+                await writer.drain()
+                data = b""
+                while not data.endswith(b"\r\n.\r\n"):
+                    data += await reader.readline()
+                self.messages.append(data)
+                sent_here += 1
+                writer.write(b"250 queued\r\n")
+                if self.drop_after and sent_here >= self.drop_after:
+                    await writer.drain()
+                    break
+            elif command.startswith("QUIT"):
+                writer.write(b"221 bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        writer.close()
+
+
+def _pool(port, size=2):
+    return SMTPConnectionPool(host="127.0.0.1", port=port, user="", starttls=False, size=size, timeout=5)
+
+
+def test_pool_reuses_sessions():
+    async def scenario():
+        standin = SMTPStandIn()
+        port = await standin.start()
+        pool = _pool(port)
+        await asyncio.gather(*[
+            pool.send(build_message(f"user{i}@example.com", "digest", "body", sender="alerts@example.com"))
+            for i in range(200)
+        ])
+        await pool.close()
+        await standin.stop()
+        return standin
+
+    standin = asyncio.run(scenario())
+    assert len(standin.messages) == 200
+    assert standin.connections <= 2
+
+
+def test_pool_reconnects_dropped_session():
+    async def scenario():
+        standin = SMTPStandIn(drop_after=3)
+        port = await standin.start()
+        pool = _pool(port, size=1)
+        for i in range(7):
+            await pool.send(build_message(f"user{i}@example.com", "s", "b", sender="alerts@example.com"))
+        await pool.close()
+        await standin.stop()
+        return standin
+
+    standin = asyncio.run(scenario())
+    assert len(standin.messages) == 7
+    assert standin.connections == 3
+
+
+def test_refused_recipient_keeps_session():
+    async def scenario():
+        standin = SMTPStandIn()
+        port = await standin.start()
+        pool = _pool(port, size=1)
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            await pool.send(build_message("reject@example.com", "s", "b", sender="alerts@example.com"))
+        await pool.send(build_message("ok@example.com", "s", "b", sender="alerts@example.com"))
+        await pool.close()
+        await standin.stop()
+        return standin
+
+    standin = asyncio.run(scenario())
+    assert len(standin.messages) == 1
+    assert standin.connections == 1
+
+
+def test_rate_limiter_spaces_out_acquisitions():
+    async def scenario():
+        limiter = RateLimiter(rate=100, burst=1)
+        started = time.perf_counter()
+        for _ in range(11):
+            await limiter.acquire()
+        return time.perf_counter() - started
+
+    assert asyncio.run(scenario()) >= 0.09
@@ -0,0 +1,84 @@
+import asyncio
+import json
+from collections import OrderedDict
+from datetime import date
+
+import pandas as pd
+
+from services import forecast_matrix, spatial
+
+CENTROIDS = {
+    "thessaloniki": {"region": "Thessaloniki", "lat": 40.6401, "lon": 22.9444, "source": "manual"},
+    "kalamaria": {"region": "Kalamaria", "lat": 40.5825, "lon": 22.9503, "source": "dataset"},
+    "pylaia": {"region": "Pylaia", "lat": 40.5986, "lon": 22.9869, "source": "manual"},
+}
+
+
+def test_matrix_is_stacked_shared_and_versioned(monkeypatch):
+    versions = {"Thessaloniki": "2025-01-01 00:00:00", "Kalamaria": "2025-01-02 00:00:00"}
+    calls = []
+
+    async def fake_window(region, pollutant, start, end):
+        calls.append(region)
+        # Kalamaria's model covers only part of the window
+        days = pd.date_range(start, end) if region == "Thessaloniki" else pd.date_range("2025-03-02", end)
+        return pd.DataFrame({"ds": days, "yhat": 30.0 if region == "Thessaloniki" else 90.0})
+
+    monkeypatch.setattr(forecast_matrix, "model_versions", lambda pollutant: dict(versions))
+    monkeypatch.setattr(forecast_matrix, "forecast_window", fake_window)
+    monkeypatch.setattr(forecast_matrix, "_bodies", OrderedDict())
+    monkeypatch.setattr(spatial, "load_centroids", lambda: CENTROIDS)
+    monkeypatch.setattr(spatial, "modeled_regions", lambda pollutant, frequency=None: list(versions))
+    monkeypatch.setattr(spatial, "_forecasts", OrderedDict())
+
+    window = ("no2_conc", date(2025, 3, 1), date(2025, 3, 3))
+    etag, body = asyncio.run(forecast_matrix.get_matrix(*window))
+    matrix = json.loads(body)
+
+    assert matrix["regions"] == ["Kalamaria", "Pylaia", "Thessaloniki"]
+    assert matrix["provenance"] == ["model", "interpolated", "model"]
+    assert matrix["dates"] == ["2025-03-01", "2025-03-02", "2025-03-03"]
+    assert matrix["yhat"][0] == [None, 90.0, 90.0] and matrix["yhat"][2] == [30.0] * 3
+    assert matrix["category_codes"][0] == [-1, 3, 3] and matrix["risk"][0] == [0, 3, 3]
+    assert 30.0 < matrix["yhat"][1][1] < 90.0  # Pylaia blends both neighbours
+    assert sorted(calls) == ["Kalamaria", "Thessaloniki"]  # rows shared with interpolation
+
+    # Same version: 304 for a matching If-None-Match, cached bytes otherwise
+    assert asyncio.run(forecast_matrix.get_matrix(*window, if_none_match=etag)) == (etag, None)
+    assert asyncio.run(forecast_matrix.get_matrix(*window)) == (etag, body)
+    assert len(calls) == 2
+
+    versions["Kalamaria"] = "2025-02-01 00:00:00"
+    new_etag, _ = asyncio.run(forecast_matrix.get_matrix(*window, if_none_match=etag))
+    assert new_etag != etag
+
+
+def test_matrix_with_failed_rows_is_not_tagged_or_cached(monkeypatch):
+    failures = {"Kalamaria": 1}
+
+    async def flaky_window(region, pollutant, start, end):
+        if failures.get(region):
+            failures[region] -= 1
+            raise TimeoutError("storage timeout")
+        return pd.DataFrame({"ds": pd.date_range(start, end), "yhat": 30.0})
+
+    monkeypatch.setattr(forecast_matrix, "model_versions", lambda pollutant: {"Kalamaria": "v1", "Thessaloniki": "v1"})
+    monkeypatch.setattr(forecast_matrix, "forecast_window", flaky_window)
+    monkeypatch.setattr(forecast_matrix, "_bodies", OrderedDict())
+    monkeypatch.setattr(spatial, "_forecasts", OrderedDict())
+
+    window = ("no2_conc", date(2025, 3, 1), date(2025, 3, 2))
+    etag, body = asyncio.run(forecast_matrix.get_matrix(*window, interpolate=False))
+    assert etag is None and "Kalamaria" in json.loads(body)["errors"]
+    assert not forecast_matrix._bodies
+
+    etag, body = asyncio.run(forecast_matrix.get_matrix(*window, interpolate=False))
+    assert etag is not None and json.loads(body)["errors"] == {}
+    assert json.loads(body)["yhat"][0] == [30.0, 30.0]
+
+
+def test_interpolated_rows_are_versioned_by_their_neighbours_models():
+    window = ("no2_conc", date(2025, 3, 1), date(2025, 3, 3))
+    _, before = forecast_matrix.plan(*window, ["Pylaia"], True, {"Kalamaria": "2026-01-01"}, CENTROIDS)
+    _, after = forecast_matrix.plan(*window, ["Pylaia"], True, {"Kalamaria": "2026-03-01"}, CENTROIDS)
+    assert before != after
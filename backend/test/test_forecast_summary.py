@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from utils import aqi
+from utils.forecast_summary import compact_forecast, estimate_tokens, summarize
+
+
+def _forecast(values, start="2025-06-01"):
+    ds = pd.date_range(start, periods=len(values))
+    return [
+        {"ds": str(d), "yhat": float(v), "category": c}
+        for d, v, c in zip(ds, values, aqi.categorize("no2_conc", np.asarray(values)))
+    ]
+
+
+def test_short_forecast_is_listed_day_by_day():
+    text = compact_forecast(_forecast([10, 30, 50]))
+    assert text.splitlines()[1] == "2025-06-02 00:00:00: 30.0 μg/m³ (Moderate)"
+
+
+def test_summary_keeps_key_facts_within_budget():
+    rng = np.random.default_rng(0)
+    values = 15 + 0.6 * np.arange(120) + rng.normal(0, 12, 120)
+    values[70] = 140.0
+    forecast = _forecast(values)
+
+    summary = summarize(forecast)
+    assert summary.trend == "rising"
+    assert summary.peaks[0]["date"] == "2025-08-10"
+    assert sum(summary.category_days.values()) == 120
+
+    text = compact_forecast(forecast, max_tokens=120)
+    assert estimate_tokens(text) <= 120
+    assert "worst category: Very Unhealthy" in text
+    assert "2025-08-10" in text
+    assert "shorter or milder periods" in text
@@ -0,0 +1,30 @@
+import asyncio
+
+from services import index_backfill
+
+
+def test_failing_datasets_back_off_instead_of_retrying_every_run(monkeypatch):
+    rows = [{"id": 1}, {"id": 2}]
+    attempts = []
+
+    async def index(row):
+        attempts.append(row["id"])
+        if row["id"] == 2:
+            raise ValueError("unparseable CSV")
+        rows.remove(row)
+
+    monkeypatch.setattr(index_backfill, "_registry", [])
+    backfill = index_backfill.Backfill("test", lambda: list(rows), index, backoff=60)
+
+    assert asyncio.run(backfill.run()) == 1
+    assert asyncio.run(backfill.run()) == 0
+    assert attempts == [1, 2]  # 2 is backing off
+
+    clock = index_backfill.time.monotonic() + 61
+    monkeypatch.setattr(index_backfill.time, "monotonic", lambda: clock)
+    asyncio.run(backfill.run())
+    assert attempts == [1, 2, 2] and backfill.failures["2"][0] == 2  # next wait is doubled
+
+    rows.clear()  # the dataset was deleted
+    asyncio.run(backfill.run())
+    assert backfill.failures == {}
@@ -0,0 +1,64 @@
+import asyncio
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from services import insights_batch
+from services.insights import _daily_trend_by_year_from_csv, _seasonal_variation_from_csv, _yearly_trend_from_csv
+
+
+def _csv(year, seed):
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(f"{year}-01-01", f"{year}-12-31 23:00", freq="h")
+    df = pd.DataFrame({"time": times.astype(str), "lat": 40.6})
+    for pollutant in ["no2_conc", "o3_conc", "so2_conc", "co_conc", "no_conc"]:
+        df[pollutant] = rng.gamma(2.0, 15.0, len(times))
+    return df.to_csv(index=False).encode()
+
+
+def test_batch_shares_loads_and_matches_single_charts(monkeypatch):
+    files = {"k2023.csv": _csv(2023, 1), "k2024.csv": _csv(2024, 2)}
+    downloads, profiles = [], []
+
+    async def fake_download(filename):
+        downloads.append(filename)
+        return files[filename]
+
+    def fake_profile(user_id):
+        profiles.append(user_id)
+        return {"user_id": user_id, "has_asthma": True}
+
+    monkeypatch.setattr(insights_batch.query_engine, "ready", lambda: False)
+    monkeypatch.setattr(insights_batch, "_dataset_rows",
+                        lambda regions: {"kalamaria": {2023: "k2023.csv", 2024: "k2024.csv"}})
+    monkeypatch.setattr(insights_batch, "load_dataset_file", fake_download)
+    monkeypatch.setattr(insights_batch, "load_profile", fake_profile)
+
+    base = {"region": "Kalamaria", "pollutant": "no2_conc", "year": 2024}
+    specs = [
+        {"id": "trend", "type": "trend", **base, "max_points": 200},
+        {"id": "yearly", "type": "yearly_trend", **base},
+        {"id": "yearly-again", "type": "yearly_trend", **base},
+        {"id": "season", "type": "seasonality", **base},
+        {"id": "mine", "type": "personalized", **base},
+        {"id": "history", "type": "multi_year_trend", **{**base, "pollutant": "pollution"}},
+        {"id": "broken", "type": "seasonality", "region": "Kalamaria", "pollutant": "no2_conc"},
+    ]
+    batch = asyncio.run(insights_batch.run_batch("u1", specs))
+    results = batch["results"]
+
+    # Each file and the profile were loaded once for all charts
+    assert sorted(downloads) == ["k2023.csv", "k2024.csv"] and profiles == ["u1"]
+    assert batch["meta"]["rendered"] == 5 and batch["meta"]["bytes_fetched"] == sum(map(len, files.values()))
+
+    csv = BytesIO(files["k2024.csv"])
+    assert results["yearly"] == results["yearly-again"] == {
+        "status": "ok", "data": _yearly_trend_from_csv(csv, "Kalamaria", "no2_conc", 2024)}
+    assert results["season"]["data"] == _seasonal_variation_from_csv(
+        BytesIO(files["k2024.csv"]), "Kalamaria", "no2_conc", 2024)
+    assert results["trend"]["data"] == _daily_trend_by_year_from_csv(
+        BytesIO(files["k2024.csv"]), "Kalamaria", "no2_conc", 2024, max_points=200)
+    assert results["mine"]["data"]["adjusted_values"] == [round(v * 1.4, 2) for v in results["yearly"]["data"]["values"]]
+    assert results["history"]["data"]["labels"] == ["2023", "2024"]
+    assert results["broken"] == {"status": "error", "error": "seasonality needs year."}
@@ -0,0 +1,148 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from services.llm_gateway import BudgetExceededError, CircuitOpenError, LLMGateway
+
+URL = "http://llm.test/v1/chat/completions"
+
+
+def test_breaker_opens_and_short_circuits():
+    calls = {"n": 0}
+
+    def handler(request):
+        calls["n"] += 1
+        return httpx.Response(503, json={"error": "down"})
+
+    gateway = LLMGateway(URL, breaker_failures=3, breaker_reset=60, transport=httpx.MockTransport(handler))
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(httpx.HTTPStatusError):
+                await gateway.complete({})
+        for _ in range(5):
+            with pytest.raises(CircuitOpenError):
+                await gateway.complete({})
+        await gateway.close()
+
+    asyncio.run(scenario())
+    assert calls["n"] == 3
+    assert gateway.metrics()["breaker_state"] == "open"
+    assert gateway.metrics()["short_circuited"] == 5
+
+
+def test_hedged_request_beats_slow_first_attempt_and_budget_is_enforced():
+    calls = {"n": 0}
+
+    async def handler(request):
+        calls["n"] += 1
+        if calls["n"] == 1:
+            await asyncio.sleep(1.0)
+        return httpx.Response(200, json={"attempt": calls["n"]})
+
+    transport = httpx.MockTransport(handler)
+    hedging = LLMGateway(URL, timeout=2.0, hedge_after=0.05, transport=transport)
+    strict = LLMGateway(URL, timeout=0.1, transport=transport)
+
+    async def scenario():
+        data = await hedging.complete({})
+        calls["n"] = 0
+        with pytest.raises(BudgetExceededError):
+            await strict.complete({})
+        await hedging.close()
+        await strict.close()
+        return data
+
+    assert asyncio.run(scenario()) == {"attempt": 2}
+    assert hedging.metrics()["hedge_wins"] == 1
+    assert strict.metrics()["budget_exceeded"] == 1
+
+
+def test_stream_relays_tokens_then_final_tip(monkeypatch):
+    from services import mistral_ai, tip_cache
+
+    frames = [{"choices": [{"delta": {"content": text}}]} for text in ["1. **Stay", " indoors**."]]
+    body = "".join(f"data: {json.dumps(frame)}\n\n" for frame in frames) + "data: [DONE]\n\n"
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body.encode()))
+    monkeypatch.setattr(mistral_ai, "gateway", LLMGateway(URL, transport=transport))
+    monkeypatch.setattr(tip_cache, "_entries", tip_cache.OrderedDict())
+    monkeypatch.setattr(tip_cache, "_load_entry", lambda key: None)
+    monkeypatch.setattr(tip_cache, "_store_entry", lambda *args: None)
+    forecast = [{"ds": "2025-06-01", "yhat": 80.0, "category": "Unhealthy"}]
+
+    async def collect():
+        return [event async for event in mistral_ai.stream_health_tip("kalamaria", "no2_conc", forecast, None)]
+
+    events = asyncio.run(collect())
+    assert events[:-1] == [("token", "1. **Stay"), ("token", " indoors**.")]
+    assert events[-1] == ("tip", {"tip": "1. **Stay indoors**.", "riskLevel": "High", "personalized": False})
+
+    # The second request is served from the cache in one piece
+    events = asyncio.run(collect())
+    assert events == [("token", "1. **Stay indoors**."), events[-1]]
+
+
+def test_cancelled_half_open_probe_lets_a_later_probe_through():
+    calls = {"n": 0}
+
+    async def handler(request):
+        calls["n"] += 1
+        if calls["n"] == 1:
+            return httpx.Response(503, json={"error": "down"})
+        if calls["n"] == 2:
+            await asyncio.sleep(1.0)  # the probe, cancelled by its caller
+        return httpx.Response(200, json={"ok": True})
+
+    gateway = LLMGateway(URL, breaker_failures=1, breaker_reset=0.05, transport=httpx.MockTransport(handler))
+
+    async def scenario():
+        with pytest.raises(httpx.HTTPStatusError):
+            await gateway.complete({})
+        await asyncio.sleep(0.06)
+        probe = asyncio.ensure_future(gateway.complete({}))
+        await asyncio.sleep(0.02)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert gateway.metrics()["breaker_state"] == "open"
+        with pytest.raises(CircuitOpenError):
+            await gateway.complete({})
+        await asyncio.sleep(0.06)
+        data = await gateway.complete({})
+        await gateway.close()
+        return data
+
+    assert asyncio.run(scenario()) == {"ok": True}
+    assert gateway.metrics()["breaker_state"] == "closed"
+
+
+def test_stream_consumer_leaving_a_half_open_probe_releases_it():
+    calls = {"n": 0}
+    body = "".join(f"data: {json.dumps({'n': i})}\n\n" for i in range(3)) + "data: [DONE]\n\n"
+
+    def handler(request):
+        calls["n"] += 1
+        if calls["n"] == 1:
+            return httpx.Response(503, json={"error": "down"})
+        return httpx.Response(200, content=body.encode())
+
+    gateway = LLMGateway(URL, breaker_failures=1, breaker_reset=0.05, transport=httpx.MockTransport(handler))
+
+    async def scenario():
+        with pytest.raises(httpx.HTTPStatusError):
+            await gateway.complete({})
+        await asyncio.sleep(0.06)
+        chunks = gateway.stream({})
+        assert await chunks.__anext__() == {"n": 0}
+        await chunks.aclose()  # the client disconnected mid-probe
+        assert gateway.metrics()["breaker_state"] == "open"
+        await asyncio.sleep(0.06)
+        received = [chunk async for chunk in gateway.stream({})]
+        await gateway.close()
+        return received
+
+    assert asyncio.run(scenario()) == [{"n": 0}, {"n": 1}, {"n": 2}]
+    assert gateway.metrics()["breaker_state"] == "closed"
+    assert gateway.metrics()["failed"] == 1
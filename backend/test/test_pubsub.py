@@ -0,0 +1,114 @@
+import asyncio
+from services import pubsub
+
+
+def test_publish_reaches_only_channel_subscribers():
+    async def scenario():
+        async with pubsub.subscribe("alerts:a") as a, pubsub.subscribe("alerts:b") as b:
+            await pubsub.publish("alerts:a", {"id": 1})
+            got = await asyncio.wait_for(a.get(), 1)
+            return got, b.queue.qsize()
+
+    got, other = asyncio.run(scenario())
+    assert got == {"id": 1}
+    assert other == 0
+
+
+def test_slow_subscriber_drops_oldest_and_unsubscribes():
+    async def scenario():
+        async with pubsub.subscribe("alerts:slow", maxsize=2) as sub:
+            for i in range(5):
+                await pubsub.publish("alerts:slow", i)
+            kept = [sub.queue.get_nowait() for _ in range(sub.queue.qsize())]
+        return kept, pubsub.hub.metrics()["subscribers"]
+
+    kept, subscribers = asyncio.run(scenario())
+    assert kept == [3, 4]
+    assert subscribers == 0
+
+
+class FakeNotify:
+    def __init__(self, payload):
+        self.payload = payload
+
+
+class FakeListenConnection:
+    """Stands in for a psycopg2 connection: a socket pair for readiness, scripted notifies."""
+
+    def __init__(self):
+        import socket
+
+        self.ours, self.server = socket.socketpair()
+        self.notifies = []
+        self.executed = []
+        self.broken = False
+        self.autocommit = False
+
+    def fileno(self):
+        return self.ours.fileno()
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql):
+                conn.executed.append(sql)
+
+        return Cursor()
+
+    def poll(self):
+        self.ours.recv(1024)
+        if self.broken:
+            raise ConnectionError("server closed the connection unexpectedly")
+
+    def send(self, channel, message):
+        import json
+
+        self.notifies.append(FakeNotify(json.dumps({"channel": channel, "message": message})))
+        self.server.send(b"!")
+
+    def close(self):
+        self.ours.close()
+        self.server.close()
+
+
+def test_postgres_listener_reconnects_and_listens_again(monkeypatch):
+    connections = [FakeListenConnection(), None, FakeListenConnection()]  # None: the database is still down
+
+    def connect():
+        conn = connections.pop(0)
+        if conn is None:
+            raise ConnectionError("could not connect to server")
+        return conn
+
+    monkeypatch.setattr(pubsub, "PUBSUB_RECONNECT_DELAY", 0.01)
+    backend = pubsub.PostgresBackend(pubsub.LocalHub())
+    monkeypatch.setattr(backend, "_connect", connect)
+
+    async def scenario():
+        await backend.start()
+        sub = backend.hub.add("alerts:a", 10)
+        first = backend._listener
+        first.send("alerts:a", 1)
+        assert await asyncio.wait_for(sub.get(), 1) == 1
+
+        first.broken = True
+        first.server.send(b"!")
+        while backend._listener is None or backend._listener is first:
+            await asyncio.sleep(0.01)
+        second = backend._listener
+        second.send("alerts:a", 2)
+        got = await asyncio.wait_for(sub.get(), 1)
+        await backend.close()
+        return second, got
+
+    second, got = asyncio.run(scenario())
+    assert got == 2
+    assert second.executed == [f"LISTEN {pubsub.PG_CHANNEL}"]
+    assert backend.reconnects == 1
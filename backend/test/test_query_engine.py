@@ -0,0 +1,93 @@
+from datetime import datetime
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("duckdb")
+
+from services import query_engine
+from services.insights import _seasonal_variation_from_csv, _yearly_trend_from_csv, seasonality_payload, yearly_trend_payload
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_engine, "_cache_dir", str(tmp_path))
+    monkeypatch.setattr(query_engine, "_connection", None)
+    return tmp_path
+
+
+def _dataset(year, seed):
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(f"{year}-01-01", f"{year}-12-31 23:00", freq="h")
+    df = pd.DataFrame({"time": times.astype(str)})
+    for pollutant in ["no2_conc", "o3_conc", "so2_conc", "co_conc", "no_conc"]:
+        df[pollutant] = rng.gamma(2.0, 15.0, len(times)).round(3)
+    return df
+
+
+def _add(dataset_id, region, year, df, created_at=datetime(2025, 1, 1)):
+    query_engine.cache_frame(dataset_id, df)
+    query_engine.note_dataset(dataset_id, region, year, created_at)
+
+
+def test_aggregates_match_the_pandas_paths(cache):
+    df = _dataset(2024, 1)
+    _add("a", "Kalamaria", 2024, df)
+    csv = df.to_csv(index=False).encode()
+
+    for pollutant in ["no2_conc", "pollution"]:
+        frame = query_engine.aggregate(pollutant, ["year"], region="kalamaria", dataset_year=2024)
+        assert yearly_trend_payload(frame, "kalamaria", pollutant, 2024) == \
+            _yearly_trend_from_csv(BytesIO(csv), "kalamaria", pollutant, 2024)
+        frame = query_engine.aggregate(pollutant, ["month"], region="kalamaria", dataset_year=2024)
+        assert seasonality_payload(frame, "kalamaria", pollutant, 2024) == \
+            _seasonal_variation_from_csv(BytesIO(csv), "kalamaria", pollutant, 2024)
+
+
+def test_latest_upload_wins_and_eviction(cache):
+    _add("old", "delta", 2023, _dataset(2023, 2), datetime(2024, 1, 1))
+    _add("new", "delta", 2023, _dataset(2023, 3), datetime(2025, 1, 1))
+    _add("other", "pylaia", 2023, _dataset(2023, 4))
+
+    stats = query_engine.aggregate("no2_conc", ["region"], ["mean", "count"], dataset_year=2023, order_by="region")
+    assert stats["region"].tolist() == ["delta", "pylaia"]
+    assert stats["mean"][0] == pytest.approx(_dataset(2023, 3)["no2_conc"].mean())
+
+    query_engine.evict("new")
+    stats = query_engine.aggregate("no2_conc", ["region"], dataset_year=2023, order_by="region")
+    assert stats["mean"][0] == pytest.approx(_dataset(2023, 2)["no2_conc"].mean())
+
+
+def test_only_whitelisted_groups_and_stats(cache):
+    with pytest.raises(ValueError):
+        query_engine.aggregate("no2_conc", ["region; DROP TABLE datasets"])
+    with pytest.raises(ValueError):
+        query_engine.aggregate("no2_conc", ["month"], stats=["sum(value)"])
+    # Filter values are bound parameters
+    assert query_engine.aggregate("no2_conc", ["month"], region="x' OR '1'='1").empty
+
+
+def test_background_sync_keeps_uploads_made_after_its_snapshot(cache, monkeypatch):
+    import asyncio
+
+    from services import insights
+
+    monkeypatch.setattr(query_engine, "_synced_at", 0.0)
+    monkeypatch.setattr(query_engine, "_pending", {})
+    _add("a", "kalamaria", 2024, _dataset(2024, 5))
+    assert asyncio.run(insights.engine_query(pollutant="no2_conc", group_by=["year"])) is None  # not synced yet
+
+    def snapshot():
+        # An upload lands while the sync is reading the dataset list
+        _add("b", "pylaia", 2024, _dataset(2024, 6))
+        return [{"id": "a", "region": "kalamaria", "year": 2024, "filename": "a.csv",
+                 "created_at": datetime(2025, 1, 1)}]
+
+    monkeypatch.setattr(query_engine, "_dataset_rows", snapshot)
+    assert asyncio.run(query_engine.sync()) == 0
+    assert query_engine.ready()
+    stats = query_engine.aggregate("no2_conc", ["region"], dataset_year=2024, order_by="region")
+    assert stats["region"].tolist() == ["kalamaria", "pylaia"]
+    assert (cache / "b.parquet").exists()
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from services.insights_engine import COMPONENT_POLLUTANTS
+from services.region_index import dataset_stats
+from utils.composite import AQI_COMPOSITE, COMPOSITE
+
+
+def _frame():
+    rng = np.random.default_rng(7)
+    times = pd.date_range("2024-01-01", periods=24 * 10, freq="h")
+    df = pd.DataFrame({"time": times.astype(str)})
+    for pollutant in COMPONENT_POLLUTANTS:
+        values = rng.uniform(5, 80, len(times))
+        values[rng.integers(0, len(times), 20)] = np.nan
+        df[pollutant] = values
+    return df
+
+
+def test_sums_and_counts_reproduce_dataset_means():
+    df = _frame()
+    yearly, daily = dataset_stats(df)
+    stats = {row["pollutant"]: row for row in yearly}
+
+    for pollutant in COMPONENT_POLLUTANTS:
+        row = stats[pollutant]
+        assert np.isclose(row["value_sum"] / row["value_count"], df[pollutant].mean())
+    composite = df[COMPONENT_POLLUTANTS].mean(axis=1).mean()
+    assert np.isclose(stats[COMPOSITE]["value_sum"] / stats[COMPOSITE]["value_count"], composite)
+
+    assert stats[AQI_COMPOSITE]["value_count"] == len(df)
+
+    # Daily rows partition the yearly totals
+    for pollutant, row in stats.items():
+        days = [d for d in daily if d["pollutant"] == pollutant]
+        assert len(days) == 10
+        assert sum(d["value_count"] for d in days) == row["value_count"]
+        assert np.isclose(sum(d["value_sum"] for d in days), row["value_sum"])
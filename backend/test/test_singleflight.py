@@ -0,0 +1,87 @@
+import asyncio
+import time
+import pytest
+from services.singleflight import SingleFlight, coalesced
+
+
+def test_concurrent_identical_requests_collapse_to_one_load():
+    """Load test: 500 simultaneous requests for one forecast do the work once."""
+    loads = 0
+
+    @coalesced("test_forecast")
+    async def load_forecast(region: str, pollutant: str):
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0.2)  # download + unpickle + predict
+        return {"region": region, "pollutant": pollutant}
+
+    async def scenario():
+        started = time.perf_counter()
+        results = await asyncio.gather(*[
+            load_forecast("thessaloniki", "no2_conc") for _ in range(500)
+        ])
+        return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(scenario())
+    assert loads == 1
+    assert all(r is results[0] for r in results)
+    assert elapsed < 0.5  # one load's latency, not 500 of them
+
+
+def test_different_keys_run_separately_and_nothing_is_cached():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def work(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key
+
+    async def scenario():
+        await asyncio.gather(*[flight.do(k, work, k) for k in ["a", "b", "a", "b"]])
+        await flight.do("a", work, "a")
+
+    asyncio.run(scenario())
+    assert sorted(calls) == ["a", "a", "b"]
+    assert flight.metrics() == {"in_flight": 0, "calls": 5, "executions": 3, "coalesced": 2}
+
+
+def test_failure_is_shared_and_next_call_retries():
+    flight = SingleFlight("test")
+    attempts = 0
+
+    async def flaky():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(0.01)
+        if attempts == 1:
+            raise RuntimeError("storage unavailable")
+        return "ok"
+
+    async def scenario():
+        first = await asyncio.gather(*[flight.do("k", flaky) for _ in range(3)], return_exceptions=True)
+        return first, await flight.do("k", flaky)
+
+    first, second = asyncio.run(scenario())
+    assert all(isinstance(r, RuntimeError) for r in first)
+    assert second == "ok"
+    assert attempts == 2
+
+
+def test_cancelled_caller_does_not_cancel_shared_work():
+    flight = SingleFlight("test")
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def scenario():
+        impatient = asyncio.ensure_future(flight.do("k", slow))
+        patient = asyncio.ensure_future(flight.do("k", slow))
+        await asyncio.sleep(0.01)
+        impatient.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await impatient
+        return await patient
+
+    assert asyncio.run(scenario()) == 42
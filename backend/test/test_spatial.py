@@ -0,0 +1,76 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services import spatial
+
+CENTROIDS = {
+    "thessaloniki": {"region": "Thessaloniki", "lat": 40.6401, "lon": 22.9444, "source": "manual"},
+    "kalamaria": {"region": "Kalamaria", "lat": 40.5825, "lon": 22.9503, "source": "dataset"},
+    "pylaia": {"region": "Pylaia", "lat": 40.5986, "lon": 22.9869, "source": "manual"},
+    "athens": {"region": "Athens", "lat": 37.9838, "lon": 23.7275, "source": "manual"},
+}
+
+
+def test_neighbors_are_nearest_within_range_with_idw_weights():
+    near = spatial.neighbors("pylaia", ["Thessaloniki", "Kalamaria", "Athens", "Pylaia"], CENTROIDS)
+    assert [n["region"] for n in near] == ["Kalamaria", "Thessaloniki"]  # Athens is ~300 km away
+    d = np.array([n["distance_km"] for n in near])
+    assert np.allclose([n["weight"] for n in near], (1 / d ** 2) / (1 / d ** 2).sum(), atol=1e-3)
+    assert spatial.neighbors("nowhere", ["Kalamaria"], CENTROIDS) == []
+    assert spatial.idw_weights([0.0, 3.0]).tolist() == [1.0, 0.0]
+
+
+def test_blend_reweights_dates_covered_by_some_neighbors():
+    a = pd.DataFrame({"ds": pd.date_range("2025-01-01", periods=3), "yhat": [10.0] * 3,
+                      "yhat_lower": [5.0] * 3, "yhat_upper": [15.0] * 3})
+    b = a.assign(ds=pd.date_range("2025-01-02", periods=3), yhat=20.0)
+    blended = spatial.blend([a, b], [0.75, 0.25])
+    # 2025-01-04 is only covered by 25% of the weight and is dropped
+    assert blended["ds"].dt.day.tolist() == [1, 2, 3]
+    assert blended["yhat"].tolist() == [10.0, 12.5, 12.5]
+
+
+def test_interpolate_uses_materialized_neighbor_forecasts(monkeypatch):
+    monkeypatch.setattr(spatial, "modeled_regions", lambda pollutant, frequency=None: ["Thessaloniki", "Kalamaria"])
+    monkeypatch.setattr(spatial, "load_centroids", lambda: CENTROIDS)
+    monkeypatch.setattr(spatial, "_forecasts", spatial.OrderedDict())
+    calls = []
+
+    async def forecast(region):
+        calls.append(region)
+        level = {"Thessaloniki": 40.0, "Kalamaria": 20.0}[region]
+        return pd.DataFrame({"ds": pd.date_range("2025-01-01", periods=4), "yhat": level,
+                             "yhat_lower": level - 5, "yhat_upper": level + 5})
+
+    async def scenario():
+        first = await spatial.interpolate("Pylaia", "no2_conc", forecast, key="test")
+        second = await spatial.interpolate("pylaia", "no2_conc", forecast, key="test")
+        return first, second
+
+    (frame, provenance), (again, _) = asyncio.run(scenario())
+    assert sorted(calls) == ["Kalamaria", "Thessaloniki"]  # second call reused them
+    weights = {n["region"]: n["weight"] for n in provenance["neighbors"]}
+    assert provenance["method"] == "idw" and sum(weights.values()) == pytest.approx(1, abs=1e-3)
+    expected = 40 * weights["Thessaloniki"] + 20 * weights["Kalamaria"]
+    assert frame["yhat"].tolist() == pytest.approx([expected] * 4, abs=0.01)
+    assert frame["category"].notna().all() and again.equals(frame)
+
+
+def test_failed_neighbor_forecasts_are_not_materialized(monkeypatch):
+    monkeypatch.setattr(spatial, "_forecasts", spatial.OrderedDict())
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise TimeoutError("storage timeout")
+        return pd.DataFrame({"ds": pd.date_range("2025-01-01", periods=2), "yhat": 10.0})
+
+    async def scenario():
+        return [await spatial.materialized(("k", "no2_conc", "Kalamaria"), flaky) for _ in range(3)]
+
+    first, second, third = asyncio.run(scenario())
+    assert first is None and second is third and len(attempts) == 2
@@ -0,0 +1,36 @@
+import pandas as pd
+from services.subscription_checker import group_subscriptions, match_group
+from utils.helpers import get_aqi_category, is_threshold_exceeded
+
+
+def _sub(i, threshold, region="thessaloniki", pollutant="no2_conc"):
+    return {"sub_id": str(i), "user_id": f"u{i}", "email": f"u{i}@example.com",
+            "region": region, "pollutant": pollutant, "threshold": threshold}
+
+
+def test_group_subscriptions_by_region_and_pollutant():
+    subs = [_sub(1, "Good"), _sub(2, "Moderate"), _sub(3, "Good", pollutant="o3_conc")]
+    groups = group_subscriptions(subs)
+    assert {k: len(v) for k, v in groups.items()} == {
+        ("thessaloniki", "no2_conc"): 2, ("thessaloniki", "o3_conc"): 1
+    }
+
+
+def test_match_group_agrees_with_per_subscription_check():
+    forecast = pd.DataFrame({
+        "ds": pd.to_datetime(["2025-12-31", "2026-12-31", "2027-12-31"]),
+        "yhat": [15.0, 45.0, 90.0],
+    })
+    thresholds = ["Good", "Moderate", "Unhealthy for Sensitive Groups", "Unhealthy", "Very Unhealthy", "bogus"]
+    subs = [_sub(i, t) for i, t in enumerate(thresholds)]
+
+    alerts = match_group(subs, "no2_conc", forecast)
+
+    expected = []
+    for sub in subs:
+        for _, row in forecast.iterrows():
+            category = get_aqi_category("no2_conc", row["yhat"])
+            if is_threshold_exceeded(category, sub["threshold"]):
+                expected.append((sub["user_id"], row["ds"], category))
+                break
+    assert [(a["user_id"], a["date"], a["category"]) for a in alerts] == expected
@@ -0,0 +1,38 @@
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from services.insights import _seasonal_variation_from_csv, _yearly_trend_from_csv
+from services.insights_engine import COMPONENT_POLLUTANTS
+from services.summary_engine import summarize_csv
+
+
+def _csv():
+    rng = np.random.default_rng(3)
+    times = pd.date_range("2023-01-01", "2024-12-31 23:00", freq="h")
+    df = pd.DataFrame({"time": times.astype(str), "extra": "x"})
+    for pollutant in COMPONENT_POLLUTANTS:
+        values = rng.gamma(2.0, 15.0, len(times))
+        values[rng.integers(0, len(times), 200)] = np.nan
+        df[pollutant] = values
+    return df.to_csv(index=False).encode()
+
+
+def test_single_pass_matches_separate_views():
+    data = _csv()
+    for pollutant in ["no2_conc", "pollution"]:
+        trend, seasonality = summarize_csv(BytesIO(data), "kalamaria", pollutant, 2024)
+        expected_trend = _yearly_trend_from_csv(BytesIO(data), "kalamaria", pollutant, 2024)
+        expected_seasonality = _seasonal_variation_from_csv(BytesIO(data), "kalamaria", pollutant, 2024)
+
+        assert trend["labels"] == expected_trend["labels"] == ["2023", "2024"]
+        assert np.allclose(trend["values"], expected_trend["values"])
+        assert np.allclose(trend["deltas"], expected_trend["deltas"])
+        assert seasonality["labels"] == [str(m) for m in expected_seasonality["labels"]]
+        assert np.allclose(seasonality["values"], expected_seasonality["values"])
+
+
+def test_missing_pollutant_is_reported_for_both_views():
+    trend, seasonality = summarize_csv(BytesIO(_csv()), "kalamaria", "pm25", 2024)
+    assert "error" in trend and "error" in seasonality
@@ -0,0 +1,54 @@
+from datetime import datetime
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.time_index import byte_range, day_blocks, merge, parse_bound, parse_values
+
+
+def _csv(start, days, seed=0):
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(start, periods=days * 24, freq="h")
+    df = pd.DataFrame({"time": times.astype(str), "no2_conc": rng.uniform(5, 50, len(times)).round(3)})
+    return df.to_csv(index=False).encode(), df
+
+
+def test_day_blocks_slice_exactly_the_requested_days():
+    contents, df = _csv("2024-12-20", 12)
+    blocks = day_blocks(contents, pd.to_datetime(df["time"]))
+    assert len(blocks["days"]) == 12
+
+    start, end = datetime(2024, 12, 23, 6), datetime(2024, 12, 25, 23, 59)
+    lo, hi = byte_range(blocks, start, end)
+    sliced = parse_values(BytesIO(blocks["header"].encode() + contents[lo:hi]), "no2_conc", start, end)
+    full = parse_values(BytesIO(contents), "no2_conc", start, end)
+    assert hi - lo < len(contents) / 3
+    assert sliced.reset_index(drop=True).equals(full.reset_index(drop=True))
+    assert len(sliced) == 18 + 24 + 24
+
+    assert byte_range(blocks, datetime(2025, 2, 1), None) == (blocks["days"][-1][1], len(contents))
+    assert day_blocks(contents, pd.to_datetime(df["time"]).iloc[::-1].reset_index(drop=True)) is None
+
+
+def test_merge_spans_datasets_and_later_uploads_win():
+    old, _ = _csv("2024-12-30", 3, seed=1)
+    new, _ = _csv("2025-01-01", 3, seed=2)
+    start, end = datetime(2024, 12, 31), datetime(2025, 1, 2, 23)
+    merged = merge([parse_values(BytesIO(old), "no2_conc", start, end),
+                    parse_values(BytesIO(new), "no2_conc", start, end)])
+
+    assert merged["time"].is_monotonic_increasing and merged["time"].is_unique
+    assert len(merged) == 3 * 24
+    overlap = merged[merged["time"] == datetime(2025, 1, 1, 5)]["value"].iloc[0]
+    expected = parse_values(BytesIO(new), "no2_conc", None, None)
+    assert overlap == expected[expected["time"] == datetime(2025, 1, 1, 5)]["value"].iloc[0]
+
+
+def test_parse_bound_covers_whole_end_day_and_rejects_garbage():
+    assert parse_bound("2024-03-01").isoformat() == "2024-03-01T00:00:00"
+    assert parse_bound("2024-03-01", end=True).isoformat() == "2024-03-01T23:59:59.999999"
+    for value in ["foo", "nan"]:
+        with pytest.raises(ValueError):
+            parse_bound(value)
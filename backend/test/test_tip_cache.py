@@ -0,0 +1,69 @@
+import asyncio
+from services import tip_cache
+
+
+def _forecast(values, categories):
+    return [{"ds": f"2025-06-0{i + 1}", "yhat": v, "category": c} for i, (v, c) in enumerate(zip(values, categories))]
+
+
+def test_signature_uses_category_runs_and_profile_flags():
+    a = _forecast([10, 12, 30], ["Good", "Good", "Moderate"])
+    b = _forecast([15, 19, 38], ["Good", "Good", "Moderate"])
+    c = _forecast([15, 25, 38], ["Good", "Moderate", "Moderate"])
+    asthma = {"has_asthma": True, "age": 40}
+
+    assert tip_cache.category_runs(a) == "Good*2,Moderate*1"
+    assert tip_cache.signature("Thessaloniki", "no2_conc", a, asthma) == tip_cache.signature("thessaloniki ", "NO2_CONC", b, {"has_asthma": True})
+    assert tip_cache.signature("thessaloniki", "no2_conc", a, asthma) != tip_cache.signature("thessaloniki", "no2_conc", c, asthma)
+    assert tip_cache.signature("thessaloniki", "no2_conc", a, asthma) != tip_cache.signature("thessaloniki", "no2_conc", a, {"is_smoker": True})
+    assert tip_cache.signature("thessaloniki", "no2_conc", a, None) != tip_cache.signature("thessaloniki", "no2_conc", a, {"age": 40})
+
+
+def test_concurrent_misses_share_one_generation_and_failures_are_not_cached(monkeypatch):
+    monkeypatch.setattr(tip_cache, "_entries", tip_cache.OrderedDict())
+    forecast = _forecast([50], ["Unhealthy for Sensitive Groups"])
+    calls = {"ok": 0, "failed": 0}
+
+    async def generate():
+        calls["ok"] += 1
+        await asyncio.sleep(0.05)
+        return {"tip": "1. **Limit** outdoor activity.", "riskLevel": "Moderate", "personalized": False}
+
+    async def failing():
+        calls["failed"] += 1
+        return None
+
+    async def scenario():
+        first = await asyncio.gather(*[
+            tip_cache.get_or_generate("kalamaria", "o3_conc", forecast, None, generate) for _ in range(10)
+        ])
+        again = await tip_cache.get_or_generate("kalamaria", "o3_conc", forecast, None, generate)
+        again["riskLevel"] = "changed by caller"
+        cached = await tip_cache.get_or_generate("kalamaria", "o3_conc", forecast, None, generate)
+        failed = [await tip_cache.get_or_generate("kalamaria", "so2_conc", forecast, None, failing) for _ in range(2)]
+        return first, cached, failed
+
+    first, cached, failed = asyncio.run(scenario())
+    assert calls == {"ok": 1, "failed": 2}
+    assert all(tip["tip"] == first[0]["tip"] for tip in first)
+    assert cached["riskLevel"] == "Moderate"
+    assert failed == [None, None]
+
+
+def test_stale_entry_is_served_while_refreshing(monkeypatch):
+    monkeypatch.setattr(tip_cache, "_entries", tip_cache.OrderedDict())
+    monkeypatch.setattr(tip_cache, "TIP_CACHE_TTL", 0.0)
+    forecast = _forecast([5], ["Good"])
+    versions = iter(["v1", "v2"])
+
+    async def generate():
+        return {"tip": next(versions), "riskLevel": "Low", "personalized": False}
+
+    async def scenario():
+        first = await tip_cache.get_or_generate("neapoli", "no2_conc", forecast, None, generate)
+        stale = await tip_cache.get_or_generate("neapoli", "no2_conc", forecast, None, generate)
+        await asyncio.sleep(0.05)
+        refreshed = await tip_cache.get_or_generate("neapoli", "no2_conc", forecast, None, generate)
+        return first["tip"], stale["tip"], refreshed["tip"]
+
+    assert asyncio.run(scenario()) == ("v1", "v1", "v2")
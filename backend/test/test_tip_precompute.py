@@ -0,0 +1,44 @@
+import asyncio
+
+import httpx
+
+from services import mistral_ai, tip_cache, tip_precompute
+from services.llm_gateway import LLMGateway
+
+FORECAST = [
+    {"ds": f"2025-06-0{day}", "yhat": 30.0 + 10 * day, "category": category}
+    for day, category in [(1, "Moderate"), (2, "Moderate"), (3, "Unhealthy for Sensitive Groups")]
+]
+
+
+def test_precompute_covers_every_profile_variant_and_serves_requests_from_cache(monkeypatch):
+    calls = {"n": 0}
+
+    def handler(request):
+        calls["n"] += 1
+        return httpx.Response(200, json={"choices": [{"message": {"content": "1. **Limit** outdoor exercise."}}]})
+
+    async def timeline(region, pollutant, start_date, end_date, profile):
+        return FORECAST
+
+    monkeypatch.setattr(mistral_ai, "gateway", LLMGateway("http://llm.test/", transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(tip_precompute, "build_timeline", timeline)
+    monkeypatch.setattr(tip_cache, "_entries", tip_cache.OrderedDict())
+    monkeypatch.setattr(tip_cache, "_load_entry", lambda key: None)
+    monkeypatch.setattr(tip_cache, "_store_entry", lambda *args: None)
+
+    async def scenario():
+        semaphore = asyncio.Semaphore(4)
+        first = await tip_precompute.precompute_target("kalamaria", "no2_conc", semaphore)
+        second = await tip_precompute.precompute_target("kalamaria", "no2_conc", semaphore)
+        profile = {"user_id": "u1", "has_asthma": True, "is_smoker": True, "age": 50}
+        tip = await mistral_ai.generate_health_tip("kalamaria", "no2_conc", FORECAST, profile)
+        anonymous = await mistral_ai.generate_health_tip("kalamaria", "no2_conc", FORECAST, None)
+        return first, second, tip, anonymous
+
+    first, second, tip, anonymous = asyncio.run(scenario())
+    assert len(tip_precompute.profile_variants()) == 33
+    assert first == {"kept": 0, "generated": 33, "failed": 0}
+    assert second == {"kept": 33, "generated": 0, "failed": 0}
+    assert calls["n"] == 33
+    assert tip["personalized"] is True and anonymous["personalized"] is False
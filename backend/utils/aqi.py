@@ -0,0 +1,137 @@
+# utils/aqi.py
+"""
+AQI categorization tables and vectorized classification.
+
+Thresholds are compiled once into NumPy bin edges per pollutant, so whole
+forecast columns are categorized with a single `np.searchsorted` instead of
+calling a Python function per row. Categories are upper-inclusive
+(`value <= limit`), matching the original per-value lookup; NaN values and
+unknown pollutants map to "Unknown".
+
+Codes index into `AQI_CATEGORIES_ORDER`; `UNKNOWN_CODE` marks "Unknown".
+"""
+
+from bisect import bisect_left
+from typing import Dict, NamedTuple
+
+import numpy as np
+
+AQI_CATEGORIES_ORDER = [
+    "Good",
+    "Moderate",
+    "Unhealthy for Sensitive Groups",
+    "Unhealthy",
+    "Very Unhealthy"
+]
+
+UNKNOWN = "Unknown"
+UNKNOWN_CODE = -1
+
+FRONTEND_LABELS = {
+    "Good": "good",
+    "Moderate": "moderate",
+    "Unhealthy for Sensitive Groups": "unhealthy-sensitive",
+    "Unhealthy": "unhealthy",
+    "Very Unhealthy": "very-unhealthy"
+}
+
+POLLUTANT_MAP = {
+    "NO2_CONC": "NO2",
+    "O3_CONC": "O3",
+    "SO2_CONC": "SO2",
+    "CO_CONC": "CO",
+    "NO_CONC": "NO",
+    "POLLUTION": "POLLUTION",
+    "POLLUTION_AQI": "POLLUTION_AQI"
+}
+
+# Upper bounds of Good .. Unhealthy; anything above the last is Very Unhealthy.
+# Based on simplified WHO / EU thresholds.
+THRESHOLDS = {
+    "NO2": (20, 40, 80, 120),
+    "O3": (60, 100, 160, 200),
+    "SO2": (20, 50, 100, 150),
+    "CO": (3, 6, 10, 15),
+    "NO": (25, 50, 100, 150),
+    "POLLUTION": (20, 40, 70, 100),
+    "POLLUTION_AQI": (50, 100, 150, 200),  # index scale, see utils.composite
+}
+
+_EDGES: Dict[str, np.ndarray] = {
+    key: np.asarray(limits, dtype=float) for key, limits in THRESHOLDS.items()
+}
+
+# Lookup tables indexed by code + 1, so UNKNOWN_CODE (-1) lands on slot 0
+_CATEGORY_TABLE = np.array([UNKNOWN] + AQI_CATEGORIES_ORDER, dtype=object)
+_LABEL_TABLE = np.array([None] + [FRONTEND_LABELS[c] for c in AQI_CATEGORIES_ORDER], dtype=object)
+_BASE_SCORE_TABLE = np.array([0] + list(range(len(AQI_CATEGORIES_ORDER))), dtype=float)
+
+
+class AqiClassification(NamedTuple):
+    codes: np.ndarray
+    categories: np.ndarray
+    labels: np.ndarray
+    risk_scores: np.ndarray
+
+
+def normalize_pollutant(pollutant: str) -> str:
+    key = pollutant.strip().upper()
+    return POLLUTANT_MAP.get(key, key)
+
+
+def category_for(pollutant: str, value: float) -> str:
+    """Scalar lookup for single values (no array allocation)."""
+    edges = THRESHOLDS.get(normalize_pollutant(pollutant))
+    if edges is None or value != value:  # NaN
+        return UNKNOWN
+    return AQI_CATEGORIES_ORDER[bisect_left(edges, value)]
+
+
+def category_codes(pollutant: str, values) -> np.ndarray:
+    values = np.asarray(values, dtype=float)
+    edges = _EDGES.get(normalize_pollutant(pollutant))
+    if edges is None:
+        return np.full(values.shape, UNKNOWN_CODE, dtype=np.int8)
+
+    codes = np.searchsorted(edges, values, side="left").astype(np.int8)
+    codes[np.isnan(values)] = UNKNOWN_CODE
+    return codes
+
+
+_CATEGORY_CODES = {name: code for code, name in enumerate(AQI_CATEGORIES_ORDER)}
+
+
+def codes_from_categories(categories) -> np.ndarray:
+    """Ordinal codes for category names (e.g. subscription thresholds); unknown names get UNKNOWN_CODE."""
+    return np.fromiter(
+        (_CATEGORY_CODES.get(c, UNKNOWN_CODE) for c in categories), dtype=np.int8
+    )
+
+
+def categories_from_codes(codes: np.ndarray) -> np.ndarray:
+    return _CATEGORY_TABLE[np.asarray(codes) + 1]
+
+
+def labels_from_codes(codes: np.ndarray) -> np.ndarray:
+    return _LABEL_TABLE[np.asarray(codes) + 1]
+
+
+def risk_scores_from_codes(codes: np.ndarray, weight: float = 1.0) -> np.ndarray:
+    """Base score (category index, 0 for Unknown) scaled by the profile weight and rounded."""
+    return np.round(_BASE_SCORE_TABLE[np.asarray(codes) + 1] * weight).astype(int)
+
+
+def categorize(pollutant: str, values) -> np.ndarray:
+    """Category names for an array of concentrations."""
+    return categories_from_codes(category_codes(pollutant, values))
+
+
+def classify(pollutant: str, values, weight: float = 1.0) -> AqiClassification:
+    """Codes, category names, frontend labels and weighted risk scores in one pass."""
+    codes = category_codes(pollutant, values)
+    return AqiClassification(
+        codes=codes,
+        categories=categories_from_codes(codes),
+        labels=labels_from_codes(codes),
+        risk_scores=risk_scores_from_codes(codes, weight),
+    )
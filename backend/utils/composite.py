@@ -0,0 +1,112 @@
+# utils/composite.py
+"""
+Derived pollutant series, computed once when a dataset is ingested.
+
+Two composites are written into every uploaded CSV as ordinary columns, so
+every reader selects them like any other pollutant:
+
+- "pollution": the plain mean of the component concentrations present in
+  the row (μg/m³; components missing from a row or from the file are
+  skipped; NaN if none are present). This is the definition the insight
+  and training code has always used.
+- "pollution_aqi": an AQI-style index. Each component is mapped piecewise
+  linearly from its category thresholds (utils.aqi.THRESHOLDS) onto a
+  common scale where 50, 100, 150 and 200 are the upper bounds of Good,
+  Moderate, Unhealthy for Sensitive Groups and Unhealthy (extrapolated
+  above), then averaged with AQI_WEIGHTS. Unlike the plain mean, it is not
+  dominated by the components with the largest concentrations.
+
+Datasets uploaded before the columns existed lack them; `pollutant_values`
+derives them on the fly with the same definitions.
+"""
+
+from typing import Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from utils.aqi import THRESHOLDS
+
+COMPONENT_POLLUTANTS = ["no2_conc", "o3_conc", "so2_conc", "co_conc", "no_conc"]
+COMPOSITE = "pollution"
+AQI_COMPOSITE = "pollution_aqi"
+DERIVED = (COMPOSITE, AQI_COMPOSITE)
+
+# NO is weighted down: it converts to NO2, which is already counted
+AQI_WEIGHTS = {"no2_conc": 1.0, "o3_conc": 1.0, "so2_conc": 1.0, "co_conc": 1.0, "no_conc": 0.5}
+AQI_SCALE = (0.0, 50.0, 100.0, 150.0, 200.0)
+
+
+def _component_key(pollutant: str) -> str:
+    return pollutant.split("_")[0].upper()
+
+
+def mean_composite(df: pd.DataFrame) -> Optional[pd.Series]:
+    available = [p for p in COMPONENT_POLLUTANTS if p in df.columns]
+    if not available:
+        return None
+    return df[available].mean(axis=1)
+
+
+def sub_index(pollutant: str, values) -> np.ndarray:
+    """A component's concentrations on the common 0/50/100/150/200 scale."""
+    limits = np.array((0.0,) + tuple(THRESHOLDS[_component_key(pollutant)]), dtype=float)
+    values = np.asarray(values, dtype=float)
+    scaled = np.interp(values, limits, AQI_SCALE)
+    # Continue the last segment's slope above the Unhealthy limit
+    slope = (AQI_SCALE[-1] - AQI_SCALE[-2]) / (limits[-1] - limits[-2])
+    return np.where(values > limits[-1], AQI_SCALE[-1] + (values - limits[-1]) * slope, scaled)
+
+
+def aqi_composite(df: pd.DataFrame) -> Optional[pd.Series]:
+    available = [p for p in COMPONENT_POLLUTANTS if p in df.columns]
+    if not available:
+        return None
+    scaled = np.column_stack([sub_index(p, df[p]) for p in available])
+    weights = np.array([AQI_WEIGHTS[p] for p in available])
+    present = ~np.isnan(scaled)
+    total = np.where(present, weights, 0.0).sum(axis=1)
+    weighted = np.where(present, scaled * weights, 0.0).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pd.Series(np.where(total > 0, weighted / total, np.nan), index=df.index)
+
+
+def add_derived_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Write both composites into `df` (in place) and return it."""
+    composite = mean_composite(df)
+    if composite is not None:
+        df[COMPOSITE] = composite
+        df[AQI_COMPOSITE] = aqi_composite(df).round(2)
+    return df
+
+
+def pollutant_values(df: pd.DataFrame, pollutant: str) -> Optional[pd.Series]:
+    """
+    The value series for any pollutant, derived ones included: the stored
+    column, with rows that lack it derived from the components. None if it
+    cannot be produced.
+    """
+    key = pollutant.lower()
+    if key not in DERIVED:
+        return df[pollutant] if pollutant in df.columns else None
+
+    stored = df[key] if key in df.columns else None
+    if stored is not None and not stored.isna().any():
+        return stored
+    # Older files (or rows from them, after a concat) lack the column
+    derived = mean_composite(df) if key == COMPOSITE else aqi_composite(df)
+    if stored is None or derived is None:
+        return derived if stored is None else stored
+    return stored.fillna(derived)
+
+
+def needed_columns(pollutant: str) -> Set[str]:
+    """Columns to read for `pollutant` (derived ones fall back to their components)."""
+    key = pollutant.lower()
+    if key in DERIVED:
+        return {key, *COMPONENT_POLLUTANTS}
+    return {pollutant}
+
+
+def is_derived(pollutant: str) -> bool:
+    return pollutant.lower() in DERIVED
@@ -0,0 +1,104 @@
+# utils/downsample.py
+"""
+Shape-preserving downsampling of chart series.
+
+A year of hourly data is ~8,760 points, far more than a chart can show.
+Two reductions, both returning sorted indices into the original series so
+labels and values stay paired:
+
+- `lttb`: Largest-Triangle-Three-Buckets keeps the point in each bucket
+  that forms the largest triangle with its neighbours, which preserves the
+  visual shape (peaks, dips, slopes) of a line chart.
+- `minmax`: keeps the minimum and maximum of each bucket, an envelope that
+  never hides a spike; useful for band / area charts.
+
+`resample` averages onto a fixed resolution (hourly, daily, weekly) first.
+"""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+METHODS = ("lttb", "minmax")
+RESOLUTIONS = {"hourly": "h", "daily": "D", "weekly": "W-MON"}
+
+
+def _all(n: int) -> np.ndarray:
+    return np.arange(n)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """Indices of at most `max_points` points chosen by LTTB (first and last always kept)."""
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return _all(n) if max_points >= n else np.linspace(0, n - 1, max(max_points, 1)).astype(int)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Interior points split into max_points - 2 buckets
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+
+    # Average of each bucket, used as the third triangle vertex for the bucket before it
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    selected = np.empty(max_points, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    # Each choice depends on the previous one, so the loop is over buckets;
+    # the work inside a bucket is vectorized.
+    for b in range(max_points - 2):
+        lo, hi = edges[b], edges[b + 1]
+        ax, ay = x[prev], y[prev]
+        cx, cy = avg_x[b + 1], avg_y[b + 1]
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        prev = lo + int(np.argmax(area))
+        selected[b + 1] = prev
+    return selected
+
+
+def minmax(y: np.ndarray, max_points: int) -> np.ndarray:
+    """Indices of each bucket's minimum and maximum, in order (at most `max_points`)."""
+    n = len(y)
+    buckets = max_points // 2
+    if max_points >= n or buckets < 1:
+        return _all(n) if max_points >= n else np.array([int(np.argmax(y))])
+
+    size = -(-n // buckets)  # ceil; every row below gets at least one real value
+    rows = -(-n // size)
+    padded = np.full(rows * size, np.nan)
+    padded[:n] = y
+    grid = padded.reshape(rows, size)
+    offsets = np.arange(rows) * size
+    lows = offsets + np.nanargmin(grid, axis=1)
+    highs = offsets + np.nanargmax(grid, axis=1)
+    return np.unique(np.concatenate([lows, highs]))
+
+
+def resample(times: pd.Series, values: pd.Series, resolution: str) -> pd.Series:
+    """Mean of `values` per hour/day/week, indexed by period start; empty periods dropped."""
+    series = pd.Series(values.to_numpy(), index=pd.DatetimeIndex(times))
+    if resolution == "weekly":
+        return series.resample(RESOLUTIONS[resolution], label="left", closed="left").mean().dropna()
+    return series.resample(RESOLUTIONS[resolution]).mean().dropna()
+
+
+def downsample(
+    times: pd.Series,
+    values: pd.Series,
+    max_points: Optional[int] = None,
+    method: str = "lttb"
+) -> np.ndarray:
+    """Indices into a time-sorted series, reduced to `max_points` with `method`."""
+    n = len(values)
+    if not max_points or max_points >= n:
+        return _all(n)
+    y = values.to_numpy(dtype=float)
+    if method == "minmax":
+        return minmax(y, max_points)
+    x = pd.DatetimeIndex(times).asi8.astype(float)
+    return lttb(x, y, max_points)
@@ -1,8 +1,11 @@
 # utils/email_utils.py
 
+import asyncio
 import os
 import smtplib
-from email.mime.text import MIMEText
+import time
+from email.message import EmailMessage
+from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,18 +15,150 @@ SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
 SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASS = os.getenv("SMTP_PASS")
 SENDER_EMAIL = os.getenv("SENDER_EMAIL")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() != "false"
 
-def send_email_alert(to_email: str, subject: str, body: str):
-    msg = MIMEText(body)
+def build_message(to_email: str, subject: str, body: str, sender: Optional[str] = None) -> EmailMessage:
+    msg = EmailMessage()
     msg["Subject"] = subject
-    msg["From"] = SENDER_EMAIL
+    msg["From"] = sender or SENDER_EMAIL
     msg["To"] = to_email
+    msg.set_content(body)
+    return msg
 
-    try:
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
+
+class RateLimiter:
+    """Token bucket: at most `rate` acquisitions per second, bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class SMTPConnectionPool:
+    """
+    A few persistent SMTP sessions shared by async senders. Each session
+    connects, upgrades to TLS and logs in once, then sends many messages;
+    a dropped session is reopened and the message retried once. smtplib is
+    blocking, so each send runs in a worker thread.
+    """
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: Optional[bool] = None,
+        size: int = 2,
+        timeout: float = 30
+    ):
+        self.host = host or SMTP_HOST
+        self.port = port or SMTP_PORT
+        self.user = user if user is not None else SMTP_USER
+        self.password = password if password is not None else SMTP_PASS
+        self.starttls = SMTP_STARTTLS if starttls is None else starttls
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle: Optional[asyncio.Queue] = None
+        self._loop = None
+
+        self.connections_opened = 0
+        self.messages_sent = 0
+
+    def _queue(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._idle is None or self._loop is not loop:
+            self._idle = asyncio.Queue()
+            for _ in range(self.size):
+                self._idle.put_nowait(None)  # session slots, connected lazily
+            self._loop = loop
+        return self._idle
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
             server.starttls()
-            server.login(SMTP_USER, SMTP_PASS)
-            server.sendmail(SENDER_EMAIL, [to_email], msg.as_string())
-            print(f"✅ Alert sent to {to_email}")
-    except Exception as e:
-        print(f"❌ Failed to send alert to {to_email}: {str(e)}")
+        if self.user:
+            server.login(self.user, self.password)
+        self.connections_opened += 1
+        return server
+
+    def _send(self, server: Optional[smtplib.SMTP], message: EmailMessage):
+        for attempt in range(2):
+            if server is None:
+                server = self._connect()
+            try:
+                server.send_message(message)
+                self.messages_sent += 1
+                return server, None
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                _quietly_close(server)
+                server = None
+                if attempt:
+                    raise
+            except smtplib.SMTPRecipientsRefused as e:
+                return server, e  # the session itself is still usable
+            except Exception:
+                _quietly_close(server)
+                raise
+
+    async def send(self, message: EmailMessage):
+        idle = self._queue()
+        server = await idle.get()
+        try:
+            server, error = await asyncio.to_thread(self._send, server, message)
+        except Exception:
+            server = None
+            raise
+        finally:
+            idle.put_nowait(server)
+        if error is not None:
+            raise error
+
+    async def close(self):
+        if self._idle is None:
+            return
+        while not self._idle.empty():
+            server = self._idle.get_nowait()
+            if server is not None:
+                await asyncio.to_thread(_quietly_quit, server)
+        self._idle = None
+
+    def metrics(self):
+        return {
+            "pool_size": self.size,
+            "connections_opened": self.connections_opened,
+            "messages_sent": self.messages_sent,
+        }
+
+
+def _quietly_quit(server: smtplib.SMTP):
+    try:
+        server.quit()
+    except Exception:
+        _quietly_close(server)
+
+
+def _quietly_close(server: Optional[smtplib.SMTP]):
+    if server is None:
+        return
+    try:
+        server.close()
+    except Exception:
+        pass
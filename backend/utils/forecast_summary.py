@@ -0,0 +1,169 @@
+# utils/forecast_summary.py
+"""
+Compact forecast summaries for LLM prompts.
+
+Listing every forecast row makes prompts grow with the date range (a month
+of daily rows, or a multi-pollutant merge, is hundreds of lines). Beyond
+DAILY_ROWS rows the forecast is summarized instead: the period and worst
+category, a linear trend, days per category, the peak days and runs of
+consecutive days in the same category. The rendered summary is kept within a token budget by
+dropping the mildest, shortest runs first.
+"""
+
+import math
+import os
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from utils.aqi import AQI_CATEGORIES_ORDER
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 160))
+DAILY_ROWS = 7  # short forecasts are still listed day by day
+PEAK_DAYS = 3
+UNIT = "μg/m³"
+
+_SEVERITY = {category: i for i, category in enumerate(AQI_CATEGORIES_ORDER)}
+
+
+class CategoryRun(NamedTuple):
+    start: str
+    end: str
+    category: str
+    days: int
+    low: float
+    high: float
+
+
+class ForecastSummary(NamedTuple):
+    start: str
+    end: str
+    days: int
+    worst: str
+    slope: float  # units per day
+    trend: str  # "rising", "falling" or "stable"
+    peaks: List[dict]
+    runs: List[CategoryRun]
+    category_days: Dict[str, int]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English and numbers)."""
+    return max(1, math.ceil(len(text) / 4))
+
+
+def _date(row: dict) -> str:
+    return str(row["ds"])[:10]
+
+
+def _trend(dates: List[str], values: np.ndarray):
+    ok = ~np.isnan(values)
+    if ok.sum() < 2:
+        return 0.0, "stable"
+    days = np.array(dates, dtype="datetime64[D]").astype(float)[ok]
+    if days[-1] == days[0]:
+        return 0.0, "stable"
+    slope = float(np.polyfit(days - days[0], values[ok], 1)[0])
+    # Call it a trend only if it moves the level by 10% over the period
+    change = slope * (days[-1] - days[0])
+    if abs(change) < 0.1 * max(abs(float(np.mean(values[ok]))), 1e-9):
+        return slope, "stable"
+    return slope, "rising" if slope > 0 else "falling"
+
+
+def summarize(forecast_list: List[dict], peaks: int = PEAK_DAYS) -> ForecastSummary:
+    rows = sorted(forecast_list, key=lambda row: str(row["ds"]))
+    dates = [_date(row) for row in rows]
+    values = np.array([np.nan if row.get("yhat") is None else row["yhat"] for row in rows], dtype=float)
+    categories = [row.get("category", "Unknown") for row in rows]
+
+    runs = []
+    start = 0
+    for i in range(1, len(rows) + 1):
+        if i == len(rows) or categories[i] != categories[start]:
+            chunk = values[start:i]
+            chunk = chunk[~np.isnan(chunk)]
+            runs.append(CategoryRun(
+                dates[start], dates[i - 1], categories[start], len(set(dates[start:i])),
+                float(chunk.min()) if chunk.size else float("nan"),
+                float(chunk.max()) if chunk.size else float("nan"),
+            ))
+            start = i
+
+    # Highest values on separate episodes: skip days next to an earlier peak
+    peak_rows, taken = [], []
+    day_numbers = np.array(dates, dtype="datetime64[D]").astype(int)
+    for i in np.argsort(-np.nan_to_num(values, nan=-np.inf), kind="stable"):
+        if len(peak_rows) == peaks or np.isnan(values[i]):
+            break
+        if any(abs(day_numbers[i] - day) <= 1 for day in taken):
+            continue
+        taken.append(day_numbers[i])
+        peak_rows.append({"date": dates[i], "value": float(values[i]), "category": categories[i]})
+
+    category_days: Dict[str, int] = {}
+    for run in runs:
+        category_days[run.category] = category_days.get(run.category, 0) + run.days
+
+    slope, trend = _trend(dates, values)
+    worst = max(categories, key=lambda c: _SEVERITY.get(c, -1)) if categories else "Unknown"
+    return ForecastSummary(
+        dates[0] if dates else "", dates[-1] if dates else "", len({*dates}),
+        worst, slope, trend, peak_rows, runs, category_days
+    )
+
+
+def _run_line(run: CategoryRun) -> str:
+    span = run.start if run.start == run.end else f"{run.start} to {run.end}"
+    values = "" if math.isnan(run.low) else f", {run.low:.0f}–{run.high:.0f}"
+    unit = "day" if run.days == 1 else "days"
+    return f"- {span}: {run.category} ({run.days} {unit}{values})"
+
+
+def render(summary: ForecastSummary, max_tokens: int = PROMPT_TOKEN_BUDGET) -> str:
+    header = [
+        f"Period: {summary.start} to {summary.end} ({summary.days} days); worst category: {summary.worst}",
+        f"Trend: {summary.trend} ({summary.slope:+.1f} {UNIT} per day)",
+        "Days per category: " + ", ".join(
+            f"{category} {days}" for category, days in
+            sorted(summary.category_days.items(), key=lambda item: -_SEVERITY.get(item[0], -1))
+        ),
+    ]
+    peaks = list(summary.peaks)
+    runs = list(summary.runs)
+    omitted = 0
+
+    def text() -> str:
+        lines = list(header)
+        if peaks:
+            lines.append("Peak days: " + "; ".join(
+                f"{p['date']} {p['value']:.0f} {UNIT} ({p['category']})" for p in peaks
+            ))
+        lines.append("Periods by category:")
+        lines.extend(_run_line(run) for run in runs)
+        if omitted:
+            lines.append(f"- plus {omitted} shorter or milder periods")
+        return "\n".join(lines)
+
+    # Drop the mildest, then shortest, runs until the summary fits
+    while estimate_tokens(text()) > max_tokens and len(runs) > 1:
+        mildest = min(range(len(runs)), key=lambda i: (_SEVERITY.get(runs[i].category, -1), runs[i].days))
+        runs.pop(mildest)
+        omitted += 1
+    while estimate_tokens(text()) > max_tokens and len(peaks) > 1:
+        peaks.pop()
+    return text()
+
+
+def daily_lines(forecast_list: List[dict]) -> str:
+    return "\n".join(
+        f"{row['ds']}: {round(row['yhat'], 1)} {UNIT} ({row['category']})"
+        for row in forecast_list
+    )
+
+
+def compact_forecast(forecast_list: List[dict], max_tokens: Optional[int] = None) -> str:
+    """Forecast text for a prompt: daily lines for short forecasts, a bounded summary otherwise."""
+    if len(forecast_list) <= DAILY_ROWS:
+        return daily_lines(forecast_list)
+    return render(summarize(forecast_list), max_tokens or PROMPT_TOKEN_BUDGET)
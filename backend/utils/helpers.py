@@ -5,6 +5,7 @@ from dotenv import load_dotenv
 from io import BytesIO
 # import httpx  # duplicate import
 from core.config import settings
+from utils.aqi import AQI_CATEGORIES_ORDER, POLLUTANT_MAP, category_for  # noqa: F401
 import logging
 
 load_dotenv()
@@ -62,6 +63,20 @@ async def download_from_supabase_storage(filename: str, bucket: str) -> BytesIO:
 
     return BytesIO(response.content)
 
+async def download_range_from_supabase_storage(filename: str, bucket: str, start: int, end: int) -> bytes:
+    """Bytes [start, end) of a stored object, via an HTTP Range request."""
+    url = f"{settings.supabase_url}/storage/v1/object/public/{bucket}/{filename}"
+
+    async with httpx.AsyncClient() as client:
+        response = await client.get(url, headers={"Range": f"bytes={start}-{end - 1}"})
+
+    if response.status_code == 206:
+        return response.content
+    if response.status_code == 200:
+        # Server ignored the range and sent the whole object
+        return response.content[start:end]
+    raise Exception(f"❌ Failed to fetch '{filename}' [{start}:{end}] from bucket '{bucket}': {response.status_code} - {response.text}")
+
 async def delete_from_supabase_storage(filename: str, bucket: str = "datasets") -> None:
     supabase_admin = create_client(settings.supabase_url, settings.supabase_service_key)
 
@@ -71,87 +86,20 @@ async def delete_from_supabase_storage(filename: str, bucket: str = "datasets")
         raise RuntimeError(f"Failed to delete {filename} from Supabase: {response['error']['message']}")
 
 
-AQI_CATEGORIES_ORDER = [
-    "Good",
-    "Moderate",
-    "Unhealthy for Sensitive Groups",
-    "Unhealthy",
-    "Very Unhealthy"
-]
-
 def is_threshold_exceeded(current_category: str, user_threshold: str) -> bool:
     try:
         return AQI_CATEGORIES_ORDER.index(current_category) >= AQI_CATEGORIES_ORDER.index(user_threshold)
     except ValueError:
         return False
 
-POLLUTANT_MAP = {
-    "NO2_CONC": "NO2",
-    "O3_CONC": "O3",
-    "SO2_CONC": "SO2",
-    "CO_CONC": "CO",
-    "NO_CONC": "NO",
-    "POLLUTION": "POLLUTION"
-}
-
 def get_aqi_category(pollutant: str, value: float) -> str:
     """
     Maps a pollutant concentration to an AQI category.
-    Based on simplified WHO / EU thresholds.
+    Based on simplified WHO / EU thresholds (see utils.aqi; use
+    utils.aqi.categorize/classify for whole columns).
     """
-    pollutant = pollutant.strip().upper()
-    pollutant = POLLUTANT_MAP.get(pollutant, pollutant)
-
-    thresholds = {
-        "NO2": [
-            (20, "Good"),
-            (40, "Moderate"),
-            (80, "Unhealthy for Sensitive Groups"),
-            (120, "Unhealthy"),
-            (float("inf"), "Very Unhealthy")
-        ],
-        "O3": [
-            (60, "Good"),
-            (100, "Moderate"),
-            (160, "Unhealthy for Sensitive Groups"),
-            (200, "Unhealthy"),
-            (float("inf"), "Very Unhealthy")
-        ],
-        "SO2": [
-            (20, "Good"),
-            (50, "Moderate"),
-            (100, "Unhealthy for Sensitive Groups"),
-            (150, "Unhealthy"),
-            (float("inf"), "Very Unhealthy")
-        ],
-        "CO": [
-            (3, "Good"),
-            (6, "Moderate"),
-            (10, "Unhealthy for Sensitive Groups"),
-            (15, "Unhealthy"),
-            (float("inf"), "Very Unhealthy")
-        ],
-        "NO": [
-            (25, "Good"),
-            (50, "Moderate"),
-            (100, "Unhealthy for Sensitive Groups"),
-            (150, "Unhealthy"),
-            (float("inf"), "Very Unhealthy")
-        ],
-        "POLLUTION": [
-            (20, "Good"),
-            (40, "Moderate"),
-            (70, "Unhealthy for Sensitive Groups"),
-            (100, "Unhealthy"),
-            (float("inf"), "Very Unhealthy")
-        ]
-    }
-    for limit, category in thresholds.get(pollutant, []):
-            if value <= limit:
-                return category
-            
-    return "Unknown"
-        
+    return category_for(pollutant, value)
+
 def get_risk_level_from_category(category: str) -> str:
     """
     Maps AQI category to generalized risk level for health advice.
@@ -0,0 +1,24 @@
+# utils/sse.py
+"""Helpers for Server-Sent Events responses."""
+
+import json
+from typing import Any, AsyncIterator, Optional
+
+from fastapi.responses import StreamingResponse
+
+SSE_RETRY_MS = 5000
+
+
+def sse_event(event: str, data: Any, id: Optional[str] = None) -> str:
+    """One SSE frame; `data` is sent as JSON."""
+    frame = f"id: {id}\n" if id is not None else ""
+    return frame + f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def sse_response(frames: AsyncIterator[str]) -> StreamingResponse:
+    # X-Accel-Buffering stops nginx-style proxies from holding back frames
+    return StreamingResponse(
+        frames,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
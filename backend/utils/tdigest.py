@@ -0,0 +1,98 @@
+# utils/tdigest.py
+"""
+Mergeable quantile sketch (a merging t-digest, vectorized with NumPy).
+
+A digest summarizes a distribution as ~COMPRESSION/2 weighted centroids,
+small near the tails and larger around the median (arcsine scale
+function), plus the exact min, max and count. Digests of disjoint data
+merge by pooling centroids and recompressing, so per-dataset, per-month
+digests can be combined into any region/year/month distribution without
+touching the raw rows.
+
+Error: for continuous data, quantile and rank estimates are within
+RANK_ERROR (as a fraction of the count) of the exact empirical CDF, tighter
+towards the tails, also after merging; measured errors are below 0.1% (see
+test/test_distribution.py). Heavily tied data (a few distinct values) can
+interpolate between the tied values; ranks stay exact. Serialized digests
+are float32 (mean, weight) pairs, about 800 bytes at the default
+compression.
+"""
+
+from typing import Iterable, Optional
+
+import numpy as np
+
+COMPRESSION = 200
+RANK_ERROR = 0.005
+
+
+class TDigest:
+    __slots__ = ("means", "weights", "count", "min", "max")
+
+    def __init__(self, means=None, weights=None, min_value: float = np.nan, max_value: float = np.nan):
+        self.means = np.asarray(means if means is not None else [], dtype=float)
+        self.weights = np.asarray(weights if weights is not None else [], dtype=float)
+        self.count = float(self.weights.sum())
+        self.min = float(min_value)
+        self.max = float(max_value)
+
+    @classmethod
+    def from_values(cls, values, compression: int = COMPRESSION) -> "TDigest":
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return cls()
+        return cls._compress(np.sort(values), np.ones(values.size), values.min(), values.max(), compression)
+
+    @classmethod
+    def merge(cls, digests: Iterable["TDigest"], compression: int = COMPRESSION) -> "TDigest":
+        digests = [d for d in digests if d.count > 0]
+        if not digests:
+            return cls()
+        means = np.concatenate([d.means for d in digests])
+        weights = np.concatenate([d.weights for d in digests])
+        order = np.argsort(means, kind="stable")
+        return cls._compress(means[order], weights[order], min(d.min for d in digests),
+                             max(d.max for d in digests), compression)
+
+    @classmethod
+    def _compress(cls, means, weights, min_value, max_value, compression) -> "TDigest":
+        # Group sorted points so each centroid spans at most one unit of
+        # k(q) = compression / (2π) · asin(2q − 1), measured at its left edge
+        total = weights.sum()
+        left = (np.cumsum(weights) - weights) / total
+        k = compression / (2 * np.pi) * np.arcsin(2 * left - 1)
+        groups = np.floor(k - k[0]).astype(int)
+        _, groups = np.unique(groups, return_inverse=True)
+        group_weights = np.bincount(groups, weights=weights)
+        group_means = np.bincount(groups, weights=means * weights) / group_weights
+        return cls(group_means, group_weights, min_value, max_value)
+
+    def _knots(self):
+        # Each centroid sits at the middle of its cumulative weight
+        centers = np.cumsum(self.weights) - self.weights / 2
+        ranks = np.concatenate([[0.0], centers, [self.count]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return ranks, values
+
+    def quantile(self, q) -> Optional[np.ndarray]:
+        """Value(s) at quantile(s) q in [0, 1]."""
+        if self.count == 0:
+            return None
+        ranks, values = self._knots()
+        return np.interp(np.clip(np.asarray(q, dtype=float), 0, 1) * self.count, ranks, values)
+
+    def cdf(self, x) -> Optional[np.ndarray]:
+        """Fraction of observations at or below x."""
+        if self.count == 0:
+            return None
+        ranks, values = self._knots()
+        return np.interp(np.asarray(x, dtype=float), values, ranks) / self.count
+
+    def to_bytes(self) -> bytes:
+        return np.column_stack([self.means, self.weights]).astype(np.float32).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, min_value: float, max_value: float) -> "TDigest":
+        pairs = np.frombuffer(data, dtype=np.float32).reshape(-1, 2).astype(float)
+        return cls(pairs[:, 0], pairs[:, 1], min_value, max_value)
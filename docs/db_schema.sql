@@ -54,3 +54,142 @@ CREATE TABLE aqi_subscriptions (
     threshold TEXT NOT NULL,
     created_at TIMESTAMP NOT NULL DEFAULT now()
 );
+
+
+-- Ledger of triggered alerts; one row per subscription and forecast date,
+-- so re-evaluations never re-send the same alert
+CREATE TABLE aqi_alerts (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    subscription_id UUID NOT NULL REFERENCES aqi_subscriptions(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL REFERENCES users(id),
+    region TEXT NOT NULL,
+    pollutant TEXT NOT NULL,
+    forecast_date DATE NOT NULL,
+    value DOUBLE PRECISION NOT NULL,
+    category TEXT NOT NULL,
+    threshold TEXT NOT NULL,
+    message TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    sent_at TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    UNIQUE (subscription_id, forecast_date)
+);
+
+CREATE INDEX aqi_alerts_user_idx ON aqi_alerts (user_id, forecast_date);
+
+-- Last evaluated model version per (region, pollutant) and the newest
+-- subscription seen at that time; unchanged groups are skipped
+CREATE TABLE aqi_alert_evaluations (
+    region TEXT NOT NULL,
+    pollutant TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    last_subscription_at TIMESTAMP,
+    evaluated_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (region, pollutant)
+);
+
+-- Outgoing alert emails (one digest per user and evaluation run), drained
+-- by the mailer worker with retries
+CREATE TABLE email_outbox (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID REFERENCES users(id),
+    to_email TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    alert_ids JSONB NOT NULL DEFAULT '[]',
+    status TEXT NOT NULL DEFAULT 'pending',  -- pending | sending | sent | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT now(),
+    claimed_at TIMESTAMP,
+    sent_at TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE INDEX email_outbox_due_idx ON email_outbox (status, next_attempt_at);
+
+-- Generated health tips keyed by a signature of region, pollutant, forecast
+-- category runs and profile flags (see services/tip_cache.py)
+CREATE TABLE health_tip_cache (
+    signature TEXT PRIMARY KEY,
+    region TEXT NOT NULL,
+    pollutant TEXT NOT NULL,
+    tip JSONB NOT NULL,
+    generation_ms DOUBLE PRECISION,
+    ttl_seconds DOUBLE PRECISION,  -- NULL: TIP_CACHE_TTL; set by the nightly precompute job
+    created_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+-- Region ranking index: per-dataset sums/counts per pollutant (including the
+-- composite "pollution"), maintained on dataset upload/delete
+-- (see services/region_index.py)
+CREATE TABLE region_pollutant_means (
+    dataset_id UUID NOT NULL REFERENCES datasets(id) ON DELETE CASCADE,
+    region TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    pollutant TEXT NOT NULL,
+    value_sum DOUBLE PRECISION NOT NULL,
+    value_count INTEGER NOT NULL,
+    PRIMARY KEY (dataset_id, pollutant)
+);
+
+CREATE INDEX region_pollutant_means_rank_idx ON region_pollutant_means (year, pollutant, region);
+
+CREATE TABLE region_pollutant_daily (
+    dataset_id UUID NOT NULL REFERENCES datasets(id) ON DELETE CASCADE,
+    region TEXT NOT NULL,
+    pollutant TEXT NOT NULL,
+    day DATE NOT NULL,
+    value_sum DOUBLE PRECISION NOT NULL,
+    value_count INTEGER NOT NULL,
+    PRIMARY KEY (dataset_id, pollutant, day)
+);
+
+CREATE INDEX region_pollutant_daily_window_idx ON region_pollutant_daily (pollutant, day, region);
+
+-- Per-region time index of datasets for date-range reads: first/last
+-- timestamp and, for time-sorted files, the CSV header and the byte offset
+-- of each day ({"header", "size", "days": [[day, offset], ...]})
+-- (see services/time_index.py)
+CREATE TABLE dataset_time_index (
+    dataset_id UUID PRIMARY KEY REFERENCES datasets(id) ON DELETE CASCADE,
+    region TEXT NOT NULL,
+    time_start TIMESTAMP,
+    time_end TIMESTAMP,
+    row_count INTEGER NOT NULL,
+    blocks JSONB  -- NULL: rows not in time order; the file is read whole
+);
+
+CREATE INDEX dataset_time_index_range_idx ON dataset_time_index (LOWER(region), time_start, time_end);
+
+-- Quantile sketches (t-digests) per dataset, pollutant, grain ('hour' values
+-- or 'day' means) and calendar month; merged per region at query time
+-- (see services/distribution.py)
+CREATE TABLE pollutant_sketches (
+    dataset_id UUID NOT NULL REFERENCES datasets(id) ON DELETE CASCADE,
+    region TEXT NOT NULL,
+    pollutant TEXT NOT NULL,
+    grain TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    value_count INTEGER NOT NULL,
+    min_value DOUBLE PRECISION NOT NULL,
+    max_value DOUBLE PRECISION NOT NULL,
+    sketch BYTEA NOT NULL,  -- float32 (mean, weight) centroid pairs
+    PRIMARY KEY (dataset_id, pollutant, grain, year, month)
+);
+
+CREATE INDEX pollutant_sketches_lookup_idx ON pollutant_sketches (LOWER(region), pollutant, grain, year, month);
+
+-- Region centroids for spatial interpolation of forecasts; 'dataset' rows
+-- come from uploaded lat/lon columns, 'manual' rows are set by an admin and
+-- win over uploads (see services/spatial.py)
+CREATE TABLE region_centroids (
+    region TEXT NOT NULL,
+    lat DOUBLE PRECISION NOT NULL,
+    lon DOUBLE PRECISION NOT NULL,
+    source TEXT NOT NULL DEFAULT 'dataset',
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE UNIQUE INDEX region_centroids_region_idx ON region_centroids (LOWER(region));